@@ -3,3 +3,6 @@ from django.contrib import admin
 # Register your models here.
 from .models import Contact
 admin.site.register(Contact)
+
+from .models import ExportJob
+admin.site.register(ExportJob)
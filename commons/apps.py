@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CommonsConfig(AppConfig):
     name = 'commons'
+
+    def ready(self):
+        # Garder la carte d'identité de l'unité de travail cohérente avec les écritures
+        from commons import signals  # noqa: F401
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from commons.services.export_job_service import ExportJobService
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker des exports en tâche de fond : traite les exports (facturation de masse et archives PDF comprises) "
+        "en attente et reprend ceux qui ont été interrompus"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Traiter les exports disponibles puis s'arrêter",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help="Attente en secondes entre deux recherches d'exports (5 par défaut)",
+        )
+        parser.add_argument(
+            '--worker',
+            help="Nom du worker (par défaut hôte:pid)",
+        )
+
+    def handle(self, *args, **options):
+        processed = ExportJobService().run_pending_export_jobs(
+            worker=options['worker'],
+            once=options['once'],
+            poll_interval=options['poll_interval'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{processed} export(s) traité(s)"))
@@ -0,0 +1,12 @@
+from commons.repositories.unit_of_work import unit_of_work
+
+
+class UnitOfWorkMiddleware:
+    """Une unité de travail par requête : les repositories partagent sa carte d'identité, vidée en fin de requête"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with unit_of_work():
+            return self.get_response(request)
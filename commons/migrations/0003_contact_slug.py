@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commons', '0002_remove_invoiceorderline_invoice_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='slug',
+            field=models.SlugField(null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commons', '0003_contact_slug'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('export_job_id', models.AutoField(primary_key=True, serialize=False)),
+                ('entity', models.CharField(max_length=30)),
+                ('export_format', models.CharField(max_length=10)),
+                ('filters', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('En attente', 'En attente'), ('En cours', 'En cours'), ('Terminé', 'Terminé'), ('Échec', 'Échec')], default='En attente', max_length=20)),
+                ('rows_total', models.IntegerField(blank=True, null=True)),
+                ('rows_written', models.IntegerField(default=0)),
+                ('checkpoint_key', models.JSONField(blank=True, null=True)),
+                ('spool_offset', models.BigIntegerField(default=0)),
+                ('spool_complete', models.BooleanField(default=False)),
+                ('filename', models.CharField(blank=True, max_length=100)),
+                ('file_path', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='export_job_status_created')],
+            },
+        ),
+    ]
@@ -1 +1,2 @@
 from .contact_models import *
+from .export_job_models import *
\ No newline at end of file
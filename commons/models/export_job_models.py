@@ -0,0 +1,51 @@
+from django.db import models
+
+
+STATUS_CHOICES = (
+    ('En attente', 'En attente'),
+    ('En cours', 'En cours'),
+    ('Terminé', 'Terminé'),
+    ('Échec', 'Échec'),
+)
+
+
+class ExportJob(models.Model):
+    export_job_id = models.AutoField(primary_key=True)
+    entity = models.CharField(max_length=30)
+    export_format = models.CharField(max_length=10)
+    # Filtres de l'export (dates au format ISO)
+    filters = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='En attente')
+    rows_total = models.IntegerField(null=True, blank=True)
+    rows_written = models.IntegerField(default=0)
+    # Point de reprise : clé de la dernière ligne écrite et taille du fichier intermédiaire à ce moment
+    checkpoint_key = models.JSONField(null=True, blank=True)
+    spool_offset = models.BigIntegerField(default=0)
+    spool_complete = models.BooleanField(default=False)
+    filename = models.CharField(max_length=100, blank=True)
+    file_path = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    # Jeton de l'attribution en cours : un worker dont la tâche a été réattribuée ne peut plus l'écrire
+    claim_token = models.CharField(max_length=32, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='export_job_status_created'),
+        ]
+
+    @property
+    def progress(self):
+        """Avancement en pourcentage (None tant que le nombre de lignes n'est pas connu)"""
+        if self.status == 'Terminé':
+            return 100
+        if not self.rows_total:
+            return None
+        return min(int(self.rows_written * 100 / self.rows_total), 99)
+
+    def __str__(self):
+        return f"Export {self.export_job_id} - {self.entity} ({self.export_format}) - {self.status}"
@@ -1,5 +1,6 @@
 from commons.dtos import CreateContactDTO, UpdateContactDTO, ContactDTO
 from commons.models import Contact
+from commons.repositories.unit_of_work import get_by_pk
 
 
 class ContactRepository:
@@ -20,10 +21,10 @@ class ContactRepository:
         return self._model_to_dto(contact)
 
     def get_contact_id(self, contact_id):
-        return Contact.objects.get(contact_id=contact_id).contact_id
+        return get_by_pk(Contact, contact_id).contact_id
 
     def get_contact_first_name(self, contact_id):
-        return Contact.objects.get(contact_id=contact_id).first_name
+        return get_by_pk(Contact, contact_id).first_name
 
     def delete_contact(self, contact_id):
         contact = Contact.objects.get(contact_id=contact_id)
@@ -35,9 +36,13 @@ class ContactRepository:
         return [self._model_to_dto(contact) for contact in contacts]
 
     def get_contact_by_id(self, contact_id) -> ContactDTO:
-        contact = Contact.objects.get(contact_id=contact_id)
+        contact = get_by_pk(Contact, contact_id)
         return self._model_to_dto(contact)
 
+    def get_existing_contact_ids(self, contact_ids):
+        """Identifiants parmi `contact_ids` qui correspondent à un contact (une requête)"""
+        return set(Contact.objects.filter(contact_id__in=contact_ids).values_list('contact_id', flat=True))
+
     def update_contact(self, contact_id, dto: UpdateContactDTO) -> ContactDTO:
         contact = Contact.objects.get(contact_id=contact_id)
         if dto.first_name is not None:
@@ -77,3 +82,19 @@ class ContactRepository:
             state=contact.state,
             zip_code=contact.zip_code
         )
+
+    def get_contacts_for_export(self, status=None, contact_id=None):
+        """Contacts à exporter, `status` filtrant le type de contact"""
+        contacts = Contact.objects.all()
+        if status is not None:
+            contacts = contacts.filter(type=status)
+        if contact_id is not None:
+            contacts = contacts.filter(contact_id=contact_id)
+        return (
+            contacts
+            .values(
+                'contact_id', 'first_name', 'last_name', 'email', 'phone', 'type', 'siret',
+                'address', 'city', 'state', 'zip_code',
+            )
+            .order_by('contact_id')
+        )
@@ -0,0 +1,83 @@
+import uuid
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from commons.models import ExportJob
+
+
+class ExportJobClaimLost(Exception):
+    """La tâche a été réattribuée à un autre worker : le worker courant doit s'arrêter sans l'écrire"""
+
+
+class ExportJobRepository:
+
+    def create_export_job(self, entity, export_format, filters, filename):
+        return ExportJob.objects.create(
+            entity=entity,
+            export_format=export_format,
+            filters=filters,
+            filename=filename,
+        )
+
+    def get_export_job_by_id(self, export_job_id):
+        try:
+            return ExportJob.objects.get(export_job_id=export_job_id)
+        except ExportJob.DoesNotExist:
+            raise ValueError(f"Export avec l'ID {export_job_id} non trouvé")
+
+    def get_recent_export_jobs(self, limit=50):
+        return ExportJob.objects.order_by('-created_at', '-export_job_id')[:limit]
+
+    def claim_next_export_job(self, worker, stale_before):
+        """
+        Attribuer à `worker` la plus ancienne tâche en attente, ou une tâche en cours abandonnée
+        (sans signe de vie depuis `stale_before`). La mise à jour conditionnelle garantit
+        qu'une tâche n'est attribuée qu'à un seul worker ; le nouveau jeton d'attribution retire
+        au worker précédent le droit d'écrire la tâche.
+        """
+        candidates = (
+            ExportJob.objects
+            .filter(Q(status='En attente') | Q(status='En cours', heartbeat_at__lt=stale_before))
+            .order_by('created_at', 'export_job_id')
+        )
+        for job in candidates[:10]:
+            now = timezone.now()
+            claimed = ExportJob.objects.filter(
+                export_job_id=job.export_job_id, status=job.status, heartbeat_at=job.heartbeat_at
+            ).update(
+                status='En cours', worker=worker, claim_token=uuid.uuid4().hex, heartbeat_at=now,
+                started_at=job.started_at or now,
+            )
+            if claimed:
+                return self.get_export_job_by_id(job.export_job_id)
+        return None
+
+    @staticmethod
+    def _claimed(job):
+        """La tâche, tant qu'elle est attribuée au jeton de `job`"""
+        return ExportJob.objects.filter(export_job_id=job.export_job_id, claim_token=job.claim_token)
+
+    @staticmethod
+    def _check_claim(job, updated):
+        if not updated:
+            raise ExportJobClaimLost(f"Export {job.export_job_id} réattribué à un autre worker")
+        job.refresh_from_db()
+
+    def save_checkpoint(self, job, checkpoint_key, spool_offset, rows):
+        """
+        Enregistrer la progression après l'écriture (synchronisée sur disque) d'un bloc de lignes.
+        Lève ExportJobClaimLost si la tâche a été réattribuée (aucune ligne mise à jour)
+        """
+        updated = self._claimed(job).update(
+            checkpoint_key=checkpoint_key,
+            spool_offset=spool_offset,
+            rows_written=F('rows_written') + rows,
+            heartbeat_at=timezone.now(),
+        )
+        self._check_claim(job, updated)
+
+    def update_export_job(self, job, **fields):
+        """Mettre à jour la tâche attribuée ; lève ExportJobClaimLost si elle a été réattribuée"""
+        fields.setdefault('heartbeat_at', timezone.now())
+        self._check_claim(job, self._claimed(job).update(**fields))
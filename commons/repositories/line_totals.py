@@ -0,0 +1,30 @@
+from django.db.models import F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round
+
+
+def line_totals(lines, document_field):
+    """
+    Expressions des totaux HT, taxe et TTC d'un document (facture, devis/commande) calculés en base
+    à partir de ses lignes : `lines` est la requête de toutes les lignes, `document_field` le champ
+    qui les relie au document. Mêmes règles que le PDF : HT = prix HT x quantité, taxe = HT x taux / 100.
+    Utilisables dans update() pour écrire les totaux stockés ou dans annotate() pour les contrôler.
+    """
+    line_ht = Cast('price_ht', FloatField()) * F('quantity')
+
+    def total(expression):
+        subquery = (
+            lines.filter(**{document_field: OuterRef('pk')})
+            .order_by()
+            .values(document_field)
+            .annotate(total=Sum(expression, output_field=FloatField()))
+            .values('total')
+        )
+        return Round(Coalesce(Subquery(subquery, output_field=FloatField()), Value(0.0)), 2)
+
+    total_ht = total(line_ht)
+    total_tax = total(line_ht * Cast('tax', FloatField()) / Value(100.0))
+    return {
+        'total_ht': total_ht,
+        'total_tax': total_tax,
+        'total_ttc': total_ht + total_tax,
+    }
@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.exceptions import ValidationError
+
+_current_unit_of_work = ContextVar('unit_of_work', default=None)
+
+
+class UnitOfWork:
+    """
+    Unité de travail d'une requête : carte d'identité des lignes chargées par clé primaire. Une ligne lue plusieurs
+    fois par les repositories pendant la requête n'est chargée qu'une fois et reste la même instance.
+    Toute écriture (save, delete, update en masse) retire la ligne de la carte : la lecture suivante repart de la base.
+    """
+
+    def __init__(self):
+        self.identity_map = {}
+        self.loads = 0
+        self.hits = 0
+
+    @staticmethod
+    def key(model, pk):
+        return model._meta.concrete_model._meta.label, pk
+
+    def get(self, model, pk, loader):
+        """Instance de la carte, sinon chargée par `loader` puis enregistrée (une absence n'est pas retenue)"""
+        key = self.key(model, pk)
+        instance = self.identity_map.get(key)
+        if instance is not None:
+            self.hits += 1
+            return instance
+        instance = loader()
+        self.loads += 1
+        self.identity_map[key] = instance
+        return instance
+
+    def discard(self, model, pks):
+        for pk in pks:
+            self.identity_map.pop(self.key(model, pk), None)
+
+    def clear(self):
+        self.identity_map.clear()
+
+
+def current_unit_of_work():
+    """Unité de travail en cours (None hors requête ou bloc unit_of_work)"""
+    return _current_unit_of_work.get()
+
+
+@contextmanager
+def unit_of_work():
+    """Ouvrir une unité de travail (requête, commande, tâche) ; sa carte d'identité est vidée à la sortie"""
+    uow = UnitOfWork()
+    token = _current_unit_of_work.set(uow)
+    try:
+        yield uow
+    finally:
+        uow.clear()
+        _current_unit_of_work.reset(token)
+
+
+def get_by_pk(model, pk, queryset=None):
+    """
+    Instance de `model` pour la clé primaire `pk` : lue dans la carte d'identité de l'unité de travail en cours,
+    sinon en base avec `queryset` (par défaut le manager du modèle). Lève model.DoesNotExist comme Model.objects.get.
+    """
+    queryset = model._default_manager.all() if queryset is None else queryset
+    uow = _current_unit_of_work.get()
+    if uow is None:
+        return queryset.get(pk=pk)
+    try:
+        # '12' et 12 désignent la même ligne
+        pk = model._meta.pk.to_python(pk)
+    except ValidationError:
+        return queryset.get(pk=pk)
+    return uow.get(model, pk, lambda: queryset.get(pk=pk))
+
+
+def discard(model, pks):
+    """Retirer des lignes de la carte d'identité après une écriture qui ne passe pas par save/delete"""
+    uow = _current_unit_of_work.get()
+    if uow is not None:
+        uow.discard(model, pks)
@@ -19,5 +19,11 @@ class ContactService:
     def get_contact_by_id(self, contact_id) -> ContactDTO:
         return self.repo.get_contact_by_id(contact_id)
 
+    def get_contacts_for_export(self, status=None, contact_id=None):
+        return self.repo.get_contacts_for_export(status, contact_id)
+
+    def get_existing_contact_ids(self, contact_ids):
+        return self.repo.get_existing_contact_ids(contact_ids)
+
     def update_contact(self, contact_id, dto: UpdateContactDTO) -> ContactDTO:
         return self.repo.update_contact(contact_id, dto)
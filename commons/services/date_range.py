@@ -0,0 +1,21 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def start_of_day(day):
+    """Début du jour `day` à minuit, heure locale (datetime aware)"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(start=None, end=None):
+    """
+    Intervalle [début, fin[ de datetimes aware couvrant les jours `start` à `end` inclus ; une date non renseignée
+    laisse l'intervalle ouvert de ce côté. Lève ValueError si `start` est postérieur à `end`
+    """
+    if start is not None and end is not None and start > end:
+        raise ValueError("La date de début doit précéder la date de fin")
+    return (
+        start_of_day(start) if start else None,
+        start_of_day(end + timedelta(days=1)) if end else None,
+    )
@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import shutil
+import socket
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from commons.repositories.export_job_repository import ExportJobClaimLost, ExportJobRepository
+from commons.services.export_service import ExportService
+from commons.services.export_writers import JsonLinesExportWriter
+from invoicing.services.invoice_pdf_service import InvoicePdfBatchService
+from invoicing.services.mass_invoicing_service import MassInvoicingService
+
+
+logger = logging.getLogger(__name__)
+
+# Tâches de fond autres que les exports, traitées par le même worker : entité de la tâche -> service.
+# job_filters() valide la demande, run_job(job, jobs) écrit dans jobs.open_spool(job) avec ses points de reprise,
+# puis publie le fichier de la tâche (jobs.publish_spool ou jobs.publish_file).
+JOB_TASKS = {
+    service.JOB_ENTITY: service
+    for service in (MassInvoicingService, InvoicePdfBatchService)
+}
+
+
+class ExportJobService:
+    """
+    Exports en tâche de fond : les demandes sont enregistrées en base puis traitées par la commande
+    run_export_jobs. Les lignes sont d'abord écrites par blocs dans un fichier intermédiaire JSON Lines,
+    avec un point de reprise après chaque bloc, puis converties dans le format demandé.
+    Le même worker traite les tâches de JOB_TASKS, avec les mêmes points de reprise et fichiers intermédiaires.
+    Chaque attribution a son propre fichier intermédiaire : un worker dont la tâche a été réattribuée
+    n'écrit pas dans celui du worker qui la reprend, et s'arrête à son prochain point de reprise.
+    """
+
+    def __init__(self):
+        self.repo = ExportJobRepository()
+        self.export_service = ExportService()
+
+    @staticmethod
+    def _directory():
+        directory = Path(settings.EXPORT_JOBS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory
+
+    @staticmethod
+    def _chunk_size():
+        return getattr(settings, 'EXPORT_JOBS_CHUNK_SIZE', ExportService.CHUNK_SIZE)
+
+    @staticmethod
+    def _spool_extension(job):
+        task = JOB_TASKS.get(job.entity)
+        return task.JOB_SPOOL_FORMAT if task else 'jsonl'
+
+    def _spool_path(self, job):
+        return self._directory() / f"export_{job.export_job_id}_{job.claim_token}.{self._spool_extension(job)}.part"
+
+    def _adopt_spool(self, job):
+        """
+        Reprise d'une tâche réattribuée : copier la partie validée (jusqu'au point de reprise) du fichier
+        intermédiaire de l'attribution précédente, puis supprimer les fichiers des attributions précédentes
+        """
+        spool_path = self._spool_path(job)
+        directory = self._directory()
+        extension = self._spool_extension(job)
+        previous = [
+            path for pattern in (
+                f"export_{job.export_job_id}.{extension}.part", f"export_{job.export_job_id}_*.{extension}.part"
+            )
+            for path in directory.glob(pattern) if path != spool_path
+        ]
+        if not previous:
+            return
+        if job.spool_offset and not spool_path.exists():
+            source = max(previous, key=lambda path: path.stat().st_mtime)
+            if source.stat().st_size >= job.spool_offset:
+                with open(source, 'rb') as old_spool, open(spool_path, 'wb') as spool:
+                    shutil.copyfileobj(old_spool, spool)
+                    spool.truncate(job.spool_offset)
+        for path in previous:
+            path.unlink(missing_ok=True)
+
+    def _file_path(self, job):
+        return self._directory() / f"export_{job.export_job_id}_{job.filename}"
+
+    @staticmethod
+    def _decode_filters(filters):
+        return {
+            'start': date.fromisoformat(filters['start']) if filters.get('start') else None,
+            'end': date.fromisoformat(filters['end']) if filters.get('end') else None,
+            'status': filters.get('status'),
+            'contact_id': filters.get('contact_id'),
+        }
+
+    def submit_export_job(self, entity, export_format, start=None, end=None, status=None, contact_id=None):
+        """Valider puis enregistrer une demande d'export (aucune ligne n'est lue ici)"""
+        source = self.export_service.get_source(entity)
+        writer = self.export_service.get_writer(export_format)
+        self.export_service.get_queryset(entity, start, end, status, contact_id)
+
+        filters = {
+            'start': start.isoformat() if start else None,
+            'end': end.isoformat() if end else None,
+            'status': status or None,
+            'contact_id': contact_id,
+        }
+        return self.repo.create_export_job(entity, export_format, filters, f"{source.filename}.{writer.extension}")
+
+    def submit_task_job(self, entity, **options):
+        """Valider puis enregistrer une tâche de fond de JOB_TASKS (facturation de masse, archive PDF...)"""
+        try:
+            task = JOB_TASKS[entity]
+        except KeyError:
+            raise ValueError(f"La tâche doit être l'une de: {', '.join(JOB_TASKS)}")
+        filters = task().job_filters(**options)
+        return self.repo.create_export_job(entity, task.JOB_FORMAT, filters, task.JOB_FILENAME)
+
+    def get_export_job_by_id(self, export_job_id):
+        return self.repo.get_export_job_by_id(export_job_id)
+
+    def get_recent_export_jobs(self, limit=50):
+        return self.repo.get_recent_export_jobs(limit)
+
+    def get_export_file(self, export_job_id):
+        """Chemin du fichier d'un export terminé"""
+        job = self.repo.get_export_job_by_id(export_job_id)
+        if job.status != 'Terminé' or not job.file_path or not os.path.exists(job.file_path):
+            raise ValueError("Le fichier de cet export n'est pas disponible")
+        return job
+
+    def claim_next_export_job(self, worker):
+        stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'EXPORT_JOBS_STALE_AFTER', 300))
+        return self.repo.claim_next_export_job(worker, stale_before)
+
+    def run_export_job(self, job):
+        """Traiter une tâche attribuée, en reprenant au dernier point de reprise enregistré"""
+        try:
+            self._adopt_spool(job)
+            task = JOB_TASKS.get(job.entity)
+            if task is not None:
+                task().run_job(job, self)
+            else:
+                if not job.spool_complete:
+                    self._write_spool(job)
+                self._assemble(job)
+        except ExportJobClaimLost:
+            logger.warning("Export %s réattribué à un autre worker : arrêt du traitement", job.export_job_id)
+        except Exception as e:
+            logger.exception("Erreur lors de l'export %s", job.export_job_id)
+            try:
+                self.repo.update_export_job(job, status='Échec', error=str(e), finished_at=timezone.now())
+            except ExportJobClaimLost:
+                # Le worker qui a repris la tâche décide de son issue
+                pass
+        return job
+
+    def open_spool(self, job):
+        """
+        Fichier intermédiaire de l'attribution en cours, ramené au dernier point de reprise : les octets écrits
+        après ce point sont abandonnés. S'il est perdu ou plus court que ce point, la tâche repart du début
+        """
+        spool_path = self._spool_path(job)
+        if job.spool_offset and (not spool_path.exists() or spool_path.stat().st_size < job.spool_offset):
+            self.repo.update_export_job(job, checkpoint_key=None, spool_offset=0, rows_written=0)
+        with open(spool_path, 'ab') as spool:
+            spool.truncate(job.spool_offset)
+        return spool_path
+
+    def publish_spool(self, job):
+        """Publier le fichier intermédiaire complet comme fichier de la tâche, terminée"""
+        file_path = self._file_path(job)
+        os.replace(self._spool_path(job), file_path)
+        self.repo.update_export_job(job, status='Terminé', file_path=str(file_path), finished_at=timezone.now())
+
+    def publish_file(self, job, write):
+        """
+        Écrire le fichier de la tâche avec write(output) dans un fichier temporaire, le publier et terminer la tâche,
+        puis supprimer le fichier intermédiaire
+        """
+        file_path = self._file_path(job)
+        temporary_path = file_path.with_name(f"{file_path.name}.{job.claim_token}.tmp")
+        with open(temporary_path, 'wb') as output:
+            write(output)
+        os.replace(temporary_path, file_path)
+
+        self.repo.update_export_job(job, status='Terminé', file_path=str(file_path), finished_at=timezone.now())
+        self._spool_path(job).unlink(missing_ok=True)
+
+    def _write_spool(self, job):
+        source = self.export_service.get_source(job.entity)
+        spool_path = self.open_spool(job)
+
+        queryset = self.export_service.get_queryset(job.entity, **self._decode_filters(job.filters))
+        if job.rows_total is None:
+            self.repo.update_export_job(job, rows_total=queryset.count())
+        if job.checkpoint_key:
+            queryset = self.export_service.after_key(job.entity, queryset, job.checkpoint_key)
+
+        names = [column.name for column in source.columns]
+        with open(spool_path, 'ab') as spool:
+            for rows in self.export_service.iter_chunks(queryset, self._chunk_size()):
+                spool.write(''.join(
+                    json.dumps({name: row[name] for name in names}, default=JsonLinesExportWriter._default) + '\n'
+                    for row in rows
+                ).encode('utf-8'))
+                spool.flush()
+                os.fsync(spool.fileno())
+                self.repo.save_checkpoint(job, [rows[-1][name] for name in source.key], spool.tell(), len(rows))
+
+        self.repo.update_export_job(job, spool_complete=True)
+
+    def _read_spool(self, job, columns):
+        """Relire le fichier intermédiaire par blocs, en retrouvant les dates"""
+        temporal = [column.name for column in columns if column.type in ('date', 'datetime')]
+        chunk_size = self._chunk_size()
+        with open(self._spool_path(job), 'rb') as spool:
+            chunk = []
+            for line in spool:
+                row = json.loads(line)
+                for name in temporal:
+                    if row[name] is not None:
+                        row[name] = datetime.fromisoformat(row[name])
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+                    self.repo.update_export_job(job)
+            if chunk:
+                yield chunk
+
+    def _assemble(self, job):
+        """Convertir le fichier intermédiaire dans le format demandé, puis publier le fichier final"""
+        source = self.export_service.get_source(job.entity)
+        writer = self.export_service.get_writer(job.export_format)
+
+        def write(output):
+            for block in writer.write(source.columns, self._read_spool(job, source.columns)):
+                output.write(block)
+
+        self.publish_file(job, write)
+
+    def run_pending_export_jobs(self, worker=None, once=False, poll_interval=5):
+        """Boucle du worker : traiter les tâches disponibles, puis attendre les suivantes (sauf `once`)"""
+        worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        processed = 0
+        while True:
+            job = self.claim_next_export_job(worker)
+            if job is not None:
+                self.run_export_job(job)
+                processed += 1
+                continue
+            if once:
+                return processed
+            time.sleep(poll_interval)
@@ -0,0 +1,215 @@
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Tuple
+
+from django.db.models import Q
+
+from commons.services.contact_service import ContactService
+from commons.services.date_range import day_range
+from commons.services.export_writers import EXPORT_WRITERS
+from invoicing.services.invoice_service import InvoiceService
+from invoicing.services.receivables_service import ReceivablesService
+from payment.services.payment_service import PaymentService
+from sales.services.sales_order_line_service import SalesOrderLineService
+
+
+@dataclass(frozen=True)
+class ExportColumn:
+    name: str
+    label: str
+    type: str = 'str'
+
+
+@dataclass(frozen=True)
+class ExportSource:
+    """Entité exportable : requête de projection (valeurs) et colonnes du fichier"""
+    name: str
+    filename: str
+    get_queryset: Callable
+    columns: Tuple[ExportColumn, ...]
+    # Colonnes de tri qui identifient une ligne (reprise d'un export interrompu)
+    key: Tuple[str, ...]
+    filters: Tuple[str, ...] = ('start', 'end', 'status', 'contact_id')
+
+
+EXPORT_SOURCES = {
+    source.name: source
+    for source in (
+        ExportSource(
+            name='invoices',
+            filename='factures',
+            get_queryset=lambda **filters: InvoiceService().get_invoices_for_export(**filters),
+            columns=(
+                ExportColumn('invoice_id', 'ID Facture', 'int'),
+                ExportColumn('contact_name', 'Contact'),
+                ExportColumn('address', 'Adresse'),
+                ExportColumn('city', 'Ville'),
+                ExportColumn('zip_code', 'Code Postal'),
+                ExportColumn('email', 'Email'),
+                ExportColumn('phone', 'Téléphone'),
+                ExportColumn('total_ht', 'Montant HT', 'float'),
+                ExportColumn('total_ttc', 'Montant TTC', 'float'),
+                ExportColumn('status', 'Statut'),
+                ExportColumn('created_at', 'Date', 'date'),
+            ),
+            key=('invoice_id',),
+        ),
+        ExportSource(
+            name='sales_orders',
+            filename='devis_commandes',
+            get_queryset=lambda **filters: SalesOrderLineService().get_sales_order_lines_for_export(**filters),
+            columns=(
+                ExportColumn('order_id', 'ID Devis/Commande', 'int'),
+                ExportColumn('order_type', 'Type'),
+                ExportColumn('order_status', 'Statut'),
+                ExportColumn('order_genre', 'Genre'),
+                ExportColumn('order_created_at', 'Date de création', 'datetime'),
+                ExportColumn('contact_name', 'Contact'),
+                ExportColumn('sales_order_line_id', 'ID Ligne', 'int'),
+                ExportColumn('product_description', 'Produit'),
+                ExportColumn('genre', 'Genre de ligne'),
+                ExportColumn('quantity', 'Quantité', 'int'),
+                ExportColumn('price_ht', 'Prix HT', 'float'),
+                ExportColumn('tax', 'TVA (%)', 'float'),
+                ExportColumn('price_it', 'Prix TTC', 'float'),
+                ExportColumn('date', 'Date de ligne', 'date'),
+            ),
+            key=('order_id', 'sales_order_line_id'),
+        ),
+        ExportSource(
+            name='payments',
+            filename='paiements',
+            get_queryset=lambda **filters: PaymentService().get_payments_for_export(**filters),
+            columns=(
+                ExportColumn('payment_id', 'ID Paiement', 'int'),
+                ExportColumn('invoice', 'ID Facture', 'int'),
+                ExportColumn('contact_name', 'Contact'),
+                ExportColumn('payment_method', 'Moyen de paiement'),
+                ExportColumn('state_payment', 'Statut'),
+                ExportColumn('amount', 'Montant', 'float'),
+                ExportColumn('created_at', 'Date', 'datetime'),
+            ),
+            key=('payment_id',),
+        ),
+        ExportSource(
+            name='receivables',
+            filename='balance_agee',
+            get_queryset=lambda **filters: ReceivablesService().get_aging_for_export(**filters),
+            columns=(
+                ExportColumn('contact_id', 'ID Contact', 'int'),
+                ExportColumn('contact_name', 'Contact'),
+                ExportColumn('invoice_count', 'Factures ouvertes', 'int'),
+                ExportColumn('days_0_30', '0-30 jours', 'float'),
+                ExportColumn('days_31_60', '31-60 jours', 'float'),
+                ExportColumn('days_61_90', '61-90 jours', 'float'),
+                ExportColumn('days_over_90', 'Plus de 90 jours', 'float'),
+                ExportColumn('total_outstanding', 'Total à encaisser', 'float'),
+            ),
+            key=('contact_id',),
+            filters=('contact_id',),
+        ),
+        ExportSource(
+            name='contacts',
+            filename='contacts',
+            get_queryset=lambda **filters: ContactService().get_contacts_for_export(**filters),
+            columns=(
+                ExportColumn('contact_id', 'ID Contact', 'int'),
+                ExportColumn('first_name', 'Prénom'),
+                ExportColumn('last_name', 'Nom'),
+                ExportColumn('email', 'Email'),
+                ExportColumn('phone', 'Téléphone'),
+                ExportColumn('type', 'Type'),
+                ExportColumn('siret', 'SIRET'),
+                ExportColumn('address', 'Adresse'),
+                ExportColumn('city', 'Ville'),
+                ExportColumn('state', 'Région'),
+                ExportColumn('zip_code', 'Code Postal'),
+            ),
+            key=('contact_id',),
+            filters=('status', 'contact_id'),
+        ),
+    )
+}
+
+
+@dataclass
+class Export:
+    """Export prêt à être envoyé : contenu en flux de bytes et métadonnées du fichier"""
+    content: object
+    content_type: str
+    filename: str
+
+
+class ExportService:
+    """Exports en streaming de toute entité déclarée dans EXPORT_SOURCES vers tout format de EXPORT_WRITERS"""
+
+    CHUNK_SIZE = 2000
+
+    def get_source(self, entity):
+        try:
+            return EXPORT_SOURCES[entity]
+        except KeyError:
+            raise ValueError(f"L'entité doit être l'une de: {', '.join(EXPORT_SOURCES)}")
+
+    def get_writer(self, export_format):
+        try:
+            writer = EXPORT_WRITERS[export_format]()
+        except KeyError:
+            raise ValueError(f"Le format doit être l'un de: {', '.join(EXPORT_WRITERS)}")
+        writer.check_available()
+        return writer
+
+    def get_queryset(self, entity, start=None, end=None, status=None, contact_id=None):
+        """
+        Requête de l'export. `start` et `end` sont des dates incluses ; les filtres non renseignés
+        sont ignorés et un filtre que l'entité ne gère pas est refusé
+        """
+        source = self.get_source(entity)
+        created_from, created_before = day_range(start, end)
+
+        filters = {
+            'start': created_from,
+            'end': created_before,
+            'status': status or None,
+            'contact_id': contact_id,
+        }
+        unsupported = [name for name, value in filters.items() if value is not None and name not in source.filters]
+        if unsupported:
+            raise ValueError(f"Filtre(s) non disponible(s) pour cet export : {', '.join(unsupported)}")
+
+        return source.get_queryset(**{name: filters[name] for name in source.filters})
+
+    def after_key(self, entity, queryset, key_values):
+        """Restreindre la requête aux lignes situées après la clé `key_values` (ordre de la clé de l'entité)"""
+        key = self.get_source(entity).key
+        condition = Q()
+        # (a, b) > (x, y)  <=>  a > x  OU  (a = x ET b > y)
+        for position, name in enumerate(key):
+            equal_prefix = {key[i]: key_values[i] for i in range(position)}
+            condition |= Q(**equal_prefix, **{f'{name}__gt': key_values[position]})
+        return queryset.filter(condition)
+
+    def iter_chunks(self, queryset, chunk_size=None):
+        """Parcourir la requête par blocs de lignes via un curseur côté serveur (une seule requête)"""
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        rows = queryset.iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def export(self, entity, export_format, chunk_size=None, **filters):
+        """
+        Préparer l'export d'une entité : les paramètres sont validés immédiatement,
+        les lignes ne sont lues qu'au fil de la consommation du contenu
+        """
+        source = self.get_source(entity)
+        writer = self.get_writer(export_format)
+        queryset = self.get_queryset(entity, **filters)
+
+        return Export(
+            content=writer.write(source.columns, self.iter_chunks(queryset, chunk_size)),
+            content_type=writer.content_type,
+            filename=f"{source.filename}.{writer.extension}",
+        )
@@ -0,0 +1,236 @@
+import csv
+import json
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.utils import timezone
+
+
+def _local(value):
+    """Date/heure dans le fuseau horaire du projet"""
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.localtime(value)
+    return value
+
+
+def to_python(value, column_type):
+    """Convertir une valeur brute de la base vers le type déclaré de la colonne"""
+    if value is None:
+        return None
+    if column_type == 'float':
+        return float(value)
+    if column_type == 'int':
+        return int(value)
+    if column_type == 'date' and isinstance(value, datetime):
+        return _local(value).date()
+    if column_type == 'datetime':
+        return _local(value)
+    if column_type == 'str':
+        return str(value).strip()
+    return value
+
+
+class Echo:
+    """Pseudo-fichier dont `write` retourne la ligne au lieu de la stocker (pour csv.writer en streaming)"""
+
+    def write(self, value):
+        return value
+
+
+class ExportWriter:
+    """
+    Écrit des blocs de lignes dans un format de fichier.
+    `write(columns, chunks)` est un générateur de bytes : chaque bloc est écrit puis oublié.
+    """
+    name = None
+    content_type = 'application/octet-stream'
+    extension = None
+
+    def check_available(self):
+        """Lever une ValueError si une dépendance optionnelle du format manque"""
+
+    def write(self, columns, chunks):
+        raise NotImplementedError
+
+
+class CsvExportWriter(ExportWriter):
+    """CSV séparé par des points-virgules, lisible directement par Excel"""
+    name = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    @staticmethod
+    def _format(value, column_type):
+        value = to_python(value, column_type)
+        if value is None:
+            return ''
+        if column_type == 'float':
+            return f"{value:.2f}"
+        if column_type == 'date':
+            return value.strftime('%d/%m/%Y')
+        if column_type == 'datetime':
+            return value.strftime('%d/%m/%Y %H:%M')
+        return value
+
+    def write(self, columns, chunks):
+        yield 'sep=;\n'.encode('utf-8')
+        yield '\ufeff'.encode('utf-8')
+
+        writer = csv.writer(Echo(), delimiter=';', quoting=csv.QUOTE_MINIMAL)
+        yield writer.writerow([column.label for column in columns]).encode('utf-8')
+        for rows in chunks:
+            yield ''.join(
+                writer.writerow([self._format(row[column.name], column.type) for column in columns])
+                for row in rows
+            ).encode('utf-8')
+
+
+class JsonLinesExportWriter(ExportWriter):
+    """Un objet JSON par ligne, dates au format ISO 8601"""
+    name = 'jsonl'
+    content_type = 'application/x-ndjson'
+    extension = 'jsonl'
+
+    @staticmethod
+    def _default(value):
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return float(value)
+        raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+    def write(self, columns, chunks):
+        for rows in chunks:
+            yield ''.join(
+                json.dumps(
+                    {column.name: to_python(row[column.name], column.type) for column in columns},
+                    ensure_ascii=False, default=self._default,
+                ) + '\n'
+                for row in rows
+            ).encode('utf-8')
+
+
+class XlsxExportWriter(ExportWriter):
+    """Classeur Excel écrit en mode write-only (lignes écrites sur disque au fil de l'eau), nécessite openpyxl"""
+    name = 'xlsx'
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    extension = 'xlsx'
+    block_size = 64 * 1024
+
+    def check_available(self):
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise ValueError("L'export XLSX nécessite le paquet openpyxl")
+
+    @staticmethod
+    def _cell(value, column_type):
+        value = to_python(value, column_type)
+        # Excel ne gère pas les fuseaux horaires : heure locale sans fuseau
+        if isinstance(value, datetime) and timezone.is_aware(value):
+            return timezone.make_naive(value)
+        return value
+
+    def write(self, columns, chunks):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Export')
+        sheet.append([column.label for column in columns])
+        for rows in chunks:
+            for row in rows:
+                sheet.append([self._cell(row[column.name], column.type) for column in columns])
+
+        # Le format zip n'est complet qu'une fois le classeur fermé : il est relu depuis un fichier temporaire
+        with tempfile.TemporaryFile() as output:
+            workbook.save(output)
+            output.seek(0)
+            while True:
+                block = output.read(self.block_size)
+                if not block:
+                    break
+                yield block
+
+
+class _StreamSink:
+    """Fichier en écriture seule dont le contenu est vidé après chaque groupe de lignes"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+class ParquetExportWriter(ExportWriter):
+    """Fichier Parquet, un groupe de lignes par bloc, nécessite pyarrow"""
+    name = 'parquet'
+    content_type = 'application/vnd.apache.parquet'
+    extension = 'parquet'
+
+    def check_available(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("L'export Parquet nécessite le paquet pyarrow")
+
+    @staticmethod
+    def _schema(columns):
+        import pyarrow as pa
+
+        types = {
+            'int': pa.int64(),
+            'float': pa.float64(),
+            'str': pa.string(),
+            'date': pa.date32(),
+            'datetime': pa.timestamp('us', tz='UTC'),
+        }
+        return pa.schema([(column.name, types[column.type]) for column in columns])
+
+    def write(self, columns, chunks):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = self._schema(columns)
+        sink = _StreamSink()
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+        try:
+            for rows in chunks:
+                table = pa.Table.from_pylist(
+                    [{column.name: to_python(row[column.name], column.type) for column in columns} for row in rows],
+                    schema=schema,
+                )
+                writer.write_table(table)
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+
+EXPORT_WRITERS = {
+    writer.name: writer
+    for writer in (CsvExportWriter, XlsxExportWriter, JsonLinesExportWriter, ParquetExportWriter)
+}
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+# Taille estimée de chaque répertoire de cache dans ce processus : [octets, écritures depuis le dernier parcours].
+# Les autres processus écrivent aussi : l'estimation est recalée par un parcours complet toutes les N écritures.
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+class PdfCacheService:
+    """
+    Cache disque des PDF générés, adressé par le contenu : la clé est l'empreinte SHA-256 de tout ce que
+    le document affiche. Une modification du document donne une nouvelle clé, l'ancien fichier n'est plus
+    lu et finit évincé. La taille du cache est bornée par PDF_CACHE_MAX_BYTES (éviction LRU), le répertoire
+    n'étant parcouru que lorsque la taille estimée dépasse ce maximum ou toutes les PDF_CACHE_EVICT_EVERY écritures.
+    """
+
+    def __init__(self):
+        self.directory = Path(settings.PDF_CACHE_DIR)
+        self.max_bytes = getattr(settings, 'PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+        self.evict_every = getattr(settings, 'PDF_CACHE_EVICT_EVERY', 100)
+
+    @staticmethod
+    def content_key(content):
+        """Empreinte d'un contenu sérialisable en JSON (dates et décimaux convertis en texte)"""
+        serialized = json.dumps(content, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.pdf"
+
+    def open(self, key):
+        """Fichier en cache ouvert en lecture, ou None. La date de modification sert d'horodatage LRU"""
+        path = self._path(key)
+        try:
+            cached = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Évincé entre-temps : le fichier déjà ouvert reste lisible
+            pass
+        return cached
+
+    def store(self, key, buffer):
+        """Enregistrer un PDF (BytesIO) sous sa clé, puis ramener le cache sous sa taille maximale si besoin"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Fichier temporaire unique (processus et threads) renommé atomiquement : un lecteur ne voit jamais un PDF partiel
+        output = tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix='.tmp', delete=False)
+        try:
+            with output:
+                output.write(buffer.getbuffer())
+            os.replace(output.name, path)
+        except BaseException:
+            Path(output.name).unlink(missing_ok=True)
+            raise
+
+        size = buffer.getbuffer().nbytes
+        with _usage_lock:
+            usage = _usage.get(self.directory)
+            if usage is not None:
+                usage[0] += size
+                usage[1] += 1
+            needs_eviction = usage is None or usage[0] > self.max_bytes or usage[1] >= self.evict_every
+        if needs_eviction:
+            self.evict()
+
+    def evict(self):
+        """Supprimer les fichiers les moins récemment servis tant que le cache dépasse sa taille maximale"""
+        entries = []
+        for path in self.directory.glob('*/*.pdf'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+        with _usage_lock:
+            _usage[self.directory] = [total, 0]
+
+    def get_or_render(self, content, render):
+        """
+        PDF du contenu : le fichier en cache s'il existe, sinon `render()` (qui retourne un BytesIO)
+        est appelé et son résultat enregistré. Retourne (fichier, trouvé_en_cache)
+        """
+        key = self.content_key(content)
+        cached = self.open(key)
+        if cached is not None:
+            return cached, True
+
+        buffer = render()
+        self.store(key, buffer)
+        buffer.seek(0)
+        return buffer, False
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from commons.models import Contact
+from commons.repositories.unit_of_work import discard
+from invoicing.models import Invoice
+from payment.models import Payment
+from products.models import Product
+from sales.models import SalesOrder
+
+
+@receiver(post_save, sender=Contact)
+@receiver(post_delete, sender=Contact)
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=SalesOrder)
+@receiver(post_delete, sender=SalesOrder)
+def discard_from_identity_map(sender, instance, **kwargs):
+    """Une ligne écrite est retirée de la carte d'identité de la requête : relue en base au prochain accès"""
+    discard(sender, [instance.pk])
@@ -0,0 +1,44 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.utils.text import slugify
+
+from commons.dtos import CreateContactDTO
+from commons.services.contact_service import ContactService
+from invoicing.services.invoice_service import InvoiceService
+
+
+class TestDataMixin:
+    """Contacts, factures et cache de dashboard de test partagés par les tests des applications"""
+
+    def _create_contact(self, last_name, first_name="Client"):
+        """Contact client ; seuls les noms varient d'un test à l'autre"""
+        return ContactService().create_contact(CreateContactDTO(
+            first_name=first_name, last_name=last_name, email=f"{slugify(first_name)}.{slugify(last_name)}@test.com",
+            phone="0123456789", type="client", siret="12345678901234", address="1 rue du Test", city="Paris",
+            state="Île-de-France", zip_code="75001",
+        ))
+
+    def _create_invoice_for(self, contact, name, **fields):
+        """Facture reprenant les coordonnées du contact"""
+        return InvoiceService().create_invoice(
+            contact_id=contact.contact_id, name=name, address=contact.address, city=contact.city,
+            state=contact.state, zip_code=contact.zip_code, siret=contact.siret, email=contact.email,
+            phone=contact.phone, **fields
+        )
+
+    def _use_temp_dashboard_cache(self):
+        """Cache de dashboard temporaire : les invalidations validées n'écrivent pas dans le cache du projet"""
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        settings_override = override_settings(CACHES={
+            **settings.CACHES,
+            'dashboard': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.cache_dir,
+            },
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
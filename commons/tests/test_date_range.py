@@ -0,0 +1,27 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from commons.services.date_range import day_range, start_of_day
+
+
+class DateRangeTests(SimpleTestCase):
+
+    def test_day_range_covers_whole_days(self):
+        """[début, fin[ va de minuit (heure locale) du premier jour à minuit du lendemain du dernier"""
+        start, end = day_range(date(2026, 3, 28), date(2026, 3, 29))
+
+        self.assertEqual(timezone.localtime(start).replace(tzinfo=None), datetime(2026, 3, 28))
+        self.assertEqual(timezone.localtime(end).replace(tzinfo=None), datetime(2026, 3, 30))
+        # Changement d'heure le 29 mars : la durée suit l'heure locale, pas 48 heures
+        self.assertEqual(end.astimezone(dt_timezone.utc) - start.astimezone(dt_timezone.utc), timedelta(hours=47))
+        self.assertEqual(start, start_of_day(date(2026, 3, 28)))
+
+    def test_open_bounds_and_order(self):
+        """Une date non renseignée laisse l'intervalle ouvert ; un début après la fin est refusé"""
+        self.assertEqual(day_range(), (None, None))
+        self.assertEqual(day_range(end=date(2026, 1, 1))[0], None)
+        self.assertEqual(day_range(start=date(2026, 1, 1))[1], None)
+        with self.assertRaisesMessage(ValueError, "La date de début doit précéder la date de fin"):
+            day_range(date(2026, 1, 2), date(2026, 1, 1))
@@ -0,0 +1,147 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from commons.dtos import CreateContactDTO
+from commons.models import ExportJob
+from commons.repositories.export_job_repository import ExportJobRepository
+from commons.services.contact_service import ContactService
+from commons.services.export_job_service import ExportJobService
+from commons.services.export_service import ExportService
+
+
+class ExportJobTests(TestCase):
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_dir)
+        settings_override = override_settings(EXPORT_JOBS_DIR=self.export_dir, EXPORT_JOBS_CHUNK_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.service = ExportJobService()
+        contact_service = ContactService()
+        for index in range(5):
+            contact_service.create_contact(CreateContactDTO(
+                first_name=f"Client{index}", last_name="Export", email=f"client{index}@test.com",
+                phone="0123456789", type="client", siret="12345678901234", address="1 rue de l'Export",
+                city="Paris", state="Île-de-France", zip_code="75001",
+            ))
+
+    def _expected_content(self, entity, export_format):
+        return b''.join(ExportService().export(entity, export_format).content)
+
+    def _read(self, job):
+        with open(job.file_path, 'rb') as exported:
+            return exported.read()
+
+    def test_worker_writes_export_file(self):
+        """Le worker traite l'export en attente et produit le même fichier que l'export direct"""
+        job = self.service.submit_export_job('contacts', 'csv')
+        self.assertEqual(job.status, 'En attente')
+
+        call_command('run_export_jobs', '--once', stdout=mock.MagicMock())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Terminé')
+        self.assertEqual((job.rows_written, job.rows_total, job.progress), (5, 5, 100))
+        self.assertEqual(self._read(job), self._expected_content('contacts', 'csv'))
+
+        response = self.client.get(reverse('commons:export_job_download', args=[job.export_job_id]))
+        self.assertEqual(b''.join(response.streaming_content), self._read(job))
+        self.assertIn('contacts.csv', response['Content-Disposition'])
+
+    def test_interrupted_job_resumes_from_checkpoint(self):
+        """Un export interrompu reprend après le dernier bloc validé, sans doublon ni perte"""
+        job = self.service.submit_export_job('contacts', 'jsonl')
+        save_checkpoint = ExportJobRepository.save_checkpoint
+        calls = []
+
+        def crash_on_second_checkpoint(repo, *args):
+            calls.append(args)
+            if len(calls) == 2:
+                # Arrêt brutal : le 2e bloc est écrit sur disque mais son point de reprise n'est pas enregistré
+                raise KeyboardInterrupt
+            return save_checkpoint(repo, *args)
+
+        with mock.patch.object(ExportJobRepository, 'save_checkpoint', crash_on_second_checkpoint):
+            with self.assertRaises(KeyboardInterrupt):
+                self.service.run_pending_export_jobs(worker='worker-1', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written, job.worker), ('En cours', 2, 'worker-1'))
+
+        # Un autre worker reprend la tâche abandonnée
+        with override_settings(EXPORT_JOBS_STALE_AFTER=-1):
+            self.assertEqual(self.service.run_pending_export_jobs(worker='worker-2', once=True), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written, job.worker), ('Terminé', 5, 'worker-2'))
+        self.assertEqual(self._read(job), self._expected_content('contacts', 'jsonl'))
+
+    def test_reclaimed_job_stops_previous_worker(self):
+        """Un worker dont la tâche a été réattribuée s'arrête à son point de reprise suivant, sans l'écrire"""
+        job = self.service.submit_export_job('contacts', 'jsonl')
+        save_checkpoint = ExportJobRepository.save_checkpoint
+        reclaimed = []
+
+        def reclaim_after_first_checkpoint(repo, stalled_job, *args):
+            if stalled_job.rows_written == 2 and not reclaimed:
+                # worker-1 semble abandonné (signe de vie trop ancien) : worker-2 reprend la tâche
+                with override_settings(EXPORT_JOBS_STALE_AFTER=-1):
+                    reclaimed.append(self.service.claim_next_export_job('worker-2'))
+            return save_checkpoint(repo, stalled_job, *args)
+
+        with mock.patch.object(ExportJobRepository, 'save_checkpoint', reclaim_after_first_checkpoint), \
+                self.assertLogs('commons.services.export_job_service', 'WARNING'):
+            self.service.run_pending_export_jobs(worker='worker-1', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written, job.worker), ('En cours', 2, 'worker-2'))
+        self.assertEqual(job.claim_token, reclaimed[0].claim_token)
+
+        self.service.run_export_job(reclaimed[0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written), ('Terminé', 5))
+        self.assertEqual(self._read(job), self._expected_content('contacts', 'jsonl'))
+        self.assertEqual(sorted(os.listdir(self.export_dir)), [os.path.basename(job.file_path)])
+
+    def test_running_job_is_not_claimed_twice(self):
+        """Une tâche en cours avec un signe de vie récent n'est pas attribuée à un autre worker"""
+        self.service.submit_export_job('contacts', 'csv')
+
+        self.assertIsNotNone(self.service.claim_next_export_job('worker-1'))
+        self.assertIsNone(self.service.claim_next_export_job('worker-2'))
+
+    def test_failed_job_records_error(self):
+        """Une erreur pendant l'export passe la tâche en échec avec son message"""
+        job = self.service.submit_export_job('contacts', 'csv')
+
+        with mock.patch.object(ExportService, 'iter_chunks', side_effect=RuntimeError("disque plein")), \
+                self.assertLogs('commons.services.export_job_service', 'ERROR'):
+            self.service.run_pending_export_jobs(once=True)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('Échec', "disque plein"))
+
+    def test_export_submission_view(self):
+        """Les pages de liste soumettent l'export en tâche de fond et redirigent vers son suivi"""
+        response = self.client.post(reverse('commons:export', args=['contacts', 'xlsx']))
+
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('commons:export_job_detail', args=[job.export_job_id]))
+        self.assertEqual((job.entity, job.export_format, job.filename), ('contacts', 'xlsx', 'contacts.xlsx'))
+
+        response = self.client.post(reverse('invoicing:invoice_export_csv'), {'start': '2026-01-01', 'status': 'Confirmé'})
+        job = ExportJob.objects.get(entity='invoices')
+        self.assertEqual(job.filters['start'], '2026-01-01')
+        self.assertEqual(job.filters['status'], 'Confirmé')
+
+        response = self.client.post(reverse('commons:export', args=['contacts', 'pdf']))
+        self.assertRedirects(response, reverse('commons:contact_list'))
+        self.assertEqual(ExportJob.objects.count(), 2)
@@ -0,0 +1,136 @@
+import importlib.util
+import io
+import json
+import unittest
+from datetime import date
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from commons.dtos import CreateContactDTO
+from commons.services.contact_service import ContactService
+from commons.services.export_service import ExportService
+from invoicing.services.invoice_service import InvoiceService
+from payment.services.payment_service import PaymentService
+from products.services.product_service import ProductService
+from sales.services.sales_order_line_service import SalesOrderLineService
+from sales.services.sales_order_service import SalesOrderService
+
+
+class ExportServiceTests(TestCase):
+
+    def setUp(self):
+        self.export_service = ExportService()
+        self.contact = ContactService().create_contact(CreateContactDTO(
+            first_name="Client", last_name="Export", email="export@test.com", phone="0123456789",
+            type="client", siret="12345678901234", address="1 rue de l'Export", city="Paris",
+            state="Île-de-France", zip_code="75001",
+        ))
+        self.product = ProductService().create_product(
+            product_id=None, product_description="Nuitée Export", price_ht=100, tax=20,
+            price_it=120, product_type="vente"
+        )
+        self.invoice = InvoiceService().create_invoice(
+            contact_id=self.contact.contact_id, name="Facture Export", address=self.contact.address,
+            city=self.contact.city, state=self.contact.state, zip_code=self.contact.zip_code,
+            siret=self.contact.siret, email=self.contact.email, phone=self.contact.phone,
+            price_ht=1000, status="Confirmé"
+        )
+
+    def _create_order(self, lines=2, order_type='Devis'):
+        order = SalesOrderService().create_sales_order(self.contact.contact_id, "Séjour", order_type)
+        for _ in range(lines):
+            SalesOrderLineService().create_sales_order_line(
+                order.sales_order_id, self.product.product_id, self.contact.contact_id,
+                100, 20, 120, 1, date.today(), "Nuitée"
+            )
+        return order
+
+    def _content(self, entity, export_format, **filters):
+        export = self.export_service.export(entity, export_format, **filters)
+        return b''.join(export.content)
+
+    def test_sales_orders_jsonl_has_one_row_per_line(self):
+        """L'export des devis/commandes contient une ligne par ligne de devis, avec les champs du devis"""
+        order = self._create_order(lines=2)
+        self._create_order(lines=1, order_type='Commande')
+
+        rows = [json.loads(line) for line in self._content('sales_orders', 'jsonl').decode('utf-8').splitlines()]
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['order_id'], order.sales_order_id)
+        self.assertEqual(rows[0]['contact_name'], "Client Export")
+        self.assertEqual(rows[0]['price_it'], 120.0)
+        self.assertEqual(rows[0]['date'], date.today().isoformat())
+
+    def test_sales_orders_export_uses_one_query(self):
+        """Les lignes exportées sont lues en une seule requête, quel que soit le nombre de devis"""
+        for _ in range(4):
+            self._create_order(lines=3)
+
+        with self.assertNumQueries(1):
+            content = self._content('sales_orders', 'csv')
+        self.assertEqual(len(content.decode('utf-8').splitlines()), 2 + 12)
+
+    def test_payments_csv_filters_status(self):
+        """L'export des paiements se filtre par statut"""
+        payment_service = PaymentService()
+        payment_service.create_payment("Carte bancaire", "Payé", self.invoice.invoice_id, 50)
+        payment_service.create_payment("Chèque", "En attente", self.invoice.invoice_id, 30)
+
+        lines = self._content('payments', 'csv', status='Payé').decode('utf-8').splitlines()
+
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Carte bancaire;Payé;50.00', lines[2])
+
+    def test_invalid_export_parameters(self):
+        """Une entité, un format ou un filtre non géré est refusé avant toute lecture"""
+        with self.assertRaises(ValueError):
+            self.export_service.export('produits', 'csv')
+        with self.assertRaises(ValueError):
+            self.export_service.export('contacts', 'pdf')
+        with self.assertRaises(ValueError):
+            self.export_service.export('contacts', 'csv', start=date(2025, 1, 1))
+
+    @unittest.skipUnless(importlib.util.find_spec('openpyxl'), "openpyxl n'est pas installé")
+    def test_contacts_xlsx(self):
+        """L'export XLSX est un classeur lisible avec une ligne d'en-tête"""
+        from openpyxl import load_workbook
+
+        sheet = load_workbook(io.BytesIO(self._content('contacts', 'xlsx'))).active
+        rows = list(sheet.iter_rows(values_only=True))
+
+        self.assertEqual(rows[0][:3], ('ID Contact', 'Prénom', 'Nom'))
+        self.assertEqual(rows[1][:3], (self.contact.contact_id, 'Client', 'Export'))
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow n'est pas installé")
+    def test_invoices_parquet_streams_row_groups(self):
+        """L'export Parquet écrit un groupe de lignes par bloc et conserve les types des colonnes"""
+        import pyarrow.parquet as pq
+
+        for _ in range(4):
+            InvoiceService().create_invoice(
+                contact_id=self.contact.contact_id, name="Facture Export", address=self.contact.address,
+                city=self.contact.city, state=self.contact.state, zip_code=self.contact.zip_code,
+                siret=self.contact.siret, email=self.contact.email, phone=self.contact.phone
+            )
+
+        export = self.export_service.export('invoices', 'parquet', chunk_size=2)
+        parquet_file = pq.ParquetFile(io.BytesIO(b''.join(export.content)))
+
+        self.assertEqual(export.filename, 'factures.parquet')
+        self.assertEqual(parquet_file.metadata.num_rows, 5)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        table = parquet_file.read()
+        self.assertEqual(str(table.schema.field('total_ttc').type), 'double')
+        self.assertEqual(table.column('created_at').to_pylist()[0], timezone.localdate())
+
+    def test_export_view(self):
+        """La vue d'export envoie le fichier en streaming, ou redirige si le format est inconnu"""
+        response = self.client.get(reverse('commons:export', args=['contacts', 'jsonl']))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="contacts.jsonl"')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 1)
+
+        response = self.client.get(reverse('commons:export', args=['contacts', 'pdf']))
+        self.assertRedirects(response, reverse('commons:contact_list'))
@@ -0,0 +1,142 @@
+from datetime import date
+
+from unittest import mock
+
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from commons.dtos import CreateContactDTO
+from commons.middleware import UnitOfWorkMiddleware
+from commons.repositories.unit_of_work import current_unit_of_work, unit_of_work
+from commons.services.contact_service import ContactService
+from invoicing.models import Invoice
+from sales.models import SalesOrder
+from invoicing.services.invoice_service import InvoiceService
+from payment.services.payment_service import PaymentService
+from products.services.product_service import ProductService
+from sales.services.sales_order_line_service import SalesOrderLineService
+from sales.services.sales_order_service import SalesOrderService
+
+
+class UnitOfWorkTests(TestCase):
+
+    def setUp(self):
+        self.contact = ContactService().create_contact(CreateContactDTO(
+            first_name="Jean", last_name="Identité", email="jean@test.com", phone="0123456789", type="client",
+            siret="12345678901234", address="1 rue de la Carte", city="Paris", state="Île-de-France", zip_code="75001",
+        ))
+        self.product = ProductService().create_product(
+            product_id=None, product_description="Nuitée", price_ht=100, tax=20, price_it=120, product_type="vente"
+        )
+        self.invoice_service = InvoiceService()
+        self.invoice = self.invoice_service.create_invoice(
+            contact_id=self.contact.contact_id, name="Jean Identité", address="1 rue de la Carte", city="Paris",
+            state="Île-de-France", zip_code="75001", siret="12345678901234", email="jean@test.com",
+            phone="0123456789", price_ht=500, status="Confirmé",
+        )
+
+    def _count_queries(self, operation):
+        with CaptureQueriesContext(connection) as queries:
+            operation()
+        return len(queries)
+
+    def test_rows_are_loaded_once_per_unit_of_work(self):
+        with self.assertNumQueries(2):
+            self.invoice_service.get_invoice_by_id(self.invoice.invoice_id)
+            self.invoice_service.get_invoice_by_id(self.invoice.invoice_id)
+
+        with unit_of_work() as uow, self.assertNumQueries(1):
+            first = self.invoice_service.get_invoice_by_id(self.invoice.invoice_id)
+            # Identifiant reçu d'une URL ou d'un formulaire : même ligne
+            self.assertIs(self.invoice_service.get_invoice_by_id(str(self.invoice.invoice_id)), first)
+        self.assertEqual(uow.identity_map, {})
+        self.assertIsNone(current_unit_of_work())
+
+    def test_writes_keep_identity_map_consistent(self):
+        with unit_of_work():
+            invoice = self.invoice_service.get_invoice_by_id(self.invoice.invoice_id)
+            Invoice.objects.get(invoice_id=self.invoice.invoice_id).save()
+            self.assertIsNot(self.invoice_service.get_invoice_by_id(self.invoice.invoice_id), invoice)
+
+            # Totaux recalculés par UPDATE, sans save()
+            order = SalesOrderService().create_sales_order(self.contact.contact_id, "Séjour", "Devis")
+            self.assertEqual(SalesOrderService().get_sales_order_by_id(order.sales_order_id).total_ttc, 0)
+            SalesOrderLineService().create_sales_order_line(
+                order.sales_order_id, self.product.product_id, self.contact.contact_id, 100, 20, 120, 2,
+                date.today(), "Nuitée"
+            )
+            self.assertEqual(SalesOrderService().get_sales_order_by_id(order.sales_order_id).total_ttc, 240)
+
+            # Solde de la facture modifié par un paiement
+            payment_service = PaymentService()
+            self.assertEqual(self.invoice_service.get_invoice_by_id(self.invoice.invoice_id).total_paid, 0)
+            payment_service.create_payment('Carte bancaire', 'Payé', self.invoice.invoice_id, 600)
+            self.assertEqual(self.invoice_service.get_invoice_by_id(self.invoice.invoice_id).total_paid, 600)
+            self.assertTrue(payment_service.repo.get_state_invoice_payment(self.invoice.invoice_id))
+
+            self.invoice_service.delete_invoice(self.invoice.invoice_id)
+            with self.assertRaises(ValueError):
+                self.invoice_service.get_invoice_by_id(self.invoice.invoice_id)
+
+    def test_failed_write_does_not_leave_modified_instance(self):
+        """Un save() qui échoue ne laisse pas dans la carte d'identité une instance modifiée mais non enregistrée"""
+        order = SalesOrderService().create_sales_order(self.contact.contact_id, "Séjour", "Devis")
+        with unit_of_work():
+            invoice = self.invoice_service.get_invoice_by_id(self.invoice.invoice_id)
+            shared_order = SalesOrderService().get_sales_order_by_id(order.sales_order_id)
+
+            with mock.patch.object(Invoice, 'save', side_effect=DatabaseError("écriture refusée")):
+                with self.assertRaises(DatabaseError):
+                    self.invoice_service.update_invoice(
+                        self.invoice.invoice_id, self.contact.contact_id, "Nouveau nom", "1 rue de la Carte",
+                        "Paris", "Île-de-France", "75001", "12345678901234", "jean@test.com", "0123456789",
+                        "Confirmé",
+                    )
+                with self.assertRaises(DatabaseError):
+                    self.invoice_service.cancel_invoice(self.invoice.invoice_id)
+            self.assertIs(self.invoice_service.get_invoice_by_id(self.invoice.invoice_id), invoice)
+            self.assertEqual((invoice.name, invoice.status), ("Jean Identité", "Confirmé"))
+
+            with mock.patch.object(SalesOrder, 'save', side_effect=DatabaseError("écriture refusée")):
+                with self.assertRaises(DatabaseError):
+                    SalesOrderService().generate_public_hash(shared_order)
+            reloaded = SalesOrderService().get_sales_order_by_id(order.sales_order_id)
+            self.assertIsNot(reloaded, shared_order)
+            self.assertIsNone(reloaded.public_hash)
+
+    def test_create_operations_load_each_row_once(self):
+        order = SalesOrderService().create_sales_order(self.contact.contact_id, "Séjour", "Devis")
+
+        def create_line():
+            SalesOrderLineService().create_sales_order_line(
+                order.sales_order_id, self.product.product_id, self.contact.contact_id, 100, 20, 120, 1,
+                date.today(), "Nuitée"
+            )
+
+        def create_payment():
+            payment = PaymentService().create_payment('Carte bancaire', 'Payé', self.invoice.invoice_id, 100)
+            self.assertEqual(payment.amount, 100)
+
+        for operation, loaded_rows in ((create_line, 3), (create_payment, 1)):
+            without_unit_of_work = self._count_queries(operation)
+            with unit_of_work() as uow:
+                self.assertLess(self._count_queries(operation), without_unit_of_work)
+            self.assertEqual(uow.loads, loaded_rows)
+
+    def test_middleware_opens_and_clears_a_unit_of_work_per_request(self):
+        seen = []
+
+        def view(request):
+            invoice = self.invoice_service.get_invoice_by_id(self.invoice.invoice_id)
+            seen.append(current_unit_of_work())
+            self.assertIs(self.invoice_service.get_invoice_by_id(self.invoice.invoice_id), invoice)
+            return 'réponse'
+
+        middleware = UnitOfWorkMiddleware(view)
+        self.assertEqual(middleware(RequestFactory().get('/')), 'réponse')
+        middleware(RequestFactory().get('/'))
+
+        self.assertIsNot(seen[0], seen[1])
+        self.assertEqual(seen[0].identity_map, {})
+        self.assertIsNone(current_unit_of_work())
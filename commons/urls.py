@@ -4,7 +4,11 @@ from commons.views import (
     ContactDetailView,
     ContactCreateView,
     ContactUpdateView,
-    ContactDeleteView
+    ContactDeleteView,
+    ExportView,
+    ExportJobListView,
+    ExportJobDetailView,
+    ExportJobDownloadView
 )
 
 app_name = 'commons'
@@ -15,5 +19,9 @@ urlpatterns = [
     path('contacts/create/', ContactCreateView.as_view(), name='contact_create'),
     path('contacts/<int:pk>/update/', ContactUpdateView.as_view(), name='contact_update'),
     path('contacts/<int:pk>/delete/', ContactDeleteView.as_view(), name='contact_delete'),
+    path('exports/jobs/', ExportJobListView.as_view(), name='export_job_list'),
+    path('exports/jobs/<int:pk>/', ExportJobDetailView.as_view(), name='export_job_detail'),
+    path('exports/jobs/<int:pk>/download/', ExportJobDownloadView.as_view(), name='export_job_download'),
+    path('exports/<str:entity>/<str:export_format>/', ExportView.as_view(), name='export'),
 ]
 
@@ -1,11 +1,15 @@
+from datetime import date
+
 from django.shortcuts import redirect
 from django.views.generic import TemplateView
 from django.contrib import messages
-from django.http import Http404
+from django.http import FileResponse, Http404, StreamingHttpResponse
 
 from commons.dtos import CreateContactDTO, UpdateContactDTO
 from commons.services.contact_service import ContactService
 from commons.forms import ContactForm
+from commons.services.export_job_service import ExportJobService
+from commons.services.export_service import ExportService
 from sales.services.sales_order_service import SalesOrderService
 from invoicing.services.invoice_service import InvoiceService
 
@@ -195,3 +199,108 @@ class ContactDeleteView(TemplateView):
         service.delete_contact(contact.contact_id)
         messages.success(request, f"Contact {first_name} {last_name} supprimé avec succès !")
         return redirect('commons:contact_list')
+
+
+class ExportView(TemplateView):
+    """
+    Export d'une entité (factures, devis/commandes, paiements, contacts) dans un format donné :
+    en streaming (GET) ou en tâche de fond (POST, traité par la commande run_export_jobs)
+    """
+
+    # Page de retour en cas d'erreur, par entité
+    error_redirects = {
+        'invoices': 'invoicing:invoice_list',
+        'sales_orders': 'sales:sales_order_list',
+        'payments': 'payment:payment',
+        'contacts': 'commons:contact_list',
+        'receivables': 'invoicing:receivables_aging',
+    }
+    entity = None
+    export_format = None
+
+    @staticmethod
+    def parse_filters(params):
+        """Lire les filtres de l'export : start/end (AAAA-MM-JJ), status et contact"""
+        def parse_date(name):
+            value = params.get(name)
+            if not value:
+                return None
+            try:
+                return date.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"Date invalide pour '{name}' : {value}")
+
+        contact = params.get('contact')
+        if contact and not contact.isdigit():
+            raise ValueError(f"Contact invalide : {contact}")
+
+        return {
+            'start': parse_date('start'),
+            'end': parse_date('end'),
+            'status': params.get('status') or None,
+            'contact_id': int(contact) if contact else None,
+        }
+
+    def get(self, request, *args, **kwargs):
+        entity = self.entity or kwargs.get('entity')
+        export_format = self.export_format or kwargs.get('export_format')
+
+        try:
+            # Les paramètres sont validés avant l'envoi du premier octet
+            export = ExportService().export(entity, export_format, **self.parse_filters(request.GET))
+        except ValueError as e:
+            messages.error(request, f"Erreur lors de l'export : {str(e)}")
+            return redirect(self.error_redirects.get(entity, 'commons:contact_list'))
+
+        response = StreamingHttpResponse(export.content, content_type=export.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{export.filename}"'
+        return response
+
+    def post(self, request, *args, **kwargs):
+        entity = self.entity or kwargs.get('entity')
+        export_format = self.export_format or kwargs.get('export_format')
+
+        try:
+            job = ExportJobService().submit_export_job(entity, export_format, **self.parse_filters(request.POST))
+        except ValueError as e:
+            messages.error(request, f"Erreur lors de l'export : {str(e)}")
+            return redirect(self.error_redirects.get(entity, 'commons:contact_list'))
+
+        messages.success(request, f"Export #{job.export_job_id} enregistré, il sera traité en tâche de fond")
+        return redirect('commons:export_job_detail', pk=job.export_job_id)
+
+
+class ExportJobListView(TemplateView):
+    """Vue pour lister les derniers exports en tâche de fond"""
+    template_name = 'commons/export_job_list.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['export_jobs'] = ExportJobService().get_recent_export_jobs()
+        return context
+
+
+class ExportJobDetailView(TemplateView):
+    """Vue pour suivre l'avancement d'un export en tâche de fond"""
+    template_name = 'commons/export_job_detail.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            context['export_job'] = ExportJobService().get_export_job_by_id(kwargs['pk'])
+        except ValueError:
+            raise Http404("Export introuvable")
+        return context
+
+
+class ExportJobDownloadView(TemplateView):
+    """Vue pour télécharger le fichier d'un export terminé"""
+
+    def get(self, request, *args, **kwargs):
+        try:
+            job = ExportJobService().get_export_file(kwargs['pk'])
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('commons:export_job_list')
+
+        return FileResponse(open(job.file_path, 'rb'), as_attachment=True, filename=job.filename)
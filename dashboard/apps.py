@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class DashboardConfig(AppConfig):
     name = 'dashboard'
+
+    def ready(self):
+        # Enregistrer l'invalidation du cache du dashboard sur les écritures
+        from dashboard import signals  # noqa: F401
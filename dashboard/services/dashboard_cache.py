@@ -0,0 +1,80 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class DashboardSnapshotCache:
+    """
+    Cache LRU en mémoire (par processus) des statistiques du dashboard.
+
+    Chaque entrée est associée à la version courante partagée, stockée dans le cache Django
+    `cache_alias` : toute écriture sur les données du dashboard la remplace par une version
+    inédite, ce qui invalide les entrées de tous les processus à leur prochaine lecture.
+    """
+    VERSION_KEY = 'dashboard:snapshot_version'
+
+    def __init__(self, ttl=None, max_entries=None, cache_alias=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'DASHBOARD_CACHE_TTL', 300)
+        self.max_entries = max_entries if max_entries is not None else getattr(settings, 'DASHBOARD_CACHE_MAX_ENTRIES', 256)
+        self.cache_alias = cache_alias or getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def version_cache(self):
+        return caches[self.cache_alias]
+
+    def get_version(self):
+        """Version courante des données du dashboard (partagée entre processus)"""
+        version = self.version_cache.get(self.VERSION_KEY)
+        if version is None:
+            # Version inédite : une clé vidée ou expirée ne fait pas revivre d'anciennes entrées
+            self.version_cache.add(self.VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = self.version_cache.get(self.VERSION_KEY)
+        return version
+
+    def invalidate(self):
+        """
+        Invalider tous les snapshots en remplaçant la version partagée par une version inédite.
+        Un simple set : incr n'est pas atomique sur tous les backends (fichiers notamment) et
+        deux invalidations concurrentes pourraient y produire la même version.
+        """
+        self.version_cache.set(self.VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key):
+        """Retourne le snapshot en cache, ou None s'il est absent, expiré ou d'une ancienne version"""
+        version = self.get_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_version, expires_at, value = entry
+            if entry_version != version or expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, version=None):
+        """Stocker un snapshot, en évinçant les entrées les moins récemment utilisées"""
+        version = version if version is not None else self.get_version()
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Vider les entrées locales du processus"""
+        with self._lock:
+            self._entries.clear()
+
+
+dashboard_snapshot_cache = DashboardSnapshotCache()
@@ -1,6 +1,15 @@
-from datetime import datetime
-from decimal import Decimal
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from dashboard.services.dashboard_cache import dashboard_snapshot_cache
+from dashboard.services.time_series_service import TimeSeriesService
 
 from sales.services.sales_order_service import SalesOrderService
 from sales.services.sales_order_line_service import SalesOrderLineService
@@ -10,8 +19,61 @@ from payment.services.payment_service import PaymentService
 from commons.services.contact_service import ContactService
 
 
+logger = logging.getLogger(__name__)
+
+_widget_executor = None
+_widget_executor_lock = threading.Lock()
+
+
+def _get_widget_executor():
+    """Pool de threads borné, partagé par le processus, pour le calcul des widgets"""
+    global _widget_executor
+    with _widget_executor_lock:
+        if _widget_executor is None:
+            _widget_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'DASHBOARD_WIDGET_WORKERS', 4),
+                thread_name_prefix='dashboard-widget',
+            )
+        return _widget_executor
+
+
+def _query_deadline(deadline):
+    """
+    Wrapper d'exécution faisant interrompre par la base une requête qui dépasse `deadline` (horloge
+    time.monotonic) : gestionnaire de progression sous SQLite, statement_timeout sous PostgreSQL
+    """
+    def wrapper(execute, sql, params, many, context):
+        connection = context['connection']
+        if connection.vendor == 'sqlite':
+            connection.connection.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+        elif connection.vendor == 'postgresql':
+            remaining_ms = max(int((deadline - time.monotonic()) * 1000), 1)
+            with connection.connection.cursor() as cursor:
+                cursor.execute("SET statement_timeout = %s", [remaining_ms])
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+def _run_widget(compute, deadline):
+    """
+    Calculer un widget dans un thread du pool puis fermer la connexion BDD propre à ce thread.
+    Le délai est appliqué dans le thread lui-même : un widget abandonné par la requête ne garde pas son thread
+    (requête interrompue par la base) et un widget dont le délai a expiré dans la file n'est pas calculé.
+    """
+    if time.monotonic() >= deadline:
+        raise TimeoutError("Délai de calcul dépassé avant le lancement du widget")
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_query_deadline(deadline)))
+            return compute()
+    finally:
+        connections.close_all()
+
+
 class DashboardService:
 
+    QUOTES_PAGE_SIZE = 10
 
     def __init__(self):
         self.sales_order_service = SalesOrderService()
@@ -20,137 +82,179 @@ class DashboardService:
         self.invoice_order_line_service = InvoiceOrderLineService()
         self.payment_service = PaymentService()
         self.contact_service = ContactService()
+        self.time_series_service = TimeSeriesService()
+
+    @staticmethod
+    def _shift_month(month_start, months):
+        """Décaler le premier jour d'un mois de `months` mois (négatif pour reculer)"""
+        index = month_start.year * 12 + month_start.month - 1 + months
+        return month_start.replace(year=index // 12, month=index % 12 + 1)
+
+    @staticmethod
+    def _current_month_start():
+        """Premier jour du mois courant à minuit, dans le fuseau horaire du projet"""
+        return timezone.localtime().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
     def get_monthly_revenue(self, payment_status='Payé'):
         """Retourne le CA du mois courant filtré par statut de paiement"""
-        # En prenant en compte les status de paiements avec filtre sur le mois courant
-        payments = self.payment_service.get_all_payments()
+        # Lecture du cumul mensuel sur [début du mois, début du mois suivant[
+        month_start = self._current_month_start()
+        next_month_start = self._shift_month(month_start, 1)
 
-        today = datetime.now()
-        current_month = today.month
-        current_year = today.year
+        rows = self.payment_service.get_rollup_revenue_by_month(payment_status, month_start, next_month_start)
+        total_revenue = sum(row['revenue'] or 0 for row in rows)
+        return float(total_revenue)
 
-        total_revenue = Decimal('0.00')
-        for payment in payments:
-            # Vérifier que le paiement a le statut demandé et du mois courant
-            if payment.state_payment == payment_status and hasattr(payment, 'created_at') and payment.created_at:
-                payment_date = payment.created_at if isinstance(payment.created_at, datetime) else datetime.fromisoformat(str(payment.created_at))
-                if payment_date.month == current_month and payment_date.year == current_year:
-                    total_revenue += Decimal(str(payment.amount))
+    def get_sales_evolution(self, payment_status='Payé', start=None, end=None, granularity='month'):
+        """
+        Évolution du CA entre `start` et `end` (dates incluses) par période, en ordre chronologique.
+        Par défaut : les 6 derniers mois, mois courant inclus.
+        """
+        today = timezone.localdate()
+        if end is None:
+            end = today
+        if start is None:
+            start = self._shift_month(today.replace(day=1), -5)
 
-        return float(total_revenue)
+        series = self.time_series_service.get_series('payments', start, end, granularity, payment_status)
+        return [
+            {'key': point['key'], 'label': point['label'], 'revenue': point['total']}
+            for point in series
+        ]
 
-    def get_sales_evolution(self, payment_status='Payé'):
-        payments = self.payment_service.get_all_payments()
-
-        evolution_data = {}
-        today = datetime.now()
-
-        # Créer les labels pour les 6 derniers mois (en remontant dans le temps)
-        for i in range(6):
-            # Calculer la date du premier jour du mois
-            if i == 0:
-                # Mois courant
-                month_date = today.replace(day=1)
-            else:
-                # Mois précédents
-                month_date = today.replace(day=1)
-                for _ in range(i):
-                    # Reculer d'un mois
-                    if month_date.month == 1:
-                        month_date = month_date.replace(year=month_date.year - 1, month=12)
-                    else:
-                        month_date = month_date.replace(month=month_date.month - 1)
-
-            month_label = month_date.strftime('%b %Y')
-            evolution_data[month_label] = {
-                'month': month_date.month,
-                'year': month_date.year,
-                'revenue': Decimal('0.00')
+    def get_top_clients(self, payment_status='Payé', limit=5, start=None, end=None):
+        """Retourne les `limit` meilleurs clients, optionnellement sur une période [start, end["""
+        rows = self.payment_service.get_top_clients(payment_status, limit, start, end)
+
+        return [
+            {
+                'name': f"{row['first_name']} {row['last_name']}",
+                'revenue': float(row['revenue'] or 0),
+                'contact_id': row['contact']
             }
+            for row in rows
+        ]
 
-        # Remplir avec les paiements du statut demandé
-        for payment in payments:
-            if payment.state_payment == payment_status and hasattr(payment, 'created_at') and payment.created_at:
-                payment_date = payment.created_at if isinstance(payment.created_at, datetime) else datetime.fromisoformat(str(payment.created_at))
-                month_label = payment_date.strftime('%b %Y')
+    def get_top_5_clients(self, payment_status='Payé', start=None, end=None):
+        return self.get_top_clients(payment_status, 5, start, end)
 
-                if month_label in evolution_data:
-                    evolution_data[month_label]['revenue'] += Decimal(str(payment.amount))
+    def get_unconverted_quotes(self, page=1, page_size=QUOTES_PAGE_SIZE, sort='oldest'):
+        """Retourne une page de devis non convertis avec nombre de lignes, montant total et ancienneté"""
+        page = max(int(page), 1)
+        offset = (page - 1) * page_size
+        quotes = self.sales_order_service.get_unconverted_quotes(sort)[offset:offset + page_size]
+        now = timezone.now()
 
-        # Retourner au format dictionnaire simple {mois: revenue}
-        return {k: float(v['revenue']) for k, v in evolution_data.items()}
+        return [
+            {
+                'id': quote.sales_order_id,
+                'contact': f"{quote.contact_id.first_name} {quote.contact_id.last_name}",
+                'genre': quote.genre,
+                'created_at': quote.created_at or 'N/A',
+                'age_days': (now - quote.created_at).days if quote.created_at else None,
+                'lines_count': quote.lines_count,
+                'total_amount': float(quote.total_amount or 0),
+            }
+            for quote in quotes
+        ]
 
-    def get_top_5_clients(self, payment_status='Payé'):
-        payments = self.payment_service.get_all_payments()
+    def count_unconverted_quotes(self):
+        """Nombre total de devis non convertis (pour la pagination)"""
+        return self.sales_order_service.get_unconverted_quotes().count()
 
-        client_revenue = {}
+    # Valeur de repli de chaque widget lorsqu'il échoue ou dépasse son délai
+    WIDGET_DEFAULTS = {
+        'monthly_revenue': 0.0,
+        'sales_evolution': [],
+        'top_5_clients': [],
+        'unconverted_quotes': [],
+        'unconverted_quotes_count': 0,
+    }
 
-        for payment in payments:
-            # Vérifier que le paiement a le statut demandé
-            if payment.state_payment == payment_status:
-                try:
-                    invoice = payment.invoice_id
-                    contact_id = invoice.contact_id.contact_id
-                    contact = self.contact_service.get_contact_by_id(contact_id)
+    def _get_widgets(self, payment_status, quotes_page, quotes_sort, evolution_start=None, evolution_end=None,
+                     evolution_granularity='month'):
+        """Widgets indépendants du dashboard, sous forme de fonctions sans argument"""
+        return {
+            'monthly_revenue': lambda: self.get_monthly_revenue(payment_status),
+            'sales_evolution': lambda: self.get_sales_evolution(
+                payment_status, evolution_start, evolution_end, evolution_granularity
+            ),
+            'top_5_clients': lambda: self.get_top_5_clients(payment_status),
+            'unconverted_quotes': lambda: self.get_unconverted_quotes(quotes_page, sort=quotes_sort),
+            'unconverted_quotes_count': self.count_unconverted_quotes,
+        }
 
-                    if contact_id not in client_revenue:
-                        client_revenue[contact_id] = {
-                            'contact': contact,
-                            'revenue': Decimal('0.00')
-                        }
+    def get_dashboard_stats(self, payment_status='Payé', quotes_page=1, quotes_sort='oldest', concurrent=None,
+                            evolution_start=None, evolution_end=None, evolution_granularity='month'):
+        """
+        Calculer tous les widgets du dashboard.
+        En mode concurrent, les widgets sont calculés en parallèle et un widget lent ou en erreur
+        est remplacé par sa valeur de repli (listé dans 'widget_errors') au lieu de faire échouer la page.
+        """
+        if concurrent is None:
+            concurrent = getattr(settings, 'DASHBOARD_CONCURRENT_WIDGETS', False)
 
-                    client_revenue[contact_id]['revenue'] += Decimal(str(payment.amount))
-                except:
-                    pass
+        widgets = self._get_widgets(
+            payment_status, quotes_page, quotes_sort, evolution_start, evolution_end, evolution_granularity
+        )
+        if not concurrent:
+            stats = {name: compute() for name, compute in widgets.items()}
+            stats['widget_errors'] = {}
+            return stats
 
-        sorted_clients = sorted(
-            client_revenue.values(),
-            key=lambda x: x['revenue'],
-            reverse=True
-        )[:5]
+        return self._compute_widgets_concurrently(widgets)
 
-        return [
-            {
-                'name': f"{client['contact'].first_name} {client['contact'].last_name}",
-                'revenue': float(client['revenue']),
-                'contact_id': client['contact'].contact_id
-            }
-            for client in sorted_clients
-        ]
+    def _compute_widgets_concurrently(self, widgets):
+        executor = _get_widget_executor()
+        timeouts = getattr(settings, 'DASHBOARD_WIDGET_TIMEOUTS', {})
+        default_timeout = getattr(settings, 'DASHBOARD_WIDGET_TIMEOUT', 5)
+
+        # Chaque widget a son propre délai, compté depuis le lancement commun
+        started_at = time.monotonic()
+        deadlines = {name: started_at + timeouts.get(name, default_timeout) for name in widgets}
+        futures = {
+            name: executor.submit(_run_widget, compute, deadlines[name]) for name, compute in widgets.items()
+        }
+
+        stats = {}
+        errors = {}
+        for name, future in futures.items():
+            try:
+                stats[name] = future.result(timeout=max(deadlines[name] - time.monotonic(), 0))
+            except TimeoutError:
+                # Sans effet sur un widget en cours : celui-ci s'arrête de lui-même à son délai (_run_widget)
+                future.cancel()
+                errors[name] = "Délai de calcul dépassé"
+                stats[name] = self.WIDGET_DEFAULTS[name]
+            except Exception as e:
+                logger.exception("Erreur lors du calcul du widget %s", name)
+                errors[name] = str(e)
+                stats[name] = self.WIDGET_DEFAULTS[name]
+
+        stats['widget_errors'] = errors
+        return stats
+
+    def get_cached_dashboard_stats(self, payment_status='Payé', quotes_page=1, quotes_sort='oldest',
+                                   evolution_start=None, evolution_end=None, evolution_granularity='month'):
+        """Statistiques du dashboard servies depuis le cache de snapshots lorsque c'est possible"""
+        # La fenêtre (jour courant, période de l'évolution) fait partie de la clé :
+        # le changement de jour ou de période donne une nouvelle entrée
+        key = (
+            'stats', payment_status, timezone.localdate().isoformat(), quotes_page, quotes_sort,
+            evolution_start and evolution_start.isoformat(), evolution_end and evolution_end.isoformat(),
+            evolution_granularity,
+        )
+        stats = dashboard_snapshot_cache.get(key)
+        if stats is not None:
+            return stats
+
+        version = dashboard_snapshot_cache.get_version()
+        stats = self.get_dashboard_stats(
+            payment_status, quotes_page, quotes_sort, None,
+            evolution_start, evolution_end, evolution_granularity,
+        )
+        # Ne pas mettre en cache un snapshot partiel
+        if not stats['widget_errors']:
+            dashboard_snapshot_cache.set(key, stats, version)
+        return stats
 
-    def get_unconverted_quotes(self):
-        sales_orders = self.sales_order_service.get_all_sales_orders()
-        invoices = self.invoice_service.get_all_invoices()
-
-        converted_quote_ids = set()
-        for invoice in invoices:
-            if hasattr(invoice, 'sales_order_id') and invoice.sales_order_id:
-                converted_quote_ids.add(invoice.sales_order_id.sales_order_id)
-
-        unconverted_quotes = []
-        for sales_order in sales_orders:
-            if sales_order.type == 'Devis':
-                if sales_order.sales_order_id not in converted_quote_ids:
-                    try:
-                        lines = self.sales_order_line_service.get_sales_order_lines_by_order(sales_order.sales_order_id)
-                        if len(lines) > 0:
-                            unconverted_quotes.append({
-                                'id': sales_order.sales_order_id,
-                                'contact': f"{sales_order.contact_id.first_name} {sales_order.contact_id.last_name}",
-                                'genre': sales_order.genre,
-                                'created_at': sales_order.created_at if hasattr(sales_order, 'created_at') else 'N/A',
-                                'lines_count': len(lines)
-                            })
-                    except:
-                        pass
-
-        return unconverted_quotes
-
-    def get_dashboard_stats(self, payment_status='Payé'):
-        return {
-            'monthly_revenue': self.get_monthly_revenue(payment_status),
-            'sales_evolution': self.get_sales_evolution(payment_status),
-            'top_5_clients': self.get_top_5_clients(payment_status),
-            'unconverted_quotes': self.get_unconverted_quotes(),
-        }
\ No newline at end of file
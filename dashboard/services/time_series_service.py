@@ -0,0 +1,231 @@
+from datetime import date, datetime, timedelta
+
+from django.utils import dateformat, timezone
+
+from commons.services.date_range import start_of_day
+from invoicing.services.invoice_service import InvoiceService
+from payment.services.payment_service import PaymentService
+from sales.services.sales_order_service import SalesOrderService
+
+
+GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+ENTITIES = ('payments', 'invoices', 'sales_orders')
+# Nombre maximal de périodes d'une série (une entrée construite par période, même vide)
+MAX_BUCKETS = 2000
+# Bornes des dates acceptées : au-delà, les calculs de période débordent de datetime.date
+MIN_DATE = date(1900, 1, 1)
+MAX_DATE = date(2999, 12, 31)
+
+
+def floor_to_bucket(day, granularity):
+    """Premier jour de la période (jour, semaine ISO, mois, trimestre, année) contenant `day`"""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Granularité inconnue : {granularity}")
+
+
+def shift_bucket(bucket_start, granularity, count):
+    """Premier jour de la période située `count` périodes plus loin (négatif pour reculer)"""
+    if granularity == 'day':
+        return bucket_start + timedelta(days=count)
+    if granularity == 'week':
+        return bucket_start + timedelta(weeks=count)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[granularity] * count
+    index = bucket_start.year * 12 + bucket_start.month - 1 + months
+    return bucket_start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def next_bucket(bucket_start, granularity):
+    """Premier jour de la période suivante"""
+    return shift_bucket(bucket_start, granularity, 1)
+
+
+def bucket_count(start, end, granularity):
+    """Nombre de périodes de la série de `start` à `end` (dates incluses)"""
+    first, last = floor_to_bucket(start, granularity), floor_to_bucket(end, granularity)
+    if granularity == 'day':
+        return (last - first).days + 1
+    if granularity == 'week':
+        return (last - first).days // 7 + 1
+    months = (last.year - first.year) * 12 + last.month - first.month
+    return months // {'month': 1, 'quarter': 3, 'year': 12}[granularity] + 1
+
+
+def clamp_range(start, end, granularity):
+    """Début ramené dans [MIN_DATE, MAX_DATE] et rapproché de `end` pour ne pas dépasser MAX_BUCKETS périodes"""
+    start = min(max(start, MIN_DATE), MAX_DATE)
+    if start <= end and bucket_count(start, end, granularity) > MAX_BUCKETS:
+        start = shift_bucket(floor_to_bucket(end, granularity), granularity, 1 - MAX_BUCKETS)
+    return start
+
+
+def bucket_key(bucket_start, granularity):
+    """Clé ISO stable d'une période : 2026-10-18, 2026-W42, 2026-10, 2026-Q4, 2026"""
+    if granularity == 'day':
+        return bucket_start.isoformat()
+    if granularity == 'week':
+        iso_year, iso_week, _ = bucket_start.isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    if granularity == 'month':
+        return f"{bucket_start.year}-{bucket_start.month:02d}"
+    if granularity == 'quarter':
+        return f"{bucket_start.year}-Q{(bucket_start.month - 1) // 3 + 1}"
+    return str(bucket_start.year)
+
+
+def bucket_label(bucket_start, granularity):
+    """Libellé d'affichage d'une période (mois traduits dans la langue active)"""
+    if granularity == 'day':
+        return bucket_start.strftime('%d/%m/%Y')
+    if granularity == 'week':
+        iso_year, iso_week, _ = bucket_start.isocalendar()
+        return f"S{iso_week:02d} {iso_year}"
+    if granularity == 'month':
+        return dateformat.format(bucket_start, 'M Y')
+    if granularity == 'quarter':
+        return f"T{(bucket_start.month - 1) // 3 + 1} {bucket_start.year}"
+    return str(bucket_start.year)
+
+
+def downsample_lttb(points, max_points, value_key='total'):
+    """
+    Réduire une série à `max_points` points avec l'algorithme Largest-Triangle-Three-Buckets.
+    Les points conservés sont ceux de la série d'origine (clé et libellé inchangés) ; le premier
+    et le dernier point sont toujours gardés et les pics de chaque tranche sont préservés.
+    """
+    if max_points is None or max_points >= len(points) or max_points < 3:
+        return list(points)
+
+    # Les périodes d'une série sont régulières : l'abscisse est l'indice du point
+    values = [float(point[value_key] or 0) for point in points]
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (max_points - 2)
+    previous = 0
+
+    for i in range(max_points - 2):
+        bucket_start = int(i * bucket_size) + 1
+        bucket_end = int((i + 1) * bucket_size) + 1
+
+        # Moyenne de la tranche suivante (le dernier point pour la dernière tranche)
+        next_start = bucket_end
+        next_end = min(int((i + 2) * bucket_size) + 1, len(points))
+        if next_start >= next_end:
+            next_start, next_end = len(points) - 1, len(points)
+        average_x = (next_start + next_end - 1) / 2
+        average_y = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        # Garder le point qui forme le plus grand triangle avec le point précédent et cette moyenne
+        best_index, best_area = bucket_start, -1
+        for index in range(bucket_start, bucket_end):
+            area = abs(
+                (previous - average_x) * (values[index] - values[previous])
+                - (previous - index) * (average_y - values[previous])
+            )
+            if area > best_area:
+                best_index, best_area = index, area
+
+        sampled.append(points[best_index])
+        previous = best_index
+
+    sampled.append(points[-1])
+    return sampled
+
+
+class TimeSeriesService:
+    """Séries temporelles agrégées en base (une requête par série) pour paiements, factures et devis/commandes"""
+
+    def __init__(self):
+        self.payment_service = PaymentService()
+        self.invoice_service = InvoiceService()
+        self.sales_order_service = SalesOrderService()
+
+    @staticmethod
+    def _local_midnight(day):
+        return start_of_day(day)
+
+    @staticmethod
+    def _covers_whole_months(start, end):
+        """Vrai si [start, end] commence un 1er du mois et finit un dernier jour de mois (ou aujourd'hui)"""
+        return start.day == 1 and ((end + timedelta(days=1)).day == 1 or end >= timezone.localdate())
+
+    def _fetch_payments(self, start, end, granularity, status):
+        # Les séries mensuelles de paiements sont lues dans le cumul mensuel lorsqu'il couvre la période
+        if granularity == 'month' and self._covers_whole_months(start, end):
+            rows = self.payment_service.get_rollup_revenue_by_month(status, start, next_bucket(end.replace(day=1), 'month'))
+            return {date(row['year'], row['month'], 1): (row['revenue'], row['count']) for row in rows}
+
+        rows = self.payment_service.get_revenue_by_period(
+            status, self._local_midnight(start), self._local_midnight(end + timedelta(days=1)), granularity
+        )
+        return self._rows_by_bucket(rows, granularity)
+
+    def _fetch_invoices(self, start, end, granularity, status):
+        rows = self.invoice_service.get_totals_by_period(
+            self._local_midnight(start), self._local_midnight(end + timedelta(days=1)), granularity, status
+        )
+        return self._rows_by_bucket(rows, granularity)
+
+    def _fetch_sales_orders(self, start, end, granularity, order_type):
+        rows = self.sales_order_service.get_totals_by_period(
+            self._local_midnight(start), self._local_midnight(end + timedelta(days=1)), granularity, order_type
+        )
+        return self._rows_by_bucket(rows, granularity)
+
+    @staticmethod
+    def _rows_by_bucket(rows, granularity):
+        """Indexer les lignes agrégées par premier jour (local) de période"""
+        buckets = {}
+        for row in rows:
+            period = row['period']
+            if isinstance(period, datetime):
+                period = (timezone.localtime(period) if timezone.is_aware(period) else period).date()
+            buckets[floor_to_bucket(period, granularity)] = (row['total'], row['count'])
+        return buckets
+
+    def get_series(self, entity, start, end, granularity='month', status=None):
+        """
+        Série dense de `start` à `end` (dates incluses) : une entrée par période, y compris les périodes vides.
+        `status` filtre le statut de paiement, le statut de facture ou le type de devis/commande selon l'entité.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"La granularité doit être l'une de: {', '.join(GRANULARITIES)}")
+        if entity not in ENTITIES:
+            raise ValueError(f"L'entité doit être l'une de: {', '.join(ENTITIES)}")
+        if start > end:
+            raise ValueError("La date de début doit précéder la date de fin")
+        if not (MIN_DATE <= start and end <= MAX_DATE):
+            raise ValueError(f"Les dates doivent être comprises entre {MIN_DATE:%d/%m/%Y} et {MAX_DATE:%d/%m/%Y}")
+        buckets = bucket_count(start, end, granularity)
+        if buckets > MAX_BUCKETS:
+            raise ValueError(
+                f"La période compte {buckets} périodes ({MAX_BUCKETS} au plus) : choisir une granularité plus large"
+            )
+
+        fetch = {
+            'payments': self._fetch_payments,
+            'invoices': self._fetch_invoices,
+            'sales_orders': self._fetch_sales_orders,
+        }[entity]
+        totals = fetch(start, end, granularity, status)
+
+        series = []
+        bucket_start = floor_to_bucket(start, granularity)
+        while bucket_start <= end:
+            total, count = totals.get(bucket_start, (0, 0))
+            series.append({
+                'key': bucket_key(bucket_start, granularity),
+                'label': bucket_label(bucket_start, granularity),
+                'start': bucket_start.isoformat(),
+                'total': float(total or 0),
+                'count': count,
+            })
+            bucket_start = next_bucket(bucket_start, granularity)
+        return series
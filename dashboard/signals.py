@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from dashboard.services.dashboard_cache import dashboard_snapshot_cache
+from invoicing.models import Invoice
+from payment.models import Payment
+from sales.models import SalesOrder, SalesOrderLine
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=SalesOrder)
+@receiver(post_delete, sender=SalesOrder)
+@receiver(post_save, sender=SalesOrderLine)
+@receiver(post_delete, sender=SalesOrderLine)
+def invalidate_dashboard_snapshots(sender, **kwargs):
+    """Invalider les snapshots du dashboard une fois l'écriture validée en base"""
+    transaction.on_commit(dashboard_snapshot_cache.invalidate)
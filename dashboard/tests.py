@@ -0,0 +1,565 @@
+import time
+from datetime import date, datetime, timedelta
+from io import BytesIO
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from commons.tests.fixtures import TestDataMixin
+from dashboard.services.dashboard_cache import DashboardSnapshotCache, dashboard_snapshot_cache
+from dashboard.services.dashboard_service import DashboardService
+from dashboard.services.time_series_service import MAX_BUCKETS, MAX_DATE, TimeSeriesService, downsample_lttb
+from invoicing.services.invoice_service import InvoiceService
+from payment.models import Payment
+from payment.services.bank_statement_service import BankStatementService
+from payment.services.payment_service import PaymentService
+from products.services.product_service import ProductService
+from sales.services.sales_order_line_service import SalesOrderLineService
+from sales.services.sales_order_service import SalesOrderService
+
+
+# Les données d'un TestCase ne sont pas validées en base : les threads du pool ne les verraient pas
+@override_settings(DASHBOARD_CONCURRENT_WIDGETS=False)
+class DashboardTestCase(TestDataMixin, TestCase):
+    """Données communes aux tests du dashboard"""
+
+    def setUp(self):
+        """Initialiser un cache de dashboard temporaire, un contact, une facture confirmée et le service dashboard"""
+        self._use_temp_dashboard_cache()
+        self.contact = self._create_contact("Dashboard")
+
+        self.invoice_service = InvoiceService()
+        self.invoice = self._create_invoice_for(self.contact, "Facture Dashboard", price_ht=100000, status="Confirmé")
+
+        self.payment_service = PaymentService()
+        self.service = DashboardService()
+        self.month_start = DashboardService._current_month_start()
+        # Le cache de snapshots est partagé par le processus : repartir d'un cache vide
+        dashboard_snapshot_cache.clear()
+
+    def _create_payment(self, amount, state_payment='Payé', created_at=None):
+        """Créer un paiement, éventuellement antidaté (le cumul mensuel est alors reconstruit)"""
+        payment = self.payment_service.create_payment("Carte bancaire", state_payment, self.invoice.invoice_id, amount)
+        if created_at is not None:
+            Payment.objects.filter(payment_id=payment.payment_id).update(created_at=created_at)
+            self.payment_service.rebuild_revenue_rollup()
+        return payment
+
+
+class DashboardRevenueTests(DashboardTestCase):
+
+    def test_monthly_revenue_filters_status_and_month(self):
+        """Le CA du mois ne compte que les paiements du statut demandé et du mois courant"""
+        self._create_payment(100)
+        self._create_payment(50)
+        self._create_payment(30, state_payment='En attente')
+        self._create_payment(1000, created_at=self.month_start - timedelta(days=1))
+
+        self.assertEqual(self.service.get_monthly_revenue('Payé'), 150.0)
+        self.assertEqual(self.service.get_monthly_revenue('En attente'), 30.0)
+
+    def test_monthly_revenue_without_payment(self):
+        """Le CA du mois vaut 0 sans paiement"""
+        self.assertEqual(self.service.get_monthly_revenue('Payé'), 0.0)
+
+    def test_sales_evolution_buckets_last_six_months(self):
+        """L'évolution regroupe les paiements par mois sur les 6 derniers mois"""
+        previous_month = DashboardService._shift_month(self.month_start, -1)
+        too_old_month = DashboardService._shift_month(self.month_start, -6)
+
+        self._create_payment(100)
+        self._create_payment(40, created_at=previous_month + timedelta(days=2))
+        self._create_payment(60, created_at=previous_month + timedelta(days=3))
+        self._create_payment(999, created_at=too_old_month + timedelta(days=1))
+
+        evolution = self.service.get_sales_evolution('Payé')
+        revenues = {point['key']: point['revenue'] for point in evolution}
+
+        self.assertEqual(len(evolution), 6)
+        # Ordre chronologique : le mois courant est le dernier point
+        self.assertEqual(evolution[-1]['key'], self.month_start.strftime('%Y-%m'))
+        self.assertEqual(revenues[self.month_start.strftime('%Y-%m')], 100.0)
+        self.assertEqual(revenues[previous_month.strftime('%Y-%m')], 100.0)
+        self.assertEqual(sum(revenues.values()), 200.0)
+
+    def test_sales_evolution_uses_one_query(self):
+        """L'évolution des ventes est lue dans le cumul mensuel en une seule requête"""
+        for _ in range(5):
+            self._create_payment(10)
+
+        with self.assertNumQueries(1):
+            self.service.get_sales_evolution('Payé')
+
+    def test_shift_month_crosses_years(self):
+        """Le décalage de mois gère le passage d'année"""
+        january = timezone.localtime().replace(year=2026, month=1, day=1)
+        self.assertEqual(DashboardService._shift_month(january, -1).month, 12)
+        self.assertEqual(DashboardService._shift_month(january, -1).year, 2025)
+        self.assertEqual(DashboardService._shift_month(january, 13).year, 2027)
+
+
+class DashboardTimeSeriesTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.time_series_service = TimeSeriesService()
+
+    @staticmethod
+    def _local(year, month, day, hour=12):
+        return timezone.make_aware(datetime(year, month, day, hour))
+
+    def test_daily_series_is_dense_with_iso_keys(self):
+        """Les jours sans paiement sont présents avec un total nul"""
+        self._create_payment(10, created_at=self._local(2025, 3, 1))
+        self._create_payment(15, created_at=self._local(2025, 3, 3, hour=23))
+
+        series = self.time_series_service.get_series('payments', date(2025, 3, 1), date(2025, 3, 4), 'day', 'Payé')
+
+        self.assertEqual([point['key'] for point in series], ['2025-03-01', '2025-03-02', '2025-03-03', '2025-03-04'])
+        self.assertEqual([point['total'] for point in series], [10.0, 0.0, 15.0, 0.0])
+        self.assertEqual([point['count'] for point in series], [1, 0, 1, 0])
+        self.assertEqual(series[0]['label'], '01/03/2025')
+
+    def test_multi_year_range_uses_one_query(self):
+        """Une plage de plusieurs années est agrégée en une seule requête"""
+        self._create_payment(100, created_at=self._local(2023, 2, 10))
+        self._create_payment(200, created_at=self._local(2025, 11, 5))
+
+        with self.assertNumQueries(1):
+            series = self.time_series_service.get_series(
+                'payments', date(2023, 1, 15), date(2025, 12, 15), 'month', 'Payé'
+            )
+
+        self.assertEqual(len(series), 36)
+        self.assertEqual(series[0]['key'], '2023-01')
+        totals = {point['key']: point['total'] for point in series}
+        self.assertEqual(totals['2023-02'], 100.0)
+        self.assertEqual(totals['2025-11'], 200.0)
+        self.assertEqual(sum(totals.values()), 300.0)
+
+    def test_monthly_rollup_matches_payments(self):
+        """Sur des mois entiers, la lecture du cumul mensuel donne la même série que les paiements"""
+        self._create_payment(20, created_at=self._local(2024, 1, 1, hour=0))
+        self._create_payment(100, created_at=self._local(2024, 1, 31, hour=23))
+        self._create_payment(50, created_at=self._local(2024, 2, 1, hour=0))
+
+        from_rollup = self.time_series_service.get_series('payments', date(2024, 1, 1), date(2024, 3, 31), 'month', 'Payé')
+        from_payments = self.time_series_service.get_series('payments', date(2024, 1, 2), date(2024, 3, 31), 'month', 'Payé')
+
+        self.assertEqual([point['total'] for point in from_rollup], [120.0, 50.0, 0.0])
+        self.assertEqual([point['total'] for point in from_payments], [100.0, 50.0, 0.0])
+        self.assertEqual([point['key'] for point in from_rollup], [point['key'] for point in from_payments])
+
+    def test_week_quarter_and_year_keys(self):
+        """Les semaines, trimestres et années ont des clés ISO stables"""
+        self._create_payment(30, created_at=self._local(2024, 12, 31))
+
+        weeks = self.time_series_service.get_series('payments', date(2024, 12, 23), date(2025, 1, 6), 'week', 'Payé')
+        self.assertEqual([point['key'] for point in weeks], ['2024-W52', '2025-W01', '2025-W02'])
+        self.assertEqual(weeks[1]['total'], 30.0)
+        self.assertEqual(weeks[1]['label'], 'S01 2025')
+
+        quarters = self.time_series_service.get_series('payments', date(2024, 11, 1), date(2025, 2, 1), 'quarter', 'Payé')
+        self.assertEqual([point['key'] for point in quarters], ['2024-Q4', '2025-Q1'])
+        self.assertEqual(quarters[0]['total'], 30.0)
+
+        years = self.time_series_service.get_series('payments', date(2024, 6, 1), date(2025, 6, 1), 'year', 'Payé')
+        self.assertEqual([(point['key'], point['total']) for point in years], [('2024', 30.0), ('2025', 0.0)])
+
+    def test_invoices_and_sales_orders_series(self):
+        """Les factures et devis/commandes sont comptés et sommés par période"""
+        product = ProductService().create_product(
+            product_id=None, product_description="Nuitée Série", price_ht=100, tax=20, price_it=120, product_type="vente"
+        )
+        quote = SalesOrderService().create_sales_order(self.contact.contact_id, "Séjour", "Devis")
+        for _ in range(2):
+            SalesOrderLineService().create_sales_order_line(
+                quote.sales_order_id, product.product_id, self.contact.contact_id,
+                100, 20, 120, 1, timezone.localdate(), "Nuitée"
+            )
+        today = timezone.localdate()
+
+        quotes = self.time_series_service.get_series('sales_orders', today, today, 'day', 'Devis')
+        self.assertEqual((quotes[0]['total'], quotes[0]['count']), (240.0, 1))
+        orders = self.time_series_service.get_series('sales_orders', today, today, 'day', 'Commande')
+        self.assertEqual(orders[0]['count'], 0)
+
+        invoices = self.time_series_service.get_series('invoices', today, today, 'day', 'Confirmé')
+        self.assertEqual(invoices[0]['count'], 1)
+
+    def test_invalid_parameters(self):
+        """Une granularité, une entité ou une période invalide est refusée"""
+        with self.assertRaises(ValueError):
+            self.time_series_service.get_series('payments', date(2025, 1, 1), date(2025, 2, 1), 'hour')
+        with self.assertRaises(ValueError):
+            self.time_series_service.get_series('contacts', date(2025, 1, 1), date(2025, 2, 1))
+        with self.assertRaises(ValueError):
+            self.time_series_service.get_series('payments', date(2025, 2, 1), date(2025, 1, 1))
+        # Période trop longue pour la granularité : refusée avant de construire la série
+        with self.assertRaises(ValueError), self.assertNumQueries(0):
+            self.time_series_service.get_series('payments', date(1, 1, 1), date(9998, 12, 31), 'day')
+
+    def test_dashboard_view_clamps_unbounded_period(self):
+        """Une période démesurée est ramenée aux dates autorisées et à MAX_BUCKETS périodes, sans erreur"""
+        response = self.client.post(reverse('dashboard:dashboard'), {
+            'payment_status': 'Payé', 'start': '0001-01-01', 'end': '9999-12-31', 'granularity': 'day',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        evolution = response.json()['sales_evolution']
+        self.assertEqual(len(evolution), MAX_BUCKETS)
+        self.assertEqual(evolution[-1]['key'], MAX_DATE.isoformat())
+        self.assertEqual(response.json()['widget_errors'], {})
+
+    def test_dashboard_view_accepts_period_and_granularity(self):
+        """La vue transmet la période et la granularité demandées à l'évolution des ventes"""
+        self._create_payment(25, created_at=self._local(2025, 5, 14))
+
+        response = self.client.post(reverse('dashboard:dashboard'), {
+            'payment_status': 'Payé', 'start': '2025-05-01', 'end': '2025-05-31', 'granularity': 'week',
+        })
+
+        evolution = response.json()['sales_evolution']
+        self.assertEqual(evolution[0]['key'], '2025-W18')
+        self.assertEqual(sum(point['revenue'] for point in evolution), 25.0)
+
+    def test_dashboard_view_downsamples_to_requested_points(self):
+        """La vue réduit une longue série quotidienne au nombre de points demandé"""
+        self._create_payment(25, created_at=self._local(2024, 7, 14))
+
+        response = self.client.post(reverse('dashboard:dashboard'), {
+            'payment_status': 'Payé', 'start': '2023-01-01', 'end': '2025-12-31', 'granularity': 'day',
+            'max_points': '100',
+        })
+
+        evolution = response.json()['sales_evolution']
+        self.assertEqual(len(evolution), 100)
+        self.assertIn('2024-07-14', [point['key'] for point in evolution])
+
+
+    def test_dashboard_page_downsamples_initial_series(self):
+        """La page embarque une série déjà réduite : demandée par max_points, sinon DASHBOARD_CHART_MAX_POINTS"""
+        self._create_payment(25, created_at=self._local(2024, 7, 14))
+        params = {'start': '2023-01-01', 'end': '2025-12-31', 'granularity': 'day'}
+
+        response = self.client.get(reverse('dashboard:dashboard'), {**params, 'max_points': '80'})
+        self.assertEqual(len(response.context['sales_evolution']), 80)
+        self.assertIn('2024-07-14', [point['key'] for point in response.context['sales_evolution']])
+
+        with override_settings(DASHBOARD_CHART_MAX_POINTS=60):
+            response = self.client.get(reverse('dashboard:dashboard'), params)
+        self.assertEqual(len(response.context['sales_evolution']), 60)
+
+
+class DashboardDownsamplingTests(SimpleTestCase):
+
+    @staticmethod
+    def _series(values):
+        return [{'key': str(index), 'label': str(index), 'revenue': value} for index, value in enumerate(values)]
+
+    def test_lttb_keeps_bounds_and_peaks(self):
+        """La série réduite garde le premier et le dernier point ainsi que les pics"""
+        values = [10.0] * 1000
+        values[417] = 5000.0
+        values[802] = -300.0
+        series = self._series(values)
+
+        sampled = downsample_lttb(series, 50, 'revenue')
+
+        self.assertEqual(len(sampled), 50)
+        self.assertIs(sampled[0], series[0])
+        self.assertIs(sampled[-1], series[-1])
+        self.assertIn(series[417], sampled)
+        self.assertIn(series[802], sampled)
+        # Les points restent dans l'ordre chronologique
+        keys = [int(point['key']) for point in sampled]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_lttb_leaves_short_series_untouched(self):
+        """Une série plus courte que la cible (ou une cible absente) n'est pas réduite"""
+        series = self._series([1.0, 2.0, 3.0])
+        self.assertEqual(downsample_lttb(series, 10, 'revenue'), series)
+        self.assertEqual(downsample_lttb(series, None, 'revenue'), series)
+
+
+class DashboardTopClientsTests(DashboardTestCase):
+
+    def _create_client_invoice(self, last_name):
+        """Créer un second client avec une facture confirmée"""
+        contact = self._create_contact(last_name)
+        return self._create_invoice_for(contact, f"Facture {last_name}", price_ht=100000, status="Confirmé")
+
+    def test_top_clients_ranking_and_limit(self):
+        """Les clients sont classés par CA décroissant et limités à N"""
+        other_invoice = self._create_client_invoice("Second")
+        self._create_payment(100)
+        self._create_payment(50)
+        self._create_payment(500, state_payment='En attente')
+        self.payment_service.create_payment("Chèque", "Payé", other_invoice.invoice_id, 200)
+
+        top = self.service.get_top_5_clients('Payé')
+        self.assertEqual([client['name'] for client in top], ["Client Second", "Client Dashboard"])
+        self.assertEqual(top[0]['revenue'], 200.0)
+        self.assertEqual(top[1]['revenue'], 150.0)
+        self.assertEqual(top[1]['contact_id'], self.contact.contact_id)
+
+        self.assertEqual(len(self.service.get_top_clients('Payé', limit=1)), 1)
+
+    def test_top_clients_date_window(self):
+        """Le classement peut être restreint à une période"""
+        self._create_payment(100)
+        self._create_payment(1000, created_at=self.month_start - timedelta(days=10))
+
+        top = self.service.get_top_clients('Payé', start=self.month_start)
+        self.assertEqual(top[0]['revenue'], 100.0)
+
+    def test_top_clients_uses_one_query(self):
+        """Le classement est calculé en une seule requête, quel que soit le nombre de paiements"""
+        other_invoice = self._create_client_invoice("Second")
+        for _ in range(5):
+            self._create_payment(10)
+            self.payment_service.create_payment("Chèque", "Payé", other_invoice.invoice_id, 20)
+
+        with self.assertNumQueries(1):
+            self.service.get_top_5_clients('Payé')
+
+
+class DashboardUnconvertedQuotesTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sales_order_service = SalesOrderService()
+        self.sales_order_line_service = SalesOrderLineService()
+        self.product = ProductService().create_product(
+            product_id=None,
+            product_description="Nuitée Dashboard",
+            price_ht=100,
+            tax=20,
+            price_it=120,
+            product_type="vente"
+        )
+
+    def _create_quote(self, lines=1, order_type='Devis'):
+        """Créer un devis avec `lines` lignes"""
+        quote = self.sales_order_service.create_sales_order(self.contact.contact_id, "Séjour", order_type)
+        for _ in range(lines):
+            self.sales_order_line_service.create_sales_order_line(
+                quote.sales_order_id, self.product.product_id, self.contact.contact_id,
+                100, 20, 120, 1, timezone.localdate(), "Nuitée"
+            )
+        return quote
+
+    def test_unconverted_quotes_excludes_converted_and_empty(self):
+        """Seuls les devis avec lignes et sans facture liée sont retournés, avec leurs totaux"""
+        open_quote = self._create_quote(lines=3)
+        converted_quote = self._create_quote(lines=1)
+        self._create_quote(lines=0)
+        self._create_quote(lines=1, order_type='Commande')
+        self._create_invoice_for(self.contact, "Facture issue du devis", sales_order_id=converted_quote.sales_order_id)
+
+        quotes = self.service.get_unconverted_quotes()
+        self.assertEqual([quote['id'] for quote in quotes], [open_quote.sales_order_id])
+        self.assertEqual(quotes[0]['lines_count'], 3)
+        self.assertEqual(quotes[0]['total_amount'], 360.0)
+        self.assertEqual(self.service.count_unconverted_quotes(), 1)
+
+    def test_unconverted_quotes_pagination_and_sort(self):
+        """Les devis sont paginés et triés par ancienneté"""
+        quote_ids = [self._create_quote().sales_order_id for _ in range(3)]
+
+        first_page = self.service.get_unconverted_quotes(page=1, page_size=2)
+        second_page = self.service.get_unconverted_quotes(page=2, page_size=2)
+        newest = self.service.get_unconverted_quotes(page_size=2, sort='newest')
+
+        self.assertEqual([quote['id'] for quote in first_page], quote_ids[:2])
+        self.assertEqual([quote['id'] for quote in second_page], quote_ids[2:])
+        self.assertEqual([quote['id'] for quote in newest], quote_ids[:0:-1])
+
+    def test_unconverted_quotes_uses_one_query(self):
+        """Le rapport tient en une requête quel que soit le nombre de devis"""
+        for _ in range(5):
+            self._create_quote(lines=2)
+
+        with self.assertNumQueries(1):
+            self.service.get_unconverted_quotes()
+
+    def test_dashboard_view_paginates_quotes(self):
+        """La vue dashboard affiche la page de devis demandée"""
+        for _ in range(DashboardService.QUOTES_PAGE_SIZE + 1):
+            self._create_quote()
+
+        response = self.client.get(reverse('dashboard:dashboard'), {'quotes_page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['unconverted_quotes']), 1)
+        self.assertTrue(response.context['quotes_has_previous'])
+        self.assertFalse(response.context['quotes_has_next'])
+
+
+class DashboardSnapshotCacheTests(DashboardTestCase):
+
+    def test_cached_stats_served_without_query(self):
+        """Un second appel est servi depuis le cache sans requête SQL"""
+        self._create_payment(100)
+        stats = self.service.get_cached_dashboard_stats('Payé')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.service.get_cached_dashboard_stats('Payé'), stats)
+
+    def test_payment_write_invalidates_snapshot(self):
+        """L'enregistrement d'un paiement invalide les snapshots après validation de la transaction"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_payment(100)
+        self.assertEqual(self.service.get_cached_dashboard_stats('Payé')['monthly_revenue'], 100.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_payment(50)
+        self.assertEqual(self.service.get_cached_dashboard_stats('Payé')['monthly_revenue'], 150.0)
+
+    def test_bank_statement_import_invalidates_snapshot(self):
+        """Les paiements d'un relevé, insérés en masse sans post_save, invalident aussi les snapshots"""
+        self.assertEqual(self.service.get_cached_dashboard_stats('Payé')['monthly_revenue'], 0)
+
+        statement = (
+            "Date;Identifiant;Libellé;Émetteur;Montant\n"
+            f"{timezone.localdate():%d/%m/%Y};OP1;VIR FACTURE {self.invoice.invoice_id};CLIENT DASHBOARD;300,00\n"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            statement_import = BankStatementService().import_statement(BytesIO(statement.encode('utf-8')), 'releve.csv')
+        self.assertEqual(statement_import.matched, 1)
+
+        stats = self.service.get_cached_dashboard_stats('Payé')
+        self.assertEqual(stats['monthly_revenue'], 300.0)
+        self.assertEqual(stats['top_5_clients'][0]['revenue'], 300.0)
+
+    def test_version_change_invalidates_other_processes(self):
+        """Un cache d'un autre processus voit l'invalidation via la version partagée"""
+        other_process_cache = DashboardSnapshotCache(ttl=60, max_entries=10)
+        other_process_cache.set('key', 'valeur')
+
+        dashboard_snapshot_cache.invalidate()
+        self.assertIsNone(other_process_cache.get('key'))
+
+    def test_invalidation_sets_a_new_version(self):
+        """Chaque invalidation écrit une version inédite dans le cache temporaire du test"""
+        versions = set()
+        for _ in range(3):
+            dashboard_snapshot_cache.invalidate()
+            versions.add(dashboard_snapshot_cache.get_version())
+        self.assertEqual(len(versions), 3)
+        self.assertEqual(dashboard_snapshot_cache.version_cache._dir, self.cache_dir)
+
+    def test_ttl_expiration(self):
+        """Les entrées expirent après leur durée de vie"""
+        cache = DashboardSnapshotCache(ttl=0, max_entries=10)
+        cache.set('key', 'valeur')
+        self.assertIsNone(cache.get('key'))
+
+    def test_lru_eviction(self):
+        """Le cache évince l'entrée la moins récemment utilisée au-delà de sa taille maximale"""
+        cache = DashboardSnapshotCache(ttl=60, max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+
+@override_settings(DASHBOARD_WIDGET_TIMEOUT=0.2, DASHBOARD_WIDGET_TIMEOUTS={})
+class DashboardConcurrentWidgetsTests(SimpleTestCase):
+
+    def _widgets(self, **overrides):
+        widgets = {name: (lambda value=value: value) for name, value in DashboardService.WIDGET_DEFAULTS.items()}
+        widgets['monthly_revenue'] = lambda: 42.0
+        widgets.update(overrides)
+        return widgets
+
+    def test_widgets_computed_in_parallel(self):
+        """Les widgets lents sont calculés en parallèle : les durées ne s'additionnent pas"""
+        def slow(value):
+            time.sleep(0.1)
+            return value
+
+        widgets = self._widgets(
+            monthly_revenue=lambda: slow(42.0),
+            top_5_clients=lambda: slow([]),
+            sales_evolution=lambda: slow([]),
+        )
+        service = DashboardService()
+        started_at = time.monotonic()
+        with mock.patch.object(service, '_get_widgets', return_value=widgets):
+            stats = service.get_dashboard_stats(concurrent=True)
+
+        self.assertLess(time.monotonic() - started_at, 0.25)
+        self.assertEqual(stats['monthly_revenue'], 42.0)
+        self.assertEqual(stats['widget_errors'], {})
+
+    def test_slow_or_failing_widget_returns_partial_data(self):
+        """Un widget en erreur ou trop lent est remplacé par sa valeur de repli"""
+        def failing():
+            raise ValueError("boom")
+
+        widgets = self._widgets(
+            top_5_clients=failing,
+            sales_evolution=lambda: time.sleep(1) or [{'key': '2026-01', 'label': 'Jan 2026', 'revenue': 1.0}],
+        )
+        service = DashboardService()
+        with mock.patch.object(service, '_get_widgets', return_value=widgets):
+            stats = service.get_dashboard_stats(concurrent=True)
+
+        self.assertEqual(stats['monthly_revenue'], 42.0)
+        self.assertEqual(stats['top_5_clients'], [])
+        self.assertEqual(stats['sales_evolution'], [])
+        self.assertEqual(set(stats['widget_errors']), {'top_5_clients', 'sales_evolution'})
+
+
+class DashboardConcurrentStatsTests(TestDataMixin, TransactionTestCase):
+
+    def setUp(self):
+        self._use_temp_dashboard_cache()
+
+    def test_concurrent_stats_match_sequential(self):
+        """Le mode concurrent retourne les mêmes statistiques que le mode séquentiel"""
+        contact = self._create_contact("Concurrent")
+        invoice = self._create_invoice_for(contact, "Facture Concurrent", price_ht=100000, status="Confirmé")
+        PaymentService().create_payment("Carte bancaire", "Payé", invoice.invoice_id, 120)
+
+        service = DashboardService()
+        sequential = service.get_dashboard_stats(concurrent=False)
+        concurrent = service.get_dashboard_stats(concurrent=True)
+
+        self.assertEqual(concurrent, sequential)
+        self.assertEqual(concurrent['monthly_revenue'], 120.0)
+
+
+    @override_settings(DASHBOARD_WIDGET_TIMEOUT=0.3, DASHBOARD_WIDGET_TIMEOUTS={})
+    def test_timed_out_widgets_release_the_pool(self):
+        """Les requêtes des widgets expirés sont interrompues : une requête suivante n'attend pas derrière elles"""
+        def blocked_query():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 1000000000) "
+                    "SELECT count(*) FROM n"
+                )
+                return cursor.fetchone()[0]
+
+        service = DashboardService()
+        blocked = {name: blocked_query for name in DashboardService.WIDGET_DEFAULTS}
+        with mock.patch.object(service, '_get_widgets', return_value=blocked):
+            stats = service.get_dashboard_stats(concurrent=True)
+        self.assertEqual(set(stats['widget_errors']), set(DashboardService.WIDGET_DEFAULTS))
+
+        fast = {name: (lambda value=value: value) for name, value in DashboardService.WIDGET_DEFAULTS.items()}
+        fast['monthly_revenue'] = lambda: 42.0
+        started_at = time.monotonic()
+        with mock.patch.object(service, '_get_widgets', return_value=fast):
+            stats = service.get_dashboard_stats(concurrent=True)
+
+        self.assertEqual(stats['widget_errors'], {})
+        self.assertEqual(stats['monthly_revenue'], 42.0)
+        self.assertLess(time.monotonic() - started_at, 0.3)
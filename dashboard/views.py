@@ -1,8 +1,46 @@
+from datetime import date
+from django.conf import settings
 from django.http import JsonResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
 import json
 from dashboard.services.dashboard_service import DashboardService
+from dashboard.services.time_series_service import (
+    GRANULARITIES, MAX_DATE, MIN_DATE, clamp_range, downsample_lttb,
+)
+
+
+def parse_evolution_params(params):
+    """
+    Lire la période (start, end au format AAAA-MM-JJ) et la granularité de l'évolution des ventes.
+    Les dates sont ramenées dans [MIN_DATE, MAX_DATE] et le début rapproché de la fin au-delà de MAX_BUCKETS périodes.
+    """
+    def parse_date(value):
+        try:
+            day = date.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+        return min(max(day, MIN_DATE), MAX_DATE) if day else None
+
+    start = parse_date(params.get('start'))
+    end = parse_date(params.get('end'))
+    if start and end and start > end:
+        start, end = end, start
+    granularity = params.get('granularity')
+    if granularity not in GRANULARITIES:
+        granularity = 'month'
+    if start:
+        start = clamp_range(start, end or timezone.localdate(), granularity)
+    return start, end, granularity
+
+
+def parse_max_points(params, default=None):
+    """Nombre de points souhaité pour le graphique de l'évolution des ventes (série réduite par LTTB)"""
+    try:
+        return int(params.get('max_points') or 0) or default
+    except ValueError:
+        return default
 
 
 class DashboardView(TemplateView):
@@ -13,14 +51,36 @@ class DashboardView(TemplateView):
         context = super().get_context_data(**kwargs)
         service = DashboardService()
 
+        # Pagination et tri des devis non convertis
+        try:
+            quotes_page = max(int(self.request.GET.get('quotes_page', 1)), 1)
+        except ValueError:
+            quotes_page = 1
+        quotes_sort = 'newest' if self.request.GET.get('quotes_sort') == 'newest' else 'oldest'
+        start, end, granularity = parse_evolution_params(self.request.GET)
+
         try:
             # Récupérer les stats avec le statut par défaut "Payé"
-            stats = service.get_dashboard_stats('Payé')
+            stats = service.get_cached_dashboard_stats('Payé', quotes_page, quotes_sort, start, end, granularity)
 
             context['monthly_revenue'] = stats['monthly_revenue']
-            context['sales_evolution'] = json.dumps(stats['sales_evolution'])
+            # Même réduction que les mises à jour AJAX : la page n'embarque pas toute une série quotidienne
+            context['sales_evolution'] = downsample_lttb(
+                stats['sales_evolution'],
+                parse_max_points(self.request.GET, getattr(settings, 'DASHBOARD_CHART_MAX_POINTS', 120)),
+                'revenue',
+            )
             context['top_5_clients'] = stats['top_5_clients']
             context['unconverted_quotes'] = stats['unconverted_quotes']
+            context['unconverted_quotes_count'] = stats['unconverted_quotes_count']
+            context['quotes_page'] = quotes_page
+            context['quotes_sort'] = quotes_sort
+            context['quotes_has_previous'] = quotes_page > 1
+            context['quotes_has_next'] = quotes_page * service.QUOTES_PAGE_SIZE < stats['unconverted_quotes_count']
+            context['widget_errors'] = stats['widget_errors']
+            context['evolution_start'] = start.isoformat() if start else ''
+            context['evolution_end'] = end.isoformat() if end else ''
+            context['evolution_granularity'] = granularity
 
         except Exception as e:
             context['error'] = f"Erreur lors du chargement des statistiques : {str(e)}"
@@ -31,16 +91,21 @@ class DashboardView(TemplateView):
         # Gérer la requête AJAX pour le filtrage par statut de paiement
         service = DashboardService()
         payment_status = request.POST.get('payment_status') or request.GET.get('payment_status')
+        start, end, granularity = parse_evolution_params(request.POST or request.GET)
 
         try:
             if payment_status:
                 # Récupérer les stats filtrées par le statut demandé
-                stats = service.get_dashboard_stats(payment_status)
+                stats = service.get_cached_dashboard_stats(payment_status, 1, 'oldest', start, end, granularity)
+
+                # Nombre de points souhaité par le navigateur pour le graphique (série réduite par LTTB)
+                max_points = parse_max_points(request.POST) or parse_max_points(request.GET)
 
                 return JsonResponse({
                     'monthly_revenue': stats['monthly_revenue'],
-                    'sales_evolution': stats['sales_evolution'],
+                    'sales_evolution': downsample_lttb(stats['sales_evolution'], max_points, 'revenue'),
                     'top_5_clients': stats['top_5_clients'],
+                    'widget_errors': stats['widget_errors'],
                 })
             else:
                 return JsonResponse({'error': 'Statut de paiement non spécifié'}, status=400)
@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'commons.middleware.UnitOfWorkMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -89,6 +90,15 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Transactions écrivantes en parallèle (facturation de masse) : le verrou d'écriture est pris
+        # dès le début de la transaction et attendu au lieu d'échouer avec "database is locked"
+        # Journal WAL : les lectures (rejeux d'encaissement, pages) ne sont pas bloquées par l'écrivain en cours
+        # et un commit ne coûte plus qu'une écriture séquentielle
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
         "TEST":{
             "NAME": "mytestdatabase",
         }
@@ -96,6 +106,68 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Le compteur de version du dashboard doit être partagé entre les workers : cache fichier local
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboard': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'dashboard',
+    },
+}
+
+DASHBOARD_CACHE_ALIAS = 'dashboard'
+DASHBOARD_CACHE_TTL = 300
+DASHBOARD_CACHE_MAX_ENTRIES = 256
+
+# Calcul des widgets du dashboard en parallèle (une connexion BDD par thread)
+DASHBOARD_CONCURRENT_WIDGETS = True
+DASHBOARD_WIDGET_WORKERS = 4
+DASHBOARD_WIDGET_TIMEOUT = 5
+DASHBOARD_WIDGET_TIMEOUTS = {
+    'unconverted_quotes': 10,
+}
+
+# Points de l'évolution des ventes envoyés avec la page (série réduite par LTTB)
+DASHBOARD_CHART_MAX_POINTS = 120
+
+# Exports en tâche de fond (commande run_export_jobs) : fichiers écrits sur le disque local
+EXPORT_JOBS_DIR = BASE_DIR / 'exports'
+EXPORT_JOBS_CHUNK_SIZE = 2000
+# Une tâche 'En cours' sans signe de vie depuis ce délai (secondes) est reprise par un autre worker
+EXPORT_JOBS_STALE_AFTER = 300
+
+# Facturation de masse : nombre de processus et de commandes par transaction
+MASS_INVOICING_PROCESSES = 4
+MASS_INVOICING_CHUNK_SIZE = 50
+
+# Contrôle des totaux stockés (commande verify_document_totals)
+DOCUMENT_TOTALS_PROCESSES = 4
+DOCUMENT_TOTALS_CHUNK_SIZE = 1000
+
+
+# Cache des PDF générés (factures, devis/commandes), adressé par le contenu, éviction LRU au-delà de la taille max
+PDF_CACHE_DIR = BASE_DIR / 'pdf_cache'
+PDF_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Parcours complet du cache (éviction) au plus toutes les N écritures, ou dès que la taille estimée dépasse le max
+PDF_CACHE_EVICT_EVERY = 100
+
+# Génération des PDF de factures en lot (archive ZIP) : processus en parallèle et factures par bloc
+PDF_BATCH_PROCESSES = 4
+PDF_BATCH_CHUNK_SIZE = 20
+
+# Import des relevés bancaires : opérations lues, rapprochées et enregistrées par lots de cette taille
+BANK_STATEMENT_BATCH_SIZE = 2000
+
+# API d'encaissement : jetons des clients machine (terminaux de paiement, intégrations), envoyés dans l'en-tête
+# Authorization: Bearer <jeton>. Sans jeton valide, la demande est soumise au contrôle CSRF comme un formulaire.
+PAYMENT_CAPTURE_API_TOKENS = []
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
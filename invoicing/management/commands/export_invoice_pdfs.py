@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicing.services.invoice_pdf_service import InvoicePdfBatchService
+
+
+class Command(BaseCommand):
+    help = "Générer les PDF des factures d'une période dans une archive ZIP, en parallèle sur plusieurs processus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Chemin de l'archive ZIP à écrire")
+        parser.add_argument('--start', type=date.fromisoformat, help="Factures créées à partir de cette date (AAAA-MM-JJ)")
+        parser.add_argument('--end', type=date.fromisoformat, help="Factures créées jusqu'à cette date incluse (AAAA-MM-JJ)")
+        parser.add_argument('--status', help="Statut des factures")
+        parser.add_argument('--contact', type=int, help="Identifiant du contact")
+        parser.add_argument('--processes', type=int, help="Nombre de processus (PDF_BATCH_PROCESSES par défaut)")
+        parser.add_argument('--chunk-size', type=int, help="Factures par bloc (PDF_BATCH_CHUNK_SIZE par défaut)")
+
+    def handle(self, *args, **options):
+        batch_service = InvoicePdfBatchService()
+        try:
+            invoice_ids = batch_service.get_invoice_ids(
+                start=options['start'],
+                end=options['end'],
+                status=options['status'],
+                contact_id=options['contact'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        report = batch_service.write_zip(
+            invoice_ids,
+            options['output'],
+            processes=options['processes'],
+            chunk_size=options['chunk_size'],
+        )
+
+        for invoice_id, error in sorted(report.failed):
+            self.stdout.write(self.style.ERROR(f"Facture {invoice_id} : {error}"))
+
+        style = self.style.WARNING if report.failed else self.style.SUCCESS
+        self.stdout.write(style(f"{options['output']} : {report.summary()}"))
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicing.services.mass_invoicing_service import MassInvoicingService
+
+
+class Command(BaseCommand):
+    help = "Facturer en masse les commandes signées sans facture, par blocs répartis sur plusieurs processus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help="Commandes créées à partir de cette date (AAAA-MM-JJ)")
+        parser.add_argument('--end', type=date.fromisoformat, help="Commandes créées jusqu'à cette date incluse (AAAA-MM-JJ)")
+        parser.add_argument('--contact', type=int, help="Identifiant du contact")
+        parser.add_argument('--processes', type=int, help="Nombre de processus (MASS_INVOICING_PROCESSES par défaut)")
+        parser.add_argument('--chunk-size', type=int, help="Commandes par transaction (MASS_INVOICING_CHUNK_SIZE par défaut)")
+
+    def handle(self, *args, **options):
+        try:
+            report = MassInvoicingService().invoice_signed_orders(
+                start=options['start'],
+                end=options['end'],
+                contact_id=options['contact'],
+                processes=options['processes'],
+                chunk_size=options['chunk_size'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for outcome in report.outcomes:
+            if outcome.status == 'Facturée':
+                self.stdout.write(outcome.describe())
+            else:
+                self.stdout.write(self.style.ERROR(outcome.describe()))
+
+        style = self.style.WARNING if report.failed else self.style.SUCCESS
+        self.stdout.write(style(report.summary()))
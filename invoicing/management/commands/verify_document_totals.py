@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicing.services.document_totals_service import DOCUMENTS, DocumentTotalsService
+
+
+class Command(BaseCommand):
+    help = "Contrôler les totaux stockés des factures et devis/commandes par rapport à leurs lignes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--document', choices=DOCUMENTS, help="Ne contrôler qu'un type de document")
+        parser.add_argument('--repair', action='store_true', help="Recalculer les totaux en écart")
+        parser.add_argument('--processes', type=int, help="Nombre de processus (DOCUMENT_TOTALS_PROCESSES par défaut)")
+        parser.add_argument('--chunk-size', type=int, help="Documents par bloc (DOCUMENT_TOTALS_CHUNK_SIZE par défaut)")
+
+    def handle(self, *args, **options):
+        report = DocumentTotalsService().verify_totals(
+            documents=(options['document'],) if options['document'] else DOCUMENTS,
+            repair=options['repair'],
+            processes=options['processes'],
+            chunk_size=options['chunk_size'],
+        )
+
+        for mismatch in report.mismatches:
+            self.stdout.write(
+                f"{mismatch.document} {mismatch.document_id} : "
+                f"stocké {' / '.join(map(str, mismatch.stored))}, attendu {' / '.join(map(str, mismatch.expected))}"
+            )
+
+        if report.mismatches and not report.repaired:
+            raise CommandError(report.summary())
+        self.stdout.write(self.style.SUCCESS(report.summary()))
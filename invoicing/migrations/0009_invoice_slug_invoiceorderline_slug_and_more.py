@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0008_alter_invoice_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='slug',
+            field=models.SlugField(null=True),
+        ),
+        migrations.AddField(
+            model_name='invoiceorderline',
+            name='slug',
+            field=models.SlugField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='status',
+            field=models.CharField(choices=[('Brouillon', 'Brouillon'), ('Confirmé', 'Confirmé'), ('Comptabilisé', 'Comptabilisé'), ('Annulée', 'Annulée')], default='Brouillon', max_length=20),
+        ),
+    ]
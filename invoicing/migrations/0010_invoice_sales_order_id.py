@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0009_invoice_slug_invoiceorderline_slug_and_more'),
+        ('sales', '0007_salesorder_slug_salesorderline_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='sales_order_id',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='sales.salesorder'),
+        ),
+    ]
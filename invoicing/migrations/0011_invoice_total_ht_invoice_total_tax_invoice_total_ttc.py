@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:29
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round
+
+
+def fill_totals(apps, schema_editor):
+    # Expressions recopiées ici (et non importées) pour que la migration reste figée
+    Invoice = apps.get_model('invoicing', 'Invoice')
+    InvoiceOrderLine = apps.get_model('invoicing', 'InvoiceOrderLine')
+    line_ht = Cast('price_ht', FloatField()) * F('quantity')
+
+    def total(expression):
+        subquery = (
+            InvoiceOrderLine.objects.filter(invoice_id=OuterRef('pk'))
+            .order_by()
+            .values('invoice_id')
+            .annotate(total=Sum(expression, output_field=FloatField()))
+            .values('total')
+        )
+        return Round(Coalesce(Subquery(subquery, output_field=FloatField()), Value(0.0)), 2)
+
+    total_ht = total(line_ht)
+    total_tax = total(line_ht * Cast('tax', FloatField()) / Value(100.0))
+    Invoice.objects.update(total_ht=total_ht, total_tax=total_tax, total_ttc=total_ht + total_tax)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0010_invoice_sales_order_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='total_ht',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='total_tax',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='total_ttc',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
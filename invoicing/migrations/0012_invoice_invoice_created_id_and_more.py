@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commons', '0004_exportjob'),
+        ('invoicing', '0011_invoice_total_ht_invoice_total_tax_invoice_total_ttc'),
+        ('sales', '0008_salesorder_total_ht_salesorder_total_tax_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['created_at', 'invoice_id'], name='invoice_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'created_at', 'invoice_id'], name='invoice_status_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['contact_id', 'created_at', 'invoice_id'], name='invoice_contact_created_id'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['total_ttc', 'invoice_id'], name='invoice_total_ttc_id'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:09
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def unlink_duplicate_invoices(apps, schema_editor):
+    """Factures en double d'un même devis/commande : seule la première reste rattachée au devis/commande"""
+    Invoice = apps.get_model('invoicing', 'Invoice')
+    first_invoice_ids = (
+        Invoice.objects.filter(sales_order_id__isnull=False)
+        .values('sales_order_id')
+        .annotate(first_invoice_id=Min('invoice_id'))
+        .values('first_invoice_id')
+    )
+    Invoice.objects.filter(sales_order_id__isnull=False).exclude(invoice_id__in=first_invoice_ids).update(
+        sales_order_id=None
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commons', '0004_exportjob'),
+        ('invoicing', '0012_invoice_invoice_created_id_and_more'),
+        ('sales', '0008_salesorder_total_ht_salesorder_total_tax_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(unlink_duplicate_invoices, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(condition=models.Q(('sales_order_id__isnull', False)), fields=('sales_order_id',), name='unique_invoice_sales_order'),
+        ),
+    ]
@@ -1,6 +1,10 @@
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models import Case, Count, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
 from django.utils import timezone
 from commons.models.contact_models import Contact
+from sales.models.sales_order_models import SalesOrder
 
 STATUS_CHOICES = (
     ('Brouillon', 'Brouillon'),
@@ -10,10 +14,82 @@ STATUS_CHOICES = (
 )
 
 
+class InvoiceQuerySet(models.QuerySet):
+
+    @staticmethod
+    def _total_amount():
+        """Montant TTC de la facture (en-tête), base des contrôles de paiement"""
+        return ExpressionWrapper(
+            F('price_ht') + F('price_ht') * F('tax') / Value(100.0), output_field=models.FloatField()
+        )
+
+    def _paid(self, **payment_filters):
+        """Sous-requête de la somme des paiements de la facture"""
+        payment_model = self.model._meta.get_field('payments').related_model
+        return (
+            payment_model.objects.filter(invoice_id=OuterRef('invoice_id'), **payment_filters)
+            .order_by()
+            .values('invoice_id')
+            .annotate(total=Sum('amount'))
+            .values('total')
+        )
+
+    def with_outstanding(self):
+        """
+        Annoter outstanding, le reste à encaisser : total TTC stocké (tenu à jour depuis les lignes) moins les seuls
+        paiements au statut 'Payé'. Diffère de remaining_amount ('Reste à payer' de la liste), qui part du montant
+        de l'en-tête et déduit aussi les paiements en attente ou en cours.
+        """
+        return self.annotate(
+            outstanding=ExpressionWrapper(
+                Cast('total_ttc', models.FloatField())
+                - Coalesce(Subquery(self._paid(state_payment='Payé'), output_field=models.IntegerField()), 0),
+                output_field=models.FloatField(),
+            ),
+        )
+
+    def _payment_count(self, **payment_filters):
+        """Sous-requête du nombre de paiements de la facture"""
+        payment_model = self.model._meta.get_field('payments').related_model
+        counted = (
+            payment_model.objects.filter(invoice_id=OuterRef('invoice_id'), **payment_filters)
+            .order_by()
+            .values('invoice_id')
+            .annotate(total=Count('payment_id'))
+            .values('total')
+        )
+        return Coalesce(Subquery(counted, output_field=models.IntegerField()), 0)
+
+    def with_payment_counts(self):
+        """
+        Annoter payment_count, pending_payment_count ('En attente') et in_progress_payment_count ('En cours') :
+        avec with_payment_totals, de quoi déterminer le statut de paiement sans relire les paiements
+        """
+        return self.annotate(
+            payment_count=self._payment_count(),
+            pending_payment_count=self._payment_count(state_payment='En attente'),
+            in_progress_payment_count=self._payment_count(state_payment='En cours'),
+        )
+
+    def with_payment_totals(self):
+        """
+        Annoter total_amount, total_paid, remaining_amount et is_paid calculés en base :
+        les propriétés du même nom utilisent ces valeurs au lieu de relire les paiements
+        """
+        return self.annotate(
+            total_amount=self._total_amount(),
+            total_paid=Coalesce(Subquery(self._paid(), output_field=models.IntegerField()), 0),
+            remaining_amount=ExpressionWrapper(F('total_amount') - F('total_paid'), output_field=models.FloatField()),
+            is_paid=Case(When(remaining_amount__lte=0, then=True), default=False, output_field=models.BooleanField()),
+        )
+
+
 class Invoice(models.Model):
     invoice_id = models.AutoField(primary_key=True)
     slug = models.SlugField(null=True)
     contact_id = models.ForeignKey(Contact, on_delete=models.CASCADE)
+    # Devis/commande d'origine lorsque la facture est issue d'une transformation
+    sales_order_id = models.ForeignKey(SalesOrder, on_delete=models.SET_NULL, null=True, blank=True, related_name='invoices')
     name = models.CharField(max_length=30)
     address = models.TextField()
     city = models.CharField(max_length=30)
@@ -29,19 +105,71 @@ class Invoice(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Brouillon')
     # rendre la date non automatique pour pouvoir la renseigner lors de la création d'une facture à partir d'un devis
     created_at = models.DateTimeField(auto_now_add=False, null=False, default=timezone.now)
+    # Totaux des lignes, tenus à jour par InvoiceOrderLineService (commande verify_document_totals pour contrôler)
+    total_ht = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_tax = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_ttc = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = InvoiceQuerySet.as_manager()
+
+    class Meta:
+        # Pagination par clé de la liste des factures : (tri, invoice_id), avec ou sans filtre
+        indexes = [
+            models.Index(fields=['created_at', 'invoice_id'], name='invoice_created_id'),
+            models.Index(fields=['status', 'created_at', 'invoice_id'], name='invoice_status_created_id'),
+            models.Index(fields=['contact_id', 'created_at', 'invoice_id'], name='invoice_contact_created_id'),
+            models.Index(fields=['total_ttc', 'invoice_id'], name='invoice_total_ttc_id'),
+        ]
+        constraints = [
+            # Une seule facture par devis/commande transformé
+            models.UniqueConstraint(
+                fields=['sales_order_id'], condition=models.Q(sales_order_id__isnull=False),
+                name='unique_invoice_sales_order',
+            ),
+        ]
+
+    # Les setters reçoivent les valeurs annotées par with_payment_totals()
 
     @property
     def total_amount(self):
+        if '_total_amount' in self.__dict__:
+            return self._total_amount
         return self.price_ht + (self.price_ht * self.tax / 100)
 
+    @total_amount.setter
+    def total_amount(self, value):
+        self._total_amount = value
+
     @property
     def total_paid(self):
-        return sum(payment.amount for payment in self.payments.all())
+        if '_total_paid' in self.__dict__:
+            return self._total_paid
+        # Solde tenu par le journal des paiements (payment.InvoicePaymentBalance) : une ligne au lieu de sommer
+        try:
+            return self.payment_balance.total_paid
+        except ObjectDoesNotExist:
+            return 0
+
+    @total_paid.setter
+    def total_paid(self, value):
+        self._total_paid = value
 
     @property
     def remaining_amount(self):
+        if '_remaining_amount' in self.__dict__:
+            return self._remaining_amount
         return self.total_amount - self.total_paid
 
+    @remaining_amount.setter
+    def remaining_amount(self, value):
+        self._remaining_amount = value
+
     @property
     def is_paid(self):
-        return self.remaining_amount <= 0
\ No newline at end of file
+        if '_is_paid' in self.__dict__:
+            return self._is_paid
+        return self.remaining_amount <= 0
+
+    @is_paid.setter
+    def is_paid(self, value):
+        self._is_paid = value
@@ -19,6 +19,25 @@ class InvoiceOrderLineRepository:
         )
         return line
 
+    def bulk_create_invoice_order_lines(self, invoice, lines, batch_size=500):
+        """Créer les lignes d'une facture en insertions groupées ; `lines` est une liste de dictionnaires de champs"""
+        return InvoiceOrderLine.objects.bulk_create(
+            [
+                InvoiceOrderLine(
+                    invoice_id=invoice,
+                    product_id_id=line['product_id'],
+                    contact_id_id=line['contact_id'],
+                    price_ht=line['price_ht'],
+                    tax=line['tax'],
+                    price_tax=line['price_tax'],
+                    quantity=line['quantity'],
+                    date=line['date'],
+                )
+                for line in lines
+            ],
+            batch_size=batch_size,
+        )
+
     def get_invoice_order_line_by_id(self, line_id):
         """Récupérer une ligne de facture par ID"""
         try:
@@ -1,15 +1,25 @@
 from invoicing.models.invoice_models import Invoice
+from invoicing.models.invoice_order_line_models import InvoiceOrderLine
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q, Sum, Value
+from django.db.models.functions import Coalesce, Concat, Round, Trunc
 from django.utils import timezone
+from commons.repositories.line_totals import line_totals
+from commons.repositories.unit_of_work import discard, get_by_pk
+from payment.models import Payment
+from payment.repositories.payment_ledger_repository import PaymentLedgerRepository
+from payment.repositories.payment_rollup_repository import PaymentRollupRepository
 
 
 class InvoiceRepository:
     def __init__(self):
         pass
 
-    def create_invoice(self, contact_id, name, address, city, state, zip_code, siret, email, phone, price_ht=0, tax=0, status='Brouillon', created_at=None):
+    def create_invoice(self, contact_id, name, address, city, state, zip_code, siret, email, phone, price_ht=0, tax=0, status='Brouillon', created_at=None, sales_order_id=None):
         """Créer une nouvelle facture"""
         invoice = Invoice.objects.create(
             contact_id_id=contact_id,
+            sales_order_id_id=sales_order_id,
             name=name,
             address=address,
             city=city,
@@ -28,15 +38,107 @@ class InvoiceRepository:
         return invoice
 
     def get_invoice_by_id(self, invoice_id):
-        """Récupérer une facture par ID"""
+        """Récupérer une facture par ID (chargée une fois par unité de travail)"""
+        try:
+            return get_by_pk(Invoice, invoice_id)
+        except Invoice.DoesNotExist:
+            raise ValueError(f"Facture avec l'ID {invoice_id} non trouvée")
+
+    def _get_invoice_for_update(self, invoice_id):
+        """
+        Facture relue en base pour une écriture : l'instance partagée de l'unité de travail n'est jamais modifiée,
+        elle ne peut donc pas garder les valeurs d'un save() qui échoue (le save() réussi l'évince)
+        """
         try:
             return Invoice.objects.get(invoice_id=invoice_id)
         except Invoice.DoesNotExist:
             raise ValueError(f"Facture avec l'ID {invoice_id} non trouvée")
 
     def get_all_invoices(self):
-        """Récupérer toutes les factures"""
-        return Invoice.objects.all()
+        """Récupérer toutes les factures, avec leur contact et leurs totaux de paiement (une requête)"""
+        return Invoice.objects.select_related('contact_id').with_payment_totals()
+
+    def get_invoice_detail(self, invoice_id):
+        """
+        Facture avec son contact et ses totaux de paiement, ses lignes avec leur produit et ses paiements
+        (les plus récents d'abord) : trois requêtes
+        """
+        try:
+            return (
+                Invoice.objects
+                .select_related('contact_id')
+                .with_payment_totals()
+                .prefetch_related(
+                    Prefetch(
+                        'invoiceorderline_set',
+                        queryset=InvoiceOrderLine.objects.select_related('product_id').order_by('invoice_order_line_id'),
+                        to_attr='detail_lines',
+                    ),
+                    Prefetch('payments', queryset=Payment.objects.order_by('-created_at'), to_attr='detail_payments'),
+                )
+                .get(invoice_id=invoice_id)
+            )
+        except Invoice.DoesNotExist:
+            raise ValueError(f"Facture avec l'ID {invoice_id} non trouvée")
+
+    def get_invoices_for_pdf(self, invoice_ids):
+        """
+        Factures à imprimer avec leur contact, totaux et nombres de paiements, lignes (et produits) et paiements :
+        trois requêtes quel que soit le nombre de factures
+        """
+        return list(
+            Invoice.objects
+            .filter(invoice_id__in=invoice_ids)
+            .select_related('contact_id')
+            .with_payment_totals()
+            .with_payment_counts()
+            .prefetch_related(
+                Prefetch(
+                    'invoiceorderline_set',
+                    queryset=InvoiceOrderLine.objects.select_related('product_id'),
+                    to_attr='pdf_lines',
+                ),
+                Prefetch('payments', to_attr='pdf_payments'),
+            )
+        )
+
+    def get_invoice_page(self, sort_field, descending, limit, start=None, end=None, status=None, contact_id=None,
+                         after=None, before=None):
+        """
+        Page de factures en pagination par clé (keyset) sur (sort_field, invoice_id), avec contact, totaux
+        et nombres de paiements (une requête). `after` / `before` sont les clés (valeur du tri, invoice_id) de la dernière /
+        première facture de la page voisine ; avec `before`, les factures sont retournées en ordre inverse.
+        Le coût d'une page ne dépend pas de sa profondeur.
+        """
+        invoices = Invoice.objects.all()
+        if start is not None:
+            invoices = invoices.filter(created_at__gte=start)
+        if end is not None:
+            invoices = invoices.filter(created_at__lt=end)
+        if status is not None:
+            invoices = invoices.filter(status=status)
+        if contact_id is not None:
+            invoices = invoices.filter(contact_id=contact_id)
+
+        key = after
+        if before is not None:
+            key, descending = before, not descending
+        if key is not None:
+            value, invoice_id = key
+            lookup = 'lt' if descending else 'gt'
+            invoices = invoices.filter(
+                Q(**{f'{sort_field}__{lookup}': value})
+                | Q(**{sort_field: value, f'invoice_id__{lookup}': invoice_id})
+            )
+
+        ordering = [f'-{name}' if descending else name for name in (sort_field, 'invoice_id')]
+        return list(
+            invoices.select_related('contact_id').with_payment_totals().with_payment_counts().order_by(*ordering)[:limit]
+        )
+
+    def exists_for_sales_order(self, sales_order_id):
+        """Vrai si une facture a déjà été créée à partir de ce devis/commande"""
+        return Invoice.objects.filter(sales_order_id=sales_order_id).exists()
 
     def get_invoices_by_contact(self, contact_id):
         """Récupérer les factures d'un contact"""
@@ -44,7 +146,8 @@ class InvoiceRepository:
 
     def update_invoice(self, invoice_id, contact_id, name, address, city, state, zip_code, siret, email, phone, status, created_at=None):
         """Mettre à jour une facture"""
-        invoice = self.get_invoice_by_id(invoice_id)
+        invoice = self._get_invoice_for_update(invoice_id)
+        previous_contact_id = invoice.contact_id_id
         invoice.contact_id_id = contact_id
         invoice.name = name
         invoice.address = address
@@ -57,13 +160,21 @@ class InvoiceRepository:
         invoice.status = status
         if created_at is not None:
             invoice.created_at = created_at
-        invoice.save()
+        with transaction.atomic():
+            invoice.save()
+            # Le cumul mensuel des paiements est tenu par contact : les paiements suivent la facture
+            if invoice.contact_id_id != previous_contact_id:
+                PaymentRollupRepository().move_invoice_payments(invoice.invoice_id, previous_contact_id, invoice.contact_id_id)
         return invoice
 
     def delete_invoice(self, invoice_id):
         """Supprimer une facture"""
         invoice = self.get_invoice_by_id(invoice_id)
-        invoice.delete()
+        with transaction.atomic():
+            # Les paiements supprimés en cascade doivent aussi sortir du cumul mensuel et être journalisés
+            PaymentRollupRepository().remove_payments_of_invoice(invoice.invoice_id)
+            PaymentLedgerRepository().record_invoice_deleted(invoice.invoice_id)
+            invoice.delete()
 
     def get_invoices_by_contact_id(self, contact_id):
         """Récupérer les factures d'un contact"""
@@ -71,8 +182,116 @@ class InvoiceRepository:
 
     def cancel_invoice(self, invoice_id):
         """Annulation d'une facture"""
-        invoice = self.get_invoice_by_id(invoice_id)
+        invoice = self._get_invoice_for_update(invoice_id)
         if invoice.status == 'Annulée':
             raise ValueError("La facture est déjà annulée")
         invoice.status = 'Annulée'
         invoice.save()
+
+    def get_totals_by_period(self, start=None, end=None, granularity='month', status=None):
+        """Montant TTC (totaux stockés) et nombre de factures par période de création"""
+        invoices = Invoice.objects.all()
+        if status is not None:
+            invoices = invoices.filter(status=status)
+        if start is not None:
+            invoices = invoices.filter(created_at__gte=start)
+        if end is not None:
+            invoices = invoices.filter(created_at__lt=end)
+        return (
+            invoices
+            .annotate(period=Trunc('created_at', granularity))
+            .values('period')
+            .annotate(total=Sum('total_ttc'), count=Count('invoice_id'))
+            .order_by('period')
+        )
+
+    def refresh_totals(self, invoice_ids):
+        """Recalculer les totaux stockés des factures à partir de leurs lignes (une requête UPDATE)"""
+        updated = Invoice.objects.filter(invoice_id__in=invoice_ids).update(
+            **line_totals(InvoiceOrderLine.objects.all(), 'invoice_id')
+        )
+        # UPDATE sans save() : les factures chargées dans l'unité de travail ont des totaux périmés
+        discard(Invoice, invoice_ids)
+        return updated
+
+    def get_totals_with_expected(self, invoice_ids):
+        """Totaux stockés et totaux recalculés depuis les lignes, pour contrôle"""
+        expected = line_totals(InvoiceOrderLine.objects.all(), 'invoice_id')
+        return (
+            Invoice.objects.filter(invoice_id__in=invoice_ids)
+            .annotate(**{f'expected_{name}': expression for name, expression in expected.items()})
+            .values(
+                'invoice_id', 'total_ht', 'total_tax', 'total_ttc',
+                'expected_total_ht', 'expected_total_tax', 'expected_total_ttc',
+            )
+            .order_by('invoice_id')
+        )
+
+    def get_invoice_ids(self, start=None, end=None, status=None, contact_id=None):
+        """Identifiants des factures (toutes par défaut) créées sur [start, end[, lus par blocs"""
+        invoices = Invoice.objects.all()
+        if start is not None:
+            invoices = invoices.filter(created_at__gte=start)
+        if end is not None:
+            invoices = invoices.filter(created_at__lt=end)
+        if status is not None:
+            invoices = invoices.filter(status=status)
+        if contact_id is not None:
+            invoices = invoices.filter(contact_id=contact_id)
+        return invoices.order_by('invoice_id').values_list('invoice_id', flat=True).iterator(chunk_size=2000)
+
+    def get_receivables_aging(self, boundaries, contact_id=None):
+        """
+        Balance âgée par contact en une requête : reste dû des factures confirmées ou comptabilisées,
+        réparti par tranche d'ancienneté. `boundaries` associe chaque tranche à l'intervalle
+        [début, fin[ de date de création (None : non borné)
+        """
+        invoices = Invoice.objects.filter(status__in=('Confirmé', 'Comptabilisé'))
+        if contact_id is not None:
+            invoices = invoices.filter(contact_id=contact_id)
+        invoices = invoices.with_outstanding().filter(outstanding__gt=0)
+
+        buckets = {}
+        for name, (start, end) in boundaries.items():
+            period = Q()
+            if start is not None:
+                period &= Q(created_at__gte=start)
+            if end is not None:
+                period &= Q(created_at__lt=end)
+            buckets[name] = Round(Coalesce(Sum('outstanding', filter=period), Value(0.0)), 2)
+
+        return (
+            invoices
+            .values('contact_id')
+            .annotate(
+                contact_name=Concat('contact_id__first_name', Value(' '), 'contact_id__last_name'),
+                invoice_count=Count('invoice_id'),
+                total_outstanding=Round(Sum('outstanding'), 2),
+                **buckets,
+            )
+            .order_by('contact_id')
+        )
+
+    def get_invoices_for_export(self, start=None, end=None, status=None, contact_id=None):
+        """
+        Factures à exporter en une seule requête : champs de la facture, nom du contact
+        et totaux HT/TTC stockés
+        """
+        invoices = Invoice.objects.all()
+        if start is not None:
+            invoices = invoices.filter(created_at__gte=start)
+        if end is not None:
+            invoices = invoices.filter(created_at__lt=end)
+        if status is not None:
+            invoices = invoices.filter(status=status)
+        if contact_id is not None:
+            invoices = invoices.filter(contact_id=contact_id)
+        return (
+            invoices
+            .annotate(contact_name=Concat('contact_id__first_name', Value(' '), 'contact_id__last_name'))
+            .values(
+                'invoice_id', 'contact_name', 'address', 'city', 'zip_code', 'email', 'phone',
+                'total_ht', 'total_ttc', 'status', 'created_at',
+            )
+            .order_by('invoice_id')
+        )
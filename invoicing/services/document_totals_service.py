@@ -0,0 +1,116 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import List, Tuple
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from invoicing.services.invoice_service import InvoiceService
+from invoicing.services.mass_invoicing_service import init_worker
+from sales.services.sales_order_service import SalesOrderService
+
+
+TOTAL_FIELDS = ('total_ht', 'total_tax', 'total_ttc')
+DOCUMENTS = ('invoices', 'sales_orders')
+
+
+@dataclass
+class TotalsMismatch:
+    document: str
+    document_id: int
+    stored: Tuple[Decimal, Decimal, Decimal]
+    expected: Tuple[Decimal, Decimal, Decimal]
+
+
+@dataclass
+class TotalsCheckReport:
+    """Résultat d'un contrôle des totaux stockés"""
+    checked: int = 0
+    mismatches: List[TotalsMismatch] = field(default_factory=list)
+    repaired: bool = False
+    elapsed: float = 0.0
+    processes: int = 1
+
+    def summary(self):
+        action = "corrigé(s)" if self.repaired else "à corriger"
+        return (
+            f"{self.checked} document(s) contrôlé(s), {len(self.mismatches)} total(aux) {action}, "
+            f"en {self.elapsed:.2f} s ({self.processes} processus)"
+        )
+
+
+def _document_service(document):
+    if document == 'invoices':
+        return InvoiceService()
+    if document == 'sales_orders':
+        return SalesOrderService()
+    raise ValueError(f"Le document doit être l'un de: {', '.join(DOCUMENTS)}")
+
+
+def _to_decimal(value):
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+def check_totals_chunk(document, document_ids, repair=False):
+    """Comparer les totaux stockés d'un bloc de documents à ceux recalculés, et corriger les écarts si demandé"""
+    service = _document_service(document)
+    checked = 0
+    mismatches = []
+    for row in service.get_totals_with_expected(document_ids):
+        checked += 1
+        stored = tuple(_to_decimal(row[name]) for name in TOTAL_FIELDS)
+        expected = tuple(_to_decimal(row[f'expected_{name}']) for name in TOTAL_FIELDS)
+        if stored != expected:
+            document_id = row['invoice_id'] if document == 'invoices' else row['sales_order_id']
+            mismatches.append(TotalsMismatch(document, document_id, stored, expected))
+
+    if repair and mismatches:
+        with transaction.atomic():
+            service.refresh_totals([mismatch.document_id for mismatch in mismatches])
+    return checked, mismatches
+
+
+class DocumentTotalsService:
+    """Contrôle (et correction) des totaux stockés des factures et devis/commandes, par blocs en parallèle"""
+
+    def get_document_ids(self, document):
+        service = _document_service(document)
+        if document == 'invoices':
+            return list(service.get_invoice_ids())
+        return list(service.get_sales_order_ids())
+
+    def verify_totals(self, documents=DOCUMENTS, repair=False, processes=None, chunk_size=None):
+        processes = processes or getattr(settings, 'DOCUMENT_TOTALS_PROCESSES', 1)
+        chunk_size = chunk_size or getattr(settings, 'DOCUMENT_TOTALS_CHUNK_SIZE', 1000)
+
+        started_at = time.monotonic()
+        tasks = []
+        for document in documents:
+            document_ids = self.get_document_ids(document)
+            tasks.extend(
+                (document, document_ids[i:i + chunk_size]) for i in range(0, len(document_ids), chunk_size)
+            )
+
+        report = TotalsCheckReport(repaired=repair)
+        if processes <= 1 or len(tasks) <= 1:
+            results = [check_totals_chunk(document, ids, repair) for document, ids in tasks]
+        else:
+            report.processes = processes
+            results = self._check_in_pool(tasks, repair, processes)
+
+        for checked, mismatches in results:
+            report.checked += checked
+            report.mismatches.extend(mismatches)
+        report.mismatches.sort(key=lambda mismatch: (mismatch.document, mismatch.document_id))
+        report.elapsed = time.monotonic() - started_at
+        return report
+
+    @staticmethod
+    def _check_in_pool(tasks, repair, processes):
+        # Les processus fils ne doivent pas hériter d'une connexion ouverte
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(processes, len(tasks)), initializer=init_worker) as executor:
+            futures = [executor.submit(check_totals_chunk, document, ids, repair) for document, ids in tasks]
+            return [future.result() for future in as_completed(futures)]
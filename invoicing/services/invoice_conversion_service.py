@@ -0,0 +1,111 @@
+from django.db import IntegrityError, transaction
+
+from commons.services.contact_service import ContactService
+from invoicing.repositories.invoice_order_line_repository import InvoiceOrderLineRepository
+from invoicing.services.invoice_service import InvoiceService
+from products.services.product_service import ProductService
+from sales.models.sales_order_models import SalesOrder
+from sales.services.sales_order_line_service import SalesOrderLineService
+from sales.services.sales_order_service import SalesOrderService
+
+
+class InvoiceConversionService:
+    """
+    Transformation d'un devis/commande en facture : les lignes sont validées avec quelques requêtes
+    groupées puis la facture et ses lignes sont écrites dans une seule transaction.
+    Le nombre de requêtes ne dépend pas du nombre de lignes.
+    """
+
+    def __init__(self):
+        self.invoice_service = InvoiceService()
+        self.line_repo = InvoiceOrderLineRepository()
+        self.sales_order_service = SalesOrderService()
+        self.sales_order_line_service = SalesOrderLineService()
+        self.product_service = ProductService()
+        self.contact_service = ContactService()
+
+    def validate_lines(self, sales_lines):
+        """Valider toutes les lignes (mêmes règles que InvoiceOrderLineService) avec une requête par table"""
+        if not sales_lines:
+            raise ValueError("Impossible de créer une facture sans lignes.")
+
+        product_ids = {line.product_id_id for line in sales_lines}
+        contact_ids = {line.contact_id_id for line in sales_lines}
+        missing_products = product_ids - self.product_service.get_existing_product_ids(product_ids)
+        missing_contacts = contact_ids - self.contact_service.get_existing_contact_ids(contact_ids)
+
+        for line in sales_lines:
+            if line.product_id_id in missing_products:
+                raise ValueError(f"Ligne {line.sales_order_line_id} : le produit n'existe pas")
+            if line.contact_id_id in missing_contacts:
+                raise ValueError(f"Ligne {line.sales_order_line_id} : le contact n'existe pas")
+            if line.price_ht < 0:
+                raise ValueError(f"Ligne {line.sales_order_line_id} : price_ht doit être positif")
+            if line.tax < 0 or line.tax > 100:
+                raise ValueError(f"Ligne {line.sales_order_line_id} : tax doit être entre 0 et 100")
+            if line.quantity <= 0:
+                raise ValueError(f"Ligne {line.sales_order_line_id} : la quantité doit être positive")
+
+    def convert_sales_order(self, sales_order_id):
+        """Créer la facture d'un devis/commande avec toutes ses lignes, ou rien en cas d'erreur"""
+        try:
+            with transaction.atomic():
+                return self._convert_locked(sales_order_id)
+        except IntegrityError:
+            # Facture créée entre-temps pour ce devis/commande : refusée par la contrainte d'unicité
+            if self.invoice_service.exists_for_sales_order(sales_order_id):
+                raise ValueError("Ce devis/commande a déjà été transformé en facture.")
+            raise
+
+    def _convert_locked(self, sales_order_id):
+        """
+        Transformation sous le verrou du devis/commande (à appeler dans une transaction) : deux transformations
+        simultanées (double clic, facturation en masse) sont sérialisées et la seconde voit la facture de la première.
+        Sans verrou de ligne (SQLite), la contrainte d'unicité refuse la seconde facture (voir convert_sales_order)
+        """
+        try:
+            sales_order = self.sales_order_service.lock_sales_order(sales_order_id)
+        except SalesOrder.DoesNotExist:
+            raise ValueError(f"Devis/commande avec l'ID {sales_order_id} non trouvé")
+
+        if self.invoice_service.exists_for_sales_order(sales_order_id):
+            raise ValueError("Ce devis/commande a déjà été transformé en facture.")
+
+        sales_lines = list(self.sales_order_line_service.get_sales_order_lines_by_order(sales_order_id))
+        self.validate_lines(sales_lines)
+
+        # Totaux calculés à partir des lignes, taxe de la première ligne (supposée identique pour toutes)
+        total_price_ht = sum(line.price_ht * line.quantity for line in sales_lines)
+        tax = sales_lines[0].tax
+
+        contact = sales_order.contact_id
+        invoice = self.invoice_service.create_invoice(
+            contact_id=contact.contact_id,
+            name=f"{contact.first_name} {contact.last_name}",
+            address=contact.address,
+            city=contact.city,
+            state=contact.state,
+            zip_code=contact.zip_code,
+            siret=contact.siret,
+            email=contact.email,
+            phone=contact.phone,
+            price_ht=int(total_price_ht),
+            tax=int(tax),
+            sales_order_id=sales_order.sales_order_id
+        )
+        self.line_repo.bulk_create_invoice_order_lines(invoice, [
+            {
+                'product_id': line.product_id_id,
+                'contact_id': line.contact_id_id,
+                'price_ht': line.price_ht,
+                'tax': line.tax,
+                'price_tax': line.price_it,
+                'quantity': line.quantity,
+                'date': line.date,
+            }
+            for line in sales_lines
+        ])
+        self.invoice_service.refresh_totals([invoice.invoice_id])
+        # Les lignes de la facture sont des copies de celles du devis/commande : mêmes totaux, sans relecture
+        invoice.total_ht, invoice.total_tax, invoice.total_ttc = sales_order.total_ht, sales_order.total_tax, sales_order.total_ttc
+        return invoice
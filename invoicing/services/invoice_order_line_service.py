@@ -1,3 +1,5 @@
+from django.db import transaction
+
 from invoicing.repositories.invoice_order_line_repository import InvoiceOrderLineRepository
 from invoicing.services.invoice_service import InvoiceService
 from products.services.product_service import ProductService
@@ -52,11 +54,18 @@ class InvoiceOrderLineService:
         product = self.product_service.get_product_by_id(product_id)
         contact_dto = self.contact_service.get_contact_by_id(contact_id)
 
-        return self.repo.create_invoice_order_line(invoice, product, contact_dto.contact_id, price_ht, tax, price_tax, quantity, date)
+        # Les totaux de la facture sont recalculés dans la même transaction que l'écriture de la ligne
+        with transaction.atomic():
+            line = self.repo.create_invoice_order_line(invoice, product, contact_dto.contact_id, price_ht, tax, price_tax, quantity, date)
+            self.invoice_service.refresh_totals([invoice.invoice_id])
+        return line
 
     def delete_invoice_order_line(self, line_id):
         """Supprimer une ligne de facture"""
-        return self.repo.delete_invoice_order_line(line_id)
+        line = self.repo.get_invoice_order_line_by_id(line_id)
+        with transaction.atomic():
+            self.repo.delete_invoice_order_line(line_id)
+            self.invoice_service.refresh_totals([line.invoice_id_id])
 
     def get_all_invoice_order_lines(self):
         """Récupérer toutes les lignes de facture"""
@@ -79,5 +88,11 @@ class InvoiceOrderLineService:
         product = self.product_service.get_product_by_id(product_id)
         contact_dto = self.contact_service.get_contact_by_id(contact_id)
 
-        return self.repo.update_invoice_order_line(line_id, invoice, product, contact_dto.contact_id, price_ht, tax, price_tax, quantity, date)
+        previous_invoice_id = self.repo.get_invoice_order_line_by_id(line_id).invoice_id_id
+
+        with transaction.atomic():
+            line = self.repo.update_invoice_order_line(line_id, invoice, product, contact_dto.contact_id, price_ht, tax, price_tax, quantity, date)
+            # La ligne peut changer de facture : les deux totaux sont recalculés
+            self.invoice_service.refresh_totals({previous_invoice_id, invoice.invoice_id})
+        return line
 
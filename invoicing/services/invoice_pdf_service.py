@@ -0,0 +1,261 @@
+import base64
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date
+from typing import List, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+from invoicing.services.invoice_service import InvoiceService
+from invoicing.services.mass_invoicing_service import init_worker
+from payment.services.payment_service import PaymentService
+from sales.sales_order_pdf import SalesOrderPDFService
+
+
+class InvoicePdfAdapter:
+    """Facture présentée comme un devis/commande au service PDF, avec ses paiements"""
+
+    def __init__(self, invoice, payments, total_paid, payment_status):
+        self.contact_id = invoice.contact_id
+        self.type = "Facture"
+        self.genre = "Facture"
+        self.created_at = invoice.created_at
+        self.invoice_id = invoice.invoice_id
+        self.payments = payments
+        self.total_paid = total_paid
+        self.payment_status = payment_status
+        self.total_ht = invoice.total_ht
+        self.total_tax = invoice.total_tax
+        self.total_ttc = invoice.total_ttc
+
+
+class InvoiceLinePdfAdapter:
+    """Ligne de facture présentée comme une ligne de devis/commande au service PDF"""
+
+    def __init__(self, line):
+        self.date = line.date
+        self.product_id = line.product_id
+        self.genre = line.product_id.product_description  # Utiliser la description du produit comme genre
+        self.quantity = line.quantity
+        self.price_ht = line.price_ht
+        self.tax = line.tax
+        self.price_it = line.price_tax  # Mapper price_tax vers price_it
+
+
+class InvoicePdfService:
+    """PDF des factures, générés par SalesOrderPDFService (et servis depuis son cache)"""
+
+    def __init__(self):
+        self.invoice_service = InvoiceService()
+        self.payment_service = PaymentService()
+        self.pdf_service = SalesOrderPDFService()
+
+    @staticmethod
+    def filename(invoice_id):
+        return f"facture_{invoice_id}.pdf"
+
+    def get_pdf(self, invoice_id):
+        """PDF d'une facture (fichier ou BytesIO positionné au début)"""
+        invoices = self.invoice_service.get_invoices_for_pdf([invoice_id])
+        if not invoices:
+            raise ValueError(f"Facture avec l'ID {invoice_id} non trouvée")
+        return self.render(invoices[0])
+
+    def render(self, invoice):
+        """
+        PDF d'une facture chargée par get_invoices_for_pdf : total payé et statut de paiement sont ceux de la liste
+        des factures (with_payment_totals, statut résolu par PaymentService)
+        """
+        payment_status = self.payment_service.get_annotated_payment_status(invoice)
+        invoice_adapter = InvoicePdfAdapter(invoice, invoice.pdf_payments, invoice.total_paid, payment_status)
+        adapted_lines = [InvoiceLinePdfAdapter(line) for line in invoice.pdf_lines]
+        return self.pdf_service.get_pdf(invoice_adapter, adapted_lines)
+
+
+@dataclass
+class PdfBatchReport:
+    """Résultat d'une génération de PDF en lot : documents archivés, échecs et débit"""
+    documents: int = 0
+    failed: List[Tuple[int, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+    processes: int = 1
+
+    @property
+    def throughput(self):
+        """Documents générés par seconde"""
+        return self.documents / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f"{self.documents} PDF archivé(s), {len(self.failed)} en échec, en {self.elapsed:.2f} s "
+            f"({self.throughput:.1f} document(s)/s, {self.processes} processus)"
+        )
+
+
+def render_invoice_chunk(invoice_ids):
+    """Générer les PDF d'un bloc de factures : liste de (invoice_id, contenu du PDF ou None, message d'erreur)"""
+    pdf_service = InvoicePdfService()
+    invoices = {
+        invoice.invoice_id: invoice for invoice in pdf_service.invoice_service.get_invoices_for_pdf(invoice_ids)
+    }
+    results = []
+    for invoice_id in invoice_ids:
+        try:
+            if invoice_id not in invoices:
+                raise ValueError(f"Facture avec l'ID {invoice_id} non trouvée")
+            pdf_file = pdf_service.render(invoices[invoice_id])
+            with pdf_file:
+                results.append((invoice_id, pdf_file.read(), ''))
+        except Exception as e:
+            results.append((invoice_id, None, str(e)))
+    return results
+
+
+class InvoicePdfBatchService:
+    """
+    PDF des factures d'une période rassemblés dans une archive ZIP, générés en parallèle par blocs.
+    Depuis l'application, l'archive est produite en tâche de fond par le worker des exports (run_export_jobs) :
+    job_filters() valide la demande, run_job() génère les PDF avec un point de reprise par tour puis écrit l'archive.
+    """
+
+    # Tâche de fond (commons.models.ExportJob) : entité, format et nom de l'archive produite
+    JOB_ENTITY = 'invoice_pdfs'
+    JOB_FORMAT = 'zip'
+    JOB_FILENAME = 'factures.zip'
+    JOB_SPOOL_FORMAT = 'jsonl'
+
+    def __init__(self):
+        self.invoice_service = InvoiceService()
+
+    def get_invoice_ids(self, start=None, end=None, status=None, contact_id=None):
+        """Factures à archiver (dates incluses), validées avant toute génération"""
+        invoice_ids = list(self.invoice_service.get_invoice_ids(start, end, status, contact_id))
+        if not invoice_ids:
+            raise ValueError("Aucune facture ne correspond aux filtres")
+        return invoice_ids
+
+    def write_zip(self, invoice_ids, path, processes=None, chunk_size=None):
+        """Écrire l'archive des PDF dans le fichier `path` et retourner le rapport"""
+        processes = processes or getattr(settings, 'PDF_BATCH_PROCESSES', 1)
+        chunk_size = chunk_size or getattr(settings, 'PDF_BATCH_CHUNK_SIZE', 20)
+        chunks = [invoice_ids[i:i + chunk_size] for i in range(0, len(invoice_ids), chunk_size)]
+        report = PdfBatchReport(processes=processes if processes > 1 and len(chunks) > 1 else 1)
+
+        started_at = time.monotonic()
+        # Les PDF sont déjà compressés : inutile de les recompresser
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for invoice_id, content, error in self._render(chunks, report.processes):
+                if content is None:
+                    report.failed.append((invoice_id, error))
+                else:
+                    archive.writestr(InvoicePdfService.filename(invoice_id), content)
+                    report.documents += 1
+            self._write_errors(archive, report.failed)
+        report.elapsed = time.monotonic() - started_at
+        return report
+
+    def job_filters(self, start=None, end=None, status=None, contact_id=None):
+        """Valider une archive en tâche de fond : filtres enregistrés avec la tâche (dates au format ISO)"""
+        self.get_invoice_ids(start, end, status, contact_id)
+        return {
+            'start': start.isoformat() if start else None,
+            'end': end.isoformat() if end else None,
+            'status': status or None,
+            'contact_id': contact_id,
+        }
+
+    def run_job(self, job, jobs):
+        """
+        Traiter une tâche d'archive attribuée (`jobs` : ExportJobService). Les factures sont figées au premier
+        passage. Chaque tour de `processes` blocs ajoute au fichier intermédiaire JSON Lines une ligne par facture
+        (PDF en base64 ou message d'erreur) puis enregistre son point de reprise ; l'archive est assemblée à partir
+        de ce fichier.
+        """
+        processes = getattr(settings, 'PDF_BATCH_PROCESSES', 1)
+        chunk_size = getattr(settings, 'PDF_BATCH_CHUNK_SIZE', 20)
+        spool_path = jobs.open_spool(job)
+
+        filters = job.filters
+        if job.rows_total is None:
+            invoice_ids = self.get_invoice_ids(
+                start=date.fromisoformat(filters['start']) if filters.get('start') else None,
+                end=date.fromisoformat(filters['end']) if filters.get('end') else None,
+                status=filters.get('status'),
+                contact_id=filters.get('contact_id'),
+            )
+            jobs.repo.update_export_job(
+                job, filters={**filters, 'invoice_ids': invoice_ids}, rows_total=len(invoice_ids)
+            )
+        invoice_ids = job.filters['invoice_ids']
+        if job.checkpoint_key:
+            invoice_ids = [invoice_id for invoice_id in invoice_ids if invoice_id > job.checkpoint_key[0]]
+
+        round_size = max(processes, 1) * chunk_size
+        with open(spool_path, 'ab') as spool:
+            for i in range(0, len(invoice_ids), round_size):
+                round_ids = invoice_ids[i:i + round_size]
+                chunks = [round_ids[j:j + chunk_size] for j in range(0, len(round_ids), chunk_size)]
+                position = {invoice_id: index for index, invoice_id in enumerate(round_ids)}
+                results = sorted(self._render(chunks, processes if len(chunks) > 1 else 1),
+                                 key=lambda result: position[result[0]])
+                spool.write(''.join(
+                    json.dumps({
+                        'invoice_id': invoice_id,
+                        'pdf': base64.b64encode(content).decode('ascii') if content is not None else None,
+                        'error': error,
+                    }) + '\n'
+                    for invoice_id, content, error in results
+                ).encode('utf-8'))
+                spool.flush()
+                os.fsync(spool.fileno())
+                jobs.repo.save_checkpoint(job, [round_ids[-1]], spool.tell(), len(round_ids))
+
+        def write_archive(output):
+            failed = []
+            # Les PDF sont déjà compressés : inutile de les recompresser
+            with open(spool_path, 'rb') as spool, \
+                    zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+                for index, line in enumerate(spool, start=1):
+                    record = json.loads(line)
+                    if record['pdf'] is None:
+                        failed.append((record['invoice_id'], record['error']))
+                    else:
+                        content = base64.b64decode(record['pdf'])
+                        archive.writestr(InvoicePdfService.filename(record['invoice_id']), content)
+                    if index % chunk_size == 0:
+                        # Signe de vie (et vérification de l'attribution) pendant l'assemblage
+                        jobs.repo.update_export_job(job)
+                self._write_errors(archive, failed)
+
+        jobs.publish_file(job, write_archive)
+
+    @staticmethod
+    def _write_errors(archive, failed):
+        if failed:
+            archive.writestr('erreurs.txt', '\n'.join(
+                f"Facture {invoice_id} : {error}" for invoice_id, error in sorted(failed)
+            ))
+
+    @staticmethod
+    def _render(chunks, processes):
+        if processes <= 1:
+            for chunk in chunks:
+                yield from render_invoice_chunk(chunk)
+            return
+
+        # Les processus fils ne doivent pas hériter d'une connexion ouverte
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(processes, len(chunks)), initializer=init_worker) as executor:
+            futures = {executor.submit(render_invoice_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                try:
+                    yield from future.result()
+                except Exception as e:
+                    # Processus perdu : tout le bloc est noté en échec
+                    for invoice_id in futures[future]:
+                        yield invoice_id, None, str(e)
@@ -1,8 +1,48 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+
+from invoicing.models.invoice_models import STATUS_CHOICES
 from invoicing.repositories.invoice_repository import InvoiceRepository
 from commons.services.contact_service import ContactService
+from commons.services.date_range import day_range
+from payment.services.payment_service import PaymentService
+
+
+# Tris de la liste des factures : champ de tri (départagé par invoice_id) et sens
+INVOICE_SORTS = {
+    'newest': ('created_at', True),
+    'oldest': ('created_at', False),
+    'amount_desc': ('total_ttc', True),
+    'amount_asc': ('total_ttc', False),
+}
+
+
+@dataclass
+class InvoicePage:
+    """Page de la liste des factures et curseurs des pages voisines (None en bout de liste)"""
+    invoices: List
+    next_cursor: Optional[str]
+    previous_cursor: Optional[str]
+
+
+@dataclass
+class InvoiceDetail:
+    """Facture et tout ce qu'affiche sa page de détail, chargés en un nombre fixe de requêtes"""
+    invoice: object
+    lines: List
+    payments: List
+    total_paid: float
+    payment_status: str
 
 
 class InvoiceService:
+    PAGE_SIZE = 25
+
     def __init__(self):
         self.repo = InvoiceRepository()
         self.contact_service = ContactService()
@@ -31,12 +71,12 @@ class InvoiceService:
         if not zip_code or zip_code.strip() == "":
             raise ValueError("Le code postal ne peut pas être vide")
 
-    def create_invoice(self, contact_id, name, address, city, state, zip_code, siret, email, phone, price_ht=0, tax=0, status='Brouillon', created_at=None):
+    def create_invoice(self, contact_id, name, address, city, state, zip_code, siret, email, phone, price_ht=0, tax=0, status='Brouillon', created_at=None, sales_order_id=None):
         """Créer une nouvelle facture"""
         self.validate_invoice_data(contact_id, name, address, city, state, zip_code, siret, email, phone)
         # Extraire l'ID du DTO (contact_service retourne un ContactDTO)
         contact_dto = self.contact_service.get_contact_by_id(contact_id)
-        return self.repo.create_invoice(contact_dto.contact_id, name, address, city, state, zip_code, siret, email, phone, price_ht, tax, status, created_at)
+        return self.repo.create_invoice(contact_dto.contact_id, name, address, city, state, zip_code, siret, email, phone, price_ht, tax, status, created_at, sales_order_id)
 
     def delete_invoice(self, invoice_id):
         """Supprimer une facture"""
@@ -50,10 +90,114 @@ class InvoiceService:
         """Récupérer une facture par ID"""
         return self.repo.get_invoice_by_id(invoice_id)
 
+    def get_invoices_for_pdf(self, invoice_ids):
+        """Factures à imprimer, avec ce que leur PDF affiche (lignes, paiements, totaux de paiement)"""
+        return self.repo.get_invoices_for_pdf(invoice_ids)
+
+    def get_invoice_detail(self, invoice_id):
+        """Facture avec contact, lignes (et produits), paiements et statut de paiement calculé"""
+        invoice = self.repo.get_invoice_detail(invoice_id)
+        payments = invoice.detail_payments
+        return InvoiceDetail(
+            invoice=invoice,
+            lines=invoice.detail_lines,
+            payments=payments,
+            total_paid=invoice.total_paid,
+            payment_status=PaymentService.resolve_payment_status(
+                [payment.state_payment for payment in payments], invoice.is_paid
+            ),
+        )
+
+    @staticmethod
+    def encode_cursor(sort, invoice):
+        """Curseur opaque d'une facture pour un tri : valeur du champ de tri et invoice_id"""
+        sort_field = INVOICE_SORTS[sort][0]
+        value = getattr(invoice, sort_field)
+        value = value.isoformat() if sort_field == 'created_at' else str(value)
+        payload = json.dumps([sort, value, invoice.invoice_id]).encode('utf-8')
+        return base64.urlsafe_b64encode(payload).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(sort, cursor):
+        try:
+            cursor_sort, value, invoice_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if cursor_sort != sort:
+                raise ValueError
+            value = datetime.fromisoformat(value) if INVOICE_SORTS[sort][0] == 'created_at' else Decimal(value)
+            return value, int(invoice_id)
+        except (ValueError, TypeError, ArithmeticError, binascii.Error, UnicodeError):
+            raise ValueError("Curseur de pagination invalide")
+
+    def get_invoice_page(self, sort='newest', after=None, before=None, page_size=None,
+                         start=None, end=None, status=None, contact_id=None):
+        """
+        Page de la liste des factures, filtrée (dates incluses, statut, contact) et triée côté serveur.
+        `after` / `before` sont les curseurs next_cursor / previous_cursor d'une page précédente.
+        """
+        if sort not in INVOICE_SORTS:
+            raise ValueError(f"Le tri doit être l'un de: {', '.join(INVOICE_SORTS)}")
+        if status is not None and status not in dict(STATUS_CHOICES):
+            raise ValueError(f"Le statut doit être l'un de: {', '.join(dict(STATUS_CHOICES))}")
+        created_from, created_before = day_range(start, end)
+        page_size = page_size or self.PAGE_SIZE
+
+        sort_field, descending = INVOICE_SORTS[sort]
+        after_key = self.decode_cursor(sort, after) if after else None
+        before_key = self.decode_cursor(sort, before) if before and not after else None
+        # Une facture de plus que la page : indique s'il reste des factures au-delà
+        invoices = self.repo.get_invoice_page(
+            sort_field, descending, page_size + 1,
+            start=created_from, end=created_before,
+            status=status, contact_id=contact_id, after=after_key, before=before_key,
+        )
+        has_more = len(invoices) > page_size
+        invoices = invoices[:page_size]
+
+        if before_key is not None:
+            invoices.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, after_key is not None
+
+        return InvoicePage(
+            invoices=invoices,
+            next_cursor=self.encode_cursor(sort, invoices[-1]) if invoices and has_next else None,
+            previous_cursor=self.encode_cursor(sort, invoices[0]) if invoices and has_previous else None,
+        )
+
+    def exists_for_sales_order(self, sales_order_id):
+        """Vérifier si le devis/commande a déjà été facturé"""
+        return self.repo.exists_for_sales_order(sales_order_id)
+
     def get_invoices_by_contact(self, contact_id):
         """Récupérer les factures d'un contact"""
         return self.repo.get_invoices_by_contact(contact_id)
 
+    def get_totals_by_period(self, start=None, end=None, granularity='month', status=None):
+        """Montants facturés par période"""
+        return self.repo.get_totals_by_period(start, end, granularity, status)
+
+    def refresh_totals(self, invoice_ids):
+        """Recalculer les totaux stockés des factures (à appeler dans la transaction qui modifie les lignes)"""
+        return self.repo.refresh_totals(invoice_ids)
+
+    def get_totals_with_expected(self, invoice_ids):
+        """Totaux stockés et recalculés des factures"""
+        return self.repo.get_totals_with_expected(invoice_ids)
+
+    def get_invoice_ids(self, start=None, end=None, status=None, contact_id=None):
+        """Identifiants des factures, filtrés par période (dates incluses), statut et contact"""
+        if status is not None and status not in dict(STATUS_CHOICES):
+            raise ValueError(f"Le statut doit être l'un de: {', '.join(dict(STATUS_CHOICES))}")
+        created_from, created_before = day_range(start, end)
+        return self.repo.get_invoice_ids(start=created_from, end=created_before, status=status, contact_id=contact_id)
+
+    def get_invoices_for_export(self, start=None, end=None, status=None, contact_id=None):
+        """Factures à exporter (avec nom du contact et totaux), créées sur [start, end["""
+        if status is not None and status not in dict(STATUS_CHOICES):
+            raise ValueError(f"Le statut doit être l'un de: {', '.join(dict(STATUS_CHOICES))}")
+        return self.repo.get_invoices_for_export(start, end, status, contact_id)
+
     def update_invoice(self, invoice_id, contact_id, name, address, city, state, zip_code, siret, email, phone, status, created_at=None):
         """Mettre à jour une facture"""
         self.validate_invoice_data(contact_id, name, address, city, state, zip_code, siret, email, phone)
@@ -0,0 +1,204 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date
+from typing import List, Optional
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+
+from commons.services.date_range import day_range
+from invoicing.services.invoice_conversion_service import InvoiceConversionService
+from sales.services.sales_order_service import SalesOrderService
+
+
+@dataclass
+class OrderOutcome:
+    sales_order_id: int
+    status: str
+    invoice_id: Optional[int] = None
+    message: str = ''
+
+    def describe(self):
+        if self.status == 'Facturée':
+            return f"Commande {self.sales_order_id} : facture {self.invoice_id}"
+        return f"Commande {self.sales_order_id} : {self.message}"
+
+
+@dataclass
+class MassInvoicingReport:
+    """Résultat d'une facturation de masse : issue de chaque commande et débit global"""
+    outcomes: List[OrderOutcome] = field(default_factory=list)
+    elapsed: float = 0.0
+    processes: int = 1
+
+    @property
+    def invoiced(self):
+        return [outcome for outcome in self.outcomes if outcome.status == 'Facturée']
+
+    @property
+    def failed(self):
+        return [outcome for outcome in self.outcomes if outcome.status == 'Échec']
+
+    @property
+    def throughput(self):
+        """Commandes traitées par seconde"""
+        return len(self.outcomes) / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f"{len(self.outcomes)} commande(s) traitée(s) : {len(self.invoiced)} facturée(s), "
+            f"{len(self.failed)} en échec, en {self.elapsed:.2f} s "
+            f"({self.throughput:.1f} commande(s)/s, {self.processes} processus)"
+        )
+
+
+def init_worker():
+    """Initialiser Django dans un processus du pool, sans réutiliser la connexion BDD du parent"""
+    django.setup()
+    connections.close_all()
+
+
+def invoice_chunk(sales_order_ids):
+    """
+    Facturer un bloc de commandes dans une transaction. Chaque commande a son point de sauvegarde :
+    une commande en erreur est annulée seule et notée en échec, les autres sont conservées.
+    """
+    conversion_service = InvoiceConversionService()
+    outcomes = []
+    with transaction.atomic():
+        for sales_order_id in sales_order_ids:
+            try:
+                with transaction.atomic():
+                    invoice = conversion_service.convert_sales_order(sales_order_id)
+                outcomes.append(OrderOutcome(sales_order_id, 'Facturée', invoice.invoice_id))
+            except Exception as e:
+                outcomes.append(OrderOutcome(sales_order_id, 'Échec', message=str(e)))
+    return outcomes
+
+
+class MassInvoicingService:
+    """
+    Facturation de masse des commandes signées, par blocs répartis sur un pool de processus.
+    Hors ligne de commande, elle est traitée en tâche de fond par le worker des exports (run_export_jobs) :
+    job_filters() valide la demande, run_job() facture et écrit le rapport avec un point de reprise par tour.
+    """
+
+    # Tâche de fond (commons.models.ExportJob) : entité, format et nom du rapport produit
+    JOB_ENTITY = 'mass_invoicing'
+    JOB_FORMAT = 'txt'
+    JOB_FILENAME = 'facturation_commandes.txt'
+    JOB_SPOOL_FORMAT = 'txt'
+
+    def __init__(self):
+        self.sales_order_service = SalesOrderService()
+
+    def get_orders_to_invoice(self, start=None, end=None, contact_id=None, sales_order_ids=None):
+        """Commandes signées sans facture, créées entre `start` et `end` (dates incluses)"""
+        created_from, created_before = day_range(start, end)
+        return self.sales_order_service.get_uninvoiced_order_ids(
+            'Commande', 'Signé', created_from, created_before, contact_id, sales_order_ids
+        )
+
+    def invoice_signed_orders(self, start=None, end=None, contact_id=None, sales_order_ids=None,
+                              processes=None, chunk_size=None):
+        """Facturer toutes les commandes signées correspondant aux filtres et retourner le rapport"""
+        processes = processes or getattr(settings, 'MASS_INVOICING_PROCESSES', 1)
+        chunk_size = chunk_size or getattr(settings, 'MASS_INVOICING_CHUNK_SIZE', 50)
+
+        started_at = time.monotonic()
+        order_ids = self.get_orders_to_invoice(start, end, contact_id, sales_order_ids)
+        outcomes, processes = self._invoice_orders(order_ids, processes, chunk_size)
+        return MassInvoicingReport(outcomes, time.monotonic() - started_at, processes)
+
+    def job_filters(self, start=None, end=None, contact_id=None, sales_order_ids=None):
+        """Valider une facturation en tâche de fond : filtres enregistrés avec la tâche (dates au format ISO)"""
+        if not self.get_orders_to_invoice(start, end, contact_id, sales_order_ids):
+            raise ValueError("Aucune commande signée sans facture ne correspond à la demande")
+        return {
+            'start': start.isoformat() if start else None,
+            'end': end.isoformat() if end else None,
+            'contact_id': contact_id,
+            'sales_order_ids': sorted(sales_order_ids) if sales_order_ids is not None else None,
+        }
+
+    def run_job(self, job, jobs):
+        """
+        Traiter une tâche de facturation attribuée (`jobs` : ExportJobService). Les commandes à facturer sont figées
+        au premier passage ; elles sont facturées par tours de `processes` blocs, chaque tour ajoute ses lignes
+        au rapport puis enregistre son point de reprise. Une reprise repart après la dernière commande du dernier tour
+        validé (une commande facturée par un tour interrompu y est notée « déjà transformé »).
+        """
+        processes = getattr(settings, 'MASS_INVOICING_PROCESSES', 1)
+        chunk_size = getattr(settings, 'MASS_INVOICING_CHUNK_SIZE', 50)
+        spool_path = jobs.open_spool(job)
+
+        filters = job.filters
+        if job.rows_total is None:
+            order_ids = self.get_orders_to_invoice(
+                start=date.fromisoformat(filters['start']) if filters.get('start') else None,
+                end=date.fromisoformat(filters['end']) if filters.get('end') else None,
+                contact_id=filters.get('contact_id'),
+                sales_order_ids=filters.get('sales_order_ids'),
+            )
+            jobs.repo.update_export_job(
+                job, filters={**filters, 'sales_order_ids': order_ids}, rows_total=len(order_ids)
+            )
+        order_ids = job.filters['sales_order_ids']
+
+        progress = job.checkpoint_key or {'sales_order_id': None, 'invoiced': 0, 'failed': 0}
+        if progress['sales_order_id'] is not None:
+            order_ids = [sales_order_id for sales_order_id in order_ids if sales_order_id > progress['sales_order_id']]
+
+        round_size = max(processes, 1) * chunk_size
+        with open(spool_path, 'ab') as spool:
+            for i in range(0, len(order_ids), round_size):
+                round_ids = order_ids[i:i + round_size]
+                outcomes, _ = self._invoice_orders(round_ids, processes, chunk_size)
+                spool.write(''.join(f"{outcome.describe()}\n" for outcome in outcomes).encode('utf-8'))
+                spool.flush()
+                os.fsync(spool.fileno())
+                invoiced = sum(1 for outcome in outcomes if outcome.status == 'Facturée')
+                progress = {
+                    'sales_order_id': round_ids[-1],
+                    'invoiced': progress['invoiced'] + invoiced,
+                    'failed': progress['failed'] + len(outcomes) - invoiced,
+                }
+                jobs.repo.save_checkpoint(job, progress, spool.tell(), len(round_ids))
+
+            spool.write((
+                f"{job.rows_total} commande(s) traitée(s) : {progress['invoiced']} facturée(s), "
+                f"{progress['failed']} en échec\n"
+            ).encode('utf-8'))
+        jobs.publish_spool(job)
+
+    def _invoice_orders(self, order_ids, processes, chunk_size):
+        """Facturer des commandes par blocs (sur un pool au-delà d'un bloc) : issues dans l'ordre des commandes"""
+        chunks = [order_ids[i:i + chunk_size] for i in range(0, len(order_ids), chunk_size)]
+
+        if processes <= 1 or len(chunks) <= 1:
+            outcomes = [outcome for chunk in chunks for outcome in invoice_chunk(chunk)]
+            processes = 1
+        else:
+            outcomes = self._invoice_in_pool(chunks, processes)
+
+        position = {sales_order_id: index for index, sales_order_id in enumerate(order_ids)}
+        outcomes.sort(key=lambda outcome: position[outcome.sales_order_id])
+        return outcomes, processes
+
+    @staticmethod
+    def _invoice_in_pool(chunks, processes):
+        # Les processus fils ne doivent pas hériter d'une connexion ouverte
+        connections.close_all()
+        outcomes = []
+        with ProcessPoolExecutor(max_workers=min(processes, len(chunks)), initializer=init_worker) as executor:
+            futures = {executor.submit(invoice_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                try:
+                    outcomes.extend(future.result())
+                except Exception as e:
+                    # Processus perdu : tout le bloc est noté en échec (sa transaction n'a pas été validée)
+                    outcomes.extend(OrderOutcome(sales_order_id, 'Échec', message=str(e)) for sales_order_id in futures[future])
+        return outcomes
@@ -0,0 +1,72 @@
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, List
+
+from django.utils import timezone
+
+from commons.services.date_range import start_of_day
+from invoicing.repositories.invoice_repository import InvoiceRepository
+
+
+# Tranches d'ancienneté (en jours depuis la date de facture) : nom, libellé, bornes incluses (None : sans fin)
+AGING_BUCKETS = (
+    ('days_0_30', '0-30 jours', 0, 30),
+    ('days_31_60', '31-60 jours', 31, 60),
+    ('days_61_90', '61-90 jours', 61, 90),
+    ('days_over_90', 'Plus de 90 jours', 91, None),
+)
+
+
+@dataclass
+class AgingReport:
+    """Balance âgée : une ligne par contact (reste dû par tranche) et total général"""
+    as_of: object
+    contacts: List[Dict] = field(default_factory=list)
+    overall: Dict = field(default_factory=dict)
+
+
+class ReceivablesService:
+    """Créances clients : balance âgée des factures confirmées ou comptabilisées, calculée en base"""
+
+    AMOUNT_FIELDS = tuple(name for name, _, _, _ in AGING_BUCKETS) + ('total_outstanding',)
+
+    def __init__(self):
+        self.repo = InvoiceRepository()
+
+    @staticmethod
+    def bucket_boundaries(as_of):
+        """Intervalles [début, fin[ de date de création de chaque tranche, à la date `as_of`"""
+        def day_start(days_ago):
+            return start_of_day(as_of - timedelta(days=days_ago))
+
+        return {
+            name: (
+                day_start(oldest) if oldest is not None else None,
+                day_start(youngest - 1) if youngest > 0 else None,
+            )
+            for name, _, youngest, oldest in AGING_BUCKETS
+        }
+
+    def get_aging_rows(self, as_of=None, contact_id=None):
+        """Reste dû par contact et par tranche (requête de valeurs, triée par contact)"""
+        as_of = as_of or timezone.localdate()
+        return self.repo.get_receivables_aging(self.bucket_boundaries(as_of), contact_id)
+
+    def get_aging_report(self, as_of=None, contact_id=None):
+        """Balance âgée à la date `as_of` (aujourd'hui par défaut), contacts par reste dû décroissant"""
+        as_of = as_of or timezone.localdate()
+        contacts = list(self.get_aging_rows(as_of, contact_id))
+
+        overall = {name: 0.0 for name in self.AMOUNT_FIELDS}
+        overall['invoice_count'] = 0
+        for row in contacts:
+            for name in overall:
+                overall[name] += row[name]
+        for name in self.AMOUNT_FIELDS:
+            overall[name] = round(overall[name], 2)
+
+        contacts.sort(key=lambda row: row['total_outstanding'], reverse=True)
+        return AgingReport(as_of=as_of, contacts=contacts, overall=overall)
+
+    def get_aging_for_export(self, contact_id=None):
+        return self.get_aging_rows(contact_id=contact_id)
@@ -1,12 +1,47 @@
-from django.test import TestCase
-from datetime import date
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import tempfile
+import zipfile
 
 
 from invoicing.services.invoice_service import InvoiceService
 from invoicing.services.invoice_order_line_service import InvoiceOrderLineService
+from invoicing.services.invoice_conversion_service import InvoiceConversionService
+from invoicing.services.mass_invoicing_service import MassInvoicingService
+from invoicing.services.document_totals_service import DocumentTotalsService
+from invoicing.services.invoice_pdf_service import InvoicePdfBatchService, InvoicePdfService, render_invoice_chunk
+from invoicing.services.receivables_service import ReceivablesService
+from invoicing.repositories.invoice_order_line_repository import InvoiceOrderLineRepository
+from invoicing.repositories.invoice_repository import InvoiceRepository
+from invoicing.models import Invoice, InvoiceOrderLine
+from sales.models import SalesOrder, SalesOrderLine
+from sales.services.sales_order_service import SalesOrderService
+from sales.services.sales_order_line_service import SalesOrderLineService
 from commons.services.contact_service import ContactService
 from commons.dtos import CreateContactDTO
+from commons.tests.fixtures import TestDataMixin
+from commons.services.export_service import ExportService
+from commons.services.export_job_service import ExportJobService
+from commons.repositories.export_job_repository import ExportJobRepository
+from commons.models import ExportJob
 from products.services.product_service import ProductService
+from payment.services.payment_service import PaymentService
+from payment.repositories.payment_repository import PaymentRepository
+from payment.models import Payment
+from commons.services.pdf_cache_service import PdfCacheService
+from sales.sales_order_pdf import SalesOrderPDFService
 
 
 class InvoiceTest(TestCase):
@@ -558,3 +593,955 @@ class InvoiceOrderLineTest(TestCase):
         # Vérifier que les lignes sont différentes
         self.assertEqual(line1.product_id.product_id, self.product.product_id)
         self.assertEqual(line2.product_id.product_id, product2.product_id)
+
+
+class InvoiceExportCSVTest(TestDataMixin, TestCase):
+    """Tests pour l'export CSV des factures en streaming"""
+
+    def setUp(self):
+        """Initialiser deux contacts, un produit et des factures avec lignes"""
+        self.invoice_service = InvoiceService()
+        self.invoice_order_line_service = InvoiceOrderLineService()
+        self.contact = self._create_contact("Export")
+        self.other_contact = self._create_contact("Client", first_name="Autre")
+        self.product = ProductService().create_product(
+            product_id=None, product_description="Produit Export", price_ht=100.00,
+            tax=20, price_it=120.00, product_type="vente"
+        )
+
+    def _create_invoice(self, contact, status='Brouillon', lines=1):
+        invoice = self._create_invoice_for(contact, "Facture Export", status=status)
+        for _ in range(lines):
+            self.invoice_order_line_service.create_invoice_order_line(
+                invoice_id=invoice.invoice_id, product_id=self.product.product_id,
+                contact_id=contact.contact_id, price_ht=100.00, tax=20, price_tax=120.00,
+                quantity=1, date=date.today()
+            )
+        return invoice
+
+    def _export(self, **params):
+        response = self.client.get(reverse('invoicing:invoice_export_csv'), params)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return [line.split(';') for line in content.splitlines()[1:]]
+
+    def test_export_contains_totals_and_contact(self):
+        """L'export contient le nom du contact et les totaux HT/TTC des lignes"""
+        invoice = self._create_invoice(self.contact, lines=3)
+        self._create_invoice(self.other_contact, lines=0)
+
+        rows = self._export()
+
+        self.assertEqual(rows[0][0], '\ufeffID Facture')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][:2], [str(invoice.invoice_id), 'Client Export'])
+        self.assertEqual(rows[1][7:9], ['300.00', '360.00'])
+        self.assertEqual(rows[2][7:9], ['0.00', '0.00'])
+
+    def test_export_filters(self):
+        """L'export se filtre par statut, contact et période"""
+        confirmed = self._create_invoice(self.contact, status='Confirmé')
+        other = self._create_invoice(self.other_contact)
+        today = date.today().isoformat()
+
+        self.assertEqual([row[0] for row in self._export(status='Confirmé')[1:]], [str(confirmed.invoice_id)])
+        self.assertEqual([row[0] for row in self._export(contact=self.other_contact.contact_id)[1:]], [str(other.invoice_id)])
+        self.assertEqual(len(self._export(start=today, end=today)), 3)
+        self.assertEqual(len(self._export(end='2000-01-01')), 1)
+
+    def test_export_uses_one_query(self):
+        """Le parcours des factures exportées n'exécute qu'une requête, quel que soit leur nombre"""
+        for _ in range(5):
+            self._create_invoice(self.contact, lines=2)
+
+        export_service = ExportService()
+        with self.assertNumQueries(1):
+            chunks = list(export_service.iter_chunks(export_service.get_queryset('invoices'), chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+
+    def test_export_invalid_filter_redirects(self):
+        """Un filtre invalide renvoie vers la liste des factures"""
+        response = self.client.get(reverse('invoicing:invoice_export_csv'), {'start': 'hier'})
+        self.assertRedirects(response, reverse('invoicing:invoice_list'))
+
+
+class InvoiceConversionTest(TestDataMixin, TestCase):
+    """Tests pour la transformation groupée d'un devis/commande en facture"""
+
+    def setUp(self):
+        self.conversion_service = InvoiceConversionService()
+        self.contact = self._create_contact("Banquet")
+        self.product = ProductService().create_product(
+            product_id=None, product_description="Couvert", price_ht=50.00,
+            tax=10, price_it=55.00, product_type="vente"
+        )
+
+    def _create_order(self, lines):
+        order = SalesOrderService().create_sales_order(self.contact.contact_id, "Banquet", "Commande")
+        line_service = SalesOrderLineService()
+        for _ in range(lines):
+            line_service.create_sales_order_line(
+                order.sales_order_id, self.product.product_id, self.contact.contact_id,
+                50, 10, 55, 2, date.today(), "Couvert"
+            )
+        return order
+
+    def test_conversion_copies_lines(self):
+        """La facture reprend le contact, les totaux et toutes les lignes du devis/commande"""
+        order = self._create_order(lines=3)
+
+        invoice = self.conversion_service.convert_sales_order(order.sales_order_id)
+
+        self.assertEqual(invoice.sales_order_id_id, order.sales_order_id)
+        self.assertEqual(invoice.name, "Client Banquet")
+        self.assertEqual(invoice.price_ht, 300)
+        self.assertEqual(invoice.tax, 10)
+        lines = InvoiceOrderLineService().get_invoice_order_lines_by_invoice(invoice.invoice_id)
+        self.assertEqual(len(lines), 3)
+        self.assertEqual((lines[0].price_tax, lines[0].quantity), (55.0, 2))
+
+    def test_conversion_query_count_is_constant(self):
+        """Le nombre de requêtes ne dépend pas du nombre de lignes"""
+        small_order = self._create_order(lines=2)
+        large_order = self._create_order(lines=60)
+
+        with CaptureQueriesContext(connection) as small:
+            self.conversion_service.convert_sales_order(small_order.sales_order_id)
+        with CaptureQueriesContext(connection) as large:
+            self.conversion_service.convert_sales_order(large_order.sales_order_id)
+
+        self.assertEqual(len(large), len(small))
+        self.assertLessEqual(len(large), 12)
+
+    def test_invalid_line_creates_nothing(self):
+        """Une ligne invalide fait échouer la transformation sans créer de facture"""
+        order = self._create_order(lines=3)
+        SalesOrderLine.objects.filter(sales_order_id=order.sales_order_id).update(quantity=0)
+
+        with self.assertRaises(ValueError):
+            self.conversion_service.convert_sales_order(order.sales_order_id)
+        self.assertFalse(Invoice.objects.filter(sales_order_id=order.sales_order_id).exists())
+
+    def test_failed_insert_rolls_back_invoice(self):
+        """Si l'écriture des lignes échoue, la facture n'est pas conservée"""
+        order = self._create_order(lines=2)
+
+        with mock.patch.object(InvoiceOrderLineRepository, 'bulk_create_invoice_order_lines', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.conversion_service.convert_sales_order(order.sales_order_id)
+        self.assertFalse(Invoice.objects.filter(sales_order_id=order.sales_order_id).exists())
+
+    def test_order_is_converted_only_once(self):
+        """Un devis/commande déjà facturé n'est pas transformé une seconde fois"""
+        order = self._create_order(lines=1)
+        self.conversion_service.convert_sales_order(order.sales_order_id)
+
+        with self.assertRaises(ValueError):
+            self.conversion_service.convert_sales_order(order.sales_order_id)
+
+        response = self.client.post(reverse('invoicing:create_from_sales', args=[order.sales_order_id]))
+        self.assertRedirects(response, reverse('sales:sales_order_detail', args=[order.sales_order_id]), fetch_redirect_response=False)
+        self.assertEqual(Invoice.objects.filter(sales_order_id=order.sales_order_id).count(), 1)
+
+    def test_concurrent_conversion_creates_one_invoice(self):
+        """Une transformation dont le contrôle a précédé la facture de l'autre est refusée par la contrainte d'unicité"""
+        order = self._create_order(lines=1)
+        self.conversion_service.convert_sales_order(order.sales_order_id)
+
+        # Contrôle effectué avant que l'autre transformation ne soit validée (base sans verrou de ligne)
+        checks = iter([False])
+        exists = InvoiceService.exists_for_sales_order
+        with mock.patch.object(
+            InvoiceService, 'exists_for_sales_order', autospec=True,
+            side_effect=lambda service, sales_order_id: next(checks, None) or exists(service, sales_order_id),
+        ):
+            with self.assertRaisesMessage(ValueError, "déjà été transformé"):
+                self.conversion_service.convert_sales_order(order.sales_order_id)
+        self.assertEqual(Invoice.objects.filter(sales_order_id=order.sales_order_id).count(), 1)
+
+    def test_conversion_integrity_error_without_row_lock(self):
+        """
+        Sur SQLite, select_for_update n'a aucun effet : la double transformation est empêchée par la contrainte
+        unique_invoice_sales_order et l'IntegrityError est traduite en erreur métier, sans facture ni ligne en trop
+        """
+        order = self._create_order(lines=2)
+        self.conversion_service.convert_sales_order(order.sales_order_id)
+        lines_before = InvoiceOrderLine.objects.count()
+
+        create_invoice = InvoiceService.create_invoice
+        raised = []
+
+        def spy(service, *args, **kwargs):
+            try:
+                return create_invoice(service, *args, **kwargs)
+            except IntegrityError as exc:
+                raised.append(exc)
+                raise
+
+        with mock.patch.object(InvoiceService, 'exists_for_sales_order', side_effect=[False, True]), \
+                mock.patch.object(InvoiceService, 'create_invoice', autospec=True, side_effect=spy):
+            with self.assertRaisesMessage(ValueError, "déjà été transformé"):
+                self.conversion_service.convert_sales_order(order.sales_order_id)
+
+        self.assertEqual(len(raised), 1)
+        self.assertEqual(Invoice.objects.filter(sales_order_id=order.sales_order_id).count(), 1)
+        self.assertEqual(InvoiceOrderLine.objects.count(), lines_before)
+
+        # La base refuse elle-même une seconde facture pour le même devis/commande
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            InvoiceService().create_invoice(
+                contact_id=self.contact.contact_id, name="Doublon", address="-", city="-", state="-", zip_code="-",
+                siret="-", email="doublon@test.com", phone="-", sales_order_id=order.sales_order_id,
+            )
+
+
+class MassInvoicingTest(TestDataMixin, TestCase):
+    """Tests pour la facturation de masse des commandes signées (un seul processus : données du TestCase)"""
+
+    def setUp(self):
+        self.mass_invoicing_service = MassInvoicingService()
+        self.contact = self._create_contact("Masse")
+        self.product = ProductService().create_product(
+            product_id=None, product_description="Séminaire", price_ht=100.00,
+            tax=20, price_it=120.00, product_type="vente"
+        )
+
+    def _create_order(self, order_type='Commande', status='Signé', contact=None):
+        contact = contact or self.contact
+        order = SalesOrderService().create_sales_order(contact.contact_id, "Séminaire", order_type)
+        SalesOrderLineService().create_sales_order_line(
+            order.sales_order_id, self.product.product_id, contact.contact_id,
+            100, 20, 120, 1, date.today(), "Séminaire"
+        )
+        SalesOrder.objects.filter(sales_order_id=order.sales_order_id).update(status=status)
+        return order
+
+    def test_only_signed_uninvoiced_orders_are_invoiced(self):
+        """Seules les commandes signées sans facture sont facturées, par blocs"""
+        signed = [self._create_order() for _ in range(3)]
+        self._create_order(status='Envoyé')
+        self._create_order(order_type='Devis')
+        InvoiceConversionService().convert_sales_order(signed[0].sales_order_id)
+
+        report = self.mass_invoicing_service.invoice_signed_orders(processes=1, chunk_size=1)
+
+        self.assertEqual([outcome.sales_order_id for outcome in report.invoiced],
+                         [order.sales_order_id for order in signed[1:]])
+        self.assertEqual(report.failed, [])
+        self.assertEqual(Invoice.objects.count(), 3)
+        self.assertIn("2 facturée(s)", report.summary())
+
+    def test_filters_on_contact_and_dates(self):
+        """Les filtres contact et période restreignent les commandes facturées"""
+        other_contact = self._create_contact("Client", first_name="Autre")
+        order = self._create_order()
+        self._create_order(contact=other_contact)
+
+        report = self.mass_invoicing_service.invoice_signed_orders(
+            contact_id=self.contact.contact_id, processes=1
+        )
+        self.assertEqual([outcome.sales_order_id for outcome in report.outcomes], [order.sales_order_id])
+
+        tomorrow = date.today() + timedelta(days=1)
+        report = self.mass_invoicing_service.invoice_signed_orders(start=tomorrow, processes=1)
+        self.assertEqual(report.outcomes, [])
+        with self.assertRaises(ValueError):
+            self.mass_invoicing_service.invoice_signed_orders(start=tomorrow, end=date.today())
+
+    def test_failed_order_does_not_cancel_chunk(self):
+        """Une commande invalide est notée en échec sans annuler les autres commandes du bloc"""
+        first, invalid, last = self._create_order(), self._create_order(), self._create_order()
+        SalesOrderLine.objects.filter(sales_order_id=invalid.sales_order_id).update(quantity=0)
+
+        report = self.mass_invoicing_service.invoice_signed_orders(processes=1, chunk_size=10)
+
+        self.assertEqual([outcome.sales_order_id for outcome in report.failed], [invalid.sales_order_id])
+        self.assertEqual(
+            set(Invoice.objects.values_list('sales_order_id', flat=True)),
+            {first.sales_order_id, last.sales_order_id},
+        )
+
+    def test_management_command(self):
+        """La commande affiche le résultat de chaque commande et le résumé"""
+        order = self._create_order()
+        output = StringIO()
+
+        call_command('invoice_signed_orders', '--processes', '1', stdout=output)
+
+        invoice = Invoice.objects.get(sales_order_id=order.sales_order_id)
+        self.assertIn(f"Commande {order.sales_order_id} : facture {invoice.invoice_id}", output.getvalue())
+        self.assertIn("1 commande(s) traitée(s)", output.getvalue())
+
+    def _use_temp_export_jobs_dir(self):
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir)
+        settings_override = override_settings(
+            EXPORT_JOBS_DIR=export_dir, MASS_INVOICING_PROCESSES=1, MASS_INVOICING_CHUNK_SIZE=1
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_admin_action_enqueues_selection(self):
+        """L'action d'administration enregistre une tâche de fond : la sélection est facturée par le worker"""
+        self._use_temp_export_jobs_dir()
+        selected, other = self._create_order(), self._create_order()
+        admin_user = User.objects.create_superuser('admin', 'admin@test.com', 'password')
+        self.client.force_login(admin_user)
+
+        self.client.post(reverse('admin:sales_salesorder_changelist'), {
+            'action': 'invoice_signed_orders',
+            '_selected_action': [selected.sales_order_id],
+        })
+
+        job = ExportJob.objects.get()
+        self.assertEqual((job.entity, job.status), (MassInvoicingService.JOB_ENTITY, 'En attente'))
+        self.assertEqual(job.filters['sales_order_ids'], [selected.sales_order_id])
+        self.assertFalse(Invoice.objects.exists())
+
+        call_command('run_export_jobs', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        invoice = Invoice.objects.get(sales_order_id=selected.sales_order_id)
+        self.assertFalse(Invoice.objects.filter(sales_order_id=other.sales_order_id).exists())
+        self.assertEqual((job.status, job.rows_written, job.progress), ('Terminé', 1, 100))
+        with open(job.file_path, encoding='utf-8') as report:
+            self.assertEqual(report.read().splitlines(), [
+                f"Commande {selected.sales_order_id} : facture {invoice.invoice_id}",
+                "1 commande(s) traitée(s) : 1 facturée(s), 0 en échec",
+            ])
+
+        # Aucune commande à facturer dans la sélection : rien n'est enregistré
+        self.client.post(reverse('admin:sales_salesorder_changelist'), {
+            'action': 'invoice_signed_orders',
+            '_selected_action': [selected.sales_order_id],
+        })
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+    def test_interrupted_job_resumes_after_last_round(self):
+        """Une facturation interrompue reprend après le dernier tour validé : chaque commande facturée une fois"""
+        self._use_temp_export_jobs_dir()
+        orders = [self._create_order() for _ in range(3)]
+        job = ExportJobService().submit_task_job(MassInvoicingService.JOB_ENTITY)
+        save_checkpoint = ExportJobRepository.save_checkpoint
+        calls = []
+
+        def crash_on_second_checkpoint(repo, *args):
+            calls.append(args)
+            if len(calls) == 2:
+                # Arrêt brutal : le 2e tour est facturé mais son point de reprise n'est pas enregistré
+                raise KeyboardInterrupt
+            return save_checkpoint(repo, *args)
+
+        with mock.patch.object(ExportJobRepository, 'save_checkpoint', crash_on_second_checkpoint):
+            with self.assertRaises(KeyboardInterrupt):
+                ExportJobService().run_pending_export_jobs(worker='worker-1', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written, job.rows_total), ('En cours', 1, 3))
+
+        with override_settings(EXPORT_JOBS_STALE_AFTER=-1):
+            ExportJobService().run_pending_export_jobs(worker='worker-2', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written), ('Terminé', 3))
+        self.assertEqual(Invoice.objects.count(), 3)
+        with open(job.file_path, encoding='utf-8') as report:
+            lines = report.read().splitlines()
+        # Le 2e tour, facturé avant l'arrêt, est repris et noté déjà transformé
+        self.assertEqual([line.split(' : ')[0] for line in lines[:-1]],
+                         [f"Commande {order.sales_order_id}" for order in orders])
+        self.assertIn("déjà été transformé", lines[1])
+        self.assertEqual(lines[-1], "3 commande(s) traitée(s) : 2 facturée(s), 1 en échec")
+        self.assertEqual(os.listdir(os.path.dirname(job.file_path)), [os.path.basename(job.file_path)])
+
+
+class InvoicePaymentTotalsTest(TestDataMixin, TestCase):
+    """Tests pour les totaux de paiement des factures calculés en base"""
+
+    def setUp(self):
+        self.contact = self._create_contact("Totaux")
+        self.partial = self._create_invoice(1000, 20)
+        self.settled = self._create_invoice(500, 10)
+        payment_service = PaymentService()
+        payment_service.create_payment("Carte bancaire", "Payé", self.partial.invoice_id, 500)
+        payment_service.create_payment("Chèque", "En attente", self.partial.invoice_id, 200)
+        payment_service.create_payment("Virement bancaire", "Payé", self.settled.invoice_id, 550)
+
+    def _create_invoice(self, price_ht, tax):
+        return self._create_invoice_for(self.contact, "Facture Totaux", price_ht=price_ht, tax=tax, status="Confirmé")
+
+    def test_annotations_match_properties(self):
+        """Les valeurs annotées sont celles calculées en Python à partir des paiements"""
+        annotated = Invoice.objects.with_payment_totals().get(invoice_id=self.partial.invoice_id)
+        plain = Invoice.objects.get(invoice_id=self.partial.invoice_id)
+
+        for invoice in (annotated, plain):
+            self.assertEqual(invoice.total_amount, 1200)
+            self.assertEqual(invoice.total_paid, 700)
+            self.assertEqual(invoice.remaining_amount, 500)
+            self.assertFalse(invoice.is_paid)
+
+    def test_list_reads_payment_state_in_one_query(self):
+        """La liste des factures et leur état de paiement sont lus en une seule requête"""
+        with self.assertNumQueries(1):
+            invoices = {invoice.invoice_id: invoice for invoice in InvoiceService().get_all_invoices()}
+            states = {invoice_id: (invoice.is_paid, invoice.remaining_amount) for invoice_id, invoice in invoices.items()}
+            [invoice.contact_id.last_name for invoice in invoices.values()]
+
+        self.assertEqual(states[self.partial.invoice_id], (False, 500))
+        self.assertEqual(states[self.settled.invoice_id], (True, 0))
+
+    def test_filter_on_payment_state(self):
+        """L'état de paiement est filtrable en base"""
+        unpaid = Invoice.objects.with_payment_totals().filter(is_paid=False)
+        self.assertEqual(list(unpaid.values_list('invoice_id', flat=True)), [self.partial.invoice_id])
+
+        with self.assertNumQueries(1):
+            self.assertTrue(PaymentRepository().get_state_invoice_payment(self.settled.invoice_id))
+
+
+class DocumentTotalsTest(TestDataMixin, TestCase):
+    """Tests pour les totaux stockés des factures et devis/commandes"""
+
+    def setUp(self):
+        self.contact = self._create_contact("Totaux")
+        self.product = ProductService().create_product(
+            product_id=None, product_description="Chambre", price_ht=80.00,
+            tax=10, price_it=88.00, product_type="vente"
+        )
+        self.line_service = SalesOrderLineService()
+        self.order = SalesOrderService().create_sales_order(self.contact.contact_id, "Séjour", "Commande")
+        self.lines = [
+            self.line_service.create_sales_order_line(
+                self.order.sales_order_id, self.product.product_id, self.contact.contact_id,
+                price_ht, tax, price_it, quantity, date.today(), "Chambre"
+            )
+            for price_ht, tax, price_it, quantity in ((80, 10, 88, 3), (19.99, 20, 23.99, 1))
+        ]
+
+    def _totals(self, document):
+        document.refresh_from_db()
+        return document.total_ht, document.total_tax, document.total_ttc
+
+    def test_sales_order_totals_follow_line_writes(self):
+        """Les totaux du devis/commande suivent les créations, modifications et suppressions de lignes"""
+        self.assertEqual(self._totals(self.order), (Decimal('259.99'), Decimal('28.00'), Decimal('287.99')))
+
+        self.line_service.update_sales_order_line(
+            self.lines[0].sales_order_line_id, self.order.sales_order_id, self.product.product_id,
+            self.contact.contact_id, 80, 10, 88, 1, date.today(), "Chambre"
+        )
+        self.assertEqual(self._totals(self.order), (Decimal('99.99'), Decimal('12.00'), Decimal('111.99')))
+
+        self.line_service.delete_sales_order_line(self.lines[1].sales_order_line_id)
+        self.assertEqual(self._totals(self.order), (Decimal('80.00'), Decimal('8.00'), Decimal('88.00')))
+
+    def test_invoice_totals_follow_conversion_and_line_writes(self):
+        """La facture issue d'un devis reprend ses totaux, puis suit ses propres lignes"""
+        invoice = InvoiceConversionService().convert_sales_order(self.order.sales_order_id)
+        self.assertEqual(invoice.total_ttc, Decimal('287.99'))
+        self.assertEqual(self._totals(invoice), (Decimal('259.99'), Decimal('28.00'), Decimal('287.99')))
+
+        line_service = InvoiceOrderLineService()
+        line = line_service.create_invoice_order_line(
+            invoice.invoice_id, self.product.product_id, self.contact.contact_id, 10, 20, 12, 2, date.today()
+        )
+        self.assertEqual(self._totals(invoice), (Decimal('279.99'), Decimal('32.00'), Decimal('311.99')))
+
+        line_service.delete_invoice_order_line(line.invoice_order_line_id)
+        self.assertEqual(self._totals(invoice)[2], Decimal('287.99'))
+
+    def test_failed_line_write_keeps_totals(self):
+        """Si le recalcul échoue, l'écriture de la ligne est annulée avec lui"""
+        with mock.patch.object(SalesOrderService, 'refresh_totals', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.line_service.delete_sales_order_line(self.lines[1].sales_order_line_id)
+
+        self.assertTrue(SalesOrderLine.objects.filter(sales_order_line_id=self.lines[1].sales_order_line_id).exists())
+        self.assertEqual(self._totals(self.order)[2], Decimal('287.99'))
+
+    def test_verify_and_repair_command(self):
+        """La commande signale les totaux en écart, puis les corrige avec --repair"""
+        SalesOrder.objects.filter(sales_order_id=self.order.sales_order_id).update(total_ttc=1)
+
+        with self.assertRaises(CommandError):
+            call_command('verify_document_totals', '--processes', '1', stdout=StringIO())
+
+        output = StringIO()
+        call_command('verify_document_totals', '--repair', '--processes', '1', stdout=output)
+        self.assertIn(f"sales_orders {self.order.sales_order_id}", output.getvalue())
+        self.assertEqual(self._totals(self.order)[2], Decimal('287.99'))
+
+        report = DocumentTotalsService().verify_totals(processes=1)
+        self.assertEqual((report.checked, report.mismatches), (1, []))
+
+
+class InvoiceListPaginationTest(TestDataMixin, TestCase):
+    """Tests pour la liste des factures paginée par curseur"""
+
+    def setUp(self):
+        self.invoice_service = InvoiceService()
+        self.contact = self._create_contact("Liste")
+        self.other_contact = self._create_contact("Liste", first_name="Autre")
+        now = timezone.now()
+        self.invoices = []
+        for index in range(7):
+            contact = self.contact if index % 2 == 0 else self.other_contact
+            invoice = self._create_invoice_for(contact, "Facture Liste", status='Confirmé' if index < 3 else 'Brouillon')
+            # Deux factures à la même date : départagées par invoice_id
+            Invoice.objects.filter(invoice_id=invoice.invoice_id).update(created_at=now - timedelta(days=index // 2 * 10))
+            self.invoices.append(invoice.invoice_id)
+
+    def _walk(self, **params):
+        """Parcourir toutes les pages en suivant next_cursor"""
+        pages = []
+        page = self.invoice_service.get_invoice_page(page_size=3, **params)
+        pages.append([invoice.invoice_id for invoice in page.invoices])
+        while page.next_cursor:
+            page = self.invoice_service.get_invoice_page(page_size=3, after=page.next_cursor, **params)
+            pages.append([invoice.invoice_id for invoice in page.invoices])
+        return pages
+
+    def test_pages_follow_sort_order(self):
+        """Les pages s'enchaînent sans doublon ni oubli, dans l'ordre du tri"""
+        newest = [1, 0, 3, 2, 5, 4, 6]
+        self.assertEqual(self._walk(sort='newest'), [
+            [self.invoices[i] for i in newest[:3]], [self.invoices[i] for i in newest[3:6]], [self.invoices[6]],
+        ])
+        oldest = sum(self._walk(sort='oldest'), [])
+        self.assertEqual(oldest, [self.invoices[i] for i in reversed(newest)])
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Le curseur précédent ramène exactement la page d'avant"""
+        first = self.invoice_service.get_invoice_page(page_size=3)
+        second = self.invoice_service.get_invoice_page(page_size=3, after=first.next_cursor)
+        back = self.invoice_service.get_invoice_page(page_size=3, before=second.previous_cursor)
+
+        self.assertIsNone(first.previous_cursor)
+        self.assertEqual([i.invoice_id for i in back.invoices], [i.invoice_id for i in first.invoices])
+        self.assertIsNone(back.previous_cursor)
+        self.assertIsNotNone(back.next_cursor)
+
+    def test_filters(self):
+        """Les filtres statut, contact et période s'appliquent à toutes les pages"""
+        confirmed = sum(self._walk(status='Confirmé', contact_id=self.contact.contact_id), [])
+        self.assertEqual(confirmed, [self.invoices[0], self.invoices[2]])
+
+        recent = sum(self._walk(start=timezone.localdate() - timedelta(days=5)), [])
+        self.assertEqual(sorted(recent), sorted(self.invoices[:2]))
+
+    def test_invalid_cursor(self):
+        """Un curseur altéré ou d'un autre tri est refusé"""
+        page = self.invoice_service.get_invoice_page(page_size=3)
+        with self.assertRaises(ValueError):
+            self.invoice_service.get_invoice_page(sort='oldest', after=page.next_cursor)
+        with self.assertRaises(ValueError):
+            self.invoice_service.get_invoice_page(after='pas-un-curseur')
+
+        response = self.client.get(reverse('invoicing:invoice_list'), {'after': 'pas-un-curseur'})
+        self.assertRedirects(response, reverse('invoicing:invoice_list'))
+
+    def test_deep_page_costs_the_same_queries(self):
+        """La première et la dernière page exécutent le même nombre (constant) de requêtes"""
+        with mock.patch.object(InvoiceService, 'PAGE_SIZE', 2):
+            with CaptureQueriesContext(connection) as first_queries:
+                response = self.client.get(reverse('invoicing:invoice_list'))
+            cursor = response.context['page'].next_cursor
+            while response.context['page'].next_cursor:
+                cursor = response.context['page'].next_cursor
+                response = self.client.get(reverse('invoicing:invoice_list'), {'after': cursor, 'status': ''})
+            with CaptureQueriesContext(connection) as last_queries:
+                response = self.client.get(reverse('invoicing:invoice_list'), {'after': cursor})
+
+        self.assertEqual(len(response.context['invoices']), 1)
+        self.assertEqual(len(last_queries), len(first_queries))
+        self.assertLessEqual(len(first_queries), 2)
+        self.assertContains(response, 'Précédentes')
+
+
+class PdfCacheTest(TestDataMixin, TestCase):
+    """Tests pour le cache des PDF adressé par le contenu"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        settings_override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.contact = self._create_contact("Cache")
+        self.invoice = self._create_invoice_for(self.contact, "Facture Cache", price_ht=100, tax=20, status="Confirmé")
+        self.product = ProductService().create_product(
+            product_id=None, product_description="Produit Cache", price_ht=100.00, tax=20,
+            price_it=120.00, product_type="vente"
+        )
+        InvoiceOrderLineService().create_invoice_order_line(
+            invoice_id=self.invoice.invoice_id, product_id=self.product.product_id,
+            contact_id=self.contact.contact_id, price_ht=100.00, tax=20, price_tax=120.00,
+            quantity=1, date=date.today()
+        )
+        self.url = reverse('invoicing:invoice_pdf', args=[self.invoice.invoice_id])
+
+    def _download(self):
+        """Télécharger le PDF de la facture en comptant les générations reportlab"""
+        with mock.patch.object(
+            SalesOrderPDFService, 'generate_pdf', autospec=True, side_effect=SalesOrderPDFService.generate_pdf
+        ) as generate_pdf:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content), generate_pdf.call_count
+
+    def test_hit_is_served_without_rendering(self):
+        """Le second téléchargement est servi depuis le cache, à l'identique, sans regénération"""
+        first, first_renders = self._download()
+        second, second_renders = self._download()
+
+        self.assertTrue(first.startswith(b'%PDF'))
+        self.assertEqual((first_renders, second_renders), (1, 0))
+        self.assertEqual(second, first)
+
+    def test_changes_produce_a_new_key(self):
+        """Un paiement ou une ligne ajouté(e) change la clé : le PDF est regénéré"""
+        self._download()
+        PaymentService().create_payment("Carte bancaire", "Payé", self.invoice.invoice_id, 50)
+        _, renders = self._download()
+        self.assertEqual(renders, 1)
+
+        InvoiceOrderLineService().create_invoice_order_line(
+            invoice_id=self.invoice.invoice_id, product_id=self.product.product_id,
+            contact_id=self.contact.contact_id, price_ht=100.00, tax=20, price_tax=120.00,
+            quantity=3, date=date.today()
+        )
+        _, renders = self._download()
+        self.assertEqual(renders, 1)
+        self.assertEqual(self._download()[1], 0)
+
+    def test_least_recently_used_files_are_evicted(self):
+        """Au-delà de la taille maximale, les fichiers les moins récemment servis sont supprimés"""
+        with override_settings(PDF_CACHE_MAX_BYTES=250):
+            cache = PdfCacheService()
+            keys = [cache.content_key({'document': index}) for index in range(3)]
+            for index, key in enumerate(keys[:2]):
+                cache.store(key, BytesIO(b'x' * 100))
+                os.utime(cache._path(key), (1_000_000 + index, 1_000_000 + index))
+            # Le premier est relu : c'est le second qui devient le moins récent
+            cache.open(keys[0]).close()
+            cache.store(keys[2], BytesIO(b'x' * 100))
+
+            self.assertTrue(cache._path(keys[0]).exists())
+            self.assertFalse(cache._path(keys[1]).exists())
+            self.assertTrue(cache._path(keys[2]).exists())
+
+
+    def test_directory_is_scanned_only_when_needed(self):
+        """Sous la taille maximale, le répertoire n'est parcouru qu'au premier enregistrement et toutes les N écritures"""
+        with override_settings(PDF_CACHE_MAX_BYTES=10_000, PDF_CACHE_EVICT_EVERY=3):
+            cache = PdfCacheService()
+            with mock.patch.object(PdfCacheService, 'evict', autospec=True, side_effect=PdfCacheService.evict) as evict:
+                for index in range(5):
+                    cache.store(cache.content_key({'document': index}), BytesIO(b'x' * 100))
+                self.assertEqual(evict.call_count, 2)
+
+                # Taille estimée au-delà du maximum : parcours immédiat
+                cache.store(cache.content_key({'document': 'gros'}), BytesIO(b'x' * 10_000))
+                self.assertEqual(evict.call_count, 3)
+
+    def test_concurrent_stores_of_the_same_key(self):
+        """Des threads qui enregistrent la même clé n'écrivent jamais dans le même fichier temporaire"""
+        cache = PdfCacheService()
+        key = cache.content_key({'document': 'partagé'})
+        content = b'%PDF' + b'x' * 100_000
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: cache.store(key, BytesIO(content)), range(16)))
+
+        self.assertEqual(cache._path(key).read_bytes(), content)
+        self.assertEqual(list(cache._path(key).parent.glob('*.tmp')), [])
+
+
+class InvoicePdfBatchTest(TestDataMixin, TestCase):
+    """Tests pour l'archive ZIP des PDF de factures (un seul processus : données du TestCase)"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        settings_override = override_settings(PDF_CACHE_DIR=os.path.join(self.work_dir, 'cache'), PDF_BATCH_PROCESSES=1)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.contact = self._create_contact("Archive")
+        self.invoices = [
+            self._create_invoice_for(self.contact, "Facture Archive", price_ht=100, tax=20, status=status)
+            for status in ("Confirmé", "Confirmé", "Confirmé", "Brouillon")
+        ]
+
+    def test_archive_contains_one_pdf_per_filtered_invoice(self):
+        """L'archive contient le PDF de chaque facture filtrée, générés par blocs"""
+        batch_service = InvoicePdfBatchService()
+        invoice_ids = batch_service.get_invoice_ids(status="Confirmé")
+        path = os.path.join(self.work_dir, 'confirmees.zip')
+        batch_service.write_zip(invoice_ids, path, chunk_size=2)
+
+        with zipfile.ZipFile(path) as archive:
+            names = sorted(archive.namelist())
+            self.assertEqual(names, sorted(f"facture_{invoice.invoice_id}.pdf" for invoice in self.invoices[:3]))
+            self.assertTrue(archive.read(names[0]).startswith(b'%PDF'))
+
+        with self.assertRaises(ValueError):
+            batch_service.get_invoice_ids(status="Annulée")
+
+    def test_failures_are_reported_in_archive(self):
+        """Une facture en erreur est notée dans le rapport et dans erreurs.txt, les autres sont archivées"""
+        path = os.path.join(self.work_dir, 'factures.zip')
+        invoice_ids = [invoice.invoice_id for invoice in self.invoices[:2]] + [999999]
+        report = InvoicePdfBatchService().write_zip(invoice_ids, path)
+
+        self.assertEqual(report.documents, 2)
+        self.assertEqual([invoice_id for invoice_id, _ in report.failed], [999999])
+        self.assertIn("document(s)/s", report.summary())
+        with zipfile.ZipFile(path) as archive:
+            self.assertIn('erreurs.txt', archive.namelist())
+            self.assertEqual(len(archive.namelist()), 3)
+
+    def test_pdf_payment_status_matches_invoice_list(self):
+        """Le PDF affiche le total payé et le statut de paiement de la liste des factures (with_payment_totals)"""
+        paid, pending, unpaid = self.invoices[:3]
+        PaymentService().create_payment("Carte bancaire", "Payé", paid.invoice_id, 120)
+        PaymentService().create_payment("Virement bancaire", "En attente", pending.invoice_id, 50)
+
+        pdf_service = InvoicePdfService()
+        invoices = (paid, pending, unpaid)
+        with mock.patch.object(
+            SalesOrderPDFService, 'get_pdf', autospec=True, return_value=BytesIO(b'%PDF')
+        ) as get_pdf:
+            for invoice in invoices:
+                pdf_service.get_pdf(invoice.invoice_id)
+        adapters = [call.args[1] for call in get_pdf.call_args_list]
+
+        statuses = PaymentService().get_invoice_payment_statuses([invoice.invoice_id for invoice in invoices])
+        self.assertEqual(
+            [adapter.payment_status for adapter in adapters], [statuses[invoice.invoice_id] for invoice in invoices]
+        )
+        self.assertEqual([adapter.payment_status for adapter in adapters], ['Payé', 'En attente', 'Non payé'])
+        self.assertEqual([adapter.total_paid for adapter in adapters], [120, 50, 0])
+
+        with self.assertRaisesMessage(ValueError, "non trouvée"):
+            pdf_service.get_pdf(999999)
+
+    def test_chunk_queries_do_not_depend_on_invoice_count(self):
+        """Un bloc de factures est chargé en un nombre fixe de requêtes, avec leurs paiements"""
+        for invoice in self.invoices:
+            PaymentService().create_payment("Carte bancaire", "Payé", invoice.invoice_id, 10)
+
+        with mock.patch.object(
+            SalesOrderPDFService, 'get_pdf', autospec=True, side_effect=lambda *args: BytesIO(b'%PDF')
+        ):
+            with CaptureQueriesContext(connection) as single:
+                render_invoice_chunk([self.invoices[0].invoice_id])
+            with CaptureQueriesContext(connection) as chunk:
+                results = render_invoice_chunk([invoice.invoice_id for invoice in self.invoices])
+
+        self.assertEqual(len(chunk.captured_queries), len(single.captured_queries))
+        self.assertEqual([error for _, _, error in results], [''] * 4)
+
+    def _use_temp_export_jobs_dir(self, **settings):
+        settings_override = override_settings(EXPORT_JOBS_DIR=os.path.join(self.work_dir, 'exports'), **settings)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_view_enqueues_archive_job(self):
+        """La vue enregistre une tâche de fond : l'archive est générée par le worker puis téléchargée"""
+        self._use_temp_export_jobs_dir()
+        response = self.client.post(reverse('invoicing:invoice_pdf_batch'), {'contact': self.contact.contact_id})
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('commons:export_job_detail', args=[job.export_job_id]))
+        self.assertEqual((job.entity, job.export_format, job.status), ('invoice_pdfs', 'zip', 'En attente'))
+
+        call_command('run_export_jobs', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written), ('Terminé', 4))
+        response = self.client.get(reverse('commons:export_job_download', args=[job.export_job_id]))
+        self.assertIn('factures.zip', response['Content-Disposition'])
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(sorted(archive.namelist()),
+                             sorted(f"facture_{invoice.invoice_id}.pdf" for invoice in self.invoices))
+
+        response = self.client.post(reverse('invoicing:invoice_pdf_batch'), {'start': 'pas-une-date'})
+        self.assertRedirects(response, reverse('invoicing:invoice_list'))
+        response = self.client.post(reverse('invoicing:invoice_pdf_batch'), {'status': 'Annulée'})
+        self.assertRedirects(response, reverse('invoicing:invoice_list'))
+        self.assertEqual(ExportJob.objects.count(), 1)
+        self.assertEqual(self.client.get(reverse('invoicing:invoice_pdf_batch')).status_code, 405)
+
+    def test_interrupted_archive_job_resumes_from_checkpoint(self):
+        """Une archive interrompue reprend au dernier tour validé : chaque PDF une fois, échecs dans erreurs.txt"""
+        self._use_temp_export_jobs_dir(PDF_BATCH_CHUNK_SIZE=1)
+        job = ExportJobService().submit_task_job('invoice_pdfs', contact_id=self.contact.contact_id)
+        # Facture supprimée après la demande : notée en échec au premier tour
+        missing = self.invoices[0].invoice_id
+        save_checkpoint = ExportJobRepository.save_checkpoint
+        calls = []
+
+        def crash_on_third_checkpoint(repo, *args):
+            calls.append(args)
+            if len(calls) == 3:
+                # Arrêt brutal : le PDF du 3e tour est écrit mais son point de reprise n'est pas enregistré
+                raise KeyboardInterrupt
+            return save_checkpoint(repo, *args)
+
+        with mock.patch.object(ExportJobRepository, 'save_checkpoint', crash_on_third_checkpoint), \
+                mock.patch.object(InvoiceService, 'get_invoices_for_pdf', autospec=True,
+                                  side_effect=lambda service, invoice_ids: [
+                                      invoice for invoice in InvoiceRepository().get_invoices_for_pdf(invoice_ids)
+                                      if invoice.invoice_id != missing
+                                  ]):
+            with self.assertRaises(KeyboardInterrupt):
+                ExportJobService().run_pending_export_jobs(worker='worker-1', once=True)
+
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.rows_written, job.rows_total), ('En cours', 2, 4))
+
+            with override_settings(EXPORT_JOBS_STALE_AFTER=-1):
+                ExportJobService().run_pending_export_jobs(worker='worker-2', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_written), ('Terminé', 4))
+        with zipfile.ZipFile(job.file_path) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), [
+                *(f"facture_{invoice.invoice_id}.pdf" for invoice in self.invoices[1:]), 'erreurs.txt'
+            ])
+            self.assertIn(f"Facture {missing} : ", archive.read('erreurs.txt').decode('utf-8'))
+        self.assertEqual(os.listdir(os.path.dirname(job.file_path)), [os.path.basename(job.file_path)])
+
+    def test_command(self):
+        """L'archive est écrite sur disque par la commande"""
+
+        path = os.path.join(self.work_dir, 'commande.zip')
+        out = StringIO()
+        call_command('export_invoice_pdfs', path, '--status', 'Brouillon', stdout=out)
+        self.assertIn("1 PDF archivé(s)", out.getvalue())
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(archive.namelist(), [f"facture_{self.invoices[3].invoice_id}.pdf"])
+
+
+class InvoiceDetailReadModelTest(TestDataMixin, TestCase):
+    """Tests pour le chargement de la page de détail d'une facture en un nombre fixe de requêtes"""
+
+    def setUp(self):
+        self.contact = self._create_contact("Détail")
+        self.invoice = self._create_invoice_for(
+            self.contact, "Facture Détail", price_ht=300, tax=20, status="Confirmé"
+        )
+
+    def _add_lines_and_payments(self, count):
+        for _ in range(count):
+            index = InvoiceOrderLine.objects.count()
+            product = ProductService().create_product(
+                product_id=None, product_description=f"Produit {index}", price_ht=100.00, tax=20,
+                price_it=120.00, product_type="vente"
+            )
+            InvoiceOrderLineService().create_invoice_order_line(
+                invoice_id=self.invoice.invoice_id, product_id=product.product_id,
+                contact_id=self.contact.contact_id, price_ht=100.00, tax=20, price_tax=120.00,
+                quantity=1, date=date.today()
+            )
+            PaymentService().create_payment("Virement bancaire", "Payé", self.invoice.invoice_id, 10)
+
+    def test_detail_is_loaded_in_three_queries(self):
+        """Le nombre de requêtes de la page ne dépend ni du nombre de lignes ni de celui des paiements"""
+        url = reverse('invoicing:invoice_detail', args=[self.invoice.invoice_id])
+        for count in (1, 4):
+            self._add_lines_and_payments(count)
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertContains(response, "Produit 0")
+
+        detail = InvoiceService().get_invoice_detail(self.invoice.invoice_id)
+        self.assertEqual(len(detail.lines), 5)
+        self.assertEqual(len(detail.payments), 5)
+        self.assertEqual(detail.total_paid, 50)
+
+    def test_payment_status_matches_payment_service(self):
+        """Le statut précalculé est celui du service de paiement"""
+        invoice_service = InvoiceService()
+        payment_service = PaymentService()
+        invoice_id = self.invoice.invoice_id
+
+        self.assertEqual(invoice_service.get_invoice_detail(invoice_id).payment_status, 'Non payé')
+        payment_service.create_payment("Chèque", "En attente", invoice_id, 100)
+        self.assertEqual(invoice_service.get_invoice_detail(invoice_id).payment_status, 'En attente')
+        Payment.objects.filter(invoice_id=invoice_id).update(state_payment='Payé', amount=360)
+        self.assertEqual(invoice_service.get_invoice_detail(invoice_id).payment_status, 'Payé')
+        self.assertEqual(payment_service.get_invoice_payment_status(invoice_id), 'Payé')
+
+        with self.assertRaises(ValueError):
+            invoice_service.get_invoice_detail(999999)
+
+
+class ReceivablesAgingTest(TestDataMixin, TestCase):
+    """Tests pour la balance âgée des créances calculée en base"""
+
+    def setUp(self):
+        self.contact = self._create_contact("Créances")
+        self.other_contact = self._create_contact("Créances", first_name="Autre")
+        self.product = ProductService().create_product(
+            product_id=None, product_description="Prestation", price_ht=100, tax=20, price_it=120, product_type="vente"
+        )
+        self.as_of = date(2025, 6, 30)
+
+    def _create_invoice(self, days_old, price_ht=100, status="Confirmé", contact=None):
+        contact = contact or self.contact
+        invoice = self._create_invoice_for(contact, "Facture Créances", price_ht=price_ht, tax=20, status=status)
+        # Le reste à encaisser part du total TTC des lignes
+        InvoiceOrderLineService().create_invoice_order_line(
+            invoice.invoice_id, self.product.product_id, contact.contact_id, price_ht, 20, price_ht * 1.2, 1, date.today()
+        )
+        created_at = timezone.make_aware(datetime.combine(self.as_of - timedelta(days=days_old), datetime.min.time()))
+        Invoice.objects.filter(invoice_id=invoice.invoice_id).update(created_at=created_at)
+        return invoice
+
+    def test_buckets_per_contact_and_overall(self):
+        """Le reste dû (hors paiements non encaissés) est réparti par tranche, par contact et au total"""
+        payment_service = PaymentService()
+        recent = self._create_invoice(30)
+        self._create_invoice(31)
+        self._create_invoice(90, price_ht=200)
+        self._create_invoice(91, contact=self.other_contact)
+        self._create_invoice(200, status="Brouillon")
+        settled = self._create_invoice(10)
+        payment_service.create_payment("Virement bancaire", "Payé", recent.invoice_id, 20)
+        payment_service.create_payment("Chèque", "En attente", recent.invoice_id, 100)
+        payment_service.create_payment("Virement bancaire", "Payé", settled.invoice_id, 120)
+
+        with self.assertNumQueries(1):
+            report = ReceivablesService().get_aging_report(as_of=self.as_of)
+
+        first, second = report.contacts
+        self.assertEqual(first['contact_id'], self.contact.contact_id)
+        self.assertEqual(first['invoice_count'], 3)
+        self.assertEqual(
+            [first[name] for name in ReceivablesService.AMOUNT_FIELDS],
+            [100.0, 120.0, 240.0, 0.0, 460.0],
+        )
+        self.assertEqual(second['days_over_90'], 120.0)
+        self.assertEqual(report.overall['total_outstanding'], 580.0)
+        self.assertEqual(report.overall['invoice_count'], 4)
+
+        # Le total TTC stocké fait foi, pas le montant de l'en-tête
+        Invoice.objects.filter(invoice_id=recent.invoice_id).update(price_ht=1000)
+        self.assertEqual(ReceivablesService().get_aging_report(as_of=self.as_of).overall['total_outstanding'], 580.0)
+
+        filtered = ReceivablesService().get_aging_report(as_of=self.as_of, contact_id=self.other_contact.contact_id)
+        self.assertEqual([row['contact_id'] for row in filtered.contacts], [self.other_contact.contact_id])
+
+    def test_page_and_export(self):
+        """La page affiche la balance et l'export la restitue par contact"""
+        self.as_of = timezone.localdate()
+        self._create_invoice(0)
+        response = self.client.get(reverse('invoicing:receivables_aging'))
+        self.assertContains(response, "Client Créances")
+        self.assertEqual(response.context['report'].overall['days_0_30'], 120.0)
+
+        content = b''.join(ExportService().export('receivables', 'csv').content).decode('utf-8-sig')
+        self.assertIn("Client Créances", content)
+        self.assertIn("120", content)
@@ -1,15 +1,17 @@
 from django.urls import path
-from invoicing.views import InvoiceListView, InvoiceDetailView, CreateInvoiceFromSalesOrderView, InvoicePdfView, \
-    InvoiceDeleteView, InvoiceExportCSVView
+from invoicing.views import InvoiceListView, InvoiceDetailView, CreateInvoiceFromSalesOrderView, InvoicePdfView, InvoicePdfBatchView, \
+    InvoiceDeleteView, InvoiceExportCSVView, ReceivablesAgingView
 
 app_name = 'invoicing'
 
 urlpatterns = [
     path('', InvoiceListView.as_view(), name='invoice_list'),
     path('<int:pk>/pdf/', InvoicePdfView.as_view(), name='invoice_pdf'),
+    path('pdf/zip/', InvoicePdfBatchView.as_view(), name='invoice_pdf_batch'),
     path('<int:pk>/delete/', InvoiceDeleteView.as_view(), name='invoice_delete'),
     path('<int:pk>/', InvoiceDetailView.as_view(), name='invoice_detail'),
     path('create-from-sales/<int:sales_order_pk>/', CreateInvoiceFromSalesOrderView.as_view(), name='create_from_sales'),
+    path('receivables/', ReceivablesAgingView.as_view(), name='receivables_aging'),
     path('invoices/export-csv/', InvoiceExportCSVView.as_view(), name='invoice_export_csv'),
 ]
 
@@ -1,36 +1,81 @@
 from django.http import Http404
-from datetime import datetime
+from invoicing.models.invoice_models import STATUS_CHOICES
 from invoicing.services.invoice_service import InvoiceService
-from invoicing.services.invoice_order_line_service import InvoiceOrderLineService
+from invoicing.services.invoice_conversion_service import InvoiceConversionService
 from invoicing.forms import  InvoiceDateForm
-from sales.services.sales_order_service import SalesOrderService
-from sales.services.sales_order_line_service import SalesOrderLineService
+from invoicing.services.receivables_service import AGING_BUCKETS, ReceivablesService
+from invoicing.services.invoice_pdf_service import InvoicePdfBatchService, InvoicePdfService
 from django.http import FileResponse
-from sales.sales_order_pdf import SalesOrderPDFService
 from payment.services.payment_service import PaymentService
-import csv
+from commons.services.contact_service import ContactService
+from commons.services.export_job_service import ExportJobService
+from commons.views import ExportView
 import logging
-from decimal import Decimal, InvalidOperation
-from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.views.generic import TemplateView
 
 
+INVOICE_SORT_LABELS = {
+    'newest': 'Plus récentes',
+    'oldest': 'Plus anciennes',
+    'amount_desc': 'Montant décroissant',
+    'amount_asc': 'Montant croissant',
+}
+
+
 class InvoiceListView(TemplateView):
-    """Vue pour lister les factures"""
+    """Vue pour lister les factures : filtres, tri et pagination par curseur (paramètres GET)"""
     template_name = 'invoicing/invoice_list.html'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        invoice_service = InvoiceService()
+    def get(self, request, *args, **kwargs):
+        sort = request.GET.get('sort') or 'newest'
+        try:
+            filters = ExportView.parse_filters(request.GET)
+            page = InvoiceService().get_invoice_page(
+                sort=sort,
+                after=request.GET.get('after'),
+                before=request.GET.get('before'),
+                **filters
+            )
+        except ValueError as e:
+            messages.error(request, f"Erreur : {str(e)}")
+            return redirect('invoicing:invoice_list')
+
+        # Statut de paiement calculé à partir des annotations de la page (sans requête supplémentaire)
+        payment_service = PaymentService()
+        for invoice in page.invoices:
+            invoice.payment_status = payment_service.get_annotated_payment_status(invoice)
+
+        context = self.get_context_data(**kwargs)
+        context['invoices'] = page.invoices
+        context['page'] = page
+        context['filters'] = filters
+        context['sort'] = sort
+        context['sorts'] = INVOICE_SORT_LABELS
+        context['statuses'] = [status for status, _ in STATUS_CHOICES]
+        context['contacts'] = ContactService().get_all_contacts()
+        return self.render_to_response(context)
+
 
+class ReceivablesAgingView(TemplateView):
+    """Vue pour afficher la balance âgée des créances clients (filtre contact en GET)"""
+    template_name = 'invoicing/receivables_aging.html'
+
+    def get(self, request, *args, **kwargs):
         try:
-            context['invoices'] = invoice_service.get_all_invoices()
-        except:
-            context['invoices'] = []
+            filters = ExportView.parse_filters(request.GET)
+            report = ReceivablesService().get_aging_report(contact_id=filters['contact_id'])
+        except ValueError as e:
+            messages.error(request, f"Erreur : {str(e)}")
+            return redirect('invoicing:receivables_aging')
 
-        return context
+        context = self.get_context_data(**kwargs)
+        context['report'] = report
+        context['buckets'] = AGING_BUCKETS
+        context['contact_id'] = filters['contact_id']
+        context['contacts'] = ContactService().get_all_contacts()
+        return self.render_to_response(context)
 
 
 class InvoiceDetailView(TemplateView):
@@ -41,19 +86,13 @@ class InvoiceDetailView(TemplateView):
         context = super().get_context_data(**kwargs)
         pk = self.kwargs.get('pk')
         invoice_service = InvoiceService()
-        invoice_line_service = InvoiceOrderLineService()
-        payment_service = PaymentService()
 
         try:
-            invoice = invoice_service.get_invoice_by_id(pk)
-            lines = invoice_line_service.get_invoice_order_lines_by_invoice(pk)
-
-            # Récupération des paiements
-            payments = invoice.payments.all() if hasattr(invoice, 'payments') else []
-            total_paid = sum(p.amount for p in payments) if payments else 0
-
-            # Récupérer le statut de paiement réel via le service
-            payment_status = payment_service.get_invoice_payment_status(pk)
+            # Facture, contact, lignes, produits et paiements : trois requêtes
+            detail = invoice_service.get_invoice_detail(pk)
+            invoice = detail.invoice
+            lines = detail.lines
+            total_paid = detail.total_paid
 
             # Ajouter le total HT calculé pour chaque ligne et infos paiements
             for line in lines:
@@ -63,9 +102,9 @@ class InvoiceDetailView(TemplateView):
 
             context['invoice'] = invoice
             context['lines'] = lines
-            context['payments'] = payments
+            context['payments'] = detail.payments
             context['total_paid'] = total_paid
-            context['payment_status'] = payment_status
+            context['payment_status'] = detail.payment_status
             context['has_lines'] = len(lines) > 0
             context['date_form'] = InvoiceDateForm(initial={'created_at': invoice.created_at})
         except:
@@ -138,55 +177,11 @@ class CreateInvoiceFromSalesOrderView(TemplateView):
 
     def post(self, request, *args, **kwargs):
         sales_order_pk = self.kwargs.get('sales_order_pk')
-        sales_order_service = SalesOrderService()
-        sales_order_line_service = SalesOrderLineService()
-        invoice_service = InvoiceService()
-        invoice_line_service = InvoiceOrderLineService()
+        conversion_service = InvoiceConversionService()
 
         try:
-            # Récupérer le devis/commande
-            sales_order = sales_order_service.get_sales_order_by_id(sales_order_pk)
-            sales_lines = sales_order_line_service.get_sales_order_lines_by_order(sales_order_pk)
-
-            # Vérifier qu'il y a au moins une ligne
-            if not sales_lines:
-                messages.error(request, "Impossible de créer une facture sans lignes.")
-                return redirect('sales:sales_order_detail', pk=sales_order_pk)
-
-            # Calculer le price_ht et tax totaux à partir des lignes
-            total_price_ht = sum(line.price_ht * line.quantity for line in sales_lines)
-            # Prendre la taxe de la première ligne (supposée être la même pour toutes)
-            tax = sales_lines[0].tax if sales_lines else 0
-
-
-            # Créer la facture avec les données du contact et les totaux calculés
-            contact = sales_order.contact_id
-            invoice = invoice_service.create_invoice(
-                contact_id=contact.contact_id,
-                name=f"{contact.first_name} {contact.last_name}",
-                address=contact.address,
-                city=contact.city,
-                state=contact.state,
-                zip_code=contact.zip_code,
-                siret=contact.siret,
-                email=contact.email,
-                phone=contact.phone,
-                price_ht=int(total_price_ht),
-                tax=int(tax)
-            )
-
-            # Copier les lignes du devis/commande vers la facture
-            for sales_line in sales_lines:
-                invoice_line_service.create_invoice_order_line(
-                    invoice_id=invoice.invoice_id,
-                    product_id=sales_line.product_id.product_id,
-                    contact_id=sales_line.contact_id.contact_id,
-                    price_ht=sales_line.price_ht,
-                    tax=sales_line.tax,
-                    price_tax=sales_line.price_it,
-                    quantity=sales_line.quantity,
-                    date=sales_line.date
-                )
+            # Valider les lignes puis créer la facture et ses lignes en une transaction
+            invoice = conversion_service.convert_sales_order(sales_order_pk)
 
             messages.success(request, f"Facture créée avec succès ! Numéro : {invoice.invoice_id}")
             return redirect('invoicing:invoice_detail', pk=invoice.invoice_id)
@@ -202,65 +197,40 @@ class InvoicePdfView(TemplateView):
 
     def get(self, request, *args, **kwargs):
         pk = self.kwargs.get('pk')
-        invoice_service = InvoiceService()
-        invoice_line_service = InvoiceOrderLineService()
-        pdf_service = SalesOrderPDFService()
 
         try:
-            invoice = invoice_service.get_invoice_by_id(pk)
-            lines = invoice_line_service.get_invoice_order_lines_by_invoice(pk)
-
-            # Récupération des paiements
-            payments = invoice.payments.all() if hasattr(invoice, 'payments') else []
-            total_paid = sum(p.amount for p in payments) if payments else 0
-            invoice_total_ttc = sum(line.price_tax for line in lines)
-
-            # Déterminer le statut de paiement
-            if total_paid >= invoice_total_ttc:
-                payment_status = "Payé"
-            elif total_paid > 0:
-                payment_status = "Partiellement Payé"
-            else:
-                payment_status = "Aucun paiement"
-
-            # Créer un objet facture compatible avec le service PDF
-            class InvoicePdfAdapter:
-                def __init__(self, invoice, payments, total_paid, payment_status):
-                    self.contact_id = invoice.contact_id
-                    self.type = "Facture"
-                    self.genre = "Facture"
-                    self.created_at = datetime.now()
-                    self.invoice_id = invoice.invoice_id
-                    self.payments = payments
-                    self.total_paid = total_paid
-                    self.payment_status = payment_status
-
-            # Créer des adaptateurs pour les lignes
-            class InvoiceLinePdfAdapter:
-                def __init__(self, line):
-                    self.date = line.date
-                    self.product_id = line.product_id
-                    self.genre = line.product_id.product_description  # Utiliser la description du produit comme genre
-                    self.quantity = line.quantity
-                    self.price_ht = line.price_ht
-                    self.tax = line.tax
-                    self.price_it = line.price_tax  # Mapper price_tax vers price_it
-
-            invoice_adapter = InvoicePdfAdapter(invoice, payments, total_paid, payment_status)
-            adapted_lines = [InvoiceLinePdfAdapter(line) for line in lines]
-
-            pdf_buffer = pdf_service.generate_pdf(invoice_adapter, adapted_lines)
+            pdf_file = InvoicePdfService().get_pdf(pk)
 
             return FileResponse(
-                pdf_buffer,
+                pdf_file,
                 as_attachment=True,
-                filename=f"facture_{pk}.pdf"
+                filename=InvoicePdfService.filename(pk)
             )
         except Exception as e:
             messages.error(request, f"Erreur : {str(e)}")
             return redirect('invoicing:invoice_detail', pk=pk)
 
 
+class InvoicePdfBatchView(TemplateView):
+    """
+    Vue pour demander en une archive ZIP les PDF des factures filtrées (filtres de la liste, en POST) : l'archive est
+    générée en tâche de fond (commande run_export_jobs) puis téléchargée depuis la page de suivi de la tâche
+    """
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        try:
+            job = ExportJobService().submit_task_job(
+                InvoicePdfBatchService.JOB_ENTITY, **ExportView.parse_filters(request.POST)
+            )
+        except ValueError as e:
+            messages.error(request, f"Erreur : {str(e)}")
+            return redirect('invoicing:invoice_list')
+
+        messages.success(request, f"Archive #{job.export_job_id} enregistrée, elle sera générée en tâche de fond")
+        return redirect('commons:export_job_detail', pk=job.export_job_id)
+
+
 class InvoiceDeleteView(TemplateView):
     """Vue pour confirmer et supprimer une facture"""
     template_name = 'invoicing/invoice_confirm_delete.html'
@@ -296,90 +266,7 @@ class InvoiceDeleteView(TemplateView):
 
 logger = logging.getLogger(__name__)
 
-class InvoiceExportCSVView(TemplateView):
-    """Vue pour exporter la liste des factures en CSV"""
-    template_name = 'invoicing/invoice_list.html'
-
-    def get(self, request, *args, **kwargs):
-        invoice_service = InvoiceService()
-        invoice_line_service = InvoiceOrderLineService()
-
-        try:
-            invoices = invoice_service.get_all_invoices()
-
-            response = HttpResponse(content_type='text/csv; charset=utf-8')
-            response['Content-Disposition'] = 'attachment; filename="factures.csv"'
-
-            response.write('sep=;\n')
-
-            response.write('\ufeff')
-
-            writer = csv.writer(response,delimiter=';', quoting=csv.QUOTE_MINIMAL)
-
-            # En-tête
-            writer.writerow([
-                'ID Facture',
-                'Contact',
-                'Adresse',
-                'Ville',
-                'Code Postal',
-                'Email',
-                'Téléphone',
-                'Montant HT',
-                'Montant TTC',
-                'Statut',
-                'Date'
-            ])
-
-            for invoice in invoices:
-                try:
-                    lines = invoice_line_service.get_invoice_order_lines_by_invoice(invoice.invoice_id)
-
-                    # Sommes en Decimal (sécurité sur les types)
-                    total_ht = sum(
-                        (Decimal(getattr(line, 'price_ht', 0)) for line in lines),
-                        Decimal('0.00')
-                    )
-                    total_ttc = sum(
-                        (Decimal(getattr(line, 'price_tax', 0)) for line in lines),
-                        Decimal('0.00')
-                    )
-
-                    contact = getattr(invoice, 'contact_id', None)
-                    contact_name = ""
-                    if contact:
-                        first = getattr(contact, 'first_name', '') or ''
-                        last = getattr(contact, 'last_name', '') or ''
-                        contact_name = (first + ' ' + last).strip()
-
-                    created_at = getattr(invoice, 'created_at', None)
-                    date_str = created_at.strftime('%d/%m/%Y') if created_at else 'N/A'
-
-                    writer.writerow([
-                        invoice.invoice_id,
-                        contact_name,
-                        getattr(invoice, 'address', ''),
-                        getattr(invoice, 'city', ''),
-                        getattr(invoice, 'zip_code', ''),
-                        getattr(invoice, 'email', ''),
-                        getattr(invoice, 'phone', ''),
-                        f"{total_ht:.2f}",
-                        f"{total_ttc:.2f}",
-                        getattr(invoice, 'status', ''),
-                        date_str
-                    ])
-                except (InvalidOperation, ValueError) as exc:
-                    # Erreur sur un calcul/formatage : log et continuer
-                    logger.exception("Erreur de calcul sur la facture %s: %s", getattr(invoice, 'invoice_id', '?'), exc)
-                    continue
-                except Exception as exc:
-                    # Erreur inattendue sur une facture : log et continuer
-                    logger.exception("Erreur lors du traitement de la facture %s", getattr(invoice, 'invoice_id', '?'))
-                    continue
-
-            return response
-
-        except Exception as e:
-            logger.exception("Erreur lors de l'export des factures")
-            messages.error(request, f"Erreur lors de l'export : {str(e)}")
-            return redirect('invoicing:invoice_list')
\ No newline at end of file
+class InvoiceExportCSVView(ExportView):
+    """Vue pour exporter la liste des factures en CSV (réponse en streaming)"""
+    entity = 'invoices'
+    export_format = 'csv'
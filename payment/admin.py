@@ -1,4 +1,38 @@
 from django.contrib import admin
 
-from .models import Payment
-admin.site.register(Payment)
\ No newline at end of file
+from .models import BankStatementImport, BankTransactionReview, Payment
+from .repositories.payment_repository import PaymentRepository
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    """
+    Les écritures passent par PaymentRepository : le cumul mensuel, le journal et le solde des factures
+    (Invoice.total_paid) restent cohérents avec les paiements modifiés depuis l'administration
+    """
+    list_display = ('payment_id', 'invoice_id', 'payment_method', 'state_payment', 'amount', 'created_at')
+    list_filter = ('state_payment', 'payment_method')
+    fields = ('invoice_id', 'payment_method', 'state_payment', 'amount', 'bank_reference', 'created_at')
+    # Référence bancaire posée par l'import des relevés uniquement
+    readonly_fields = ('bank_reference', 'created_at')
+
+    def save_model(self, request, obj, form, change):
+        repo = PaymentRepository()
+        if change:
+            repo.update_payment(obj.payment_id, obj.payment_method, obj.state_payment, obj.invoice_id, obj.amount)
+        else:
+            payment = repo.insert_payment(obj.invoice_id, obj.payment_method, obj.state_payment, obj.amount)
+            obj.payment_id = payment.payment_id
+            obj.created_at = payment.created_at
+
+    def delete_model(self, request, obj):
+        PaymentRepository().delete_payment(obj.payment_id)
+
+    def delete_queryset(self, request, queryset):
+        repo = PaymentRepository()
+        for payment_id in queryset.values_list('payment_id', flat=True):
+            repo.delete_payment(payment_id)
+
+
+admin.site.register(BankStatementImport)
+admin.site.register(BankTransactionReview)
@@ -0,0 +1,135 @@
+import random
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.base.creation import TEST_DATABASE_PREFIX
+
+from commons.dtos import CreateContactDTO
+from commons.services.contact_service import ContactService
+from invoicing.services.invoice_service import InvoiceService
+from payment.models import Payment, PaymentCapture
+from payment.services.payment_capture_service import PaymentCaptureService
+from payment.services.payment_service import PaymentService
+
+
+def capture_batch(requests):
+    """Demandes d'encaissement d'un écrivain (un thread, sa propre connexion) : codes HTTP et rejeux"""
+    service = PaymentCaptureService()
+    outcomes = Counter()
+    try:
+        for idempotency_key, invoice_id, amount in requests:
+            result = service.capture(idempotency_key, 'Carte bancaire', 'Payé', invoice_id, amount)
+            outcomes['replayed' if result.replayed else result.status_code] += 1
+    finally:
+        connections.close_all()
+    return outcomes
+
+
+def is_throwaway_database():
+    """
+    Base de test (nom TEST['NAME'] ou préfixe test_) ou SQLite en mémoire : les écritures de la mesure y sont
+    sans conséquence
+    """
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return True
+    name = str(connection.settings_dict['NAME'])
+    test_name = connection.settings_dict.get('TEST', {}).get('NAME')
+    return name.startswith(TEST_DATABASE_PREFIX) or (test_name is not None and name == str(test_name))
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit de l'encaissement idempotent sous écritures concurrentes : des écrivains parallèles "
+        "encaissent sur quelques factures, une part des demandes est rejouée avec la même clé. "
+        "Les données de mesure (contact, factures, paiements, demandes) sont supprimées à la fin ; "
+        "le journal des paiements, en ajout seul, garde la trace des suppressions. "
+        "Refusé sur une base qui n'est pas jetable (base de test, SQLite en mémoire) sans --force."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Écrivains parallèles")
+        parser.add_argument('--requests', type=int, default=2000, help="Demandes distinctes")
+        parser.add_argument('--invoices', type=int, default=20, help="Factures encaissées (contention par facture)")
+        parser.add_argument('--replay-ratio', type=float, default=0.3, help="Part des demandes envoyées deux fois")
+        parser.add_argument('--keep', action='store_true', help="Conserver les données de mesure")
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Lancer la mesure sur une base qui n'est pas jetable (écritures permanentes du journal)"
+        )
+
+    def handle(self, *args, **options):
+        if not options['force'] and not is_throwaway_database():
+            raise CommandError(
+                f"La base « {connection.settings_dict['NAME']} » n'est pas une base jetable : la mesure y laisserait "
+                "des écritures permanentes (journal des paiements, cumuls mensuels) et invaliderait le cache du "
+                "dashboard. Lancez-la sur une base de test ou confirmez avec --force."
+            )
+        writers = max(options['writers'], 1)
+        contact = ContactService().create_contact(CreateContactDTO(
+            first_name="Mesure", last_name=f"Encaissement {uuid.uuid4().hex[:8]}", email="mesure@example.com",
+            phone="0000000000", type="client", siret="private", address="-", city="-", state="-", zip_code="-",
+        ))
+        invoice_service = InvoiceService()
+        # Montant des factures calculé pour qu'une partie des demandes dépasse le reste à payer
+        price_ht = max(options['requests'] * 30 // max(options['invoices'], 1) * 3 // 4, 1)
+        invoice_ids = [
+            invoice_service.create_invoice(
+                contact_id=contact.contact_id, name="Mesure encaissement", address="-", city="-", state="-",
+                zip_code="-", siret="private", email="mesure@example.com", phone="0000000000",
+                price_ht=price_ht, status="Confirmé",
+            ).invoice_id
+            for _ in range(options['invoices'])
+        ]
+
+        requests = []
+        try:
+            requests = [
+                (uuid.uuid4().hex, random.choice(invoice_ids), random.randint(10, 50)) for _ in range(options['requests'])
+            ]
+            sent = requests + random.sample(requests, int(len(requests) * options['replay_ratio']))
+            random.shuffle(sent)
+            batches = [sent[index::writers] for index in range(writers)]
+
+            connections.close_all()
+            started_at = time.monotonic()
+            with ThreadPoolExecutor(max_workers=writers) as executor:
+                outcomes = sum(executor.map(capture_batch, batches), Counter())
+            elapsed = time.monotonic() - started_at
+
+            self.stdout.write(
+                f"{len(sent)} demande(s) ({len(requests)} distinctes) par {writers} écrivain(s) en {elapsed:.2f} s : "
+                f"{len(sent) / elapsed:.0f} demande(s)/s"
+            )
+            self.stdout.write(
+                f"Paiements créés : {outcomes[201]}, refusés (reste à payer dépassé) : {outcomes[409]}, "
+                f"rejeux servis depuis la réponse conservée : {outcomes['replayed']}"
+            )
+            self._check(invoice_ids, outcomes[201])
+        finally:
+            if not options['keep']:
+                for invoice_id in invoice_ids:
+                    invoice_service.delete_invoice(invoice_id)
+                PaymentCapture.objects.filter(idempotency_key__in=[key for key, _, _ in requests]).delete()
+                ContactService().delete_contact(contact.contact_id)
+
+    def _check(self, invoice_ids, created):
+        """Aucun doublon, aucune facture payée au-delà de son montant, soldes cohérents avec les paiements"""
+        payments = Payment.objects.filter(invoice_id__in=invoice_ids).count()
+        if payments != created:
+            raise CommandError(f"{payments} paiement(s) en base pour {created} encaissement(s) acceptés")
+
+        payment_service = PaymentService()
+        overpaid = [
+            invoice.invoice_id for invoice in InvoiceService().get_all_invoices().filter(invoice_id__in=invoice_ids)
+            if invoice.total_paid > invoice.total_amount
+        ]
+        if overpaid:
+            raise CommandError(f"Facture(s) payée(s) au-delà de leur montant : {overpaid}")
+        differences = [diff for diff in payment_service.verify_invoice_balances() if diff['invoice_id'] in invoice_ids]
+        if differences:
+            raise CommandError(f"{len(differences)} solde(s) de facture incohérent(s)")
+        self.stdout.write(self.style.SUCCESS("Aucun doublon ni dépassement, soldes cohérents"))
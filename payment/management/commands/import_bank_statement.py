@@ -0,0 +1,36 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payment.services.bank_statement_parsers import STATEMENT_PARSERS
+from payment.services.bank_statement_service import BankStatementService
+
+
+class Command(BaseCommand):
+    help = "Importe un relevé bancaire (CSV ou CAMT.053) et rapproche ses crédits avec les factures ouvertes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier du relevé")
+        parser.add_argument('--format', choices=STATEMENT_PARSERS, help="Format du relevé (d'après l'extension par défaut)")
+        parser.add_argument('--method', default='Virement bancaire', help="Moyen de paiement des paiements créés")
+        parser.add_argument('--batch-size', type=int, help="Opérations par lot (BANK_STATEMENT_BATCH_SIZE par défaut)")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as stream:
+                statement_import = BankStatementService().import_statement(
+                    stream,
+                    os.path.basename(options['path']),
+                    statement_format=options['format'],
+                    payment_method=options['method'],
+                    batch_size=options['batch_size'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        rate = statement_import.transactions / statement_import.elapsed if statement_import.elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Import {statement_import.bank_statement_import_id} : {statement_import.transactions} opération(s), "
+            f"{statement_import.matched} paiement(s) créé(s), {statement_import.to_review} à vérifier, "
+            f"{statement_import.skipped} écartée(s), en {statement_import.elapsed:.2f} s ({rate:.0f} opération(s)/s)"
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payment.services.payment_service import PaymentService
+
+
+class Command(BaseCommand):
+    help = "Reconstruit le cumul mensuel des paiements depuis la table Payment puis le vérifie"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help="Vérifier le cumul sans le reconstruire",
+        )
+
+    def handle(self, *args, **options):
+        service = PaymentService()
+
+        if not options['verify_only']:
+            count = service.rebuild_revenue_rollup()
+            self.stdout.write(f"Cumul mensuel reconstruit : {count} ligne(s)")
+
+        differences = service.verify_revenue_rollup()
+        if differences:
+            for diff in differences:
+                self.stderr.write(
+                    f"{diff['month']:02d}/{diff['year']} {diff['state_payment']} contact {diff['contact_id']} : "
+                    f"attendu {diff['expected']}, stocké {diff['stored']}"
+                )
+            raise CommandError(f"{len(differences)} écart(s) entre le cumul mensuel et les paiements")
+
+        self.stdout.write(self.style.SUCCESS("Cumul mensuel cohérent avec les paiements"))
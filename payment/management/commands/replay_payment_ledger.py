@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payment.services.payment_service import PaymentService
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les soldes des factures en rejouant le journal des paiements puis les vérifie"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help="Vérifier les soldes sans les reconstruire",
+        )
+
+    def handle(self, *args, **options):
+        service = PaymentService()
+
+        if not options['verify_only']:
+            count = service.rebuild_invoice_balances()
+            self.stdout.write(f"Soldes reconstruits depuis le journal : {count} facture(s)")
+
+        differences = service.verify_invoice_balances()
+        if differences:
+            for diff in differences:
+                self.stderr.write(f"Facture {diff['invoice_id']} : attendu {diff['expected']}, stocké {diff['stored']}")
+            raise CommandError(f"{len(differences)} écart(s) entre les soldes des factures et les paiements")
+
+        self.stdout.write(self.style.SUCCESS("Soldes des factures cohérents avec les paiements"))
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('invoicing', '0009_invoice_slug_invoiceorderline_slug_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('payment_id', models.AutoField(primary_key=True, serialize=False)),
+                ('slug', models.SlugField(null=True)),
+                ('payment_method', models.CharField(choices=[('Carte bancaire', 'Carte bancaire'), ('PayPal', 'PayPal'), ('Virement bancaire', 'Virement bancaire'), ('Chèque', 'Chèque')], default='Carte bancaire', max_length=30)),
+                ('state_payment', models.CharField(choices=[('En attente', 'En attente'), ('En cours ', 'En cours'), ('Payé', 'Payé')], default='En attente', max_length=20)),
+                ('amount', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('invoice_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='invoicing.invoice')),
+            ],
+        ),
+    ]
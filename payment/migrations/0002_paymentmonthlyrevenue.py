@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commons', '0003_contact_slug'),
+        ('payment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentMonthlyRevenue',
+            fields=[
+                ('payment_monthly_revenue_id', models.AutoField(primary_key=True, serialize=False)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('state_payment', models.CharField(choices=[('En attente', 'En attente'), ('En cours ', 'En cours'), ('Payé', 'Payé')], max_length=20)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('contact_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_monthly_revenues', to='commons.contact')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['state_payment', 'year', 'month'], name='payment_rollup_state_period')],
+                'constraints': [models.UniqueConstraint(fields=('year', 'month', 'state_payment', 'contact_id'), name='unique_payment_monthly_revenue_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0012_invoice_invoice_created_id_and_more'),
+        ('payment', '0002_paymentmonthlyrevenue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['invoice_id', 'state_payment', 'amount'], name='payment_invoice_state_amount'),
+        ),
+    ]
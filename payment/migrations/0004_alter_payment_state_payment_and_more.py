@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:42
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def normalize_states(apps, schema_editor):
+    """'En cours ' devient 'En cours' : paiements, puis cumuls mensuels (fusionnés si le cumul 'En cours' existe)"""
+    Payment = apps.get_model('payment', 'Payment')
+    PaymentMonthlyRevenue = apps.get_model('payment', 'PaymentMonthlyRevenue')
+    Payment.objects.filter(state_payment='En cours ').update(state_payment='En cours')
+
+    for legacy in PaymentMonthlyRevenue.objects.filter(state_payment='En cours '):
+        merged = PaymentMonthlyRevenue.objects.filter(
+            year=legacy.year, month=legacy.month, state_payment='En cours', contact_id=legacy.contact_id_id,
+        ).update(revenue=F('revenue') + legacy.revenue, payment_count=F('payment_count') + legacy.payment_count)
+        if merged:
+            legacy.delete()
+        else:
+            legacy.state_payment = 'En cours'
+            legacy.save(update_fields=['state_payment'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0003_payment_payment_invoice_state_amount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='state_payment',
+            field=models.CharField(choices=[('En attente', 'En attente'), ('En cours', 'En cours'), ('Payé', 'Payé')], default='En attente', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='paymentmonthlyrevenue',
+            name='state_payment',
+            field=models.CharField(choices=[('En attente', 'En attente'), ('En cours', 'En cours'), ('Payé', 'Payé')], max_length=20),
+        ),
+        migrations.RunPython(normalize_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0012_invoice_invoice_created_id_and_more'),
+        ('payment', '0004_alter_payment_state_payment_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankStatementImport',
+            fields=[
+                ('bank_statement_import_id', models.AutoField(primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('statement_format', models.CharField(choices=[('csv', 'CSV'), ('camt053', 'CAMT.053 (XML)')], max_length=10)),
+                ('status', models.CharField(choices=[('En cours', 'En cours'), ('Terminé', 'Terminé'), ('Échec', 'Échec')], default='En cours', max_length=20)),
+                ('transactions', models.IntegerField(default=0)),
+                ('matched', models.IntegerField(default=0)),
+                ('to_review', models.IntegerField(default=0)),
+                ('skipped', models.IntegerField(default=0)),
+                ('elapsed', models.FloatField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='bank_reference',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='BankTransactionReview',
+            fields=[
+                ('bank_transaction_review_id', models.AutoField(primary_key=True, serialize=False)),
+                ('bank_reference', models.CharField(max_length=100, unique=True)),
+                ('booking_date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('reference', models.TextField(blank=True)),
+                ('counterparty', models.CharField(blank=True, max_length=255)),
+                ('reason', models.CharField(max_length=255)),
+                ('candidates', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('À traiter', 'À traiter'), ('Rapproché', 'Rapproché'), ('Ignoré', 'Ignoré')], default='À traiter', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bank_statement_import_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='payment.bankstatementimport')),
+                ('invoice_id', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bank_reviews', to='invoicing.invoice')),
+                ('payment_id', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bank_reviews', to='payment.payment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'booking_date'], name='bank_review_status_date')],
+            },
+        ),
+    ]
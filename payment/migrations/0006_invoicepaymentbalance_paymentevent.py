@@ -0,0 +1,84 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_ledger(apps, schema_editor):
+    """Un événement 'Création' par paiement existant (état actuel) et le solde de chaque facture payée"""
+    Payment = apps.get_model('payment', 'Payment')
+    PaymentEvent = apps.get_model('payment', 'PaymentEvent')
+    InvoicePaymentBalance = apps.get_model('payment', 'InvoicePaymentBalance')
+
+    balances, events = {}, []
+    for payment in Payment.objects.order_by('invoice_id', 'created_at', 'payment_id').iterator(chunk_size=5000):
+        balance = balances.setdefault(payment.invoice_id_id, InvoicePaymentBalance(invoice_id_id=payment.invoice_id_id))
+        balance.total_paid += payment.amount
+        balance.payment_count += 1
+        if payment.state_payment == 'Payé':
+            balance.settled_amount += payment.amount
+        elif payment.state_payment == 'En attente':
+            balance.pending_payment_count += 1
+        elif payment.state_payment == 'En cours':
+            balance.in_progress_payment_count += 1
+        balance.version += 1
+        events.append(PaymentEvent(
+            invoice_id_id=payment.invoice_id_id,
+            payment_id_id=payment.payment_id,
+            sequence=balance.version,
+            event_type='Création',
+            payment_method=payment.payment_method,
+            state_payment=payment.state_payment,
+            amount=payment.amount,
+            total_paid=balance.total_paid,
+            settled_amount=balance.settled_amount,
+        ))
+    PaymentEvent.objects.bulk_create(events, batch_size=1000)
+    InvoicePaymentBalance.objects.bulk_create(balances.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0012_invoice_invoice_created_id_and_more'),
+        ('payment', '0005_bankstatementimport_payment_bank_reference_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoicePaymentBalance',
+            fields=[
+                ('invoice_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payment_balance', serialize=False, to='invoicing.invoice')),
+                ('total_paid', models.BigIntegerField(default=0)),
+                ('settled_amount', models.BigIntegerField(default=0)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('pending_payment_count', models.IntegerField(default=0)),
+                ('in_progress_payment_count', models.IntegerField(default=0)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('payment_event_id', models.AutoField(primary_key=True, serialize=False)),
+                ('sequence', models.PositiveIntegerField()),
+                ('event_type', models.CharField(choices=[('Création', 'Création'), ('Changement de statut', 'Changement de statut'), ('Correction du montant', 'Correction du montant'), ('Changement de moyen', 'Changement de moyen'), ('Suppression', 'Suppression')], max_length=30)),
+                ('payment_method', models.CharField(choices=[('Carte bancaire', 'Carte bancaire'), ('PayPal', 'PayPal'), ('Virement bancaire', 'Virement bancaire'), ('Chèque', 'Chèque')], max_length=30)),
+                ('state_payment', models.CharField(choices=[('En attente', 'En attente'), ('En cours', 'En cours'), ('Payé', 'Payé')], max_length=20)),
+                ('previous_state_payment', models.CharField(blank=True, choices=[('En attente', 'En attente'), ('En cours', 'En cours'), ('Payé', 'Payé')], max_length=20, null=True)),
+                ('amount', models.IntegerField()),
+                ('previous_amount', models.IntegerField(blank=True, null=True)),
+                ('total_paid', models.BigIntegerField()),
+                ('settled_amount', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('invoice_id', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='payment_events', to='invoicing.invoice')),
+                ('payment_id', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='payment.payment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['payment_id', 'sequence'], name='payment_event_payment_seq')],
+                'constraints': [models.UniqueConstraint(fields=('invoice_id', 'sequence'), name='unique_payment_event_sequence')],
+            },
+        ),
+        migrations.RunPython(seed_ledger, migrations.RunPython.noop),
+    ]
@@ -1 +1,5 @@
-from .payment_model import *
\ No newline at end of file
+from .payment_model import *
+from .payment_rollup_model import *
+from .bank_statement_model import *
+from .payment_ledger_model import *
+from .payment_capture_model import *
@@ -0,0 +1,68 @@
+from django.db import models
+
+from invoicing.models.invoice_models import Invoice
+from payment.models.payment_model import Payment
+
+
+STATEMENT_FORMAT_CHOICES = (
+    ('csv', 'CSV'),
+    ('camt053', 'CAMT.053 (XML)'),
+)
+
+IMPORT_STATUS_CHOICES = (
+    ('En cours', 'En cours'),
+    ('Terminé', 'Terminé'),
+    ('Échec', 'Échec'),
+)
+
+REVIEW_STATUS_CHOICES = (
+    ('À traiter', 'À traiter'),
+    ('Rapproché', 'Rapproché'),
+    ('Ignoré', 'Ignoré'),
+)
+
+
+class BankStatementImport(models.Model):
+    """Import d'un relevé bancaire : compteurs des opérations rapprochées, à vérifier et écartées"""
+    bank_statement_import_id = models.AutoField(primary_key=True)
+    filename = models.CharField(max_length=255)
+    statement_format = models.CharField(max_length=10, choices=STATEMENT_FORMAT_CHOICES)
+    status = models.CharField(max_length=20, choices=IMPORT_STATUS_CHOICES, default='En cours')
+    transactions = models.IntegerField(default=0)
+    matched = models.IntegerField(default=0)
+    to_review = models.IntegerField(default=0)
+    # Débits, montants nuls et opérations déjà importées
+    skipped = models.IntegerField(default=0)
+    elapsed = models.FloatField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Import {self.bank_statement_import_id} - {self.filename} - {self.status}"
+
+
+class BankTransactionReview(models.Model):
+    """Opération bancaire à rapprocher à la main : aucune facture ou plusieurs factures possibles"""
+    bank_transaction_review_id = models.AutoField(primary_key=True)
+    bank_statement_import_id = models.ForeignKey(BankStatementImport, on_delete=models.CASCADE, related_name='reviews')
+    # Identifiant de l'opération dans le relevé (un relevé réimporté ne crée pas de doublon)
+    bank_reference = models.CharField(max_length=100, unique=True)
+    booking_date = models.DateField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    reference = models.TextField(blank=True)
+    counterparty = models.CharField(max_length=255, blank=True)
+    reason = models.CharField(max_length=255)
+    # Factures candidates (identifiants)
+    candidates = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20, choices=REVIEW_STATUS_CHOICES, default='À traiter')
+    invoice_id = models.ForeignKey(Invoice, on_delete=models.SET_NULL, null=True, blank=True, related_name='bank_reviews')
+    payment_id = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='bank_reviews')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'booking_date'], name='bank_review_status_date'),
+        ]
+
+    def __str__(self):
+        return f"Opération {self.bank_reference} - {self.amount} - {self.status}"
@@ -0,0 +1,23 @@
+from django.db import models
+
+from invoicing.models.invoice_models import Invoice
+from payment.models.payment_model import Payment
+
+
+class PaymentCapture(models.Model):
+    """
+    Demande d'encaissement identifiée par sa clé d'idempotence : la réponse est conservée
+    et renvoyée telle quelle lorsque la même demande est rejouée
+    """
+    payment_capture_id = models.AutoField(primary_key=True)
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    # Empreinte des paramètres : une clé réutilisée pour une autre demande est refusée
+    request_fingerprint = models.CharField(max_length=64)
+    invoice_id = models.ForeignKey(Invoice, on_delete=models.SET_NULL, null=True, blank=True, related_name='captures')
+    payment_id = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='captures')
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.idempotency_key} - {self.status_code}"
@@ -0,0 +1,89 @@
+from django.db import models
+
+from invoicing.models.invoice_models import Invoice
+from payment.models.payment_model import METHOD_CHOICES, STATUS_CHOICES, Payment
+
+EVENT_TYPE_CHOICES = (
+    ('Création', 'Création'),
+    ('Changement de statut', 'Changement de statut'),
+    ('Correction du montant', 'Correction du montant'),
+    ('Changement de moyen', 'Changement de moyen'),
+    ('Suppression', 'Suppression'),
+)
+
+
+class PaymentEventQuerySet(models.QuerySet):
+    """Le journal est en ajout seul : les événements ne sont ni modifiés ni supprimés"""
+
+    def update(self, **kwargs):
+        raise ValueError("Le journal des paiements est en ajout seul : un événement ne peut pas être modifié")
+
+    def delete(self):
+        raise ValueError("Le journal des paiements est en ajout seul : un événement ne peut pas être supprimé")
+
+
+class PaymentEvent(models.Model):
+    """
+    Événement du journal des paiements d'une facture, avec le solde de la facture après l'événement.
+    Les clés étrangères sont sans contrainte : l'historique survit à la suppression du paiement ou de la facture.
+    """
+    payment_event_id = models.AutoField(primary_key=True)
+    invoice_id = models.ForeignKey(
+        Invoice, on_delete=models.DO_NOTHING, db_constraint=False, related_name='payment_events'
+    )
+    payment_id = models.ForeignKey(Payment, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events')
+    # Rang de l'événement dans le journal de la facture (version du solde après l'événement)
+    sequence = models.PositiveIntegerField()
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPE_CHOICES)
+    payment_method = models.CharField(max_length=30, choices=METHOD_CHOICES)
+    state_payment = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    previous_state_payment = models.CharField(max_length=20, choices=STATUS_CHOICES, null=True, blank=True)
+    amount = models.IntegerField()
+    previous_amount = models.IntegerField(null=True, blank=True)
+    # Solde de la facture après l'événement : total des paiements et part au statut 'Payé'
+    total_paid = models.BigIntegerField()
+    settled_amount = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = PaymentEventQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['invoice_id', 'sequence'], name='unique_payment_event_sequence'),
+        ]
+        indexes = [
+            models.Index(fields=['payment_id', 'sequence'], name='payment_event_payment_seq'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Le journal des paiements est en ajout seul : un événement ne peut pas être modifié")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Le journal des paiements est en ajout seul : un événement ne peut pas être supprimé")
+
+    def __str__(self):
+        return f"Facture {self.invoice_id_id} #{self.sequence} - {self.event_type} - paiement {self.payment_id_id}"
+
+
+class InvoicePaymentBalance(models.Model):
+    """
+    Solde des paiements d'une facture, mis à jour dans la transaction de chaque événement du journal :
+    lecture en une ligne au lieu de sommer les paiements
+    """
+    invoice_id = models.OneToOneField(
+        Invoice, on_delete=models.CASCADE, primary_key=True, related_name='payment_balance'
+    )
+    # Somme de tous les paiements (comme Invoice.total_paid) et des seuls paiements 'Payé'
+    total_paid = models.BigIntegerField(default=0)
+    settled_amount = models.BigIntegerField(default=0)
+    payment_count = models.IntegerField(default=0)
+    pending_payment_count = models.IntegerField(default=0)
+    in_progress_payment_count = models.IntegerField(default=0)
+    # Séquence du dernier événement appliqué
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Facture {self.invoice_id_id} - payé {self.total_paid} (v{self.version})"
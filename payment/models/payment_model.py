@@ -11,10 +11,15 @@ METHOD_CHOICES = (
 
 STATUS_CHOICES = (
     ('En attente', 'En attente'),
-    ('En cours ', 'En cours'),
+    ('En cours', 'En cours'),
     ('Payé', 'Payé'),
 )
 
+
+def normalize_state_payment(state_payment):
+    """Statut de paiement sans espaces superflus (l'ancienne valeur 'En cours ' devient 'En cours')"""
+    return state_payment.strip() if isinstance(state_payment, str) else state_payment
+
 class Payment(models.Model):
     payment_id = models.AutoField(primary_key=True)
     slug = models.SlugField(null=True)
@@ -22,4 +27,12 @@ class Payment(models.Model):
     state_payment = models.CharField(max_length=20, choices=STATUS_CHOICES, default='En attente')
     invoice_id = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='payments')
     amount = models.IntegerField()
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Identifiant de l'opération bancaire d'origine (paiements importés d'un relevé)
+    bank_reference = models.CharField(max_length=100, null=True, blank=True, unique=True)
+
+    class Meta:
+        indexes = [
+            # Sommes des paiements d'une facture par statut (balance âgée) lues dans l'index seul
+            models.Index(fields=['invoice_id', 'state_payment', 'amount'], name='payment_invoice_state_amount'),
+        ]
\ No newline at end of file
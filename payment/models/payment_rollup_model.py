@@ -0,0 +1,29 @@
+from django.db import models
+
+from commons.models.contact_models import Contact
+from payment.models.payment_model import STATUS_CHOICES
+
+
+class PaymentMonthlyRevenue(models.Model):
+    """Cumul mensuel des paiements par statut et par contact, maintenu à chaque écriture de paiement"""
+    payment_monthly_revenue_id = models.AutoField(primary_key=True)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    state_payment = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    contact_id = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name='payment_monthly_revenues')
+    revenue = models.BigIntegerField(default=0)
+    payment_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['year', 'month', 'state_payment', 'contact_id'],
+                name='unique_payment_monthly_revenue_bucket',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['state_payment', 'year', 'month'], name='payment_rollup_state_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:02d}/{self.year} - {self.state_payment} - {self.revenue}"
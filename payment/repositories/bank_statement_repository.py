@@ -0,0 +1,72 @@
+from invoicing.models.invoice_models import Invoice
+from payment.models import BankStatementImport, BankTransactionReview, Payment
+from payment.repositories.payment_ledger_repository import PaymentLedgerRepository
+from payment.repositories.payment_rollup_repository import PaymentRollupRepository
+
+
+class BankStatementRepository:
+    """Accès aux imports de relevés bancaires, à leur file de vérification et aux paiements importés"""
+
+    def __init__(self):
+        self.rollup_repo = PaymentRollupRepository()
+        self.ledger_repo = PaymentLedgerRepository()
+
+    def get_open_invoices(self):
+        """Factures confirmées ou comptabilisées avec un reste à payer, et le nom de leur contact (une requête)"""
+        return (
+            Invoice.objects
+            .filter(status__in=('Confirmé', 'Comptabilisé'))
+            .with_payment_totals()
+            .filter(remaining_amount__gt=0)
+            .values('invoice_id', 'contact_id', 'contact_id__first_name', 'contact_id__last_name', 'remaining_amount')
+            .iterator(chunk_size=5000)
+        )
+
+    def get_known_references(self, bank_references):
+        """Références d'opérations déjà importées, en paiement ou en file de vérification"""
+        known = set(Payment.objects.filter(bank_reference__in=bank_references).values_list('bank_reference', flat=True))
+        known.update(
+            BankTransactionReview.objects.filter(bank_reference__in=bank_references).values_list('bank_reference', flat=True)
+        )
+        return known
+
+    def create_import(self, filename, statement_format):
+        return BankStatementImport.objects.create(filename=filename, statement_format=statement_format)
+
+    def save_import(self, statement_import):
+        statement_import.save()
+        return statement_import
+
+    def save_batch(self, payments, reviews):
+        """Enregistrer un lot : paiements rapprochés (journalisés avec le solde de leur facture) et opérations à vérifier"""
+        created = Payment.objects.bulk_create(payments, batch_size=1000)
+        self.ledger_repo.record_created_many(created)
+        BankTransactionReview.objects.bulk_create(reviews, batch_size=1000)
+        return created
+
+    def add_to_rollup(self, entries):
+        """Reporter les paiements importés dans le cumul mensuel : (created_at, state_payment, contact_id, amount)"""
+        self.rollup_repo.add_many(entries)
+
+    def get_reviews(self, status='À traiter'):
+        return (
+            BankTransactionReview.objects
+            .filter(status=status)
+            .order_by('booking_date', 'bank_transaction_review_id')
+        )
+
+    def count_reviews(self, status='À traiter'):
+        return BankTransactionReview.objects.filter(status=status).count()
+
+    def get_review(self, review_id):
+        try:
+            return BankTransactionReview.objects.get(bank_transaction_review_id=review_id)
+        except BankTransactionReview.DoesNotExist:
+            raise ValueError(f"Opération à vérifier avec l'ID {review_id} non trouvée")
+
+    def save_review(self, review):
+        review.save()
+        return review
+
+    def get_recent_imports(self, limit=10):
+        return BankStatementImport.objects.order_by('-created_at')[:limit]
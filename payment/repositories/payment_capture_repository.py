@@ -0,0 +1,33 @@
+from invoicing.models.invoice_models import Invoice
+from payment.models import PaymentCapture
+
+
+class PaymentCaptureRepository:
+    """Accès aux demandes d'encaissement idempotentes et verrouillage de la facture à encaisser"""
+
+    def get_capture(self, idempotency_key):
+        """Demande déjà traitée pour cette clé (lecture par l'index unique), None sinon"""
+        return PaymentCapture.objects.filter(idempotency_key=idempotency_key).first()
+
+    def lock_invoice(self, invoice_id):
+        """
+        Facture verrouillée jusqu'à la fin de la transaction, avec le solde de ses paiements :
+        les encaissements concurrents d'une même facture passent l'un après l'autre
+        """
+        return (
+            Invoice.objects
+            .select_for_update(of=('self',))
+            .select_related('payment_balance')
+            .filter(invoice_id=invoice_id)
+            .first()
+        )
+
+    def create_capture(self, idempotency_key, request_fingerprint, invoice_id, payment, status_code, response):
+        return PaymentCapture.objects.create(
+            idempotency_key=idempotency_key,
+            request_fingerprint=request_fingerprint,
+            invoice_id_id=invoice_id,
+            payment_id=payment,
+            status_code=status_code,
+            response=response,
+        )
@@ -0,0 +1,230 @@
+from collections import defaultdict
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from commons.repositories.unit_of_work import discard
+from invoicing.models.invoice_models import Invoice
+from payment.models import InvoicePaymentBalance, Payment, PaymentEvent
+
+
+class PaymentLedgerRepository:
+    """
+    Journal des paiements en ajout seul et solde par facture. Chaque écriture verrouille le solde de la facture,
+    lui applique l'événement puis ajoute l'événement avec le solde obtenu : à appeler dans la transaction
+    de l'écriture du paiement.
+    """
+
+    BALANCE_FIELDS = ('total_paid', 'settled_amount', 'payment_count', 'pending_payment_count', 'in_progress_payment_count')
+
+    @staticmethod
+    def _count_field(state_payment):
+        return {'En attente': 'pending_payment_count', 'En cours': 'in_progress_payment_count'}.get(state_payment)
+
+    def _deltas(self, state_payment, amount, count):
+        """Variations du solde pour ajouter (count=1) ou retirer (count=-1) un paiement"""
+        deltas = {
+            'total_paid': count * amount,
+            'settled_amount': count * amount if state_payment == 'Payé' else 0,
+            'payment_count': count,
+        }
+        count_field = self._count_field(state_payment)
+        if count_field:
+            deltas[count_field] = count
+        return deltas
+
+    def _apply(self, balance, state_payment, amount, count):
+        for name, delta in self._deltas(state_payment, amount, count).items():
+            setattr(balance, name, getattr(balance, name) + delta)
+
+    def _lock_balances(self, invoice_ids):
+        """Soldes des factures verrouillés (créés à zéro au premier paiement), par ordre d'ID contre les interblocages"""
+        invoice_ids = sorted(set(invoice_ids))
+        locked = InvoicePaymentBalance.objects.select_for_update().order_by('invoice_id')
+        balances = {balance.invoice_id_id: balance for balance in locked.filter(invoice_id__in=invoice_ids)}
+        missing = [invoice_id for invoice_id in invoice_ids if invoice_id not in balances]
+        if missing:
+            InvoicePaymentBalance.objects.bulk_create(
+                [InvoicePaymentBalance(invoice_id_id=invoice_id) for invoice_id in missing], ignore_conflicts=True,
+            )
+            balances.update((balance.invoice_id_id, balance) for balance in locked.filter(invoice_id__in=missing))
+        return balances
+
+    def _event(self, balance, payment, event_type, previous_state_payment=None, previous_amount=None):
+        balance.version += 1
+        return PaymentEvent(
+            invoice_id_id=balance.invoice_id_id,
+            payment_id_id=payment.payment_id,
+            sequence=balance.version,
+            event_type=event_type,
+            payment_method=payment.payment_method,
+            state_payment=payment.state_payment,
+            previous_state_payment=previous_state_payment,
+            amount=payment.amount,
+            previous_amount=previous_amount,
+            total_paid=balance.total_paid,
+            settled_amount=balance.settled_amount,
+        )
+
+    def _save(self, balances, events):
+        PaymentEvent.objects.bulk_create(events)
+        for balance in balances:
+            balance.save()
+        self._discard_invoices(balances)
+
+    def _discard_invoices(self, balances):
+        # Une facture de l'unité de travail peut porter son ancien solde (Invoice.total_paid) : elle sera relue
+        discard(Invoice, [balance.invoice_id_id for balance in balances])
+
+    def record_created(self, payment):
+        """Journaliser la création d'un paiement"""
+        balance = self._lock_balances([payment.invoice_id_id])[payment.invoice_id_id]
+        self._apply(balance, payment.state_payment, payment.amount, 1)
+        self._save([balance], [self._event(balance, payment, 'Création')])
+
+    def record_updated(self, previous, payment):
+        """
+        Journaliser la modification d'un paiement : `previous` est le paiement avant modification.
+        Un paiement déplacé vers une autre facture est supprimé du journal de l'ancienne et créé dans la nouvelle.
+        """
+        balances = self._lock_balances([previous.invoice_id_id, payment.invoice_id_id])
+        if previous.invoice_id_id != payment.invoice_id_id:
+            old_balance, balance = balances[previous.invoice_id_id], balances[payment.invoice_id_id]
+            self._apply(old_balance, previous.state_payment, previous.amount, -1)
+            self._apply(balance, payment.state_payment, payment.amount, 1)
+            self._save([old_balance, balance], [
+                self._event(old_balance, previous, 'Suppression'),
+                self._event(balance, payment, 'Création'),
+            ])
+            return
+
+        balance = balances[payment.invoice_id_id]
+        self._apply(balance, previous.state_payment, previous.amount, -1)
+        self._apply(balance, payment.state_payment, payment.amount, 1)
+        # Un événement par changement ; les soldes intermédiaires sont ceux après l'ensemble de la modification
+        events = []
+        if previous.state_payment != payment.state_payment:
+            events.append(self._event(balance, payment, 'Changement de statut', previous_state_payment=previous.state_payment))
+        if previous.amount != payment.amount:
+            events.append(self._event(balance, payment, 'Correction du montant', previous_amount=previous.amount))
+        if previous.payment_method != payment.payment_method:
+            events.append(self._event(balance, payment, 'Changement de moyen'))
+        if events:
+            self._save([balance], events)
+
+    def record_deleted(self, payment):
+        """Journaliser la suppression d'un paiement"""
+        balance = self._lock_balances([payment.invoice_id_id])[payment.invoice_id_id]
+        self._apply(balance, payment.state_payment, payment.amount, -1)
+        self._save([balance], [self._event(balance, payment, 'Suppression')])
+
+    def record_created_many(self, payments):
+        """Journaliser des paiements créés en lot : soldes verrouillés et écrits en quelques requêtes"""
+        if not payments:
+            return
+        balances = self._lock_balances(payment.invoice_id_id for payment in payments)
+        events = []
+        for payment in payments:
+            balance = balances[payment.invoice_id_id]
+            self._apply(balance, payment.state_payment, payment.amount, 1)
+            events.append(self._event(balance, payment, 'Création'))
+        PaymentEvent.objects.bulk_create(events, batch_size=1000)
+        InvoicePaymentBalance.objects.bulk_create(
+            balances.values(),
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['invoice_id'],
+            update_fields=self.BALANCE_FIELDS + ('version', 'updated_at'),
+        )
+        self._discard_invoices(balances.values())
+
+    def record_invoice_deleted(self, invoice_id):
+        """Journaliser la suppression des paiements d'une facture supprimée (le solde part avec la facture)"""
+        payments = list(Payment.objects.filter(invoice_id=invoice_id).order_by('payment_id'))
+        if not payments:
+            return
+        balance = self._lock_balances([invoice_id])[invoice_id]
+        events = []
+        for payment in payments:
+            self._apply(balance, payment.state_payment, payment.amount, -1)
+            events.append(self._event(balance, payment, 'Suppression'))
+        self._save([balance], events)
+
+    def get_balance(self, invoice_id):
+        """Solde des paiements de la facture, None si aucun paiement n'a été journalisé"""
+        return InvoicePaymentBalance.objects.filter(invoice_id=invoice_id).first()
+
+    def get_events(self, invoice_id):
+        return PaymentEvent.objects.filter(invoice_id=invoice_id).order_by('sequence')
+
+    def replay(self):
+        """Soldes par facture recalculés en rejouant le journal dans l'ordre : {invoice_id: {champ: valeur}}"""
+        balances = defaultdict(lambda: dict.fromkeys(self.BALANCE_FIELDS + ('version',), 0))
+        # Dernier état connu de chaque paiement, pour retirer l'ancienne valeur lors d'une modification
+        current = {}
+        events = PaymentEvent.objects.order_by('invoice_id', 'sequence').values(
+            'invoice_id', 'payment_id', 'sequence', 'event_type', 'state_payment', 'amount',
+        )
+        for event in events.iterator(chunk_size=5000):
+            balance = balances[event['invoice_id']]
+            key = (event['invoice_id'], event['payment_id'])
+            changes = []
+            if key in current:
+                changes.append(current.pop(key) + (-1,))
+            if event['event_type'] != 'Suppression':
+                current[key] = (event['state_payment'], event['amount'])
+                changes.append(current[key] + (1,))
+            for state_payment, amount, count in changes:
+                for name, delta in self._deltas(state_payment, amount, count).items():
+                    balance[name] += delta
+            balance['version'] = event['sequence']
+        return dict(balances)
+
+    def rebuild(self):
+        """Reconstruire les soldes des factures existantes en rejouant le journal"""
+        replayed = self.replay()
+        invoice_ids = set(Invoice.objects.values_list('invoice_id', flat=True))
+        InvoicePaymentBalance.objects.all().delete()
+        rows = [
+            InvoicePaymentBalance(invoice_id_id=invoice_id, **values)
+            for invoice_id, values in replayed.items()
+            if invoice_id in invoice_ids
+        ]
+        InvoicePaymentBalance.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    def compute_from_payments(self):
+        """Soldes attendus calculés depuis la table des paiements (requête groupée par facture)"""
+        return (
+            Payment.objects
+            .values('invoice_id')
+            .annotate(
+                total_paid=Sum('amount'),
+                settled_amount=Coalesce(Sum('amount', filter=Q(state_payment='Payé')), 0),
+                payment_count=Count('payment_id'),
+                pending_payment_count=Count('payment_id', filter=Q(state_payment='En attente')),
+                in_progress_payment_count=Count('payment_id', filter=Q(state_payment='En cours')),
+            )
+            .order_by('invoice_id')
+        )
+
+    def verify(self):
+        """Comparer les soldes stockés aux paiements, retourne la liste des écarts"""
+        expected = {
+            row['invoice_id']: tuple(row[name] for name in self.BALANCE_FIELDS) for row in self.compute_from_payments()
+        }
+        stored = {
+            row['invoice_id']: tuple(row[name] for name in self.BALANCE_FIELDS)
+            for row in InvoicePaymentBalance.objects.values('invoice_id', *self.BALANCE_FIELDS)
+        }
+        empty = (0,) * len(self.BALANCE_FIELDS)
+
+        differences = []
+        for invoice_id in sorted(set(expected) | set(stored)):
+            if expected.get(invoice_id, empty) != stored.get(invoice_id, empty):
+                differences.append({
+                    'invoice_id': invoice_id,
+                    'expected': dict(zip(self.BALANCE_FIELDS, expected.get(invoice_id, empty))),
+                    'stored': dict(zip(self.BALANCE_FIELDS, stored.get(invoice_id, empty))),
+                })
+        return differences
@@ -1,13 +1,26 @@
-from payment.models import Payment
+import copy
+
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Concat, Trunc
+
+from payment.models import Payment, normalize_state_payment
+from payment.repositories.payment_ledger_repository import PaymentLedgerRepository
+from payment.repositories.payment_rollup_repository import PaymentRollupRepository
+from commons.repositories.unit_of_work import get_by_pk
 from invoicing.models.invoice_models import Invoice
 
 
 class PaymentRepository:
 
-    def create_payment(self, payment_method, state_payment, invoice_id, amount):
+    def __init__(self):
+        self.rollup_repo = PaymentRollupRepository()
+        self.ledger_repo = PaymentLedgerRepository()
+
+    def create_payment(self, payment_method, state_payment, invoice_id, amount, bank_reference=None):
         # Récupérer l'instance Invoice et vérifier statut
         try:
-            invoice = Invoice.objects.get(invoice_id=invoice_id)
+            invoice = get_by_pk(Invoice, invoice_id)
             # Vérifier que la facture est au minimum "Confirmé" pour créer un paiement
             valid_statuses = ['Confirmé', 'Comptabilisé']
             if invoice.status not in valid_statuses:
@@ -15,15 +28,25 @@ class PaymentRepository:
         except Invoice.DoesNotExist:
             raise ValueError(f"La facture avec l'ID {invoice_id} n'existe pas")
 
-        return Payment.objects.create(
-            payment_method=payment_method,
-            state_payment=state_payment,
-            invoice_id=invoice,
-            amount=amount
-        )
+        return self.insert_payment(invoice, payment_method, state_payment, amount, bank_reference)
+
+    def insert_payment(self, invoice, payment_method, state_payment, amount, bank_reference=None):
+        """Enregistrer un paiement sur une facture déjà chargée (et contrôlée par l'appelant)"""
+        # Le cumul mensuel et le journal de la facture sont mis à jour dans la même transaction que le paiement
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                payment_method=payment_method,
+                state_payment=normalize_state_payment(state_payment),
+                invoice_id=invoice,
+                amount=amount,
+                bank_reference=bank_reference,
+            )
+            self.rollup_repo.add_payment(payment, invoice.contact_id_id)
+            self.ledger_repo.record_created(payment)
+        return payment
 
     def get_payment_by_id(self, payment_id):
-        return Payment.objects.get(payment_id=payment_id)
+        return get_by_pk(Payment, payment_id)
 
     def get_payments_by_invoice_id(self, invoice_id):
         return Payment.objects.filter(invoice_id=invoice_id).order_by('-created_at')
@@ -31,37 +54,126 @@ class PaymentRepository:
     # récupération status facture pour valider paiement
     def get_invoice_status(self, invoice_id):
         """Récupérer le statut d'une facture par son ID"""
-        invoice = Invoice.objects.get(invoice_id=invoice_id)
-        return invoice.status
+        return get_by_pk(Invoice, invoice_id).status
 
     def get_all_payments(self):
         return Payment.objects.all().order_by('payment_id')
 
     def update_payment(self, payment_id, payment_method, state_payment, invoice_id, amount):
-        payment = Payment.objects.get(payment_id=payment_id)
-        payment.payment_method = payment_method
-        payment.state_payment = state_payment
-        payment.invoice_id = invoice_id
-        payment.amount = amount
-        payment.save()
+        invoice = invoice_id if isinstance(invoice_id, Invoice) else Invoice.objects.get(invoice_id=invoice_id)
+        with transaction.atomic():
+            payment = Payment.objects.select_related('invoice_id').get(payment_id=payment_id)
+            # Retirer l'ancien état du cumul avant d'appliquer le nouveau (statut, montant ou facture)
+            self.rollup_repo.remove_payment(payment, payment.invoice_id.contact_id_id)
+            previous = copy.copy(payment)
+            payment.payment_method = payment_method
+            payment.state_payment = normalize_state_payment(state_payment)
+            payment.invoice_id = invoice
+            payment.amount = amount
+            payment.save()
+            self.rollup_repo.add_payment(payment, invoice.contact_id_id)
+            self.ledger_repo.record_updated(previous, payment)
         return payment
 
     def delete_payment(self, payment_id):
-        payment = Payment.objects.get(payment_id=payment_id)
-        payment.delete()
+        with transaction.atomic():
+            payment = Payment.objects.select_related('invoice_id').get(payment_id=payment_id)
+            self.rollup_repo.remove_payment(payment, payment.invoice_id.contact_id_id)
+            self.ledger_repo.record_deleted(payment)
+            payment.delete()
         return True
 
     def get_state_payment(self, payment_id):
         """Récupérer le statut d'un paiement par son ID"""
-        payment = Payment.objects.get(payment_id=payment_id)
-        return payment.state_payment
+        return get_by_pk(Payment, payment_id).state_payment
 
     def get_state_invoice_payment(self, invoice_id):
-        """Récupérer le statut de paiement d'une facture par son ID"""
-        invoice = Invoice.objects.get(invoice_id=invoice_id)
+        """
+        Facture entièrement payée ou non, d'après le solde tenu par le journal des paiements (une ligne lue).
+        Chaque écriture du journal retire la facture de l'unité de travail : le solde lu avec elle reste à jour.
+        """
+        invoice = get_by_pk(Invoice, invoice_id, Invoice.objects.select_related('payment_balance'))
         return invoice.is_paid
 
+    def get_invoice_balance(self, invoice_id):
+        """Solde des paiements de la facture (None avant le premier paiement)"""
+        return self.ledger_repo.get_balance(invoice_id)
+
+    def get_payment_events(self, invoice_id):
+        """Journal des paiements de la facture, dans l'ordre"""
+        return self.ledger_repo.get_events(invoice_id)
+
+    def get_payment_status_counts(self, invoice_ids):
+        """
+        Pour chaque facture : nombre de paiements (total, 'En attente', 'En cours') et couverture du montant,
+        en une requête (sous-requêtes groupées par facture sur les paiements)
+        """
+        return (
+            Invoice.objects.filter(invoice_id__in=invoice_ids)
+            .with_payment_totals()
+            .with_payment_counts()
+            .values('invoice_id', 'payment_count', 'pending_payment_count', 'in_progress_payment_count', 'is_paid')
+        )
+
     def get_payment_id(self, invoice_id):
         """Récupérer l'ID du paiement associé à une facture par son ID"""
         payment = Payment.objects.filter(invoice_id=invoice_id).first()
         return payment.payment_id if payment else None
+
+    def _filter_payments(self, state_payment, start=None, end=None):
+        """Paiements d'un statut donné, bornés sur [start, end[ si précisé"""
+        payments = Payment.objects.filter(state_payment=state_payment)
+        if start is not None:
+            payments = payments.filter(created_at__gte=start)
+        if end is not None:
+            payments = payments.filter(created_at__lt=end)
+        return payments
+
+    def get_total_revenue(self, state_payment, start=None, end=None):
+        """Somme des montants des paiements d'un statut (calculée en base)"""
+        total = self._filter_payments(state_payment, start, end).aggregate(total=Sum('amount'))['total']
+        return total or 0
+
+    def get_revenue_by_period(self, state_payment, start=None, end=None, granularity='month'):
+        """Somme et nombre des paiements d'un statut par période ('day', 'week', 'month', 'quarter', 'year')"""
+        return (
+            self._filter_payments(state_payment, start, end)
+            .annotate(period=Trunc('created_at', granularity))
+            .values('period')
+            .annotate(total=Sum('amount'), count=Count('payment_id'))
+            .order_by('period')
+        )
+
+    def get_top_clients(self, state_payment, limit=5, start=None, end=None):
+        """Classement des contacts par montant payé : une jointure paiement → facture → contact groupée"""
+        return (
+            self._filter_payments(state_payment, start, end)
+            .values(
+                contact=F('invoice_id__contact_id'),
+                first_name=F('invoice_id__contact_id__first_name'),
+                last_name=F('invoice_id__contact_id__last_name'),
+            )
+            .annotate(revenue=Sum('amount'))
+            .order_by('-revenue', 'contact')[:limit]
+        )
+
+    def get_payments_for_export(self, start=None, end=None, status=None, contact_id=None):
+        """Paiements avec leur facture et le nom du contact (une requête)"""
+        payments = Payment.objects.all()
+        if start is not None:
+            payments = payments.filter(created_at__gte=start)
+        if end is not None:
+            payments = payments.filter(created_at__lt=end)
+        if status is not None:
+            payments = payments.filter(state_payment=status)
+        if contact_id is not None:
+            payments = payments.filter(invoice_id__contact_id=contact_id)
+        return (
+            payments
+            .annotate(
+                invoice=F('invoice_id'),
+                contact_name=Concat('invoice_id__contact_id__first_name', Value(' '), 'invoice_id__contact_id__last_name'),
+            )
+            .values('payment_id', 'invoice', 'contact_name', 'payment_method', 'state_payment', 'amount', 'created_at')
+            .order_by('payment_id')
+        )
@@ -0,0 +1,168 @@
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from payment.models import Payment, PaymentMonthlyRevenue
+
+
+class PaymentRollupRepository:
+    """Accès au cumul mensuel des paiements (PaymentMonthlyRevenue)"""
+
+    def _bucket(self, created_at, state_payment, contact_id):
+        """Clé du cumul d'un paiement : mois local de création, statut et contact"""
+        created_at = timezone.localtime(created_at) if timezone.is_aware(created_at) else created_at
+        return {
+            'year': created_at.year,
+            'month': created_at.month,
+            'state_payment': state_payment,
+            'contact_id_id': contact_id,
+        }
+
+    def add(self, created_at, state_payment, contact_id, amount, count=1):
+        """Ajouter (ou retirer avec des valeurs négatives) un montant au cumul du mois"""
+        bucket = self._bucket(created_at, state_payment, contact_id)
+        rollups = PaymentMonthlyRevenue.objects.filter(**bucket)
+        changes = {'revenue': F('revenue') + amount, 'payment_count': F('payment_count') + count}
+        updated = rollups.update(**changes)
+        if not updated and count > 0:
+            # Premier paiement du cumul : ligne vide créée (ou récupérée si un paiement concurrent vient de la créer,
+            # get_or_create relisant la ligne après l'IntegrityError) puis incrémentée comme les autres
+            PaymentMonthlyRevenue.objects.get_or_create(**bucket)
+            rollups.update(**changes)
+        elif count < 0:
+            # Supprimer les cumuls vidés pour garder la table compacte
+            PaymentMonthlyRevenue.objects.filter(payment_count__lte=0, **bucket).delete()
+
+    def add_many(self, entries):
+        """
+        Ajouter en lot des paiements au cumul : `entries` est une liste de (created_at, state_payment, contact_id,
+        amount). Les cumuls concernés sont lus puis mis à jour ou créés en quelques requêtes, quel que soit le volume
+        """
+        totals = {}
+        for created_at, state_payment, contact_id, amount in entries:
+            bucket = self._bucket(created_at, state_payment, contact_id)
+            key = (bucket['year'], bucket['month'], bucket['state_payment'], bucket['contact_id_id'])
+            revenue, count = totals.get(key, (0, 0))
+            totals[key] = (revenue + amount, count + 1)
+
+        periods = {}
+        for year, month, state_payment, contact_id in totals:
+            periods.setdefault((year, month, state_payment), set()).add(contact_id)
+
+        rows = []
+        for (year, month, state_payment), contact_ids in periods.items():
+            existing = {
+                row.contact_id_id: row
+                for row in PaymentMonthlyRevenue.objects.select_for_update().filter(
+                    year=year, month=month, state_payment=state_payment, contact_id__in=contact_ids,
+                )
+            }
+            for contact_id in contact_ids:
+                revenue, count = totals[(year, month, state_payment, contact_id)]
+                row = existing.get(contact_id)
+                if row is None:
+                    row = PaymentMonthlyRevenue(
+                        year=year, month=month, state_payment=state_payment, contact_id_id=contact_id,
+                        revenue=0, payment_count=0,
+                    )
+                row.revenue += revenue
+                row.payment_count += count
+                rows.append(row)
+
+        # Un seul INSERT ... ON CONFLICT DO UPDATE par lot, plutôt qu'un bulk_update en CASE WHEN
+        PaymentMonthlyRevenue.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['year', 'month', 'state_payment', 'contact_id'],
+            update_fields=['revenue', 'payment_count'],
+        )
+
+    def add_payment(self, payment, contact_id):
+        """Comptabiliser un paiement dans le cumul"""
+        self.add(payment.created_at, payment.state_payment, contact_id, payment.amount, 1)
+
+    def remove_payment(self, payment, contact_id):
+        """Retirer un paiement du cumul"""
+        self.add(payment.created_at, payment.state_payment, contact_id, -payment.amount, -1)
+
+    def move_invoice_payments(self, invoice_id, previous_contact_id, contact_id):
+        """Déplacer les paiements d'une facture vers le cumul de son nouveau contact (dans la transaction du changement)"""
+        for payment in Payment.objects.filter(invoice_id=invoice_id):
+            self.remove_payment(payment, previous_contact_id)
+            self.add_payment(payment, contact_id)
+
+    def remove_payments_of_invoice(self, invoice_id):
+        """Retirer du cumul tous les paiements d'une facture (avant sa suppression en cascade)"""
+        payments = Payment.objects.filter(invoice_id=invoice_id).select_related('invoice_id')
+        for payment in payments:
+            self.remove_payment(payment, payment.invoice_id.contact_id_id)
+
+    def compute_from_payments(self):
+        """Recalculer les cumuls depuis la table des paiements, en une requête groupée"""
+        return (
+            Payment.objects
+            .annotate(year=ExtractYear('created_at'), month=ExtractMonth('created_at'))
+            .values('year', 'month', 'state_payment', contact=F('invoice_id__contact_id'))
+            .annotate(revenue=Sum('amount'), payment_count=Count('payment_id'))
+            .order_by('year', 'month', 'state_payment', 'contact')
+        )
+
+    def rebuild(self):
+        """Reconstruire entièrement la table des cumuls"""
+        with transaction.atomic():
+            PaymentMonthlyRevenue.objects.all().delete()
+            rows = [
+                PaymentMonthlyRevenue(
+                    year=row['year'],
+                    month=row['month'],
+                    state_payment=row['state_payment'],
+                    contact_id_id=row['contact'],
+                    revenue=row['revenue'],
+                    payment_count=row['payment_count'],
+                )
+                for row in self.compute_from_payments()
+            ]
+            PaymentMonthlyRevenue.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    def verify(self):
+        """Comparer les cumuls stockés aux paiements, retourne la liste des écarts"""
+        expected = {
+            (row['year'], row['month'], row['state_payment'], row['contact']): (row['revenue'], row['payment_count'])
+            for row in self.compute_from_payments()
+        }
+        stored = {
+            (row.year, row.month, row.state_payment, row.contact_id_id): (row.revenue, row.payment_count)
+            for row in PaymentMonthlyRevenue.objects.all()
+        }
+
+        differences = []
+        for key in sorted(set(expected) | set(stored), key=str):
+            if expected.get(key) != stored.get(key):
+                differences.append({
+                    'year': key[0],
+                    'month': key[1],
+                    'state_payment': key[2],
+                    'contact_id': key[3],
+                    'expected': expected.get(key, (0, 0)),
+                    'stored': stored.get(key, (0, 0)),
+                })
+        return differences
+
+    def get_revenue_by_month(self, state_payment, start=None, end=None):
+        """Cumul par mois d'un statut sur [start, end[ (premiers jours de mois)"""
+        rollups = PaymentMonthlyRevenue.objects.filter(state_payment=state_payment)
+        if start is not None or end is not None:
+            rollups = rollups.annotate(period=F('year') * 12 + F('month'))
+        if start is not None:
+            rollups = rollups.filter(period__gte=start.year * 12 + start.month)
+        if end is not None:
+            rollups = rollups.filter(period__lt=end.year * 12 + end.month)
+        return (
+            rollups
+            .values('year', 'month')
+            .annotate(revenue=Sum('revenue'), count=Sum('payment_count'))
+            .order_by('year', 'month')
+        )
@@ -0,0 +1,197 @@
+import csv
+import hashlib
+import io
+import unicodedata
+import xml.etree.ElementTree as ElementTree
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+
+@dataclass
+class BankTransaction:
+    """Opération créditrice d'un relevé bancaire"""
+    bank_reference: str
+    booking_date: date
+    amount: Decimal
+    reference: str = ''
+    counterparty: str = ''
+
+
+def normalize_text(value):
+    """Texte en minuscules, sans accents ni espaces superflus (comparaison des libellés et des noms)"""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(value.lower().split())
+
+
+def parse_amount(value):
+    """Montant au format bancaire français ou international : '1 234,56', '-12.50', '+80'"""
+    cleaned = (value or '').replace(' ', '').replace(' ', '').replace(' ', '')
+    if ',' in cleaned and '.' in cleaned:
+        cleaned = cleaned.replace('.', '') if cleaned.rfind(',') > cleaned.rfind('.') else cleaned.replace(',', '')
+    try:
+        return Decimal(cleaned.replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"Montant invalide : {value}")
+
+
+def parse_booking_date(value):
+    """Date au format AAAA-MM-JJ (éventuellement suivie d'une heure) ou JJ/MM/AAAA"""
+    value = (value or '').strip()
+    try:
+        if '/' in value:
+            # Découpage direct plutôt que strptime, sensiblement plus lent sur un relevé de plusieurs milliers de lignes
+            day, month, year = value.split('/')
+            return date(int(year), int(month), int(day))
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        raise ValueError(f"Date invalide : {value}")
+
+
+def synthetic_reference(*parts):
+    """Identifiant stable d'une opération sans identifiant bancaire (date, montant, libellé, rang)"""
+    return 'h:' + hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class CsvStatementParser:
+    """
+    Relevé CSV (séparateur ';' ou ',', ligne d'en-tête obligatoire), lu ligne à ligne.
+    Colonnes reconnues : date et montant obligatoires ; identifiant, libellé et contrepartie facultatifs.
+    """
+
+    COLUMNS = {
+        'bank_reference': ('id', 'identifiant', 'reference operation', 'ref operation', 'transaction'),
+        'booking_date': ('date', 'date operation', 'date comptable', 'date de valeur'),
+        'amount': ('montant', 'amount', 'credit'),
+        'reference': ('libelle', 'reference', 'communication', 'motif'),
+        'counterparty': ('contrepartie', 'emetteur', 'tiers', 'nom'),
+    }
+
+    def _columns(self, header):
+        positions = {}
+        normalized = [normalize_text(name) for name in header]
+        for field, aliases in self.COLUMNS.items():
+            for alias in aliases:
+                if alias in normalized:
+                    positions[field] = normalized.index(alias)
+                    break
+        missing = [field for field in ('booking_date', 'amount') if field not in positions]
+        if missing:
+            raise ValueError(f"Colonne(s) obligatoire(s) absente(s) du relevé CSV : {', '.join(missing)}")
+        return positions
+
+    def parse(self, stream):
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        header_line = text.readline()
+        delimiter = ';' if header_line.count(';') >= header_line.count(',') else ','
+        columns = self._columns(next(csv.reader([header_line], delimiter=delimiter)))
+
+        seen = {}
+        for line_number, row in enumerate(csv.reader(text, delimiter=delimiter), start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            values = {field: row[position].strip() if position < len(row) else '' for field, position in columns.items()}
+            try:
+                booking_date = parse_booking_date(values['booking_date'])
+                amount = parse_amount(values['amount'])
+            except ValueError as e:
+                raise ValueError(f"Ligne {line_number} : {e}")
+
+            bank_reference = values.get('bank_reference')
+            if not bank_reference:
+                # Deux opérations identiques le même jour restent distinctes grâce à leur rang
+                key = (booking_date, amount, values.get('reference', ''), values.get('counterparty', ''))
+                seen[key] = seen.get(key, 0) + 1
+                bank_reference = synthetic_reference(*key, seen[key])
+            yield BankTransaction(
+                bank_reference=bank_reference,
+                booking_date=booking_date,
+                amount=amount,
+                reference=values.get('reference', ''),
+                counterparty=values.get('counterparty', ''),
+            )
+
+
+class Camt053StatementParser:
+    """
+    Relevé ISO 20022 CAMT.053 lu en flux (iterparse) : chaque écriture (Ntry) est traitée puis libérée,
+    la mémoire ne dépend pas de la taille du relevé. Les débits sont retournés avec un montant négatif.
+    """
+
+    @staticmethod
+    def _local(tag):
+        return tag.rsplit('}', 1)[-1]
+
+    def _find(self, element, *path):
+        """Premier descendant suivant le chemin de noms locaux (espaces de noms ignorés)"""
+        for name in path:
+            element = next((child for child in element if self._local(child.tag) == name), None)
+            if element is None:
+                return None
+        return element
+
+    def _text(self, element, *path):
+        found = self._find(element, *path)
+        return (found.text or '').strip() if found is not None else ''
+
+    def _entry(self, entry, position):
+        amount = parse_amount(self._text(entry, 'Amt'))
+        if self._text(entry, 'CdtDbtInd') == 'DBIT':
+            amount = -amount
+        booking_date = parse_booking_date(self._text(entry, 'BookgDt', 'Dt') or self._text(entry, 'BookgDt', 'DtTm'))
+
+        details = self._find(entry, 'NtryDtls', 'TxDtls')
+        references, counterparty = [], ''
+        if details is not None:
+            remittance = self._find(details, 'RmtInf')
+            if remittance is not None:
+                references.extend(
+                    (child.text or '').strip() for child in remittance.iter() if self._local(child.tag) in ('Ustrd', 'Ref')
+                )
+            counterparty = self._text(details, 'RltdPties', 'Dbtr', 'Nm') or self._text(details, 'RltdPties', 'Dbtr', 'Pty', 'Nm')
+            references.append(self._text(details, 'Refs', 'EndToEndId'))
+        references.append(self._text(entry, 'AddtlNtryInf'))
+        reference = ' '.join(part for part in references if part and part != 'NOTPROVIDED')
+
+        bank_reference = self._text(entry, 'AcctSvcrRef') or self._text(entry, 'NtryRef')
+        if not bank_reference:
+            bank_reference = synthetic_reference(booking_date, amount, reference, counterparty, position)
+        return BankTransaction(bank_reference, booking_date, amount, reference, counterparty)
+
+    def parse(self, stream):
+        statement = None
+        position = 0
+        for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+            name = self._local(element.tag)
+            if event == 'start':
+                if name == 'Stmt':
+                    statement = element
+                continue
+            if name != 'Ntry':
+                continue
+            position += 1
+            try:
+                yield self._entry(element, position)
+            except ValueError as e:
+                raise ValueError(f"Écriture {position} : {e}")
+            # Libérer l'écriture traitée : l'arbre ne garde jamais plus d'une écriture
+            element.clear()
+            if statement is not None:
+                statement.remove(element)
+
+
+STATEMENT_PARSERS = {
+    'csv': CsvStatementParser,
+    'camt053': Camt053StatementParser,
+}
+
+
+def detect_format(filename):
+    """Format d'un relevé d'après l'extension de son fichier"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return 'csv'
+    if extension == 'xml':
+        return 'camt053'
+    raise ValueError(f"Format de relevé non reconnu pour '{filename}' : CSV ou CAMT.053 (.xml) attendu")
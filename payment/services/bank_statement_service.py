@@ -0,0 +1,268 @@
+import re
+import time
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from dashboard.services.dashboard_cache import dashboard_snapshot_cache
+from payment.models import BankTransactionReview, Payment
+from payment.repositories.bank_statement_repository import BankStatementRepository
+from payment.services.bank_statement_parsers import STATEMENT_PARSERS, detect_format, normalize_text
+from payment.services.payment_service import PaymentService
+
+
+def to_cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1')))
+
+
+class InvoiceMatchIndex:
+    """
+    Index en mémoire des factures ouvertes pour rapprocher les opérations bancaires : par numéro de facture
+    cité dans le libellé, par contact (nom de l'émetteur) et montant, et par montant seul. Tenu à jour au fil
+    des rapprochements pour qu'une facture soldée ne soit pas rapprochée deux fois.
+    """
+
+    REFERENCE_PATTERN = re.compile(r'\b(?:facture|fact|fac|invoice|inv|f)\s*(?:n\s*[°o]?\s*)?[#:._-]?\s*(\d{1,9})\b')
+    MAX_CANDIDATES = 20
+
+    def __init__(self, open_invoices):
+        self.remaining = {}
+        self.contact_of = {}
+        self.by_amount = defaultdict(set)
+        self.by_contact = defaultdict(set)
+        self.by_contact_amount = defaultdict(set)
+        # Premier mot du nom de famille -> [(contact_id, mots du nom, mots du prénom)]
+        self.by_name = defaultdict(list)
+
+        named = set()
+        for row in open_invoices:
+            invoice_id, contact_id = row['invoice_id'], row['contact_id']
+            cents = to_cents(row['remaining_amount'])
+            self.remaining[invoice_id] = cents
+            self.contact_of[invoice_id] = contact_id
+            self.by_amount[cents].add(invoice_id)
+            self.by_contact[contact_id].add(invoice_id)
+            self.by_contact_amount[(contact_id, cents)].add(invoice_id)
+            if contact_id not in named:
+                named.add(contact_id)
+                last_name = self._words(row['contact_id__last_name'])
+                if last_name:
+                    self.by_name[last_name[0]].append(
+                        (contact_id, set(last_name), set(self._words(row['contact_id__first_name'])))
+                    )
+
+    @staticmethod
+    def _words(value):
+        return re.findall(r'[a-z0-9]+', normalize_text(value))
+
+    def referenced_invoices(self, reference):
+        """Factures ouvertes dont le numéro est cité dans le libellé"""
+        cited = {int(number) for number in self.REFERENCE_PATTERN.findall(normalize_text(reference))}
+        return sorted(invoice_id for invoice_id in cited if invoice_id in self.remaining)
+
+    def contacts(self, counterparty):
+        """Contacts dont le nom (et le prénom s'il est connu) figure dans le nom de l'émetteur"""
+        words = set(self._words(counterparty))
+        return {
+            contact_id
+            for word in words
+            for contact_id, last_name, first_name in self.by_name.get(word, ())
+            if last_name <= words and first_name <= words
+        }
+
+    def _candidates(self, invoice_ids):
+        return sorted(invoice_ids)[:self.MAX_CANDIDATES]
+
+    def match(self, operation):
+        """
+        Facture à créditer de l'opération, ou None avec le motif de la vérification manuelle
+        et les factures candidates : (invoice_id, motif, candidates)
+        """
+        cents = to_cents(operation.amount)
+
+        referenced = self.referenced_invoices(operation.reference)
+        if len(referenced) > 1:
+            # Plusieurs factures citées : celle dont le reste dû est exactement le montant
+            exact = [invoice_id for invoice_id in referenced if self.remaining[invoice_id] == cents]
+            if len(exact) != 1:
+                return None, "Plusieurs factures citées dans le libellé", referenced
+            referenced = exact
+        if referenced:
+            invoice_id = referenced[0]
+            if cents > self.remaining[invoice_id]:
+                return None, "Montant supérieur au reste dû de la facture citée", referenced
+            return invoice_id, '', []
+
+        contacts = self.contacts(operation.counterparty)
+        if contacts:
+            exact = set().union(*(self.by_contact_amount.get((contact_id, cents), ()) for contact_id in contacts))
+            if len(exact) == 1:
+                return exact.pop(), '', []
+            if exact:
+                return None, "Plusieurs factures du contact pour ce montant", self._candidates(exact)
+            open_invoices = set().union(*(self.by_contact[contact_id] for contact_id in contacts))
+            return None, "Aucune facture du contact pour ce montant", self._candidates(open_invoices)
+
+        same_amount = self.by_amount.get(cents)
+        if same_amount:
+            return None, "Rapprochement par montant seul, à confirmer", self._candidates(same_amount)
+        return None, "Aucune facture correspondante", []
+
+    def apply(self, invoice_id, amount):
+        """Déduire un paiement du reste dû de la facture (retirée de l'index une fois soldée)"""
+        contact_id = self.contact_of[invoice_id]
+        cents = self.remaining[invoice_id]
+        for index, key in ((self.by_amount, cents), (self.by_contact_amount, (contact_id, cents))):
+            index[key].discard(invoice_id)
+            if not index[key]:
+                del index[key]
+
+        cents -= to_cents(amount)
+        if cents > 0:
+            self.remaining[invoice_id] = cents
+            self.by_amount[cents].add(invoice_id)
+            self.by_contact_amount[(contact_id, cents)].add(invoice_id)
+        else:
+            del self.remaining[invoice_id]
+            self.by_contact[contact_id].discard(invoice_id)
+
+
+class BankStatementService:
+    """
+    Import des relevés bancaires (CSV, CAMT.053) : lecture en flux, rapprochement des crédits avec les factures
+    ouvertes, paiements créés par lots, opérations ambiguës placées dans la file de vérification
+    """
+
+    PAYMENT_STATE = 'Payé'
+
+    def __init__(self):
+        self.repo = BankStatementRepository()
+
+    def import_statement(self, stream, filename, statement_format=None, payment_method='Virement bancaire',
+                         batch_size=None):
+        """Importer un relevé (flux binaire) et retourner l'import avec ses compteurs"""
+        statement_format = statement_format or detect_format(filename)
+        if statement_format not in STATEMENT_PARSERS:
+            raise ValueError(f"Le format doit être l'un de: {', '.join(STATEMENT_PARSERS)}")
+        if payment_method not in dict(Payment._meta.get_field('payment_method').choices):
+            raise ValueError(f"Moyen de paiement inconnu : {payment_method}")
+        batch_size = batch_size or getattr(settings, 'BANK_STATEMENT_BATCH_SIZE', 2000)
+
+        started_at = time.monotonic()
+        statement_import = self.repo.create_import(filename, statement_format)
+        try:
+            # Un relevé est importé entièrement ou pas du tout ; le cumul mensuel est mis à jour une fois, à la fin
+            with transaction.atomic():
+                index = InvoiceMatchIndex(self.repo.get_open_invoices())
+                transactions = STATEMENT_PARSERS[statement_format]().parse(stream)
+                seen, rollup_entries = set(), []
+                while True:
+                    batch = list(islice(transactions, batch_size))
+                    if not batch:
+                        break
+                    rollup_entries.extend(self._import_batch(statement_import, batch, index, seen, payment_method))
+                self.repo.add_to_rollup(rollup_entries)
+                if rollup_entries:
+                    # Paiements insérés en masse, sans post_save : invalider les snapshots du dashboard ici
+                    transaction.on_commit(dashboard_snapshot_cache.invalidate)
+        except Exception as e:
+            statement_import.status = 'Échec'
+            statement_import.error = str(e)
+            statement_import.matched = statement_import.to_review = 0
+            raise
+        else:
+            statement_import.status = 'Terminé'
+        finally:
+            statement_import.elapsed = time.monotonic() - started_at
+            self.repo.save_import(statement_import)
+        return statement_import
+
+    def _import_batch(self, statement_import, batch, index, seen, payment_method):
+        """Rapprocher et enregistrer un lot d'opérations, retourne les entrées du cumul mensuel des paiements créés"""
+        known = self.repo.get_known_references([operation.bank_reference for operation in batch])
+        payments, contact_ids, reviews = [], [], []
+        for operation in batch:
+            statement_import.transactions += 1
+            # Débits, montants nuls et opérations déjà importées (ou répétées dans le relevé) sont écartés
+            if operation.amount <= 0 or operation.bank_reference in known or operation.bank_reference in seen:
+                statement_import.skipped += 1
+                continue
+            seen.add(operation.bank_reference)
+
+            invoice_id, reason, candidates = index.match(operation)
+            if invoice_id is not None and operation.amount != operation.amount.to_integral_value():
+                # Les montants de paiement sont entiers : un montant avec centimes est saisi à la main
+                invoice_id, reason, candidates = None, "Montant avec centimes, paiement à saisir manuellement", [invoice_id]
+
+            if invoice_id is None:
+                reviews.append(BankTransactionReview(
+                    bank_statement_import_id=statement_import,
+                    bank_reference=operation.bank_reference,
+                    booking_date=operation.booking_date,
+                    amount=operation.amount,
+                    reference=operation.reference,
+                    counterparty=operation.counterparty[:255],
+                    reason=reason,
+                    candidates=candidates,
+                ))
+                continue
+
+            payments.append(Payment(
+                payment_method=payment_method,
+                state_payment=self.PAYMENT_STATE,
+                invoice_id_id=invoice_id,
+                amount=int(operation.amount),
+                bank_reference=operation.bank_reference,
+            ))
+            contact_ids.append(index.contact_of[invoice_id])
+            index.apply(invoice_id, operation.amount)
+
+        created = self.repo.save_batch(payments, reviews)
+        statement_import.matched += len(payments)
+        statement_import.to_review += len(reviews)
+        return [
+            (payment.created_at, payment.state_payment, contact_id, payment.amount)
+            for payment, contact_id in zip(created, contact_ids)
+        ]
+
+    def get_pending_reviews(self, limit=None):
+        """Opérations à vérifier, les plus anciennes d'abord"""
+        reviews = self.repo.get_reviews('À traiter')
+        return reviews[:limit] if limit else reviews
+
+    def count_pending_reviews(self):
+        return self.repo.count_reviews('À traiter')
+
+    def get_recent_imports(self, limit=10):
+        return self.repo.get_recent_imports(limit)
+
+    def resolve_review(self, review_id, invoice_id, payment_method='Virement bancaire'):
+        """Rapprocher à la main une opération de la file avec une facture : le paiement est créé"""
+        review = self.repo.get_review(review_id)
+        if review.status != 'À traiter':
+            raise ValueError("Cette opération a déjà été traitée")
+        if review.amount != review.amount.to_integral_value():
+            raise ValueError("Le montant a des centimes : saisir le paiement depuis la page des paiements")
+
+        with transaction.atomic():
+            result = PaymentService().create_payment(
+                payment_method, self.PAYMENT_STATE, invoice_id, int(review.amount), review.bank_reference
+            )
+            if isinstance(result, dict) and not result.get('success', True):
+                raise ValueError(result.get('error'))
+            review.status = 'Rapproché'
+            review.invoice_id_id = invoice_id
+            review.payment_id = result
+            self.repo.save_review(review)
+        return review
+
+    def ignore_review(self, review_id):
+        """Écarter une opération de la file (aucun paiement créé)"""
+        review = self.repo.get_review(review_id)
+        if review.status != 'À traiter':
+            raise ValueError("Cette opération a déjà été traitée")
+        review.status = 'Ignoré'
+        return self.repo.save_review(review)
@@ -0,0 +1,134 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+
+from payment.models import METHOD_CHOICES, STATUS_CHOICES, normalize_state_payment
+from payment.repositories.payment_capture_repository import PaymentCaptureRepository
+from payment.repositories.payment_repository import PaymentRepository
+
+
+@dataclass
+class CaptureResult:
+    """Réponse d'une demande d'encaissement : code HTTP, contenu et indicateur de rejeu"""
+    status_code: int
+    response: dict
+    replayed: bool = False
+
+    @property
+    def success(self):
+        return self.response.get('success', False)
+
+
+class PaymentCaptureService:
+    """
+    Encaissement idempotent : une clé fournie par l'appelant identifie la demande. Contrôles et création du paiement
+    se font dans une transaction courte qui verrouille la facture ; la réponse est conservée avec la clé et renvoyée
+    sans nouveau traitement aux demandes rejouées (double clic, nouvelle tentative d'un terminal de paiement).
+    """
+
+    VALID_INVOICE_STATUSES = ('Confirmé', 'Comptabilisé')
+    MAX_KEY_LENGTH = 255
+
+    def __init__(self):
+        self.repo = PaymentCaptureRepository()
+        self.payment_repo = PaymentRepository()
+
+    @staticmethod
+    def fingerprint(payment_method, state_payment, invoice_id, amount):
+        payload = json.dumps([payment_method, state_payment, invoice_id, amount], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def validate(self, idempotency_key, payment_method, state_payment, invoice_id, amount):
+        """Paramètres de la demande contrôlés et normalisés (ValueError si invalides : rien n'est conservé)"""
+        idempotency_key = (idempotency_key or '').strip()
+        if not idempotency_key or len(idempotency_key) > self.MAX_KEY_LENGTH:
+            raise ValueError(f"La clé d'idempotence est obligatoire ({self.MAX_KEY_LENGTH} caractères au plus)")
+        if payment_method not in dict(METHOD_CHOICES):
+            raise ValueError(f"Moyen de paiement inconnu : {payment_method}")
+        state_payment = normalize_state_payment(state_payment)
+        if state_payment not in dict(STATUS_CHOICES):
+            raise ValueError(f"Statut de paiement inconnu : {state_payment}")
+        try:
+            invoice_id = int(invoice_id)
+            amount = Decimal(str(amount))
+        except (TypeError, ValueError, InvalidOperation):
+            raise ValueError("La facture et le montant doivent être des nombres valides")
+        if amount <= 0 or amount != amount.to_integral_value():
+            raise ValueError("Le montant doit être un nombre entier d'euros supérieur à 0")
+        return idempotency_key, payment_method, state_payment, invoice_id, int(amount)
+
+    def capture(self, idempotency_key, payment_method, state_payment, invoice_id, amount):
+        """Encaisser un paiement sur une facture, au plus une fois par clé d'idempotence"""
+        idempotency_key, payment_method, state_payment, invoice_id, amount = self.validate(
+            idempotency_key, payment_method, state_payment, invoice_id, amount
+        )
+        fingerprint = self.fingerprint(payment_method, state_payment, invoice_id, amount)
+
+        # Rejeu : une lecture par l'index unique, sans transaction ni verrou
+        stored = self.repo.get_capture(idempotency_key)
+        if stored is not None:
+            return self._replay(stored, fingerprint)
+
+        try:
+            with transaction.atomic():
+                invoice = self.repo.lock_invoice(invoice_id)
+                # Une demande concurrente avec la même clé a pu être traitée pendant l'attente du verrou
+                stored = self.repo.get_capture(idempotency_key)
+                if stored is not None:
+                    return self._replay(stored, fingerprint)
+
+                status_code, response, payment = self._process(invoice, invoice_id, payment_method, state_payment, amount)
+                self.repo.create_capture(
+                    idempotency_key, fingerprint, invoice.invoice_id if invoice else None, payment, status_code, response,
+                )
+        except IntegrityError:
+            # Clé enregistrée entre-temps par une autre transaction : sa réponse fait foi
+            stored = self.repo.get_capture(idempotency_key)
+            if stored is None:
+                raise
+            return self._replay(stored, fingerprint)
+        return CaptureResult(status_code, response)
+
+    def _process(self, invoice, invoice_id, payment_method, state_payment, amount):
+        """Contrôles sur la facture verrouillée puis création du paiement : (code HTTP, réponse, paiement)"""
+        if invoice is None:
+            return 404, {'success': False, 'error': f"La facture avec l'ID {invoice_id} n'existe pas"}, None
+        if invoice.status not in self.VALID_INVOICE_STATUSES:
+            return 409, {
+                'success': False,
+                'error': f"Impossible de créer un paiement pour une facture avec le statut '{invoice.status}'. "
+                         f"La facture doit être 'Confirmé' ou 'Comptabilisé' pour être payée.",
+            }, None
+
+        # Solde tenu par le journal des paiements, lu avec la facture verrouillée
+        remaining_amount = invoice.total_amount - invoice.total_paid
+        if remaining_amount <= 0:
+            return 409, {'success': False, 'error': "Impossible de créer un paiement pour une facture déjà payée."}, None
+        if amount > remaining_amount:
+            return 409, {
+                'success': False,
+                'error': f"Le montant ({amount}€) dépasse le reste à payer de la facture ({remaining_amount:.2f}€)",
+            }, None
+
+        payment = self.payment_repo.insert_payment(invoice, payment_method, state_payment, amount)
+        return 201, {
+            'success': True,
+            'payment_id': payment.payment_id,
+            'invoice_id': invoice.invoice_id,
+            'payment_method': payment.payment_method,
+            'state_payment': payment.state_payment,
+            'amount': payment.amount,
+            'remaining_amount': round(remaining_amount - amount, 2),
+            'created_at': payment.created_at.isoformat(),
+        }, payment
+
+    def _replay(self, stored, fingerprint):
+        if stored.request_fingerprint != fingerprint:
+            return CaptureResult(422, {
+                'success': False,
+                'error': "Cette clé d'idempotence a déjà été utilisée pour une autre demande d'encaissement",
+            })
+        return CaptureResult(stored.status_code, stored.response, replayed=True)
@@ -1,13 +1,18 @@
 from django.contrib.messages.context_processors import messages
 from django.template.loader import render_to_string
+from payment.models import normalize_state_payment
+from payment.repositories.payment_ledger_repository import PaymentLedgerRepository
 from payment.repositories.payment_repository import PaymentRepository
+from payment.repositories.payment_rollup_repository import PaymentRollupRepository
 
 class PaymentService:
 
     def __init__(self):
         self.repo = PaymentRepository()
+        self.rollup_repo = PaymentRollupRepository()
+        self.ledger_repo = PaymentLedgerRepository()
 
-    def create_payment(self, payment_method, state_payment, invoice_id, amount):
+    def create_payment(self, payment_method, state_payment, invoice_id, amount, bank_reference=None):
         # Vérifier que facture n'est pas en statut "Brouillon" ou "Annulée" avant de créer un paiement
         if self.repo.get_invoice_status(invoice_id) in ['Brouillon', 'Annulée']:
             return {'success': False, 'error': "Impossible de créer un paiement pour une facture en statut 'Brouillon' ou 'Annulée'. Veuillez vérifier le statut de la facture avant de créer un paiement."}
@@ -16,7 +21,7 @@ class PaymentService:
         if self.repo.get_state_invoice_payment(invoice_id):
             return {'success': False, 'error': "Impossible de créer un paiement pour une facture déjà payée. Veuillez vérifier le statut de la facture avant de créer un paiement."}
 
-        return self.repo.create_payment(payment_method, state_payment, invoice_id, amount)
+        return self.repo.create_payment(payment_method, state_payment, invoice_id, amount, bank_reference)
 
     def get_payment_by_id(self, payment_id):
         return self.repo.get_payment_by_id(payment_id)
@@ -27,6 +32,50 @@ class PaymentService:
     def get_all_payments(self):
         return self.repo.get_all_payments()
 
+    def get_total_revenue(self, state_payment, start=None, end=None):
+        """Chiffre d'affaires d'un statut de paiement sur une période"""
+        return self.repo.get_total_revenue(state_payment, start, end)
+
+    def get_revenue_by_period(self, state_payment, start=None, end=None, granularity='month'):
+        """Chiffre d'affaires d'un statut de paiement par période (jour, semaine, mois, trimestre, année)"""
+        return self.repo.get_revenue_by_period(state_payment, start, end, granularity)
+
+    def get_top_clients(self, state_payment, limit=5, start=None, end=None):
+        """Meilleurs clients d'un statut de paiement sur une période"""
+        return self.repo.get_top_clients(state_payment, limit, start, end)
+
+    def get_payments_for_export(self, start=None, end=None, status=None, contact_id=None):
+        """Paiements à exporter, créés sur [start, end["""
+        return self.repo.get_payments_for_export(start, end, status, contact_id)
+
+    def get_rollup_revenue_by_month(self, state_payment, start=None, end=None):
+        """Chiffre d'affaires par mois lu dans le cumul mensuel (sans parcourir les paiements)"""
+        return self.rollup_repo.get_revenue_by_month(state_payment, start, end)
+
+    def rebuild_revenue_rollup(self):
+        """Reconstruire le cumul mensuel depuis les paiements"""
+        return self.rollup_repo.rebuild()
+
+    def verify_revenue_rollup(self):
+        """Lister les écarts entre le cumul mensuel et les paiements"""
+        return self.rollup_repo.verify()
+
+    def get_invoice_balance(self, invoice_id):
+        """Solde des paiements d'une facture tenu par le journal (None avant le premier paiement)"""
+        return self.repo.get_invoice_balance(invoice_id)
+
+    def get_payment_events(self, invoice_id):
+        """Historique des paiements d'une facture : création, changement de statut, correction, suppression"""
+        return self.repo.get_payment_events(invoice_id)
+
+    def rebuild_invoice_balances(self):
+        """Reconstruire les soldes des factures en rejouant le journal des paiements"""
+        return self.ledger_repo.rebuild()
+
+    def verify_invoice_balances(self):
+        """Lister les écarts entre les soldes des factures et les paiements"""
+        return self.ledger_repo.verify()
+
     def get_invoice_payment_status(self, invoice_id):
         """
         Déterminer le statut de paiement réel d'une facture.
@@ -36,28 +85,51 @@ class PaymentService:
         - 'En cours' s'il y a des paiements en statut 'En cours'
         - 'Non payé' si aucun paiement
         """
-        payments = self.repo.get_payments_by_invoice_id(invoice_id)
-
-        if not payments:
+        return self.get_invoice_payment_statuses([invoice_id]).get(invoice_id, 'Non payé')
+
+    def get_invoice_payment_statuses(self, invoice_ids):
+        """Statut de paiement de chaque facture, en une requête : {invoice_id: statut}"""
+        return {
+            row['invoice_id']: self.status_from_counts(
+                row['payment_count'], row['pending_payment_count'], row['in_progress_payment_count'], row['is_paid']
+            )
+            for row in self.repo.get_payment_status_counts(invoice_ids)
+        }
+
+    @staticmethod
+    def status_from_counts(payment_count, pending_count, in_progress_count, is_paid):
+        """Statut de paiement à partir du nombre de paiements par statut et de la couverture du montant"""
+        if not payment_count:
             return 'Non payé'
 
-        # Vérifier si tous les paiements sont en statut 'Payé'
-        payment_states = [p.state_payment for p in payments]
-
         # S'il y a des paiements en attente
-        if 'En attente' in payment_states:
+        if pending_count:
             return 'En attente'
 
         # S'il y a des paiements en cours
-        if 'En cours ' in payment_states or 'En cours' in payment_states:
+        if in_progress_count:
             return 'En cours'
 
         # Vérifier si la facture est complètement payée
-        if self.repo.get_state_invoice_payment(invoice_id):
+        if is_paid:
             return 'Payé'
 
         return 'Non payé'
 
+    @staticmethod
+    def resolve_payment_status(payment_states, is_paid):
+        """Statut de paiement d'une facture à partir des statuts de ses paiements déjà chargés"""
+        payment_states = [normalize_state_payment(state) for state in payment_states]
+        return PaymentService.status_from_counts(
+            len(payment_states), payment_states.count('En attente'), payment_states.count('En cours'), is_paid
+        )
+
+    def get_annotated_payment_status(self, invoice):
+        """Statut de paiement d'une facture annotée par with_payment_totals et with_payment_counts"""
+        return self.status_from_counts(
+            invoice.payment_count, invoice.pending_payment_count, invoice.in_progress_payment_count, invoice.is_paid
+        )
+
     def get_invoice_status(self, invoice_id):
         """Récupérer le statut d'une facture par son ID"""
 
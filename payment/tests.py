@@ -1,6 +1,26 @@
-from django.test import TestCase
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import QuerySet
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 from commons.dtos import CreateContactDTO
+from commons.tests.fixtures import TestDataMixin
+from invoicing.models import Invoice
 from invoicing.services.invoice_service import InvoiceService
+from payment.management.commands.benchmark_payment_capture import is_throwaway_database
+from payment.models import (
+    BankTransactionReview, InvoicePaymentBalance, Payment, PaymentCapture, PaymentEvent, PaymentMonthlyRevenue,
+)
+from payment.services.bank_statement_service import BankStatementService
+from payment.services.payment_capture_service import PaymentCaptureService
 from payment.services.payment_service import PaymentService
 from commons.services.contact_service import ContactService
 
@@ -72,3 +92,491 @@ class PaymentTests(TestCase):
         # Vérifier que le paiement n'existe plus
         with self.assertRaises(Exception):
             self.service.get_payment_by_id(self.payment.payment_id_id)
+
+
+class PaymentRollupTests(TestDataMixin, TestCase):
+    """Tests du cumul mensuel des paiements (PaymentMonthlyRevenue)"""
+
+    def setUp(self):
+        self.contact = self._create_contact("Rollup")
+        self.invoice_service = InvoiceService()
+        self.invoice = self._create_invoice_for(self.contact, "Facture Rollup", price_ht=10000, status="Confirmé")
+        self.service = PaymentService()
+
+    def _rollup(self, state_payment):
+        return {
+            (row.year, row.month): (row.revenue, row.payment_count)
+            for row in PaymentMonthlyRevenue.objects.filter(state_payment=state_payment, contact_id=self.contact.contact_id)
+        }
+
+    def test_create_payment_updates_rollup(self):
+        """La création d'un paiement alimente le cumul du mois"""
+        payment = self.service.create_payment("Carte bancaire", "Payé", self.invoice.invoice_id, 100)
+        self.service.create_payment("Chèque", "Payé", self.invoice.invoice_id, 50)
+
+        month = timezone.localtime(payment.created_at)
+        self.assertEqual(self._rollup("Payé"), {(month.year, month.month): (150, 2)})
+        self.assertEqual(self.service.verify_revenue_rollup(), [])
+
+    def test_update_payment_moves_rollup_bucket(self):
+        """Un changement de statut ou de montant déplace le paiement dans le cumul"""
+        payment = self.service.create_payment("Carte bancaire", "En attente", self.invoice.invoice_id, 100)
+        self.service.update_payment(payment.payment_id, "Carte bancaire", "Payé", self.invoice.invoice_id, 80)
+
+        month = timezone.localtime(payment.created_at)
+        self.assertEqual(self._rollup("En attente"), {})
+        self.assertEqual(self._rollup("Payé"), {(month.year, month.month): (80, 1)})
+        self.assertEqual(self.service.verify_revenue_rollup(), [])
+
+    def test_delete_payment_and_invoice_update_rollup(self):
+        """Les suppressions de paiement et de facture retirent les montants du cumul"""
+        payment = self.service.create_payment("Carte bancaire", "Payé", self.invoice.invoice_id, 100)
+        self.service.create_payment("Carte bancaire", "Payé", self.invoice.invoice_id, 40)
+
+        self.service.delete_payment(payment.payment_id)
+        self.assertEqual(sum(revenue for revenue, _ in self._rollup("Payé").values()), 40)
+
+        self.invoice_service.delete_invoice(self.invoice.invoice_id)
+        self.assertEqual(self._rollup("Payé"), {})
+        self.assertEqual(self.service.verify_revenue_rollup(), [])
+
+    def test_invoice_contact_change_moves_rollup(self):
+        """Les paiements d'une facture passent dans le cumul de son nouveau contact"""
+        payment = self.service.create_payment("Carte bancaire", "Payé", self.invoice.invoice_id, 100)
+        other = self._create_contact("Rollup", first_name="John")
+
+        invoice = self.invoice
+        self.invoice_service.update_invoice(
+            invoice.invoice_id, other.contact_id, invoice.name, invoice.address, invoice.city, invoice.state,
+            invoice.zip_code, invoice.siret, invoice.email, invoice.phone, invoice.status,
+        )
+
+        month = timezone.localtime(payment.created_at)
+        self.assertEqual(self._rollup("Payé"), {})
+        self.assertEqual(
+            PaymentMonthlyRevenue.objects.get(contact_id=other.contact_id, year=month.year, month=month.month).revenue,
+            100,
+        )
+        self.assertEqual(self.service.verify_revenue_rollup(), [])
+
+    def test_first_payment_of_bucket_tolerates_concurrent_creation(self):
+        """Un cumul créé par un paiement concurrent entre la mise à jour et la création est incrémenté, sans erreur"""
+        month = timezone.localtime()
+        bucket = {'year': month.year, 'month': month.month, 'state_payment': 'Payé', 'contact_id_id': self.contact.contact_id}
+        update = QuerySet.update
+        calls = []
+
+        def concurrent_update(queryset, **kwargs):
+            if queryset.model is PaymentMonthlyRevenue and not calls:
+                # Aucun cumul à la mise à jour, puis l'autre paiement le crée avant nous
+                calls.append(kwargs)
+                PaymentMonthlyRevenue.objects.create(revenue=30, payment_count=1, **bucket)
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=concurrent_update):
+            self.service.create_payment("Carte bancaire", "Payé", self.invoice.invoice_id, 100)
+
+        self.assertEqual(self._rollup("Payé"), {(month.year, month.month): (130, 2)})
+
+    def test_rebuild_command_repairs_rollup(self):
+        """La commande de reconstruction répare un cumul désynchronisé"""
+        self.service.create_payment("Carte bancaire", "Payé", self.invoice.invoice_id, 100)
+        PaymentMonthlyRevenue.objects.update(revenue=1)
+        self.assertEqual(len(self.service.verify_revenue_rollup()), 1)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_payment_rollup', '--verify-only', stdout=StringIO(), stderr=StringIO())
+
+        call_command('rebuild_payment_rollup', stdout=StringIO())
+        self.assertEqual(self.service.verify_revenue_rollup(), [])
+
+
+class PaymentStatusBatchTests(TestDataMixin, TestCase):
+    """Tests du statut de paiement calculé pour plusieurs factures à la fois"""
+
+    def setUp(self):
+        self.contact = self._create_contact("Statuts")
+        self.service = PaymentService()
+        self.invoices = [
+            self._create_invoice_for(self.contact, "Facture Statuts", price_ht=100, status="Confirmé").invoice_id
+            for _ in range(5)
+        ]
+
+    def test_statuses_in_one_query(self):
+        """Chaque facture reçoit le même statut qu'avec la méthode unitaire, en une seule requête"""
+        unpaid, pending, in_progress, paid, partial = self.invoices
+        self.service.create_payment("Chèque", "En attente", pending, 50)
+        self.service.create_payment("Chèque", "Payé", pending, 10)
+        # L'ancienne valeur avec espace final est enregistrée normalisée
+        self.service.create_payment("Virement bancaire", "En cours ", in_progress, 50)
+        self.service.create_payment("Virement bancaire", "Payé", paid, 100)
+        self.service.create_payment("Carte bancaire", "Payé", partial, 40)
+
+        with self.assertNumQueries(1):
+            statuses = self.service.get_invoice_payment_statuses(self.invoices)
+
+        self.assertEqual(statuses, {
+            unpaid: 'Non payé', pending: 'En attente', in_progress: 'En cours', paid: 'Payé', partial: 'Non payé',
+        })
+        self.assertEqual(
+            {invoice_id: self.service.get_invoice_payment_status(invoice_id) for invoice_id in self.invoices},
+            statuses,
+        )
+        self.assertEqual(Payment.objects.get(invoice_id=in_progress).state_payment, 'En cours')
+        self.assertEqual(self.service.get_invoice_payment_status(999999), 'Non payé')
+
+    def test_normalization_migration(self):
+        """La migration normalise 'En cours ' dans les paiements et fusionne les cumuls mensuels"""
+        normalize_states = import_module('payment.migrations.0004_alter_payment_state_payment_and_more').normalize_states
+        invoice_id = self.invoices[0]
+        self.service.create_payment("Chèque", "En cours", invoice_id, 30)
+        legacy = self.service.create_payment("Chèque", "En cours", invoice_id, 20)
+        Payment.objects.filter(payment_id=legacy.payment_id).update(state_payment='En cours ')
+        rollup = PaymentMonthlyRevenue.objects.get(state_payment='En cours')
+        PaymentMonthlyRevenue.objects.create(
+            year=rollup.year, month=rollup.month, state_payment='En cours ', contact_id_id=rollup.contact_id_id,
+            revenue=20, payment_count=1,
+        )
+        PaymentMonthlyRevenue.objects.filter(pk=rollup.pk).update(revenue=30, payment_count=1)
+
+        normalize_states(django_apps, None)
+
+        self.assertFalse(Payment.objects.filter(state_payment='En cours ').exists())
+        self.assertEqual(
+            list(PaymentMonthlyRevenue.objects.values_list('state_payment', 'revenue', 'payment_count')),
+            [('En cours', 50, 2)],
+        )
+        self.assertEqual(self.service.verify_revenue_rollup(), [])
+
+
+class BankStatementImportTests(TestDataMixin, TestCase):
+    """Tests de l'import des relevés bancaires et du rapprochement avec les factures ouvertes"""
+
+    def setUp(self):
+        self.contact = self._create_contact("Releve")
+        self.service = BankStatementService()
+        self.invoices = [
+            self._create_invoice_for(self.contact, "Facture Relevé", price_ht=price_ht, status="Confirmé").invoice_id
+            for price_ht in (100, 250, 250)
+        ]
+
+    def _import_csv(self, lines, filename='releve.csv'):
+        content = "Date;Identifiant;Libellé;Émetteur;Montant\n" + "\n".join(lines) + "\n"
+        return self.service.import_statement(BytesIO(content.encode('utf-8')), filename)
+
+    def test_csv_import_matches_and_queues(self):
+        """Référence citée et contact+montant unique : paiement ; ambiguïtés : file de vérification"""
+        first, second, third = self.invoices
+        statement_import = self._import_csv([
+            f"02/01/2026;OP1;VIR FACTURE {first};M JANE RELEVE;100,00",
+            "03/01/2026;OP2;VIREMENT;INCONNU SARL;100,00",
+            "04/01/2026;OP3;VIREMENT;MME JANE RELEVE;250,00",
+            "05/01/2026;OP4;PRLV ASSURANCE;ASSURANCE;-45,90",
+            f"06/01/2026;OP5;FACTURE {first};JANE RELEVE;12,50",
+        ])
+
+        self.assertEqual(statement_import.status, 'Terminé')
+        self.assertEqual(
+            (statement_import.transactions, statement_import.matched, statement_import.to_review, statement_import.skipped),
+            (5, 1, 3, 1),
+        )
+        payment = Payment.objects.get(bank_reference='OP1')
+        self.assertEqual((payment.invoice_id_id, payment.amount, payment.state_payment), (first, 100, 'Payé'))
+        reviews = {review.bank_reference: review for review in self.service.get_pending_reviews()}
+        self.assertEqual(set(reviews), {'OP2', 'OP3', 'OP5'})
+        # Montant seul : la facture déjà soldée n'est plus candidate
+        self.assertEqual(reviews['OP2'].candidates, [])
+        self.assertEqual(reviews['OP3'].candidates, [second, third])
+        self.assertEqual(PaymentService().verify_revenue_rollup(), [])
+        self.assertEqual(PaymentService().verify_invoice_balances(), [])
+
+        # Un second import du même relevé n'ajoute rien
+        again = self._import_csv([f"02/01/2026;OP1;VIR FACTURE {first};M JANE RELEVE;100,00"])
+        self.assertEqual((again.matched, again.to_review, again.skipped), (0, 0, 1))
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_camt053_import(self):
+        """Les écritures CAMT.053 sont lues en flux, débits écartés"""
+        second = self.invoices[1]
+        entries = "".join(
+            f"""<Ntry><NtryRef>{reference}</NtryRef><Amt Ccy="EUR">{amount}</Amt><CdtDbtInd>{indicator}</CdtDbtInd>
+            <BookgDt><Dt>2026-01-10</Dt></BookgDt><NtryDtls><TxDtls><RltdPties><Dbtr><Nm>Jane Releve</Nm></Dbtr></RltdPties>
+            <RmtInf><Ustrd>{label}</Ustrd></RmtInf></TxDtls></NtryDtls></Ntry>"""
+            for reference, amount, indicator, label in (
+                ('C1', '250.00', 'CRDT', f'Facture n° {second}'),
+                ('C2', '80.00', 'DBIT', 'Frais'),
+            )
+        )
+        content = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02"><BkToCstmrStmt><Stmt>'
+            f'{entries}</Stmt></BkToCstmrStmt></Document>'
+        )
+        statement_import = self.service.import_statement(BytesIO(content.encode('utf-8')), 'releve.xml')
+
+        self.assertEqual((statement_import.matched, statement_import.skipped), (1, 1))
+        self.assertEqual(Payment.objects.get(bank_reference='C1').invoice_id_id, second)
+
+    def test_resolve_and_ignore_review(self):
+        """Une opération vérifiée crée le paiement ; elle ne peut être traitée qu'une fois"""
+        second, third = self.invoices[1:]
+        self._import_csv([
+            "04/01/2026;OP3;VIREMENT;MME JANE RELEVE;250,00",
+            "05/01/2026;OP4;VIREMENT;INCONNU;30,00",
+        ])
+        review = BankTransactionReview.objects.get(bank_reference='OP3')
+
+        self.service.resolve_review(review.bank_transaction_review_id, third)
+        review.refresh_from_db()
+        self.assertEqual((review.status, review.invoice_id_id), ('Rapproché', third))
+        self.assertEqual(review.payment_id.bank_reference, 'OP3')
+        with self.assertRaises(ValueError):
+            self.service.resolve_review(review.bank_transaction_review_id, second)
+
+        ignored = self.service.ignore_review(BankTransactionReview.objects.get(bank_reference='OP4').bank_transaction_review_id)
+        self.assertEqual(ignored.status, 'Ignoré')
+        self.assertEqual(list(self.service.get_pending_reviews()), [])
+
+    def test_command_and_invalid_statement(self):
+        """Un relevé illisible fait échouer l'import avec un message clair"""
+        with self.assertRaises(ValueError):
+            self._import_csv(["pas une date;OP1;X;Y;10"])
+        with self.assertRaises(ValueError):
+            self.service.import_statement(BytesIO(b''), 'releve.pdf')
+        with self.assertRaises(CommandError):
+            call_command('import_bank_statement', '/nonexistent/releve.csv', stdout=StringIO())
+
+
+class PaymentLedgerTests(TestDataMixin, TestCase):
+    """Tests du journal des paiements (ajout seul) et du solde par facture"""
+
+    def setUp(self):
+        self.contact = self._create_contact("Journal")
+        self.invoice_service = InvoiceService()
+        self.invoices = [
+            self._create_invoice_for(self.contact, "Facture Journal", price_ht=500, status="Confirmé").invoice_id
+            for _ in range(2)
+        ]
+        self.service = PaymentService()
+
+    def _events(self, invoice_id):
+        return [
+            (event.sequence, event.event_type, event.total_paid, event.settled_amount)
+            for event in self.service.get_payment_events(invoice_id)
+        ]
+
+    def test_admin_writes_keep_balance_and_rollup(self):
+        """Les paiements créés, modifiés et supprimés depuis l'administration passent par le journal et le cumul"""
+        first, _ = self.invoices
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@test.com', 'password'))
+
+        response = self.client.post(reverse('admin:payment_payment_add'), {
+            'invoice_id': first, 'payment_method': 'Chèque', 'state_payment': 'Payé', 'amount': 200,
+        })
+        self.assertEqual(response.status_code, 302)
+        payment = Payment.objects.get()
+        self.assertEqual(Invoice.objects.get(invoice_id=first).total_paid, 200)
+
+        self.client.post(reverse('admin:payment_payment_change', args=[payment.payment_id]), {
+            'invoice_id': first, 'payment_method': 'Chèque', 'state_payment': 'Payé', 'amount': 600,
+        })
+        self.assertEqual(Invoice.objects.get(invoice_id=first).total_paid, 600)
+        self.assertTrue(Invoice.objects.get(invoice_id=first).is_paid)
+        self.assertEqual(self.service.verify_revenue_rollup(), [])
+
+        self.client.post(reverse('admin:payment_payment_changelist'), {
+            'action': 'delete_selected', '_selected_action': [payment.payment_id], 'post': 'yes',
+        })
+        self.assertFalse(Payment.objects.exists())
+        self.assertEqual(Invoice.objects.get(invoice_id=first).total_paid, 0)
+        self.assertEqual(self.service.verify_invoice_balances(), [])
+        self.assertEqual(self.service.verify_revenue_rollup(), [])
+
+    def test_events_and_balance_follow_payment_writes(self):
+        """Chaque écriture ajoute ses événements et met à jour le solde de la facture"""
+        first, second = self.invoices
+        payment = self.service.create_payment("Chèque", "En attente", first, 100)
+        self.service.create_payment("Carte bancaire", "Payé", first, 50)
+        self.service.update_payment(payment.payment_id, "Chèque", "Payé", first, 150)
+        other = self.service.create_payment("Chèque", "En cours", first, 10)
+        self.service.update_payment(other.payment_id, "Chèque", "En cours", second, 10)
+        self.service.delete_payment(payment.payment_id)
+
+        self.assertEqual(self._events(first), [
+            (1, 'Création', 100, 0),
+            (2, 'Création', 150, 50),
+            (3, 'Changement de statut', 200, 200),
+            (4, 'Correction du montant', 200, 200),
+            (5, 'Création', 210, 200),
+            (6, 'Suppression', 200, 200),
+            (7, 'Suppression', 50, 50),
+        ])
+        self.assertEqual(self._events(second), [(1, 'Création', 10, 0)])
+        balance = self.service.get_invoice_balance(first)
+        self.assertEqual(
+            (balance.total_paid, balance.settled_amount, balance.payment_count, balance.pending_payment_count, balance.version),
+            (50, 50, 1, 0, 7),
+        )
+        self.assertEqual(self.service.get_invoice_balance(second).in_progress_payment_count, 1)
+        self.assertEqual(self.service.verify_invoice_balances(), [])
+
+        # Le contrôle « déjà payée » lit le solde en une requête
+        with self.assertNumQueries(1):
+            self.assertFalse(self.service.repo.get_state_invoice_payment(first))
+
+    def test_events_are_append_only(self):
+        """Un événement du journal ne peut être ni modifié ni supprimé"""
+        self.service.create_payment("Chèque", "Payé", self.invoices[0], 100)
+        event = PaymentEvent.objects.get()
+        event.amount = 1
+        with self.assertRaises(ValueError):
+            event.save()
+        with self.assertRaises(ValueError):
+            event.delete()
+        with self.assertRaises(ValueError):
+            PaymentEvent.objects.update(amount=1)
+        with self.assertRaises(ValueError):
+            PaymentEvent.objects.all().delete()
+
+    def test_invoice_deletion_keeps_history_and_replay_repairs(self):
+        """Le journal survit à la suppression de la facture ; rejouer le journal répare un solde faussé"""
+        first, second = self.invoices
+        self.service.create_payment("Chèque", "Payé", first, 80)
+        payment = self.service.create_payment("Chèque", "En attente", second, 30)
+        self.service.update_payment(payment.payment_id, "Virement bancaire", "Payé", second, 40)
+
+        self.invoice_service.delete_invoice(first)
+        self.assertEqual(self._events(first), [(1, 'Création', 80, 80), (2, 'Suppression', 0, 0)])
+        self.assertFalse(InvoicePaymentBalance.objects.filter(invoice_id=first).exists())
+
+        InvoicePaymentBalance.objects.filter(invoice_id=second).update(total_paid=1, settled_amount=1)
+        with self.assertRaises(CommandError):
+            call_command('replay_payment_ledger', '--verify-only', stdout=StringIO(), stderr=StringIO())
+        call_command('replay_payment_ledger', stdout=StringIO())
+
+        balance = self.service.get_invoice_balance(second)
+        self.assertEqual((balance.total_paid, balance.settled_amount, balance.version), (40, 40, 4))
+        self.assertEqual(self.service.verify_invoice_balances(), [])
+
+    def test_seed_migration(self):
+        """La migration crée un événement par paiement existant et le solde des factures"""
+        seed_ledger = import_module('payment.migrations.0006_invoicepaymentbalance_paymentevent').seed_ledger
+        first = self.invoices[0]
+        self.service.create_payment("Chèque", "Payé", first, 80)
+        self.service.create_payment("Chèque", "En attente", first, 20)
+        PaymentEvent.objects.all()._raw_delete(PaymentEvent.objects.db)
+        InvoicePaymentBalance.objects.all().delete()
+
+        seed_ledger(django_apps, None)
+
+        self.assertEqual(self._events(first), [(1, 'Création', 80, 80), (2, 'Création', 100, 80)])
+        self.assertEqual(self.service.verify_invoice_balances(), [])
+
+
+class PaymentCaptureTests(TestDataMixin, TestCase):
+    """Tests de l'encaissement idempotent"""
+
+    def setUp(self):
+        self.contact = self._create_contact("Encaissement")
+        self.invoice_id = self._create_invoice_for(
+            self.contact, "Facture Encaissement", price_ht=100, status="Confirmé"
+        ).invoice_id
+        self.service = PaymentCaptureService()
+
+    def test_replay_returns_stored_response(self):
+        """Une demande rejouée reçoit la réponse d'origine, en une requête, sans second paiement"""
+        first = self.service.capture('cle-1', 'Carte bancaire', 'Payé', self.invoice_id, 60)
+        self.assertEqual(first.status_code, 201)
+        self.assertFalse(first.replayed)
+
+        with self.assertNumQueries(1):
+            replay = self.service.capture('cle-1', 'Carte bancaire', 'Payé', self.invoice_id, 60)
+        self.assertTrue(replay.replayed)
+        self.assertEqual((replay.status_code, replay.response), (201, first.response))
+        self.assertEqual(Payment.objects.count(), 1)
+
+        # Même clé, autre demande : refusée sans rien enregistrer
+        conflict = self.service.capture('cle-1', 'Carte bancaire', 'Payé', self.invoice_id, 10)
+        self.assertEqual(conflict.status_code, 422)
+        self.assertEqual(PaymentCapture.objects.count(), 1)
+
+    def test_overpayment_is_refused_and_stored(self):
+        """Un montant supérieur au reste à payer est refusé ; le refus est conservé pour les rejeux"""
+        self.service.capture('cle-1', 'Chèque', 'En attente', self.invoice_id, 70)
+        refused = self.service.capture('cle-2', 'Chèque', 'Payé', self.invoice_id, 40)
+        self.assertEqual(refused.status_code, 409)
+        self.assertFalse(refused.success)
+        self.assertTrue(self.service.capture('cle-2', 'Chèque', 'Payé', self.invoice_id, 40).replayed)
+
+        self.assertEqual(self.service.capture('cle-3', 'Chèque', 'Payé', self.invoice_id, 30).response['remaining_amount'], 0)
+        self.assertEqual(self.service.capture('cle-4', 'Chèque', 'Payé', self.invoice_id, 1).status_code, 409)
+        self.assertEqual(self.service.capture('cle-5', 'Chèque', 'Payé', 999999, 1).status_code, 404)
+        self.assertEqual(Payment.objects.count(), 2)
+
+        for amount in (0, '12.5', 'abc'):
+            with self.assertRaises(ValueError):
+                self.service.capture('cle-6', 'Chèque', 'Payé', self.invoice_id, amount)
+        with self.assertRaises(ValueError):
+            self.service.capture('', 'Chèque', 'Payé', self.invoice_id, 10)
+
+    def test_capture_api_and_form(self):
+        """L'API renvoie la réponse conservée avec l'en-tête de rejeu ; le formulaire garde ses propres contrôles"""
+        url = reverse('payment:payment_capture')
+        payload = {'invoice_id': self.invoice_id, 'amount': 20, 'payment_method': 'PayPal'}
+        response = self.client.post(url, payload, content_type='application/json', headers={'Idempotency-Key': 'api-1'})
+        self.assertEqual(response.status_code, 201)
+        replay = self.client.post(url, payload, content_type='application/json', headers={'Idempotency-Key': 'api-1'})
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), response.json())
+        self.assertEqual(self.client.post(url, payload, content_type='application/json').status_code, 400)
+
+        # Le formulaire n'utilise pas l'encaissement de l'API : montant en centimes et au-delà du reste à payer acceptés
+        form = {
+            'invoice_id': self.invoice_id, 'amount': '150.50', 'payment_method': 'Chèque', 'state_payment': 'En attente',
+            'idempotency_key': 'form-1',
+        }
+        response = self.client.post(reverse('payment:payment'), form)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['success'], 'Paiement enregistré avec succès')
+        self.assertEqual(Payment.objects.filter(invoice_id=self.invoice_id).count(), 2)
+        self.assertFalse(PaymentCapture.objects.filter(idempotency_key='form-1').exists())
+
+    @override_settings(PAYMENT_CAPTURE_API_TOKENS=['jeton-terminal'])
+    def test_capture_api_requires_token_or_csrf(self):
+        """Sans jeton, l'API est soumise au contrôle CSRF : une page tierce ne peut pas enregistrer de paiement"""
+        client = Client(enforce_csrf_checks=True)
+        url = reverse('payment:payment_capture')
+        form = {'invoice_id': self.invoice_id, 'amount': 20, 'idempotency_key': 'tiers-1'}
+        self.assertEqual(client.post(url, form).status_code, 403)
+        self.assertEqual(client.post(url, form, headers={'Authorization': 'Bearer autre'}).status_code, 403)
+        self.assertFalse(Payment.objects.exists())
+
+        response = client.post(url, form, headers={'Authorization': 'Bearer jeton-terminal'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Payment.objects.count(), 1)
+
+
+class PaymentCaptureConcurrencyTests(TestDataMixin, TransactionTestCase):
+    """Encaissements concurrents : ni doublon ni dépassement du montant des factures"""
+
+    def setUp(self):
+        self._use_temp_dashboard_cache()
+
+    def test_benchmark_command(self):
+        arguments = ('benchmark_payment_capture', '--writers', '4', '--requests', '60', '--invoices', '3')
+        self.assertTrue(is_throwaway_database())
+        # Base de production : refus sans --force, avant toute écriture
+        with mock.patch(
+            'payment.management.commands.benchmark_payment_capture.is_throwaway_database', return_value=False
+        ):
+            with self.assertRaisesMessage(CommandError, "--force"):
+                call_command(*arguments, stdout=StringIO())
+            self.assertFalse(PaymentEvent.objects.exists())
+
+            stdout = StringIO()
+            call_command(*arguments, '--force', stdout=stdout)
+        self.assertIn("Aucun doublon ni dépassement", stdout.getvalue())
+        self.assertFalse(Payment.objects.exists())
+        self.assertFalse(PaymentCapture.objects.exists())
@@ -1,5 +1,7 @@
 from django.urls import path
-from payment.views import PaymentView, PaymentDeleteView, PaymentUpdateView
+from payment.views import (
+    BankStatementView, BankTransactionReviewView, PaymentCaptureView, PaymentView, PaymentDeleteView, PaymentUpdateView,
+)
 
 app_name = 'payment'
 
@@ -7,5 +9,8 @@ urlpatterns = [
     path('', PaymentView.as_view(), name='payment'),
     path('<int:payment_id>/delete/', PaymentDeleteView.as_view(), name='payment_delete'),
     path('<int:payment_id>/update/', PaymentUpdateView.as_view(), name='payment_update'),
+    path('capture/', PaymentCaptureView.as_view(), name='payment_capture'),
+    path('bank-statement/', BankStatementView.as_view(), name='bank_statement'),
+    path('bank-statement/review/<int:review_id>/', BankTransactionReviewView.as_view(), name='bank_review'),
 ]
 
@@ -1,7 +1,19 @@
+import hmac
+import json
+
+from django.conf import settings
+from django.contrib import messages
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
 
+from payment.services.bank_statement_parsers import STATEMENT_PARSERS
+from payment.services.bank_statement_service import BankStatementService
+from payment.services.payment_capture_service import PaymentCaptureService
 from payment.services.payment_service import PaymentService
 
 
@@ -20,10 +32,12 @@ class PaymentView(TemplateView):
             # Affiche seulement les paiements de cette facture spécifique
             if invoice_id:
                 context['payments'] = payment_service.get_payments_by_invoice_id(invoice_id)
+                context['payment_events'] = payment_service.get_payment_events(invoice_id)
                 # Récupérer le statut de la facture
                 context['invoice'] = type('obj', (object,), {'status': payment_service.get_invoice_status(invoice_id)})()
             else:
                 context['payments'] = None
+                context['payment_events'] = None
                 context['invoice'] = None
             context['invoice_id'] = invoice_id
         except:
@@ -56,7 +70,7 @@ class PaymentView(TemplateView):
                 context['error'] = 'Le montant doit être un nombre valide'
                 return render(request, self.template_name, context)
 
-            # Créer le paiement
+            # Créer le paiement (l'encaissement idempotent est réservé à l'API, PaymentCaptureView)
             result = payment_service.create_payment(payment_method, state_payment, invoice_id, amount)
 
             # Vérifier si le résultat est un dictionnaire d'erreur
@@ -149,3 +163,111 @@ class PaymentUpdateView(TemplateView):
             context['error'] = f'Erreur lors de la modification : {str(e)}'
             return render(request, self.template_name, context)
 
+
+class BankStatementView(TemplateView):
+    """Import d'un relevé bancaire et file des opérations à vérifier"""
+    template_name = 'payment/bank_statement.html'
+    REVIEW_PAGE_SIZE = 100
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        service = BankStatementService()
+        context['imports'] = service.get_recent_imports()
+        context['reviews'] = service.get_pending_reviews(self.REVIEW_PAGE_SIZE)
+        context['review_count'] = service.count_pending_reviews()
+        context['formats'] = STATEMENT_PARSERS
+        return context
+
+    def post(self, request, *args, **kwargs):
+        statement = request.FILES.get('statement')
+        if statement is None:
+            messages.error(request, "Aucun relevé sélectionné")
+            return redirect('payment:bank_statement')
+
+        try:
+            statement_import = BankStatementService().import_statement(
+                statement,
+                statement.name,
+                statement_format=request.POST.get('statement_format') or None,
+            )
+            messages.success(
+                request,
+                f"Relevé importé : {statement_import.matched} paiement(s) créé(s), "
+                f"{statement_import.to_review} opération(s) à vérifier, {statement_import.skipped} écartée(s)"
+            )
+        except ValueError as e:
+            messages.error(request, f"Erreur : {str(e)}")
+        return redirect('payment:bank_statement')
+
+
+class BankTransactionReviewView(TemplateView):
+    """Traitement d'une opération de la file : rapprochement avec une facture ou mise à l'écart"""
+
+    def post(self, request, review_id, *args, **kwargs):
+        service = BankStatementService()
+        try:
+            if request.POST.get('action') == 'ignore':
+                service.ignore_review(review_id)
+                messages.success(request, "Opération écartée")
+            else:
+                invoice_id = request.POST.get('invoice_id')
+                if not invoice_id or not invoice_id.isdigit():
+                    raise ValueError("Le numéro de facture est obligatoire")
+                service.resolve_review(review_id, int(invoice_id))
+                messages.success(request, f"Paiement enregistré sur la facture {invoice_id}")
+        except ValueError as e:
+            messages.error(request, f"Erreur : {str(e)}")
+        return redirect('payment:bank_statement')
+
+
+def has_capture_api_token(request):
+    """Demande authentifiée par un jeton de PAYMENT_CAPTURE_API_TOKENS (en-tête Authorization: Bearer <jeton>)"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    return any(
+        hmac.compare_digest(token.encode(), expected.encode()) for expected in settings.PAYMENT_CAPTURE_API_TOKENS
+    )
+
+
+class PaymentCaptureView(TemplateView):
+    """
+    API d'encaissement idempotente (terminaux de paiement, intégrations) : POST JSON ou formulaire avec
+    invoice_id, amount, payment_method, state_payment et l'en-tête Idempotency-Key (ou le champ idempotency_key).
+    Une demande rejouée reçoit la réponse d'origine avec l'en-tête Idempotent-Replayed.
+    Les clients machine s'authentifient par jeton ; les autres demandes passent le contrôle CSRF.
+    """
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        # Seule une demande authentifiée par jeton échappe au contrôle CSRF : une page tierce ne connaît pas le jeton
+        if not has_capture_api_token(request):
+            rejected = CsrfViewMiddleware(lambda req: None).process_view(request, None, (), {})
+            if rejected is not None:
+                return rejected
+        return super().dispatch(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return JsonResponse({'success': False, 'error': 'Corps JSON invalide'}, status=400)
+        else:
+            data = request.POST
+
+        try:
+            result = PaymentCaptureService().capture(
+                request.headers.get('Idempotency-Key') or data.get('idempotency_key'),
+                data.get('payment_method', 'Carte bancaire'),
+                data.get('state_payment', 'Payé'),
+                data.get('invoice_id'),
+                data.get('amount'),
+            )
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+        response = JsonResponse(result.response, status=result.status_code)
+        if result.replayed:
+            response['Idempotent-Replayed'] = 'true'
+        return response
@@ -1,3 +1,4 @@
+from commons.repositories.unit_of_work import get_by_pk
 from products.models import Product
 
 class ProductRepository:
@@ -21,7 +22,7 @@ class ProductRepository:
         return Product.objects.all().order_by('product_description')
 
     def get_product_by_id(self, product_id):
-        return Product.objects.get(product_id=product_id)
+        return get_by_pk(Product, product_id)
 
     def update_product(self, product_id, product_description, price_ht, tax, price_it, product_type):
         product = Product.objects.get(product_id=product_id)
@@ -31,4 +32,8 @@ class ProductRepository:
         product.price_it = price_it
         product.product_type = product_type
         product.save()
-        return product
\ No newline at end of file
+        return product
+
+    def get_existing_product_ids(self, product_ids):
+        """Identifiants parmi `product_ids` qui correspondent à un produit (une requête)"""
+        return set(Product.objects.filter(product_id__in=product_ids).values_list('product_id', flat=True))
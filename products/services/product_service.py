@@ -45,6 +45,9 @@ class ProductService:
     def get_product_by_id(self, product_id):
         return self.repo.get_product_by_id(product_id)
 
+    def get_existing_product_ids(self, product_ids):
+        return self.repo.get_existing_product_ids(product_ids)
+
     def update_product(self, product_id, product_description, price_ht, tax, price_it, product_type):
         self.validate_product_data(product_id, product_description, price_ht, tax, price_it, product_type)
         return self.repo.update_product(product_id, product_description, price_ht, tax, price_it, product_type)
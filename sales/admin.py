@@ -1,9 +1,37 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.urls import reverse
+from django.utils.html import format_html
 
 # Register your models here.
 from .models import SalesOrder
 from .models import SalesOrderLine
+from commons.services.export_job_service import ExportJobService
+from invoicing.services.mass_invoicing_service import MassInvoicingService
+
 admin.site.register(SalesOrderLine)
-admin.site.register(SalesOrder)
 
 
+@admin.register(SalesOrder)
+class SalesOrderAdmin(admin.ModelAdmin):
+    list_display = ('sales_order_id', 'genre', 'type', 'status', 'contact_id', 'created_at')
+    list_filter = ('type', 'status', 'created_at')
+    actions = ['invoice_signed_orders']
+
+    @admin.action(description="Facturer les commandes signées sélectionnées")
+    def invoice_signed_orders(self, request, queryset):
+        """
+        Seules les commandes signées et non facturées de la sélection sont facturées, en tâche de fond
+        (commande run_export_jobs) : la requête ne fait qu'enregistrer la tâche
+        """
+        try:
+            job = ExportJobService().submit_task_job(
+                MassInvoicingService.JOB_ENTITY,
+                sales_order_ids=list(queryset.values_list('sales_order_id', flat=True)),
+            )
+        except ValueError as e:
+            self.message_user(request, str(e), messages.WARNING)
+            return
+        self.message_user(request, format_html(
+            'Facturation <a href="{}">#{}</a> enregistrée, elle sera traitée en tâche de fond',
+            reverse('commons:export_job_detail', args=[job.export_job_id]), job.export_job_id,
+        ), messages.SUCCESS)
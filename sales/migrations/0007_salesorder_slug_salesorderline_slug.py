@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_salesorder_public_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesorder',
+            name='slug',
+            field=models.SlugField(null=True),
+        ),
+        migrations.AddField(
+            model_name='salesorderline',
+            name='slug',
+            field=models.SlugField(null=True),
+        ),
+    ]
@@ -26,6 +26,10 @@ class SalesOrder(models.Model):
     signed_at = models.DateTimeField(null=True, blank=True)
     signed_ip = models.GenericIPAddressField(null=True, blank=True)
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='Envoyé')
+    # Totaux des lignes, tenus à jour par SalesOrderLineService (commande verify_document_totals pour contrôler)
+    total_ht = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_tax = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_ttc = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     class Meta:
         db_table = 'sales_order'
 
@@ -1,3 +1,6 @@
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+
 from sales.models.sales_order_line_models import SalesOrderLine
 
 
@@ -44,3 +47,31 @@ class SalesOrderLineRepository:
         sales_order_line.save()
         return sales_order_line
 
+    def get_sales_order_lines_for_export(self, start=None, end=None, status=None, contact_id=None):
+        """Lignes de devis/commandes avec les champs de leur devis/commande, le contact et le produit (une requête)"""
+        lines = SalesOrderLine.objects.all()
+        if start is not None:
+            lines = lines.filter(sales_order_id__created_at__gte=start)
+        if end is not None:
+            lines = lines.filter(sales_order_id__created_at__lt=end)
+        if status is not None:
+            lines = lines.filter(sales_order_id__status=status)
+        if contact_id is not None:
+            lines = lines.filter(sales_order_id__contact_id=contact_id)
+        return (
+            lines
+            .annotate(
+                order_id=F('sales_order_id'),
+                order_type=F('sales_order_id__type'),
+                order_status=F('sales_order_id__status'),
+                order_genre=F('sales_order_id__genre'),
+                order_created_at=F('sales_order_id__created_at'),
+                contact_name=Concat('sales_order_id__contact_id__first_name', Value(' '), 'sales_order_id__contact_id__last_name'),
+                product_description=F('product_id__product_description'),
+            )
+            .values(
+                'order_id', 'order_type', 'order_status', 'order_genre', 'order_created_at', 'contact_name',
+                'sales_order_line_id', 'product_description', 'genre', 'quantity', 'price_ht', 'tax', 'price_it', 'date',
+            )
+            .order_by('sales_order_id', 'sales_order_line_id')
+        )
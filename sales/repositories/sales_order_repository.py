@@ -1,3 +1,10 @@
+from django.db.models import Count, Exists, F, OuterRef, Sum
+from django.db.models.functions import Trunc
+
+from commons.repositories.line_totals import line_totals
+from commons.repositories.unit_of_work import discard, get_by_pk
+from invoicing.models.invoice_models import Invoice
+from sales.models.sales_order_line_models import SalesOrderLine
 from sales.models.sales_order_models import SalesOrder
 
 
@@ -19,7 +26,21 @@ class SalesOrderRepository:
         return SalesOrder.objects.all().order_by('sales_order_id')
 
     def get_sales_order_by_id(self, sales_order_id):
-        return SalesOrder.objects.get(sales_order_id=sales_order_id)
+        return get_by_pk(SalesOrder, sales_order_id)
+
+    def lock_sales_order(self, sales_order_id):
+        """
+        Devis/commande et son contact, seul le devis/commande est verrouillé (of=self) jusqu'à la fin de la transaction
+        en cours : le contact n'est que lu. SQLite ignore select_for_update, c'est alors la contrainte
+        unique_invoice_sales_order (IntegrityError) qui empêche une double transformation.
+        """
+        return SalesOrder.objects.select_for_update(of=('self',)).select_related('contact_id').get(
+            sales_order_id=sales_order_id
+        )
+
+    def get_sales_order_with_contact(self, sales_order_id):
+        """Devis/commande et son contact en une requête"""
+        return SalesOrder.objects.select_related('contact_id').get(sales_order_id=sales_order_id)
 
     def get_sales_orders_by_type(self, order_type):
         return SalesOrder.objects.filter(type=order_type).order_by('sales_order_id')
@@ -36,9 +57,84 @@ class SalesOrderRepository:
         return sales_order
 
     def save(self, sales_order):
-        sales_order.save()
+        try:
+            sales_order.save()
+        except Exception:
+            # Instance modifiée par l'appelant, peut-être celle de l'unité de travail : elle ne reflète plus la base
+            discard(SalesOrder, [sales_order.pk])
+            raise
         return sales_order
 
     def get_by_public_hash(self, public_hash):
         return SalesOrder.objects.get(public_hash=public_hash)
 
+    def get_unconverted_quotes(self, order_by='created_at'):
+        """Devis sans facture liée (anti-jointure), annotés du nombre de lignes et du montant total stocké"""
+        converted = Invoice.objects.filter(sales_order_id=OuterRef('sales_order_id'))
+        return (
+            SalesOrder.objects
+            .filter(type='Devis')
+            .filter(~Exists(converted))
+            .annotate(lines_count=Count('salesorderline'), total_amount=F('total_ttc'))
+            .filter(lines_count__gt=0)
+            .select_related('contact_id')
+            .order_by(order_by, 'sales_order_id')
+        )
+
+    def get_uninvoiced_order_ids(self, order_type='Commande', status='Signé', start=None, end=None,
+                                 contact_id=None, sales_order_ids=None):
+        """Identifiants des devis/commandes sans facture liée correspondant aux filtres, du plus ancien au plus récent"""
+        invoiced = Invoice.objects.filter(sales_order_id=OuterRef('sales_order_id'))
+        sales_orders = SalesOrder.objects.filter(type=order_type, status=status).filter(~Exists(invoiced))
+        if start is not None:
+            sales_orders = sales_orders.filter(created_at__gte=start)
+        if end is not None:
+            sales_orders = sales_orders.filter(created_at__lt=end)
+        if contact_id is not None:
+            sales_orders = sales_orders.filter(contact_id=contact_id)
+        if sales_order_ids is not None:
+            sales_orders = sales_orders.filter(sales_order_id__in=sales_order_ids)
+        return list(sales_orders.order_by('created_at', 'sales_order_id').values_list('sales_order_id', flat=True))
+
+    def get_totals_by_period(self, start=None, end=None, granularity='month', order_type=None):
+        """Montant TTC (totaux stockés) et nombre de devis/commandes par période de création"""
+        sales_orders = SalesOrder.objects.all()
+        if order_type is not None:
+            sales_orders = sales_orders.filter(type=order_type)
+        if start is not None:
+            sales_orders = sales_orders.filter(created_at__gte=start)
+        if end is not None:
+            sales_orders = sales_orders.filter(created_at__lt=end)
+        return (
+            sales_orders
+            .annotate(period=Trunc('created_at', granularity))
+            .values('period')
+            .annotate(total=Sum('total_ttc'), count=Count('sales_order_id'))
+            .order_by('period')
+        )
+
+    def refresh_totals(self, sales_order_ids):
+        """Recalculer les totaux stockés des devis/commandes à partir de leurs lignes (une requête UPDATE)"""
+        updated = SalesOrder.objects.filter(sales_order_id__in=sales_order_ids).update(
+            **line_totals(SalesOrderLine.objects.all(), 'sales_order_id')
+        )
+        # UPDATE sans save() : les devis/commandes chargés dans l'unité de travail ont des totaux périmés
+        discard(SalesOrder, sales_order_ids)
+        return updated
+
+    def get_totals_with_expected(self, sales_order_ids):
+        """Totaux stockés et totaux recalculés depuis les lignes, pour contrôle"""
+        expected = line_totals(SalesOrderLine.objects.all(), 'sales_order_id')
+        return (
+            SalesOrder.objects.filter(sales_order_id__in=sales_order_ids)
+            .annotate(**{f'expected_{name}': expression for name, expression in expected.items()})
+            .values(
+                'sales_order_id', 'total_ht', 'total_tax', 'total_ttc',
+                'expected_total_ht', 'expected_total_tax', 'expected_total_ttc',
+            )
+            .order_by('sales_order_id')
+        )
+
+    def get_sales_order_ids(self):
+        """Identifiants de tous les devis/commandes, lus par blocs"""
+        return SalesOrder.objects.order_by('sales_order_id').values_list('sales_order_id', flat=True).iterator(chunk_size=2000)
@@ -7,8 +7,13 @@ from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from io import BytesIO
 from datetime import datetime
 
+from commons.services.pdf_cache_service import PdfCacheService
+
 
 class SalesOrderPDFService:
+    # À incrémenter à chaque modification de la mise en page : les PDF en cache sont alors régénérés
+    LAYOUT_VERSION = 1
+
     def __init__(self):
         self.page_width = A4[0]
         self.page_height = A4[1]
@@ -58,6 +63,40 @@ class SalesOrderPDFService:
         buffer.seek(0)
         return buffer
 
+    def document_content(self, sales_order, lines):
+        """Tout ce que le PDF affiche : sert de clé au cache, toute modification du document la change"""
+        contact = sales_order.contact_id
+        content = {
+            'layout': self.LAYOUT_VERSION,
+            'header': [sales_order.type, sales_order.genre, sales_order.created_at],
+            'contact': [
+                contact.first_name, contact.last_name, contact.address, contact.city,
+                contact.zip_code, contact.email, contact.phone, contact.siret,
+            ],
+            'lines': [
+                [line.date, line.product_id.product_description, line.genre, line.quantity,
+                 line.price_ht, line.tax, line.price_it]
+                for line in lines
+            ],
+            'totals': [sales_order.total_ht, sales_order.total_tax, sales_order.total_ttc],
+        }
+        if hasattr(sales_order, 'payments') and sales_order.payments:
+            content['payments'] = [
+                sales_order.payment_status,
+                sales_order.total_paid,
+                [[payment.created_at, payment.payment_method, payment.state_payment, payment.amount]
+                 for payment in sales_order.payments],
+            ]
+        return content
+
+    def get_pdf(self, sales_order, lines):
+        """PDF du document depuis le cache, généré seulement si son contenu n'y est pas encore"""
+        pdf_file, _ = PdfCacheService().get_or_render(
+            self.document_content(sales_order, lines),
+            lambda: self.generate_pdf(sales_order, lines),
+        )
+        return pdf_file
+
     def _build_header(self, sales_order):
         """Construire l'en-tête du devis"""
         elements = []
@@ -215,10 +254,10 @@ class SalesOrderPDFService:
         """Construire la section des totaux"""
         elements = []
 
-        # Calculer les totaux
-        total_ht = sum(line.price_ht * line.quantity for line in lines)
-        total_tax = sum(line.price_ht * line.quantity * line.tax / 100 for line in lines)
-        total_ttc = total_ht + total_tax
+        # Totaux stockés sur le document (tenus à jour à chaque écriture de ligne)
+        total_ht = sales_order.total_ht
+        total_tax = sales_order.total_tax
+        total_ttc = sales_order.total_ttc
 
         # Tableau des totaux
         totals_data = [
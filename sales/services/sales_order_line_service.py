@@ -1,3 +1,5 @@
+from django.db import transaction
+
 from sales.repositories.sales_order_line_repository import SalesOrderLineRepository
 from sales.services.sales_order_service import SalesOrderService
 from products.services.product_service import ProductService
@@ -51,10 +53,18 @@ class SalesOrderLineService:
         # Extraire le DTO du contact pour obtenir l'ID, pas le DTO lui-même
         contact_dto = self.contact_service.get_contact_by_id(contact_id)
 
-        return self.repo.create_sales_order_line(sales_order, product, contact_dto.contact_id, price_ht, tax, price_it, quantity, date, genre)
+        # Les totaux du devis/commande sont recalculés dans la même transaction que l'écriture de la ligne
+        with transaction.atomic():
+            line = self.repo.create_sales_order_line(sales_order, product, contact_dto.contact_id, price_ht, tax, price_it, quantity, date, genre)
+            self.sales_order_service.refresh_totals([sales_order.sales_order_id])
+        return line
 
     def delete_sales_order_line(self, sales_order_line_id):
-        return self.repo.delete_sales_order_line(sales_order_line_id)
+        line = self.repo.get_sales_order_line_by_id(sales_order_line_id)
+        with transaction.atomic():
+            deleted = self.repo.delete_sales_order_line(sales_order_line_id)
+            self.sales_order_service.refresh_totals([line.sales_order_id_id])
+        return deleted
 
     def get_all_sales_order_lines(self):
         return self.repo.get_all_sales_order_lines()
@@ -65,12 +75,21 @@ class SalesOrderLineService:
     def get_sales_order_lines_by_order(self, sales_order_id):
         return self.repo.get_sales_order_lines_by_order(sales_order_id)
 
-    def update_sales_order_line(self, sales_order_line_id, sales_order_id, product_id, contact_id, price_ht, tax, quantity, date, genre):
+    def get_sales_order_lines_for_export(self, start=None, end=None, status=None, contact_id=None):
+        """Lignes des devis/commandes créés sur [start, end[, avec les champs de leur devis/commande"""
+        return self.repo.get_sales_order_lines_for_export(start, end, status, contact_id)
+
+    def update_sales_order_line(self, sales_order_line_id, sales_order_id, product_id, contact_id, price_ht, tax, price_it, quantity, date, genre):
         self.validate_sales_order_line_data(sales_order_id, product_id, contact_id, price_ht, tax, quantity, date, genre)
         sales_order = self.sales_order_service.get_sales_order_by_id(sales_order_id)
         product = self.product_service.get_product_by_id(product_id)
         # Extraire le DTO du contact pour obtenir l'ID, pas le DTO lui-même
         contact_dto = self.contact_service.get_contact_by_id(contact_id)
+        previous_sales_order_id = self.repo.get_sales_order_line_by_id(sales_order_line_id).sales_order_id_id
 
-        return self.repo.update_sales_order_line(sales_order_line_id, sales_order, product, contact_dto.contact_id, price_ht, tax, quantity, date, genre)
+        with transaction.atomic():
+            line = self.repo.update_sales_order_line(sales_order_line_id, sales_order, product, contact_dto.contact_id, price_ht, tax, price_it, quantity, date, genre)
+            # La ligne peut changer de devis/commande : les deux totaux sont recalculés
+            self.sales_order_service.refresh_totals({previous_sales_order_id, sales_order.sales_order_id})
+        return line
 
@@ -48,12 +48,44 @@ class SalesOrderService:
     def get_sales_order_by_id(self, sales_order_id):
         return self.repo.get_sales_order_by_id(sales_order_id)
 
+    def lock_sales_order(self, sales_order_id):
+        """Verrouiller le devis/commande (à appeler dans une transaction)"""
+        return self.repo.lock_sales_order(sales_order_id)
+
+    def get_sales_order_with_contact(self, sales_order_id):
+        return self.repo.get_sales_order_with_contact(sales_order_id)
+
     def get_sales_orders_by_type(self, order_type):
         return self.repo.get_sales_orders_by_type(order_type)
 
     def get_sales_orders_by_contact(self, contact_id):
         return self.repo.get_sales_orders_by_contact(contact_id)
 
+    def get_unconverted_quotes(self, sort='oldest'):
+        """Devis non transformés en facture, triés du plus ancien ('oldest') ou du plus récent ('newest')"""
+        order_by = '-created_at' if sort == 'newest' else 'created_at'
+        return self.repo.get_unconverted_quotes(order_by)
+
+    def get_uninvoiced_order_ids(self, order_type='Commande', status='Signé', start=None, end=None,
+                                 contact_id=None, sales_order_ids=None):
+        """Devis/commandes restant à facturer"""
+        return self.repo.get_uninvoiced_order_ids(order_type, status, start, end, contact_id, sales_order_ids)
+
+    def refresh_totals(self, sales_order_ids):
+        """Recalculer les totaux stockés des devis/commandes (à appeler dans la transaction qui modifie les lignes)"""
+        return self.repo.refresh_totals(sales_order_ids)
+
+    def get_totals_with_expected(self, sales_order_ids):
+        """Totaux stockés et recalculés des devis/commandes"""
+        return self.repo.get_totals_with_expected(sales_order_ids)
+
+    def get_sales_order_ids(self):
+        return self.repo.get_sales_order_ids()
+
+    def get_totals_by_period(self, start=None, end=None, granularity='month', order_type=None):
+        """Montants des devis/commandes par période"""
+        return self.repo.get_totals_by_period(start, end, granularity, order_type)
+
     def update_sales_order(self, sales_order_id, contact_id, genre, order_type):
         self.validate_sales_order_data(contact_id, genre, order_type)
         contact_dto = self.contact_service.get_contact_by_id(contact_id)
@@ -126,7 +126,7 @@ class SalesOrderDownloadPDFView(TemplateView):
 
         # Générer le PDF
         pdf_service = SalesOrderPDFService()
-        pdf_buffer = pdf_service.generate_pdf(sales_order, lines)
+        pdf_buffer = pdf_service.get_pdf(sales_order, lines)
 
         # Déterminer le nom du fichier
         doc_type = "Devis" if sales_order.type == "Devis" else "Commande"